@@ -0,0 +1,47 @@
+"""student_mastery_bkt_state
+
+Revision ID: 3b1d9c0e7a21
+Revises: f527b3c4785a
+Create Date: 2026-01-12 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '3b1d9c0e7a21'
+down_revision: Union[str, None] = 'f527b3c4785a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # BKT state per (user, skill). The unique constraint is the conflict target
+    # for the batched INSERT ... ON CONFLICT issued by BKTService.
+    op.create_table('student_mastery',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('skill_id', sa.String(length=200), nullable=False),
+        sa.Column('p_mastery', sa.Float(), server_default='0.1', nullable=False),
+        sa.Column('p_transit', sa.Float(), server_default='0.1', nullable=False),
+        sa.Column('p_slip', sa.Float(), server_default='0.1', nullable=False),
+        sa.Column('p_guess', sa.Float(), server_default='0.2', nullable=False),
+        sa.Column('attempts_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('correct_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'skill_id', name='uq_student_mastery_user_skill')
+    )
+    op.create_index('ix_student_mastery_user_id', 'student_mastery', ['user_id'])
+    op.create_index('ix_student_mastery_skill_id', 'student_mastery', ['skill_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_student_mastery_skill_id', table_name='student_mastery')
+    op.drop_index('ix_student_mastery_user_id', table_name='student_mastery')
+    op.drop_table('student_mastery')
@@ -0,0 +1,37 @@
+"""llm_analysis_cache
+
+Revision ID: 5e7a1c3b9f20
+Revises: 8c4e2f6a9d13
+Create Date: 2026-01-27 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a1c3b9f20'
+down_revision: Union[str, None] = '8c4e2f6a9d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('llm_analysis_cache',
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('namespace', sa.String(length=50), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('prompt_version', sa.String(length=50), nullable=False),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index(op.f('ix_llm_analysis_cache_expires_at'), 'llm_analysis_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_llm_analysis_cache_expires_at'), table_name='llm_analysis_cache')
+    op.drop_table('llm_analysis_cache')
@@ -0,0 +1,48 @@
+"""student_node_rollups
+
+Revision ID: 8c4e2f6a9d13
+Revises: 3b1d9c0e7a21
+Create Date: 2026-01-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2f6a9d13'
+down_revision: Union[str, None] = '3b1d9c0e7a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('student_node_rollups',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('node_id', sa.Integer(), nullable=False),
+        sa.Column('attempt_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('correct_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('score_sum', sa.Float(), server_default='0', nullable=False),
+        sa.Column('time_sum_ms', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('last_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['node_id'], ['curriculum_nodes.node_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'node_id')
+    )
+
+    # Seed from existing history; from here on rollup_service keeps it current
+    op.execute("""
+        INSERT INTO student_node_rollups
+            (user_id, node_id, attempt_count, correct_count, score_sum, time_sum_ms, last_attempt_at)
+        SELECT a.user_id, qc.node_id, COUNT(*), COUNT(*) FILTER (WHERE a.is_correct),
+               SUM(a.score), COALESCE(SUM(a.time_taken_ms), 0), MAX(a.attempted_at)
+        FROM attempt_logs a
+        JOIN question_curriculum qc ON qc.question_id = a.question_id
+        GROUP BY a.user_id, qc.node_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('student_node_rollups')
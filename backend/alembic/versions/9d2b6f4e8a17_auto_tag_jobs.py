@@ -0,0 +1,44 @@
+"""auto_tag_jobs
+
+Revision ID: 9d2b6f4e8a17
+Revises: 5e7a1c3b9f20
+Create Date: 2026-02-03 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2b6f4e8a17'
+down_revision: Union[str, None] = '5e7a1c3b9f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('auto_tag_jobs',
+        sa.Column('job_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='queued', nullable=False),
+        sa.Column('question_status', sa.String(length=20), nullable=True),
+        sa.Column('curriculum_path', sa.String(), nullable=True),
+        sa.Column('retag', sa.Boolean(), server_default='false', nullable=False),
+        sa.Column('last_question_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('total', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('processed', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('tagged', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('failed', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('tag_links', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('cancel_requested', sa.Boolean(), server_default='false', nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('job_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('auto_tag_jobs')
@@ -0,0 +1,46 @@
+"""student_knowledge_profiles
+
+Revision ID: c4a8d2e6f310
+Revises: b7f3e1a9c254
+Create Date: 2026-03-09 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8d2e6f310'
+down_revision: Union[str, None] = 'b7f3e1a9c254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Diagnosis knowledge profiles (previously held in process memory by the
+    # diagnosis service). Both tables are written with additive upserts.
+    op.create_table('student_knowledge_profiles',
+        sa.Column('student_id', sa.String(length=100), nullable=False),
+        sa.Column('total_attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('total_correct', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('student_id')
+    )
+    # The (student_id, concept) primary key also serves "all concepts of a student"
+    op.create_table('student_concept_knowledge',
+        sa.Column('student_id', sa.String(length=100), nullable=False),
+        sa.Column('concept', sa.String(length=200), nullable=False),
+        sa.Column('relation', sa.String(length=50), nullable=False),
+        sa.Column('strength', sa.Float(), nullable=False),
+        sa.Column('evidence_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('mastery_sum', sa.Float(), server_default='0', nullable=False),
+        sa.Column('last_evidence', sa.Text(), nullable=True),
+        sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('student_id', 'concept')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('student_concept_knowledge')
+    op.drop_table('student_knowledge_profiles')
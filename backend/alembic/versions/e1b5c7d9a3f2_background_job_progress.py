@@ -0,0 +1,27 @@
+"""background_job_progress
+
+Revision ID: e1b5c7d9a3f2
+Revises: c4a8d2e6f310
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b5c7d9a3f2'
+down_revision: Union[str, None] = 'c4a8d2e6f310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Progress published by a running handler, readable from every worker
+    op.add_column('background_jobs', sa.Column('progress', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('background_jobs', 'progress')
@@ -1,5 +1,5 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.models.attempt import AttemptLog
@@ -17,16 +17,18 @@ class AttemptSubmit(BaseModel):
     score: float
     time_taken_ms: int
 
-@router.post("/attempt")
+@router.post("/attempt", status_code=202)
 async def submit_attempt(
-    attempt: AttemptSubmit,
-    db: AsyncSession = Depends(deps.get_db)
+    attempt: AttemptSubmit
 ) -> Any:
     """
-    Submit a question attempt and trigger real BKT update.
+    Submit a question attempt.
+    The attempt is acknowledged immediately and written to attempt_logs (plus the
+    BKT update) by the ingestion buffer in micro-batches.
     """
-    # 1. Save Log
-    log = AttemptLog(
+    from app.services.ingestion_service import attempt_buffer, PendingAttempt, IngestionBufferFull
+
+    pending = PendingAttempt(
         user_id=attempt.user_id,
         question_id=attempt.question_id,
         response_data=attempt.response_data,
@@ -34,43 +36,25 @@ async def submit_attempt(
         score=attempt.score,
         time_taken_ms=attempt.time_taken_ms
     )
-    db.add(log)
-    await db.commit()
-
-    # 2. Get skill from question tags (real implementation)
-    from app.services.analytics_service import analytics_service
-    from app.models.question import Question, QuestionTag
-    from app.models.tag import Tag
-    from sqlalchemy import select
-
-    # Find skill tags for this question
-    stmt = select(Tag).join(QuestionTag).where(
-        QuestionTag.question_id == attempt.question_id,
-        Tag.tag_type.in_(["concept", "subject"])
-    ).limit(1)
-
-    result = await db.execute(stmt)
-    skill_tag = result.scalars().first()
-
-    if skill_tag:
-        skill_id = skill_tag.name
-    else:
-        skill_id = "General.Unknown"
-
-    # 3. Update BKT with real DB integration
-    new_mastery = await analytics_service.update_bkt(
-        db=db,
-        user_id=attempt.user_id,
-        skill_id=skill_id,
-        is_correct=attempt.is_correct
-    )
+    try:
+        await attempt_buffer.submit(pending)
+    except IngestionBufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
     return {
-        "status": "recorded",
-        "skill_analyzed": skill_id,
-        "new_mastery_estimate": round(new_mastery, 3)
+        "status": "accepted",
+        "attempted_at": pending.attempted_at.isoformat()
     }
 
+@router.get("/ingestion/stats")
+async def get_ingestion_stats() -> Any:
+    """
+    Ingestion buffer counters (pending, flushed, dropped, last batch timing).
+    """
+    from app.services.ingestion_service import attempt_buffer
+
+    return {"pending": attempt_buffer.pending, "running": attempt_buffer.running, **attempt_buffer.stats}
+
 @router.get("/report/{user_id}")
 async def get_user_report(
     user_id: UUID,
@@ -86,9 +70,14 @@ async def get_user_report(
     # Get mastery map
     mastery_map = await analytics_service.get_user_mastery_map(db, user_id)
 
-    # Get recent activity
+    # Get recent activity (time-bounded so only recent partitions are scanned)
+    from datetime import timedelta
+    from app.core.config import settings
+
+    since = datetime.now().astimezone() - timedelta(days=settings.ANALYTICS_WINDOW_DAYS)
     stmt = select(AttemptLog).where(
-        AttemptLog.user_id == user_id
+        AttemptLog.user_id == user_id,
+        AttemptLog.attempted_at >= since
     ).order_by(AttemptLog.attempted_at.desc()).limit(10)
 
     result = await db.execute(stmt)
@@ -124,19 +113,51 @@ async def get_user_report(
 async def recommend_questions(
     user_id: UUID,
     db: AsyncSession = Depends(deps.get_db),
-    count: int = 5
+    count: int = 5,
+    node_id: Optional[int] = None,
+    tag: Optional[str] = None
 ) -> Any:
     """
     Get personalized question recommendations based on mastery.
+    Unattempted items with maximum information at the student's ability,
+    weakest skills first (or restricted to one curriculum node / skill tag).
     """
     from app.services.analytics_service import analytics_service
 
-    recommended_ids = await analytics_service.recommend_next_questions(
+    items = await analytics_service.recommend_next_questions(
         db=db,
-        user_id=user_id
+        user_id=user_id,
+        count=max(1, min(count, 50)),
+        node_id=node_id,
+        tag=tag
     )
 
     return {
         "user_id": str(user_id),
-        "recommended_question_ids": [str(qid) for qid in recommended_ids[:count]]
+        "recommended_question_ids": [str(item["question_id"]) for item in items],
+        "items": [{**item, "question_id": str(item["question_id"])} for item in items]
+    }
+
+@router.get("/partitions")
+async def get_attempt_partitions(
+    db: AsyncSession = Depends(deps.get_db)
+) -> Any:
+    """
+    attempt_logs partitions with their bounds and on-disk size.
+    """
+    from app.services.partition_service import partition_manager
+
+    partitions = await partition_manager.partition_sizes(db)
+    return {
+        "partitions": partitions,
+        "total_bytes": sum(p["total_bytes"] for p in partitions)
     }
+
+@router.post("/partitions/maintenance")
+async def run_partition_maintenance() -> Any:
+    """
+    Run partition maintenance now (create upcoming months, archive expired ones).
+    """
+    from app.services.partition_service import partition_manager
+
+    return await partition_manager.run_maintenance()
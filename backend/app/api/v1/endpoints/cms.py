@@ -1,13 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
 import uuid
 from datetime import datetime
 
 from app.api import deps
-from app.schemas.bulk import BulkSubmitRequest, BulkSubmitResponse
-from app.models.attempt import AttemptLog
-# Assuming we might need question validation, but skipping for speed in MVP
+from app.schemas.bulk import BulkSubmitRequest, BulkSubmitResponse, BulkImportResponse
+from app.services.bulk_import_service import bulk_import_service, InvalidBulkBody, UnsupportedBulkFormat
 
 router = APIRouter()
 
@@ -17,48 +16,34 @@ async def bulk_submit_attempts(
     db: Session = Depends(deps.get_db)
 ):
     """
-    Submit multiple student attempts in a single transaction.
+    Submit multiple student attempts.
+    Question IDs are validated with one set-based query and rows are written with
+    COPY in chunks; a bad row only fails that row, a failed chunk only that chunk.
     """
-    success_count = 0
-    failed_items = []
+    result = await bulk_import_service.import_items(db, request.items)
 
-    for item in request.items:
-        try:
-            # Create attempt record
-            # Note: score is strictly 100.0 (correct) or 0.0 (incorrect) for MVP generic logic
-            score = 100.0 if item.is_correct else 0.0
-            
-            db_attempt = AttemptLog(
-                user_id=item.student_id,
-                question_id=item.question_id,
-                response_data={"notes": item.notes} if item.notes else {},
-                is_correct=item.is_correct,
-                score=score,
-                time_taken_ms=item.time_taken_seconds * 1000 if item.time_taken_seconds else None,
-                attempted_at=datetime.now()
-            )
-            db.add(db_attempt)
-            success_count += 1
-        except Exception as e:
-            failed_items.append({
-                "student_id": str(item.student_id),
-                "question_id": str(item.question_id),
-                "error": str(e)
-            })
+    return BulkSubmitResponse(
+        success_count=result.success_count,
+        failed_count=result.failed_count,
+        failed_items=[item for chunk in result.chunks for item in chunk.failed_items]
+    )
 
+@router.post("/bulk-submit/stream", response_model=BulkImportResponse)
+async def bulk_submit_stream(
+    request: Request,
+    db: Session = Depends(deps.get_db)
+):
+    """
+    Streamed bulk import for large uploads.
+    Body is NDJSON (one BulkAttemptItem per line) or CSV with a header row
+    (student_id,question_id,is_correct,time_taken_seconds,notes).
+    The response reports success/failure per chunk.
+    """
     try:
-        await db.commit()
-    except Exception as e:
-        await db.rollback()
-        # If commit fails, all fail
-        return BulkSubmitResponse(
-            success_count=0,
-            failed_count=len(request.items),
-            failed_items=[{"error": "Transaction commit failed: " + str(e)}]
+        return await bulk_import_service.import_stream(
+            db, request.stream(), request.headers.get("content-type", "")
         )
-
-    return BulkSubmitResponse(
-        success_count=success_count,
-        failed_count=len(failed_items),
-        failed_items=failed_items
-    )
+    except UnsupportedBulkFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except InvalidBulkBody as e:
+        raise HTTPException(status_code=400, detail=str(e))
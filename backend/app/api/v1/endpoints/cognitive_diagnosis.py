@@ -11,6 +11,9 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 import logging
 
+from app.core.config import settings
+from app.core.llm_metrics import llm_template
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/diagnosis", tags=["Cognitive Diagnosis"])
@@ -20,7 +23,7 @@ router = APIRouter(prefix="/diagnosis", tags=["Cognitive Diagnosis"])
 
 class DiagnoseRequest(BaseModel):
     """진단 요청 스키마"""
-    student_id: str = Field(..., description="학생 ID")
+    student_id: str = Field(..., max_length=100, description="학생 ID")
     question_content: str = Field(..., description="문제 내용")
     student_answer: str = Field(..., description="학생 답안 (OCR 텍스트 포함)")
     correct_answer: Optional[str] = Field(None, description="정답 (선택사항)")
@@ -42,7 +45,7 @@ class DiagnoseRequest(BaseModel):
 
 class BatchDiagnoseRequest(BaseModel):
     """일괄 진단 요청 스키마"""
-    student_id: str
+    student_id: str = Field(..., max_length=100)
     subject: str = "수학"
     attempts: List[Dict[str, str]] = Field(
         ...,
@@ -117,12 +120,9 @@ def get_diagnosis_service():
     if _diagnosis_service is None:
         try:
             from mathesis_core.diagnosis import CognitiveDiagnosisService
-            from mathesis_core.llm.clients import create_ollama_client
+            from app.core.llm_gateway import shared_ollama_client
 
-            llm_client = create_ollama_client(
-                base_url="http://localhost:11434",
-                model="llama3"
-            )
+            llm_client = shared_ollama_client(settings.OLLAMA_BASE_URL, settings.DIAGNOSIS_MODEL)
             _diagnosis_service = CognitiveDiagnosisService(
                 llm_client=llm_client,
                 subject="수학"
@@ -140,8 +140,7 @@ def get_diagnosis_service():
 class MockDiagnosisService:
     """테스트용 Mock 진단 서비스"""
 
-    def __init__(self):
-        self._profiles = {}
+    model_version = "mock"
 
     def diagnose(self, **kwargs):
         from mathesis_core.diagnosis.models import (
@@ -186,15 +185,6 @@ class MockDiagnosisService:
             concepts_involved=["일반개념"]
         )
 
-    def get_student_profile(self, student_id: str):
-        from mathesis_core.diagnosis.models import StudentKnowledgeProfile
-        if student_id not in self._profiles:
-            self._profiles[student_id] = StudentKnowledgeProfile(student_id=student_id)
-        return self._profiles[student_id]
-
-    def get_weak_concepts(self, student_id: str, threshold: float = 0.5):
-        return self.get_student_profile(student_id).weak_concepts
-
     def get_recommendations(self, student_id: str):
         return ["복습 추천"]
 
@@ -209,6 +199,22 @@ class MockDiagnosisService:
         return {"total_score": 0, "feedback": "[Mock] 루브릭 평가"}
 
 
+async def run_diagnosis(fn, *args, timeout: Optional[float] = None, **kwargs):
+    """
+    동기 진단 서비스 호출을 전용 스레드 풀에서 실행 (이벤트 루프 차단 방지)
+
+    대기 중인 진단이 너무 많으면 503, 시간 초과 시 504
+    """
+    from app.services.diagnosis_executor import DiagnosisOverloaded, DiagnosisTimeout, diagnosis_executor
+
+    try:
+        return await diagnosis_executor.run(fn, *args, timeout=timeout, **kwargs)
+    except DiagnosisOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except DiagnosisTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+
 # ============== API Endpoints ==============
 
 @router.post("/analyze", response_model=DiagnosisResponse)
@@ -221,45 +227,89 @@ async def analyze_student_answer(
 
     LLM을 사용하여 학생의 답안을 분석하고 오개념을 진단합니다.
     BKT/IRT와 달리 Zero-shot으로 즉시 진단이 가능합니다.
+    정답과 수식적으로 동치임이 증명되는 답안은 LLM 없이 즉시 정답으로 진단합니다.
+    같은 문제에 같은 답안(정규화 후)이 들어오면 캐시된 진단을 재사용합니다.
     """
     try:
-        result = service.diagnose(
-            student_id=request.student_id,
-            question_content=request.question_content,
-            student_answer=request.student_answer,
-            correct_answer=request.correct_answer,
-            question_id=request.question_id
-        )
+        from app.services.answer_check_service import answer_checker, correct_diagnosis
+        from app.services.diagnosis_batch_service import diagnosis_result_dict
+        from app.services.knowledge_profile_service import knowledge_profile_store
+        from app.services.misconception_cache_service import diagnosis_model, misconception_cache
+
+        check = await answer_checker.check(request.student_answer, request.correct_answer,
+                                           request.question_content)
+        if check.equivalent:
+            payload = correct_diagnosis(request.student_id, request.question_id, check)
+            await knowledge_profile_store.record(payload["student_id"], True, payload["kg_operations"])
+            return DiagnosisResponse(**payload)
+
+        async def diagnose():
+            result = await run_diagnosis(
+                service.diagnose,
+                student_id=request.student_id,
+                question_content=request.question_content,
+                student_answer=request.student_answer,
+                correct_answer=request.correct_answer,
+                question_id=request.question_id
+            )
+            return diagnosis_result_dict(result)
+
+        with llm_template("diagnosis"):
+            payload = await misconception_cache.diagnose(
+                diagnose,
+                student_id=request.student_id,
+                question_content=request.question_content,
+                student_answer=request.student_answer,
+                correct_answer=request.correct_answer,
+                question_id=request.question_id,
+                model=diagnosis_model(service)
+            )
+        await knowledge_profile_store.record(payload["student_id"], payload["is_correct"], payload["kg_operations"])
 
-        return DiagnosisResponse(
-            student_id=result.student_id,
-            question_id=result.question_id,
-            is_correct=result.is_correct,
-            error_type=result.error_type.value if result.error_type else None,
-            reasoning_trace=result.reasoning_trace,
-            error_location=result.error_location,
-            feedback=result.feedback,
-            recommendation=result.recommendation,
-            concepts_involved=result.concepts_involved,
-            kg_operations=[
-                KGOperationResponse(
-                    operation=op.operation,
-                    relation=op.relation.value,
-                    concept=op.concept,
-                    strength=op.strength,
-                    evidence=op.evidence
-                )
-                for op in result.kg_operations
-            ],
-            confidence=result.confidence,
-            timestamp=result.timestamp.isoformat()
-        )
+        return DiagnosisResponse(**payload)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Diagnosis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/analyze/stream")
+async def analyze_student_answer_stream(request: DiagnoseRequest):
+    """
+    학생 답안 인지 진단 (스트리밍, text/event-stream)
+
+    생성되는 토큰(token)과 완성된 필드(field)를 즉시 전송하고,
+    마지막에 DiagnosisResponse 형식의 result 이벤트를 보냅니다.
+    """
+    from app.core.streaming import event_stream_response, sse_event
+    from app.services.diagnosis_stream_service import stream_diagnosis
+    from app.services.knowledge_profile_service import knowledge_profile_store
+
+    async def events():
+        try:
+            async for kind, payload in stream_diagnosis(
+                student_id=request.student_id,
+                question_content=request.question_content,
+                student_answer=request.student_answer,
+                correct_answer=request.correct_answer,
+                question_id=request.question_id,
+            ):
+                if kind == "token":
+                    yield sse_event("token", {"text": payload})
+                elif kind == "field":
+                    yield sse_event("field", payload)
+                else:
+                    await knowledge_profile_store.record(payload["student_id"], payload["is_correct"], payload["kg_operations"])
+                    yield sse_event("result", DiagnosisResponse(**payload).model_dump())
+        except Exception as e:
+            logger.error(f"Diagnosis stream failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return event_stream_response(events())
+
+
 @router.post("/analyze/batch")
 async def analyze_batch(
     request: BatchDiagnoseRequest,
@@ -268,19 +318,58 @@ async def analyze_batch(
     """
     여러 문제에 대한 일괄 진단
 
-    여러 문제의 풀이를 한 번에 분석하여 패턴을 파악합니다.
+    여러 문제의 풀이를 동시에 진단하고 (DIAGNOSIS_BATCH_CONCURRENCY개씩),
+    결과로부터 오류 패턴을 분석합니다. 완료되는 대로 받으려면 /analyze/batch/stream
     """
+    from app.services.diagnosis_batch_service import diagnosis_batch_service
+
     try:
-        result = service.diagnose_batch(
-            student_id=request.student_id,
-            attempts=request.attempts
-        )
-        return result
+        results: Dict[int, Dict[str, Any]] = {}
+        errors = []
+        async for event in diagnosis_batch_service.run(service, request.student_id, request.attempts):
+            if event["type"] == "result":
+                results[event["index"]] = event["result"]
+            elif event["type"] == "error":
+                errors.append({"index": event["index"], "detail": event["detail"]})
+            else:
+                summary = event
+        return {
+            "individual_results": [results[i] for i in sorted(results)],
+            "pattern_analysis": summary["pattern_analysis"],
+            "overall_diagnosis": summary["overall_diagnosis"],
+            "errors": errors
+        }
     except Exception as e:
         logger.error(f"Batch diagnosis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/analyze/batch/stream")
+async def analyze_batch_stream(
+    request: BatchDiagnoseRequest,
+    service=Depends(get_diagnosis_service)
+):
+    """
+    여러 문제에 대한 일괄 진단 (스트리밍, application/x-ndjson)
+
+    문제별 진단이 끝나는 대로 한 줄씩 보냅니다:
+    result (index, 진단 결과, 지금까지의 패턴 분석), error (index, 사유),
+    마지막에 summary (최종 패턴 분석, 종합 진단).
+    """
+    from app.core.streaming import ndjson_line, ndjson_response
+    from app.services.diagnosis_batch_service import diagnosis_batch_service
+
+    async def lines():
+        try:
+            async for event in diagnosis_batch_service.run(service, request.student_id, request.attempts):
+                yield ndjson_line(event)
+        except Exception as e:
+            logger.error(f"Batch diagnosis stream failed: {e}")
+            yield ndjson_line({"type": "error", "index": None, "detail": str(e)})
+
+    return ndjson_response(lines())
+
+
 @router.post("/evaluate/rubric")
 async def evaluate_with_rubric(
     request: RubricEvaluationRequest,
@@ -292,29 +381,33 @@ async def evaluate_with_rubric(
     정의된 평가 기준(루브릭)에 따라 학생 답안을 평가합니다.
     """
     try:
-        result = service.evaluate_with_rubric(
-            question_content=request.question_content,
-            student_answer=request.student_answer,
-            rubric=request.rubric
-        )
+        with llm_template("rubric_evaluation"):
+            result = await run_diagnosis(
+                service.evaluate_with_rubric,
+                question_content=request.question_content,
+                student_answer=request.student_answer,
+                rubric=request.rubric
+            )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Rubric evaluation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/profile/{student_id}", response_model=StudentProfileResponse)
-async def get_student_profile(
-    student_id: str,
-    service=Depends(get_diagnosis_service)
-):
+async def get_student_profile(student_id: str):
     """
     학생 지식 프로필 조회
 
     Personal Knowledge Graph (PKG) 기반의 학생 지식 상태를 반환합니다.
+    (Postgres 저장, 프로세스별 LRU 캐시)
     """
+    from app.services.knowledge_profile_service import knowledge_profile_store
+
     try:
-        profile = service.get_student_profile(student_id)
+        profile = await knowledge_profile_store.get(student_id)
 
         return StudentProfileResponse(
             student_id=profile.student_id,
@@ -336,16 +429,17 @@ async def get_student_profile(
 @router.get("/weak-concepts/{student_id}")
 async def get_weak_concepts(
     student_id: str,
-    threshold: float = 0.5,
-    service=Depends(get_diagnosis_service)
+    threshold: float = settings.PROFILE_WEAK_THRESHOLD
 ):
     """
     약점 개념 조회
 
-    학생이 어려워하는 개념 목록을 반환합니다.
+    학생이 어려워하는 개념 목록을 반환합니다 (숙련도가 threshold 미만, 약한 순).
     """
+    from app.services.knowledge_profile_service import knowledge_profile_store
+
     try:
-        weak = service.get_weak_concepts(student_id, threshold)
+        weak = (await knowledge_profile_store.get(student_id)).weak(threshold)
         return {"student_id": student_id, "weak_concepts": weak}
     except Exception as e:
         logger.error(f"Failed to get weak concepts: {e}")
@@ -363,8 +457,10 @@ async def get_recommendations(
     학생의 현재 지식 상태에 기반한 학습 추천을 반환합니다.
     """
     try:
-        recommendations = service.get_recommendations(student_id)
+        recommendations = await run_diagnosis(service.get_recommendations, student_id)
         return {"student_id": student_id, "recommendations": recommendations}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get recommendations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -375,9 +471,18 @@ async def health_check(service=Depends(get_diagnosis_service)):
     """
     진단 서비스 상태 확인
     """
+    from app.services.answer_check_service import answer_checker
+    from app.services.diagnosis_executor import diagnosis_executor
+    from app.services.knowledge_profile_service import knowledge_profile_store
+    from app.services.misconception_cache_service import misconception_cache
+
     is_mock = isinstance(service, MockDiagnosisService)
     return {
         "status": "healthy",
         "service_type": "mock" if is_mock else "ollama",
-        "message": "Cognitive Diagnosis API is running (Node2 Q-DNA)"
+        "message": "Cognitive Diagnosis API is running (Node2 Q-DNA)",
+        "executor": diagnosis_executor.stats(),
+        "profiles": knowledge_profile_store.get_stats(),
+        "answer_check": answer_checker.get_stats(),
+        "misconception_cache": misconception_cache.get_stats()
     }
@@ -1,7 +1,6 @@
 from typing import Any, List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from app.api import deps
 from app.models.curriculum import CurriculumNode
 from pydantic import BaseModel
@@ -21,34 +20,12 @@ async def get_curriculum_tree(
 ) -> Any:
     """
     Get full curriculum tree.
-    Fetches flat list from DB and reconstructs tree in memory.
+    Served from the process-wide curriculum index (rebuilt only after writes).
     """
-    result = await db.execute(select(CurriculumNode).order_by(CurriculumNode.path))
-    nodes = result.scalars().all()
+    from app.services.curriculum_index import curriculum_index
 
-    # Convert to dictionary for O(1) access
-    node_map = {node.path: CurriculumNodeSchema(
-        node_id=node.node_id,
-        name=node.name,
-        path=node.path,
-        description=node.description,
-        children=[]
-    ) for node in nodes}
-
-    root_nodes = []
-
-    for node in nodes:
-        if "." in node.path:
-            parent_path = node.path.rsplit(".", 1)[0]
-            if parent_path in node_map:
-                node_map[parent_path].children.append(node_map[node.path])
-            else:
-                # Parent missing or it's a root-like node in a sub-query context
-                root_nodes.append(node_map[node.path])
-        else:
-            root_nodes.append(node_map[node.path])
-
-    return root_nodes
+    index = await curriculum_index.get(db)
+    return index.as_tree()
 
 @router.post("/", response_model=CurriculumNodeSchema)
 async def create_node(
@@ -60,6 +37,10 @@ async def create_node(
     db.add(node)
     await db.commit()
     await db.refresh(node)
+
+    from app.services.curriculum_index import curriculum_index
+    curriculum_index.invalidate()
+
     return CurriculumNodeSchema(
         node_id=node.node_id, 
         name=node.name, 
@@ -0,0 +1,77 @@
+from typing import Any, Optional
+import os
+import uuid
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api import deps
+from app.core.config import settings
+from app.schemas.job import JobCreate
+
+router = APIRouter()
+
+@router.post("/", status_code=202)
+async def create_job(
+    request: JobCreate,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_db),
+    idempotency_key: Optional[str] = Header(default=None, max_length=200),
+) -> Any:
+    """
+    Queue a long-running job (twin, bulk_twin, diagram, error_worksheet, student_report, exam_crawl).
+    Poll GET /jobs/{job_id}; fetch the output from GET /jobs/{job_id}/result.
+    Resubmitting with the same Idempotency-Key returns the original job.
+    """
+    from app.services.job_service import job_service, job_to_dict
+
+    kind = job_service.kinds.get(request.kind)
+    if kind is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind. Available: {', '.join(job_service.kinds)}")
+    try:
+        payload = kind.payload_model(**request.payload).model_dump(mode="json")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    key = idempotency_key or request.idempotency_key
+    job, created = await job_service.enqueue(db, request.kind, payload, idempotency_key=key)
+    if not created and job.payload != payload:
+        raise HTTPException(status_code=409, detail="Idempotency key was already used with a different payload")
+
+    response.headers["Location"] = f"{settings.API_V1_STR}/jobs/{job.job_id}"
+    return job_to_dict(job)
+
+async def _job_or_404(db: AsyncSession, job_id: str):
+    from app.services.job_service import job_service
+
+    try:
+        job = await job_service.get_job(db, uuid.UUID(job_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid UUID format")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(deps.get_db)) -> Any:
+    """Status, attempts and last error of a job."""
+    from app.services.job_service import job_to_dict
+
+    return job_to_dict(await _job_or_404(db, job_id))
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, db: AsyncSession = Depends(deps.get_db)) -> Any:
+    """
+    Output of a succeeded job: the produced file (PDF) or its JSON result.
+    409 while the job is queued/running or after it failed.
+    """
+    job = await _job_or_404(db, job_id)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""))
+
+    file = (job.result or {}).get("file")
+    if file:
+        if not os.path.exists(file["path"]):
+            raise HTTPException(status_code=410, detail="Result file is no longer available")
+        return FileResponse(file["path"], media_type=file["media_type"], filename=file["filename"])
+    return job.result
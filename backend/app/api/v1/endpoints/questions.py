@@ -1,10 +1,11 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.api import deps
 from app.models.question import Question as QuestionModel
-from app.schemas.question import Question, QuestionCreate
+from app.schemas.question import Question, QuestionCreate, AutoTagJobRequest
+from app.schemas.job import BulkTwinJobPayload
 
 router = APIRouter()
 
@@ -30,6 +31,9 @@ async def create_question(
     await db.commit()
     await db.refresh(db_obj)
     print(f"DEBUG: Created Question {db_obj.question_id}")
+
+    from app.services.recommender_service import recommender_service
+    await recommender_service.refresh_questions(db, [db_obj.question_id])
     return db_obj
 
 @router.get("/", response_model=List[Question])
@@ -118,21 +122,50 @@ async def generate_twin_question(
     twin_create_data = await math_advanced_service.generate_twin_question(q_schema)
     
     # 3. Save to DB
-    db_obj = QuestionModel(
-        question_type=twin_create_data.question_type,
-        content_stem=twin_create_data.content_stem,
-        content_metadata=twin_create_data.content_metadata.model_dump(), # JSONB serialization
-        answer_key=twin_create_data.answer_key,
-        difficulty_index=twin_create_data.difficulty_index,
-        created_by=original_q.created_by, # Inherit owner for now
-        status="generated"
-    )
-    
-    db.add(db_obj)
-    await db.commit()
-    await db.refresh(db_obj)
-    
-    return db_obj
+    from app.services.question_service import question_service
+    return await question_service.save_twin(db, original_q, twin_create_data)
+
+@router.post("/{question_id}/twin/stream")
+async def stream_twin_question(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    question_id: str,
+) -> Any:
+    """
+    [Advanced Math] Streaming variant of POST /{question_id}/twin (text/event-stream).
+    Emits token and field events while the twin is generated, then a result event
+    with the saved question (or an error event).
+    """
+    from app.core.database import SessionLocal
+    from app.core.streaming import event_stream_response, sse_event
+    from app.services.math_advanced_service import math_advanced_service
+    from app.services.question_service import question_service
+    import logging
+    import uuid
+
+    stmt = select(QuestionModel).where(QuestionModel.question_id == uuid.UUID(question_id))
+    original_q = (await db.execute(stmt)).scalar_one_or_none()
+    if not original_q:
+        raise HTTPException(status_code=404, detail="Question not found")
+    q_schema = Question.model_validate(original_q)
+
+    async def events():
+        try:
+            async for kind, payload in math_advanced_service.stream_twin_question(q_schema):
+                if kind == "token":
+                    yield sse_event("token", {"text": payload})
+                elif kind == "field":
+                    yield sse_event("field", payload)
+                else:
+                    # The request's session is closed once the response starts streaming
+                    async with SessionLocal() as session:
+                        db_obj = await question_service.save_twin(session, original_q, payload)
+                        yield sse_event("result", Question.model_validate(db_obj).model_dump(mode="json"))
+        except Exception as e:
+            logging.getLogger(__name__).exception("Twin stream failed")
+            yield sse_event("error", {"detail": str(e)})
+
+    return event_stream_response(events())
 
 @router.post("/{question_id}/erroneous-solution")
 async def generate_error_worksheet(
@@ -178,16 +211,16 @@ async def generate_error_worksheet(
     # Handling potential missing answer key
     correct_ans = question.answer_key.get("answer", "") if question.answer_key else ""
     
-    erroneous_data = await error_solution_service.generate_erroneous_solution(
+    # Both generations run concurrently and are cached per question version and error types
+    solutions = await error_solution_service.generate_worksheet_solutions(
+        question_id=question.question_id,
+        version=question.version,
         question_content=question.content_stem,
         correct_answer=correct_ans,
         error_types=selected_errors
     )
-
-    correct_data = await error_solution_service.generate_correct_solution(
-        question_content=question.content_stem,
-        correct_answer=correct_ans
-    )
+    erroneous_data = solutions["erroneous_solution"]
+    correct_data = solutions["correct_solution"]
 
     # 4. PDF 생성
     if output_format == "pdf":
@@ -203,7 +236,7 @@ async def generate_error_worksheet(
         filename = f"error_worksheet_{question_id}.pdf"
         
         try:
-            pdf_bytes = report_service.generate_error_worksheet(template_data)
+            pdf_bytes = await report_service.error_worksheet_pdf(template_data)
         except Exception as e:
             print(f"PDF Generation Error: {e}")
             raise HTTPException(status_code=500, detail="PDF Generation Failed. Ensure WeasyPrint/GTK is installed.")
@@ -220,3 +253,70 @@ async def generate_error_worksheet(
             "correct_solution": correct_data
         }
 
+@router.post("/bulk-twins", status_code=202)
+async def create_bulk_twin_job(
+    request: BulkTwinJobPayload,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_db),
+    idempotency_key: Optional[str] = Header(default=None, max_length=200),
+) -> Any:
+    """
+    [Advanced Math] Generate count_per_question twins for every question in a curriculum subtree.
+    Near-duplicates of existing questions (or of each other) are dropped before insert.
+    Sources that already have twins are skipped, so a retried job resumes where it stopped.
+    Runs as a background job: poll GET /jobs/{job_id}, summary at GET /jobs/{job_id}/result.
+    """
+    from app.core.config import settings
+    from app.services.job_service import job_service, job_to_dict
+
+    job, _ = await job_service.enqueue(db, "bulk_twin", request.model_dump(mode="json"), idempotency_key=idempotency_key)
+    response.headers["Location"] = f"{settings.API_V1_STR}/jobs/{job.job_id}"
+    return job_to_dict(job)
+
+@router.post("/auto-tag-jobs", status_code=202)
+async def create_auto_tag_job(
+    request: AutoTagJobRequest,
+    db: AsyncSession = Depends(deps.get_db),
+) -> Any:
+    """
+    Auto-tag every matching question (untagged unless retag=true) as a background job
+    (job kind "auto_tag"). Poll GET /questions/auto-tag-jobs/{job_id} for progress.
+    """
+    from app.services.auto_tag_service import auto_tag_service, job_to_dict
+
+    job = await auto_tag_service.create_job(
+        db, status=request.status, curriculum_path=request.curriculum_path, retag=request.retag
+    )
+    await auto_tag_service.start_job(db, job.job_id)
+    return job_to_dict(job)
+
+async def _auto_tag_job_or_404(db: AsyncSession, job_id: str, action: str):
+    import uuid
+    from app.services.auto_tag_service import auto_tag_service
+
+    try:
+        uuid_obj = uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid UUID format")
+    job = await getattr(auto_tag_service, action)(db, uuid_obj)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/auto-tag-jobs/{job_id}")
+async def get_auto_tag_job(job_id: str, db: AsyncSession = Depends(deps.get_db)) -> Any:
+    """Progress, counters and checkpoint of an auto-tagging job."""
+    from app.services.auto_tag_service import job_to_dict
+    return job_to_dict(await _auto_tag_job_or_404(db, job_id, "get_job"))
+
+@router.post("/auto-tag-jobs/{job_id}/cancel")
+async def cancel_auto_tag_job(job_id: str, db: AsyncSession = Depends(deps.get_db)) -> Any:
+    """Stop the job after the page in progress; already written pages are kept."""
+    from app.services.auto_tag_service import job_to_dict
+    return job_to_dict(await _auto_tag_job_or_404(db, job_id, "cancel_job"))
+
+@router.post("/auto-tag-jobs/{job_id}/resume", status_code=202)
+async def resume_auto_tag_job(job_id: str, db: AsyncSession = Depends(deps.get_db)) -> Any:
+    """Continue a cancelled or failed job (or one left without a queue entry) from its last checkpoint."""
+    from app.services.auto_tag_service import job_to_dict
+    return job_to_dict(await _auto_tag_job_or_404(db, job_id, "resume_job"))
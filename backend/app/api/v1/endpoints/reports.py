@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import Response
+from fastapi.responses import Response, FileResponse
 from sqlalchemy.orm import Session
 from uuid import UUID
 from datetime import date, timedelta
@@ -7,6 +7,7 @@ from datetime import date, timedelta
 from app.api import deps
 from app.services.report_service import report_service
 from app.services.analytics_service import analytics_service
+from app.schemas.report import CohortReportRequest
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
@@ -37,3 +38,48 @@ async def generate_report(
         })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def _cohort_job_to_dict(job) -> dict:
+    from app.services.job_service import job_to_dict
+
+    # The batch's own state: final once the job succeeded, the latest progress before that
+    return {**job_to_dict(job), "report": job.result if job.result is not None else job.progress}
+
+@router.post("/cohort-jobs", status_code=202)
+async def create_cohort_report_job(request: CohortReportRequest, db: AsyncSession = Depends(deps.get_db)):
+    """
+    Queue a weekly report batch for a cohort (explicit student_ids, or every
+    student active in the period) as a "cohort_report" background job.
+    Poll GET /reports/cohort-jobs/{job_id}.
+    """
+    from app.schemas.job import CohortReportJobPayload
+    from app.services.cohort_report_service import default_since
+    from app.services.job_service import job_service
+
+    payload = CohortReportJobPayload(since=request.since or default_since(), student_ids=request.student_ids)
+    job, _ = await job_service.enqueue(db, "cohort_report", payload.model_dump(mode="json"))
+    return _cohort_job_to_dict(job)
+
+@router.get("/cohort-jobs/{job_id}")
+async def get_cohort_report_job(job_id: UUID, db: AsyncSession = Depends(deps.get_db)):
+    """Progress, per-stage timings and manifest location of a cohort report job."""
+    from app.services.job_service import job_service
+
+    job = await job_service.get_job(db, job_id)
+    if job is None or job.kind != "cohort_report":
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _cohort_job_to_dict(job)
+
+@router.get("/files/{digest}")
+async def get_report_file(digest: str):
+    """Download a rendered report by its content address (SHA-256)."""
+    import os
+    from app.services.cohort_report_service import cohort_report_service
+    from app.services.report_service import report_store_path
+
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise HTTPException(status_code=400, detail="Invalid report digest")
+    path = report_store_path(cohort_report_service.output_dir, digest)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Report not found")
+    return FileResponse(path, media_type="application/pdf", filename=f"report_{digest[:12]}.pdf")
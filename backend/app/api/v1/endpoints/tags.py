@@ -57,3 +57,11 @@ async def suggest_tags(
     """
     from app.services.tagging_service import tagging_service
     return await tagging_service.get_tag_recommendations(text)
+
+@router.get("/analysis-cache/stats")
+async def analysis_cache_stats() -> Any:
+    """
+    Hit/miss counters of the DNA analysis cache (memory and Postgres tiers).
+    """
+    from app.services.analysis_cache_service import analysis_cache
+    return analysis_cache.stats()
@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -15,14 +16,113 @@ class Settings(BaseSettings):
 
     # Ollama
     OLLAMA_BASE_URL: str = "http://localhost:11434"
-    OLLAMA_URL: str = "http://localhost:11434"  # Alias for mathesis_core compatibility
+    OLLAMA_URL: str = "http://localhost:11434"  # Alias for mathesis_core compatibility; follows OLLAMA_BASE_URL unless set
     OLLAMA_VISION_MODEL: str = "llama3.2-vision:11b"
     OLLAMA_TEXT_MODEL: str = "qwen2.5:latest"
     OLLAMA_MODEL: str = "qwen2.5:latest"  # Default model for mathesis_core
 
+    # Attempt ingestion (write-behind buffer for POST /analytics/attempt)
+    ATTEMPT_BUFFER_MAX_PENDING: int = 50000
+    ATTEMPT_FLUSH_BATCH_SIZE: int = 500
+    ATTEMPT_FLUSH_INTERVAL_MS: int = 200
+    ATTEMPT_ENQUEUE_TIMEOUT_MS: int = 1000
+    ATTEMPT_DEAD_LETTER_PATH: str = "data/dead_letter/attempts.jsonl"  # rows the flusher could not write
+
+    # Bulk attempt import (/cms/bulk-submit)
+    BULK_IMPORT_CHUNK_ROWS: int = 5000
+
+    # attempt_logs partitioning (monthly) and analytics query windows
+    ATTEMPT_PARTITION_MONTHS_AHEAD: int = 3
+    ATTEMPT_RETENTION_MONTHS: int = 24  # 0 keeps every partition attached
+    PARTITION_MAINTENANCE_INTERVAL_HOURS: float = 6.0
+    REPORT_PERIOD_DAYS: int = 7
+    ANALYTICS_WINDOW_DAYS: int = 365
+
+    # Cohort weekly report batch
+    REPORT_OUTPUT_DIR: str = "data/reports"  # content-addressed PDF store
+    REPORT_RENDER_WORKERS: int = 0  # 0 = one per CPU
+
+    # In-memory curriculum tree index (rebuilt on local writes; TTL covers other workers)
+    CURRICULUM_INDEX_TTL_SECONDS: float = 300.0
+
+    # IRT (2PL) calibration: items need this many responses before their parameters are written
+    IRT_MIN_RESPONSES: int = 30
+
+    # Recommender item index: background poll for question changes from other processes
+    RECOMMENDER_REFRESH_SECONDS: float = 30.0
+
+    # DNA analysis cache (memory LRU + llm_analysis_cache table); bump the prompt version to invalidate
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 4096
+    ANALYSIS_CACHE_TTL_SECONDS: float = 30 * 86400.0
+    ANALYSIS_CACHE_PERSISTENT: bool = True
+    ANALYSIS_CACHE_PURGE_INTERVAL_HOURS: float = 6.0  # delete expired llm_analysis_cache rows; 0 disables
+    ANALYSIS_PROMPT_VERSION: str = "dna-v1"
+
+    # LLM gateway: per-model concurrency shared by every service, interactive requests first
+    LLM_MAX_CONCURRENCY_PER_MODEL: int = 4
+    LLM_INTERACTIVE_RESERVED_SLOTS: int = 1  # never handed to background work
+    LLM_INTERACTIVE_TIMEOUT_SECONDS: float = 120.0  # queue wait + generation; 0 = no deadline
+    LLM_BACKGROUND_TIMEOUT_SECONDS: float = 0.0
+
+    # Cognitive diagnosis: the sync mathesis_core service runs in a bounded thread pool
+    DIAGNOSIS_WORKERS: int = 4
+    DIAGNOSIS_MAX_PENDING: int = 32  # running + queued; beyond this requests get 503
+    DIAGNOSIS_TIMEOUT_SECONDS: float = 120.0
+    DIAGNOSIS_BATCH_TIMEOUT_SECONDS: float = 600.0
+    DIAGNOSIS_BATCH_CONCURRENCY: int = 4  # attempts of one batch diagnosed at once
+    DIAGNOSIS_MODEL: str = "llama3"  # model of mathesis_core's CognitiveDiagnosisService
+    # Misconception cache: diagnoses shared by (question, normalized answer, model) through the analysis cache
+    MISCONCEPTION_CACHE_ENABLED: bool = True
+    DIAGNOSIS_PROMPT_VERSION: str = "diagnosis-v1"  # bump to invalidate cached diagnoses
+    # Symbolic fast path: answers proven equal to correct_answer skip the LLM
+    ANSWER_CHECK_ENABLED: bool = True
+    ANSWER_CHECK_TIMEOUT_SECONDS: float = 2.0
+    ANSWER_CHECK_MAX_LENGTH: int = 200  # longer answers always go to the LLM
+    ANSWER_CHECK_REL_TOLERANCE: float = 1e-6
+    ANSWER_CHECK_ABS_TOLERANCE: float = 1e-9
+
+    # Diagnosis knowledge profiles (Postgres, per-process LRU, write-behind deltas)
+    PROFILE_CACHE_MAX_ENTRIES: int = 10000
+    PROFILE_CACHE_TTL_SECONDS: float = 60.0  # bounds staleness of updates made by other workers
+    PROFILE_FLUSH_INTERVAL_MS: int = 500
+    PROFILE_FLUSH_BATCH_SIZE: int = 1000  # students with pending deltas that trigger an early flush
+    PROFILE_FLUSH_MAX_FAILURES: int = 3  # consecutive failed flushes before the batch is split to isolate bad rows
+    PROFILE_DEAD_LETTER_PATH: str = "data/dead_letter/knowledge_profiles.jsonl"
+    PROFILE_WEAK_THRESHOLD: float = 0.5  # concept mastery below this is weak
+    PROFILE_STRONG_THRESHOLD: float = 0.8
+
+    # LLM call instrumentation (GET /metrics, GET /health/llm/calls)
+    LLM_METRICS_RING_SIZE: int = 2000  # most recent call/parse-failure/fallback/cache events kept
+
+    # Batch auto-tagging jobs (POST /questions/auto-tag-jobs)
+    AUTO_TAG_PAGE_SIZE: int = 200  # questions analyzed and written per checkpoint
+    AUTO_TAG_CONCURRENCY: int = 4  # analyses in flight per job; the LLM gateway still caps per-model load
+
+    # Error worksheets: rendered PDFs kept in memory (and on disk under REPORT_OUTPUT_DIR/worksheets)
+    WORKSHEET_PDF_CACHE_ENTRIES: int = 128
+
+    # Durable background jobs (background_jobs table; POST /jobs)
+    JOB_WORKERS: int = 2  # in the API process; 0 when scripts/run_job_worker.py runs them instead
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_LEASE_SECONDS: float = 300.0  # renewed while running; an expired lease means the worker died
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BASE_SECONDS: float = 5.0  # doubled per attempt, with jitter
+    JOB_RETRY_MAX_SECONDS: float = 600.0
+
+    # Bulk twin generation (POST /questions/bulk-twins)
+    BULK_TWIN_CONCURRENCY: int = 4  # variants in flight per job; the LLM gateway still caps per-model load
+    TWIN_DUPLICATE_THRESHOLD: float = 0.8  # estimated Jaccard (MinHash) at which a twin counts as a near-duplicate
+
     # CORS
     BACKEND_CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000"
 
+    @model_validator(mode="after")
+    def _ollama_url_follows_base_url(self) -> "Settings":
+        # One variable (e.g. a load-test stand-in) must redirect every client
+        if "OLLAMA_URL" not in self.model_fields_set:
+            self.OLLAMA_URL = self.OLLAMA_BASE_URL
+        return self
+
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
@@ -0,0 +1,387 @@
+"""
+Process-wide LLM gateway for Node 2 (Q-DNA).
+
+Every service talks to the same Ollama host, so generations are admitted
+through one gateway instead of each client firing unbounded requests:
+
+- at most LLM_MAX_CONCURRENCY_PER_MODEL generations per model run at once;
+- waiting requests are served by priority: INTERACTIVE (student/teacher
+  facing, the default) before BACKGROUND (batch tagging, backfills), and
+  LLM_INTERACTIVE_RESERVED_SLOTS slots per model are never given to
+  background work, so a bulk job cannot starve interactive latency;
+- each request has a deadline covering queue wait and generation; an
+  expired request raises LLMDeadlineExceeded (a TimeoutError);
+- queue depth, active slots, waits and timeouts are exposed via stats();
+  each call's queue wait, latency and tokens are recorded in llm_metrics.
+
+Priority, deadline and a cancellation flag travel in context variables,
+so a batch job only wraps its work in `with llm_request(Priority.BACKGROUND):
+...`. Once the flag is set, further calls in that context raise
+LLMCancelled instead of starting a generation; this is how sync work
+abandoned in a worker thread stops early.
+"""
+import asyncio
+import contextvars
+import heapq
+import inspect
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.llm_metrics import LLMEvent, active_call, llm_metrics
+from app.core.single_flight import GENERATION_METHODS, SingleFlightClient, llm_single_flight
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    pass
+
+
+class LLMCancelled(asyncio.CancelledError):
+    """The caller gave up; a CancelledError so broad `except Exception` handlers do not swallow it."""
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("llm_priority", default=Priority.INTERACTIVE)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+_cancel: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("llm_cancel", default=None)
+
+
+@contextmanager
+def llm_request(
+    priority: Optional[Priority] = None,
+    timeout: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[None]:
+    """
+    Set priority, an absolute deadline (timeout seconds from now) and/or a
+    cancellation flag for LLM calls in this context.
+    """
+    tokens = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if timeout is not None:
+        tokens.append((_deadline, _deadline.set(time.monotonic() + timeout)))
+    if cancel is not None:
+        tokens.append((_cancel, _cancel.set(cancel)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+def _check_cancelled(model: str) -> None:
+    cancel = _cancel.get()
+    if cancel is not None and cancel.is_set():
+        raise LLMCancelled(f"{model}: request was cancelled")
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "abandoned", "future", "loop", "event")
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.granted = False
+        self.abandoned = False
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.event: Optional[threading.Event] = None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelLimiter:
+    """
+    Priority admission for one model. State is guarded by a threading lock so
+    async callers and sync callers (mathesis_core code run in threads) share
+    the same slots.
+    """
+
+    def __init__(self, model: str, capacity: int, reserved_interactive: int = 0):
+        self.model = model
+        self.capacity = max(1, capacity)
+        self.background_limit = max(1, self.capacity - reserved_interactive)
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[int, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self.active = {Priority.INTERACTIVE: 0, Priority.BACKGROUND: 0}
+        self.queued = {Priority.INTERACTIVE: 0, Priority.BACKGROUND: 0}
+        self.max_queued = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def _eligible(self, priority: Priority) -> bool:
+        if sum(self.active.values()) >= self.capacity:
+            return False
+        return priority == Priority.INTERACTIVE or self.active[Priority.BACKGROUND] < self.background_limit
+
+    def _dispatch(self) -> None:
+        # Interactive waiters sort first, so a blocked background head means nothing else can run
+        while self._heap:
+            waiter = self._heap[0][2]
+            if waiter.abandoned:
+                heapq.heappop(self._heap)
+                continue
+            if not self._eligible(waiter.priority):
+                break
+            heapq.heappop(self._heap)
+            self.queued[waiter.priority] -= 1
+            self.active[waiter.priority] += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _enter(self, waiter: _Waiter) -> bool:
+        """Take a slot now (True) or queue the waiter behind everyone already waiting."""
+        with self._lock:
+            if not self._heap and self._eligible(waiter.priority):
+                self.active[waiter.priority] += 1
+                return True
+            heapq.heappush(self._heap, (int(waiter.priority), next(self._seq), waiter))
+            self.queued[waiter.priority] += 1
+            self.max_queued = max(self.max_queued, sum(self.queued.values()))
+            self._dispatch()
+            return waiter.granted
+
+    async def acquire(self, priority: Priority, timeout: Optional[float]) -> None:
+        waiter = _Waiter(priority)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        if self._enter(waiter):
+            return
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except BaseException:
+            with self._lock:
+                if waiter.granted:
+                    # Granted while we were timing out or being cancelled: hand the slot on
+                    self.active[priority] -= 1
+                else:
+                    waiter.abandoned = True
+                    self.queued[priority] -= 1
+                self._dispatch()
+            raise
+
+    def acquire_sync(self, priority: Priority, timeout: Optional[float]) -> None:
+        waiter = _Waiter(priority)
+        waiter.event = threading.Event()
+        if self._enter(waiter) or waiter.event.wait(timeout):
+            return
+        with self._lock:
+            if waiter.granted:
+                return  # granted just as the wait timed out; keep the slot
+            waiter.abandoned = True
+            self.queued[priority] -= 1
+        raise asyncio.TimeoutError()
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def release(self, priority: Priority, wait_ms: float) -> None:
+        with self._lock:
+            self.active[priority] -= 1
+            self.completed += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "background_limit": self.background_limit,
+                "active": {p.name.lower(): n for p, n in self.active.items()},
+                "queued": {p.name.lower(): n for p, n in self.queued.items()},
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.wait_ms_total / self.completed, 2) if self.completed else 0.0,
+                "max_wait_ms": round(self.wait_ms_max, 2),
+            }
+
+
+class LLMGateway:
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY_PER_MODEL,
+        reserved_interactive: int = settings.LLM_INTERACTIVE_RESERVED_SLOTS,
+        interactive_timeout: float = settings.LLM_INTERACTIVE_TIMEOUT_SECONDS,
+        background_timeout: float = settings.LLM_BACKGROUND_TIMEOUT_SECONDS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.reserved_interactive = reserved_interactive
+        self.default_timeouts = {Priority.INTERACTIVE: interactive_timeout, Priority.BACKGROUND: background_timeout}
+        self._limiters: Dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model: str) -> ModelLimiter:
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None:
+                limiter = self._limiters[model] = ModelLimiter(model, self.max_concurrency, self.reserved_interactive)
+            return limiter
+
+    def _deadline(self, priority: Priority) -> Optional[float]:
+        deadline = _deadline.get()
+        if deadline is None and self.default_timeouts[priority]:
+            deadline = time.monotonic() + self.default_timeouts[priority]
+        return deadline
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: Optional[Priority] = None,
+                   call: Optional[LLMEvent] = None) -> AsyncIterator[Optional[float]]:
+        """
+        Hold one generation slot for the block (e.g. while consuming a token
+        stream). Yields the absolute deadline (time.monotonic()) or None; only
+        the queue wait is enforced here, the holder checks the rest. The
+        queue wait is reported into `call` (default: the call being measured
+        in this context).
+        """
+        _check_cancelled(model)
+        priority = current_priority() if priority is None else priority
+        deadline = self._deadline(priority)
+        limiter = self.limiter(model)
+
+        started = time.monotonic()
+        try:
+            await limiter.acquire(priority, None if deadline is None else max(0.0, deadline - started))
+        except asyncio.TimeoutError:
+            limiter.record_timeout()
+            raise LLMDeadlineExceeded(f"{model}: deadline passed while queued")
+        wait_ms = (time.monotonic() - started) * 1000
+        call = call or active_call()
+        if call is not None:
+            call.admitted(wait_ms, priority.name.lower())
+        try:
+            yield deadline
+        finally:
+            limiter.release(priority, wait_ms)
+
+    async def run(self, model: str, fn: Callable[[], Awaitable[T]], priority: Optional[Priority] = None) -> T:
+        async with self.slot(model, priority) as deadline:
+            if deadline is None:
+                return await fn()
+            try:
+                return await asyncio.wait_for(fn(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                self.limiter(model).record_timeout()
+                raise LLMDeadlineExceeded(f"{model}: deadline passed during generation")
+
+    def run_sync(self, model: str, fn: Callable[[], T], priority: Optional[Priority] = None) -> T:
+        """
+        Blocking variant for sync client methods; the deadline bounds queue
+        wait only, and a cancellation flag is honoured until the slot is granted.
+        """
+        _check_cancelled(model)
+        priority = current_priority() if priority is None else priority
+        deadline = self._deadline(priority)
+        limiter = self.limiter(model)
+
+        started = time.monotonic()
+        try:
+            limiter.acquire_sync(priority, None if deadline is None else max(0.0, deadline - started))
+        except asyncio.TimeoutError:
+            limiter.record_timeout()
+            raise LLMDeadlineExceeded(f"{model}: deadline passed while queued")
+        wait_ms = (time.monotonic() - started) * 1000
+        call = active_call()
+        if call is not None:
+            call.admitted(wait_ms, priority.name.lower())
+        try:
+            _check_cancelled(model)
+            return fn()
+        finally:
+            limiter.release(priority, wait_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {
+            "models": {limiter.model: limiter.stats() for limiter in limiters},
+            "single_flight": llm_single_flight.stats(),
+            "calls": llm_metrics.summary(),
+        }
+
+
+class GatewayClient:
+    """
+    Proxy that admits a client's generate/chat calls through the gateway
+    under one model name and records each call in llm_metrics.
+    """
+
+    def __init__(self, client: Any, model: str, gateway: Optional["LLMGateway"] = None):
+        self.unwrapped = client
+        self.model = model
+        self._gateway = gateway or llm_gateway
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.unwrapped, name)
+        if name not in GENERATION_METHODS or not callable(attr):
+            return attr
+        if inspect.iscoroutinefunction(attr):
+            async def admitted(*args, **kwargs):
+                with llm_metrics.call(self.model, name, args, kwargs) as call:
+                    result = await self._gateway.run(self.model, lambda: attr(*args, **kwargs))
+                    call.finish(result)
+                    return result
+        else:
+            def admitted(*args, **kwargs):
+                with llm_metrics.call(self.model, name, args, kwargs) as call:
+                    result = self._gateway.run_sync(self.model, lambda: attr(*args, **kwargs))
+                    call.finish(result)
+                    return result
+        return admitted
+
+
+def pooled_client(client: Any, model: str) -> SingleFlightClient:
+    """Single-flight in front of the gateway: coalesced duplicates never take a slot."""
+    return SingleFlightClient(GatewayClient(client, model), llm_single_flight, namespace=model)
+
+
+_shared_clients: Dict[Tuple, SingleFlightClient] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_ollama_client(base_url: str, model: str, **options: Any) -> SingleFlightClient:
+    """
+    One mathesis_core Ollama client per (host, model, options) for the whole
+    process, wrapped in single-flight and the gateway.
+    """
+    key = (base_url, model, tuple(sorted(options.items())))
+    with _shared_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            from mathesis_core.llm.clients import create_ollama_client
+            client = _shared_clients[key] = pooled_client(
+                create_ollama_client(base_url=base_url, model=model, **options), model
+            )
+        return client
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,374 @@
+"""
+Per-call LLM instrumentation for Node 2 (Q-DNA).
+
+Every generation that goes through the gateway (GatewayClient, i.e. every
+shared_ollama_client/pooled_client call, and OllamaService.stream_text) is
+recorded with:
+
+    template   prompt template / feature id, from llm_template(...)
+    model, method, priority
+    queue_wait_ms   time waiting for a gateway slot
+    ttft_ms         time to first token after admission (streaming calls only)
+    latency_ms      total, queue wait included
+    prompt_tokens, completion_tokens
+                    Ollama's prompt_eval_count / eval_count when the response
+                    carries them, otherwise estimated from the text
+                    (tokens_estimated=True)
+    outcome         ok, error, timeout or cancelled (caller went away)
+
+Services also report what happens around a call: json_parse_failure,
+fallback (e.g. keyword tagging when analysis failed), cache_hit (answered by
+the analysis cache, no call made) and coalesced (joined an identical call in
+flight). All of it is attributed to the template active in the context:
+
+    @llm_template("twin_variant")
+    async def generate_twin_variant(...): ...
+
+Aggregates are exported in Prometheus text format (GET /metrics); the last
+LLM_METRICS_RING_SIZE events are kept in a ring buffer that can be filtered
+(GET /health/llm/calls).
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+UNLABELLED = "unlabelled"
+EVENT_KINDS = ("call", "json_parse_failure", "fallback", "cache_hit", "coalesced")
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_template: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_template", default=None)
+_active_call: contextvars.ContextVar[Optional["LLMEvent"]] = contextvars.ContextVar("llm_active_call", default=None)
+
+
+class llm_template:
+    """
+    Label the LLM work in a block (or a sync/async function, or an async
+    generator) with a template id. The innermost label wins.
+    """
+
+    def __init__(self, template_id: str):
+        self.template_id = template_id
+        self._tokens: List[contextvars.Token] = []
+
+    def __enter__(self) -> "llm_template":
+        self._tokens.append(_template.set(self.template_id))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _template.reset(self._tokens.pop())
+
+    def __call__(self, fn):
+        template_id = self.template_id
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen(*args, **kwargs):
+                # Re-entered around every step: an async generator runs in its consumer's context
+                gen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        with llm_template(template_id):
+                            try:
+                                item = await gen.__anext__()
+                            except StopAsyncIteration:
+                                return
+                        yield item
+                finally:
+                    await gen.aclose()
+            return agen
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coro(*args, **kwargs):
+                with llm_template(template_id):
+                    return await fn(*args, **kwargs)
+            return coro
+
+        @functools.wraps(fn)
+        def sync(*args, **kwargs):
+            with llm_template(template_id):
+                return fn(*args, **kwargs)
+        return sync
+
+
+def current_template() -> str:
+    return _template.get() or UNLABELLED
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 bytes per token holds for both English and Korean (3 bytes/char) with Ollama's tokenizers
+    return max(1, len(text.encode("utf-8")) // 4) if text else 0
+
+
+def _field(value: Any, name: str) -> Any:
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def prompt_text(args: tuple, kwargs: Dict[str, Any]) -> str:
+    prompt = kwargs.get("prompt")
+    if prompt is None and args and isinstance(args[0], str):
+        prompt = args[0]
+    if prompt is not None:
+        return str(prompt)
+    messages = kwargs.get("messages") or (args[0] if args and isinstance(args[0], list) else [])
+    return "\n".join(str(m.get("content", "")) for m in messages if isinstance(m, dict))
+
+
+def completion_text(result: Any) -> str:
+    if isinstance(result, str):
+        return result
+    text = _field(result, "response")
+    if text is None:
+        message = _field(result, "message")
+        text = _field(message, "content") if message is not None else None
+    if text is None and result is not None:
+        return str(result)
+    return text or ""
+
+
+@dataclass
+class LLMEvent:
+    kind: str
+    template: str
+    model: Optional[str] = None
+    method: Optional[str] = None
+    priority: Optional[str] = None
+    outcome: Optional[str] = None
+    queue_wait_ms: Optional[float] = None
+    ttft_ms: Optional[float] = None
+    latency_ms: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    tokens_estimated: bool = False
+    detail: Optional[str] = None
+    ts: float = field(default_factory=time.time)
+    _started: float = field(default_factory=time.monotonic, repr=False)
+    _admitted: Optional[float] = field(default=None, repr=False)
+    _prompt: str = field(default="", repr=False)
+
+    def admitted(self, wait_ms: float, priority: Optional[str] = None) -> None:
+        """Called by the gateway once a slot is granted."""
+        self.queue_wait_ms = round(wait_ms, 2)
+        self.priority = priority
+        self._admitted = time.monotonic()
+
+    def first_token(self) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = round((time.monotonic() - (self._admitted or self._started)) * 1000, 2)
+
+    def finish(self, result: Any) -> None:
+        """Take token counts from the response (Ollama usage fields), or estimate them."""
+        prompt_tokens, completion_tokens = _field(result, "prompt_eval_count"), _field(result, "eval_count")
+        if prompt_tokens is None or completion_tokens is None:
+            self.tokens_estimated = True
+            prompt_tokens = estimate_tokens(self._prompt) if prompt_tokens is None else prompt_tokens
+            completion_tokens = estimate_tokens(completion_text(result)) if completion_tokens is None else completion_tokens
+        self.prompt_tokens, self.completion_tokens = int(prompt_tokens), int(completion_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if not k.startswith("_")}
+
+
+class _Series:
+    __slots__ = ("calls", "errors", "timeouts", "cancelled", "latency_s", "queue_wait_s", "ttft_s", "ttft_count",
+                 "prompt_tokens", "completion_tokens", "buckets", "events")
+
+    def __init__(self):
+        self.calls = self.errors = self.timeouts = self.cancelled = self.ttft_count = 0
+        self.latency_s = self.queue_wait_s = self.ttft_s = 0.0
+        self.prompt_tokens = self.completion_tokens = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.events = {kind: 0 for kind in EVENT_KINDS if kind != "call"}
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "avg_latency_ms": round(self.latency_s * 1000 / calls, 2),
+            "avg_queue_wait_ms": round(self.queue_wait_s * 1000 / calls, 2),
+            "avg_ttft_ms": round(self.ttft_s * 1000 / self.ttft_count, 2) if self.ttft_count else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            **self.events,
+        }
+
+
+class LLMMetrics:
+
+    def __init__(self, ring_size: int = settings.LLM_METRICS_RING_SIZE):
+        self._ring: Deque[LLMEvent] = deque(maxlen=ring_size)
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def call(self, model: str, method: str, args: tuple = (), kwargs: Optional[Dict[str, Any]] = None,
+             bind: bool = True) -> Iterator[LLMEvent]:
+        """
+        Measure one generation. With bind=True the gateway finds the event in
+        the context and reports the queue wait into it; streams pass it to
+        the gateway explicitly (bind=False) because async generators share
+        their consumer's context.
+        """
+        event = LLMEvent(kind="call", template=current_template(), model=model, method=method,
+                         _prompt=prompt_text(args, kwargs or {}))
+        token = _active_call.set(event) if bind else None
+        try:
+            yield event
+        except TimeoutError as e:
+            event.outcome, event.detail = "timeout", str(e)[:200]
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            event.outcome = "cancelled"
+            raise
+        except BaseException as e:
+            event.outcome, event.detail = "error", f"{type(e).__name__}: {e}"[:200]
+            raise
+        else:
+            event.outcome = "ok"
+        finally:
+            if token is not None:
+                _active_call.reset(token)
+            event.latency_ms = round((time.monotonic() - event._started) * 1000, 2)
+            self._record(event)
+
+    def event(self, kind: str, model: Optional[str] = None, detail: Optional[str] = None,
+              template: Optional[str] = None) -> None:
+        """Record a non-call event (json_parse_failure, fallback, cache_hit, coalesced)."""
+        if kind not in EVENT_KINDS or kind == "call":
+            raise ValueError(f"Unknown LLM event kind: {kind}")
+        self._record(LLMEvent(kind=kind, template=template or current_template(), model=model,
+                              detail=None if detail is None else str(detail)[:200]))
+
+    def _record(self, event: LLMEvent) -> None:
+        with self._lock:
+            self._ring.append(event)
+            series = self._series.get((event.template, event.model or ""))
+            if series is None:
+                series = self._series[(event.template, event.model or "")] = _Series()
+            if event.kind != "call":
+                series.events[event.kind] += 1
+                return
+            series.calls += 1
+            series.errors += event.outcome == "error"
+            series.timeouts += event.outcome == "timeout"
+            series.cancelled += event.outcome == "cancelled"
+            latency_s = (event.latency_ms or 0.0) / 1000
+            series.latency_s += latency_s
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency_s <= bound:
+                    series.buckets[i] += 1
+            series.queue_wait_s += (event.queue_wait_ms or 0.0) / 1000
+            if event.ttft_ms is not None:
+                series.ttft_s += event.ttft_ms / 1000
+                series.ttft_count += 1
+            series.prompt_tokens += event.prompt_tokens or 0
+            series.completion_tokens += event.completion_tokens or 0
+
+    def recent(self, template: Optional[str] = None, model: Optional[str] = None, kind: Optional[str] = None,
+               outcome: Optional[str] = None, since_seconds: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest-first events from the ring buffer matching every given filter."""
+        cutoff = time.time() - since_seconds if since_seconds else None
+        with self._lock:
+            events = list(self._ring)
+        matched = []
+        for event in reversed(events):
+            if cutoff is not None and event.ts < cutoff:
+                break
+            if ((template is None or event.template == template) and (model is None or event.model == model)
+                    and (kind is None or event.kind == kind) and (outcome is None or event.outcome == outcome)):
+                matched.append(event.to_dict())
+                if len(matched) >= limit:
+                    break
+        return matched
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            series = {key: s.to_dict() for key, s in self._series.items()}
+            buffered = len(self._ring)
+        by_template: Dict[str, Dict[str, Any]] = {}
+        for (template, model), stats in sorted(series.items()):
+            by_template.setdefault(template, {})[model or "-"] = stats
+        return {"templates": by_template, "ring_buffer": {"size": buffered, "capacity": self._ring.maxlen}}
+
+    def prometheus(self) -> str:
+        """Aggregates in Prometheus text exposition format."""
+        with self._lock:
+            series = [(key, _copy(s)) for key, s in sorted(self._series.items())]
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, Any]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        def labels(template: str, model: str, **extra: str) -> str:
+            pairs = {"template": template, "model": model, **extra}
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + "}"
+
+        metric("llm_calls_total", "counter", "LLM generations by outcome", [
+            (labels(t, m, outcome=outcome), count)
+            for (t, m), s in series
+            for outcome, count in (("ok", s.calls - s.errors - s.timeouts - s.cancelled), ("error", s.errors),
+                                   ("timeout", s.timeouts), ("cancelled", s.cancelled))
+        ])
+        histogram = []
+        for (t, m), s in series:
+            for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                histogram.append((labels(t, m, le=str(bound)), count))
+            histogram.append((labels(t, m, le="+Inf"), s.calls))
+        lines.append("# HELP llm_latency_seconds LLM generation latency including queue wait")
+        lines.append("# TYPE llm_latency_seconds histogram")
+        lines.extend(f"llm_latency_seconds_bucket{lbl} {value}" for lbl, value in histogram)
+        lines.extend(f"llm_latency_seconds_sum{labels(t, m)} {round(s.latency_s, 6)}" for (t, m), s in series)
+        lines.extend(f"llm_latency_seconds_count{labels(t, m)} {s.calls}" for (t, m), s in series)
+        metric("llm_queue_wait_seconds_total", "counter", "Time spent waiting for a gateway slot",
+               [(labels(t, m), round(s.queue_wait_s, 6)) for (t, m), s in series])
+        metric("llm_ttft_seconds_total", "counter", "Time to first token of streamed generations",
+               [(labels(t, m), round(s.ttft_s, 6)) for (t, m), s in series])
+        metric("llm_ttft_count", "counter", "Streamed generations with a first token",
+               [(labels(t, m), s.ttft_count) for (t, m), s in series])
+        metric("llm_tokens_total", "counter", "Prompt and completion tokens (estimated where Ollama counts are unavailable)", [
+            (labels(t, m, type=kind), count)
+            for (t, m), s in series
+            for kind, count in (("prompt", s.prompt_tokens), ("completion", s.completion_tokens))
+        ])
+        for kind, name, help_text in (
+            ("json_parse_failure", "llm_json_parse_failures_total", "LLM outputs that could not be parsed as JSON"),
+            ("fallback", "llm_fallbacks_total", "Requests answered by a non-LLM fallback"),
+            ("cache_hit", "llm_cache_hits_total", "Requests answered from a cache without a generation"),
+            ("coalesced", "llm_coalesced_calls_total", "Calls that joined an identical call already in flight"),
+        ):
+            metric(name, "counter", help_text,
+                   [(labels(t, m), s.events[kind]) for (t, m), s in series])
+        return "\n".join(lines) + "\n"
+
+
+def _copy(series: _Series) -> _Series:
+    copied = _Series()
+    for name in _Series.__slots__:
+        value = getattr(series, name)
+        setattr(copied, name, list(value) if isinstance(value, list) else dict(value) if isinstance(value, dict) else value)
+    return copied
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def active_call() -> Optional[LLMEvent]:
+    return _active_call.get()
+
+
+llm_metrics = LLMMetrics()
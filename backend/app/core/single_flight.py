@@ -0,0 +1,143 @@
+"""
+Single-flight coalescing of identical concurrent calls for Node 2 (Q-DNA).
+
+When several callers ask for the same thing at the same moment (a worksheet
+upload firing /tags/suggest, /questions/analyze and diagnosis for one text),
+only the first call runs; the others wait for its result. Nothing is cached
+once the call finishes - that is the job of the analysis cache.
+
+SingleFlightClient wraps a mathesis_core LLM client so that generate/chat
+calls with identical arguments share one Ollama generation.
+"""
+import asyncio
+import concurrent.futures
+import copy
+import hashlib
+import inspect
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.core.llm_metrics import llm_metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Client methods that produce a generation; everything else is passed through untouched
+GENERATION_METHODS = frozenset({"generate", "chat", "async_generate", "async_chat"})
+
+
+class SingleFlight:
+    """
+    Async calls run as their own task, so a caller that is cancelled (client
+    disconnect, timeout) does not cancel the generation the other waiters
+    share. Sync calls coalesce across threads through concurrent Futures.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._futures: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._tasks) + len(self._futures)
+
+    def is_running(self, key: str) -> bool:
+        return key in self._tasks or key in self._futures
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._tasks.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def do_sync(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                self.calls += 1
+                future = self._futures[key] = concurrent.futures.Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._futures[key]
+        return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.calls + self.coalesced
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+
+def call_key(namespace: str, method: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        [namespace, method, list(args), kwargs], sort_keys=True, ensure_ascii=False, default=repr
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlightClient:
+    """
+    Transparent proxy around an LLM client. Identical concurrent generate/chat
+    calls (same method, model and arguments) are coalesced; each caller gets
+    its own copy of the response. Use .unwrapped for calls that must not be
+    shared (e.g. deliberately sampling several answers to one prompt).
+    """
+
+    def __init__(self, client: Any, flight: Optional[SingleFlight] = None, namespace: Optional[str] = None):
+        self.unwrapped = client
+        self._flight = flight or llm_single_flight
+        self._namespace = namespace or str(getattr(client, "model", "") or type(client).__name__)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.unwrapped, name)
+        if name not in GENERATION_METHODS or not callable(attr):
+            return attr
+
+        if inspect.iscoroutinefunction(attr):
+            async def coalesced(*args, **kwargs):
+                key = call_key(self._namespace, name, args, kwargs)
+                self._note_coalesced(key)
+                return copy.deepcopy(await self._flight.do(key, lambda: attr(*args, **kwargs)))
+        else:
+            def coalesced(*args, **kwargs):
+                key = call_key(self._namespace, name, args, kwargs)
+                self._note_coalesced(key)
+                return copy.deepcopy(self._flight.do_sync(key, lambda: attr(*args, **kwargs)))
+        return coalesced
+
+    def _note_coalesced(self, key: str) -> None:
+        if self._flight.is_running(key):
+            llm_metrics.event("coalesced", model=self._namespace)
+
+
+llm_single_flight = SingleFlight()
@@ -0,0 +1,137 @@
+"""
+Server-sent-event helpers for Node 2 (Q-DNA).
+
+Generation endpoints stream as text/event-stream with these events:
+
+    token   {"text": "..."}              raw model output, as generated
+    field   {"name": "...", "value": x}  a top-level JSON field once complete
+    result  {...}                        final (persisted) result
+    error   {"detail": "..."}            generation or persistence failed
+
+PartialJSONScanner turns the token stream of a JSON-mode generation into
+field events, so clients can render e.g. the question stem before the
+solution steps have been generated.
+
+Endpoints that stream whole records rather than tokens (batch diagnosis)
+use NDJSON instead: one JSON object per line, flushed as each is ready.
+"""
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Proxies (nginx) must not buffer, or the first token arrives with the last
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def ndjson_line(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+
+def ndjson_response(lines: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class PartialJSONScanner:
+    """
+    Incremental scanner over a streamed JSON object. feed() returns the
+    top-level (name, value) pairs completed by the new chunk. Text before
+    the opening brace is ignored; nested values are emitted whole. fields
+    may be partial if the stream stops early; document() only returns an
+    object whose closing brace arrived.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._is_object = False
+        self._field_start: Optional[int] = None
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        completed: List[Tuple[str, Any]] = []
+        text = self.text
+        while self._pos < len(text):
+            c = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                if self._depth == 0:
+                    self._is_object = c == "{"
+                    self._field_start = self._pos + 1
+                    self._start = self._pos
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 1:
+                    self._complete(self._pos, completed)
+                    if self._end is None:
+                        self._end = self._pos
+                self._depth = max(0, self._depth - 1)
+            elif c == "," and self._depth == 1:
+                self._complete(self._pos, completed)
+                self._field_start = self._pos + 1
+            self._pos += 1
+        return completed
+
+    @property
+    def closed(self) -> bool:
+        """The first top-level value has been closed."""
+        return self._end is not None
+
+    def document(self) -> Dict[str, Any]:
+        """
+        The complete top-level object.
+
+        Raises:
+            ValueError: If the object was not closed (stream cut off) or does not parse
+        """
+        if not self.closed:
+            raise ValueError("JSON object was not closed (output cut off)")
+        document = json.loads(self.text[self._start:self._end + 1])
+        if not isinstance(document, dict):
+            raise ValueError("not a JSON object")
+        return document
+
+    def _complete(self, end: int, completed: List[Tuple[str, Any]]) -> None:
+        if not self._is_object or self._field_start is None:
+            return
+        piece = self.text[self._field_start:end].strip()
+        if not piece:
+            return
+        try:
+            parsed = json.loads("{" + piece + "}")
+        except ValueError:
+            return
+        for name, value in parsed.items():
+            self.fields[name] = value
+            completed.append((name, value))
@@ -0,0 +1,372 @@
+"""
+Record/replay Ollama stand-in for Node 2 (Q-DNA) load tests.
+
+A small HTTP server that speaks the parts of the Ollama API the backend uses
+(/api/generate, /api/chat, /api/tags, /api/version), so benchmarks measure
+the backend's own overhead, concurrency limits and caches instead of model
+latency. Point the backend at it with OLLAMA_BASE_URL.
+
+- record: requests are forwarded to a real Ollama (--upstream); every
+  response is relayed to the caller and appended to a cassette (JSONL)
+  with its chunks and timing.
+- replay: responses come from the cassette, streamed chunk by chunk with
+  the latency of a LatencyProfile: time to first token, token rate and
+  jitter, or the recorded timing itself. Jitter is drawn from a RNG seeded
+  by (seed, request key, occurrence), so a run is repeatable regardless of
+  request interleaving.
+
+Requests match on (endpoint, model, prompt/messages, system, format);
+sampling options are ignored. Unmatched requests either get a deterministic
+pick among the recordings for the same endpoint and model (on_miss="any")
+or a 404 (on_miss="error").
+
+Run with: python -m scripts.run_ollama_standin --cassette data/llm_cassette.jsonl --profile gpu
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ("generate", "chat")
+
+# Whitespace-attached words approximate tokens well enough for pacing
+_TOKENS = re.compile(r"\s*\S+|\s+")
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    name: str
+    ttft_ms: float = 0.0  # time to first token
+    tokens_per_second: float = 0.0  # 0 = no per-token delay
+    jitter: float = 0.0  # each delay is scaled by a factor in [1 - jitter, 1 + jitter]
+    use_recorded: bool = False  # replay the recorded ttft and token rate instead
+    speed: float = 1.0  # divides every delay (use_recorded or not)
+
+
+PROFILES: Dict[str, LatencyProfile] = {
+    "instant": LatencyProfile("instant"),
+    "recorded": LatencyProfile("recorded", use_recorded=True),
+    "gpu": LatencyProfile("gpu", ttft_ms=150.0, tokens_per_second=60.0, jitter=0.1),
+    "cpu": LatencyProfile("cpu", ttft_ms=800.0, tokens_per_second=12.0, jitter=0.2),
+}
+
+
+def request_key(endpoint: str, body: Dict[str, Any]) -> str:
+    """Cassette key of an Ollama request; sampling options and stream flag do not count."""
+    identity = {
+        "endpoint": endpoint,
+        "model": body.get("model"),
+        "prompt": body.get("prompt"),
+        "messages": [
+            {"role": m.get("role"), "content": m.get("content")} for m in body.get("messages") or []
+        ],
+        "system": body.get("system"),
+        "format": body.get("format"),
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def split_tokens(text: str) -> List[str]:
+    return _TOKENS.findall(text) or [""]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Cassette:
+    """Recorded exchanges, loaded from and appended to a JSONL file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._by_model: Dict[tuple, List[str]] = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+            logger.info(f"Loaded {len(self.entries)} recordings from {path}")
+
+    def _index(self, entry: Dict[str, Any]) -> None:
+        if entry["key"] not in self.entries:
+            self._by_model.setdefault((entry["endpoint"], entry["model"]), []).append(entry["key"])
+        self.entries[entry["key"]] = entry
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        self._index(entry)
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def any_for(self, endpoint: str, model: str, key: str) -> Optional[Dict[str, Any]]:
+        """Deterministic stand-in for an unrecorded request: same endpoint and model if possible."""
+        candidates = self._by_model.get((endpoint, model)) or sorted(
+            k for k, e in self.entries.items() if e["endpoint"] == endpoint
+        )
+        if not candidates:
+            return None
+        return self.entries[candidates[int(key[:8], 16) % len(candidates)]]
+
+    def models(self) -> List[str]:
+        return sorted({entry["model"] for entry in self.entries.values()})
+
+
+class StandinStats:
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def _chunk(endpoint: str, model: str, text: str) -> Dict[str, Any]:
+    chunk: Dict[str, Any] = {"model": model, "created_at": _now(), "done": False}
+    if endpoint == "chat":
+        chunk["message"] = {"role": "assistant", "content": text}
+    else:
+        chunk["response"] = text
+    return chunk
+
+
+def _final(endpoint: str, model: str, entry: Dict[str, Any], text: str, elapsed_ns: int) -> Dict[str, Any]:
+    final = _chunk(endpoint, model, text)
+    final.update(
+        done=True,
+        done_reason="stop",
+        total_duration=elapsed_ns,
+        load_duration=0,
+        prompt_eval_count=entry.get("prompt_eval_count", 0),
+        prompt_eval_duration=0,
+        eval_count=entry.get("eval_count") or len(entry["chunks"]),
+        eval_duration=elapsed_ns,
+    )
+    if endpoint == "generate":
+        final["context"] = []
+    return final
+
+
+class OllamaStandin:
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        profile: LatencyProfile = PROFILES["instant"],
+        seed: int = 0,
+        on_miss: str = "any",
+        upstream: Optional[str] = None,
+        upstream_client: Optional[httpx.AsyncClient] = None,
+    ):
+        if on_miss not in ("any", "error"):
+            raise ValueError("on_miss must be 'any' or 'error'")
+        self.cassette = cassette
+        self.profile = profile
+        self.seed = seed
+        self.on_miss = on_miss
+        self.recording = upstream is not None or upstream_client is not None
+        self.upstream = upstream_client or (
+            httpx.AsyncClient(base_url=upstream, timeout=None) if upstream else None
+        )
+        self.stats = StandinStats()
+        self._occurrences: Dict[str, int] = {}
+
+    # ---- Latency ----
+
+    def delays(self, key: str, entry: Dict[str, Any]) -> List[float]:
+        """Seconds to wait before each chunk (first = time to first token)."""
+        n = self._occurrences.get(key, 0)
+        self._occurrences[key] = n + 1
+        rng = random.Random(f"{self.seed}:{key}:{n}")
+        profile = self.profile
+        count = len(entry["chunks"])
+
+        if profile.use_recorded:
+            timing = entry.get("timing") or {}
+            ttft = timing.get("ttft_ms", 0.0) / 1000
+            per_token = max(timing.get("total_ms", 0.0) / 1000 - ttft, 0.0) / max(count - 1, 1)
+        else:
+            ttft = profile.ttft_ms / 1000
+            per_token = 1.0 / profile.tokens_per_second if profile.tokens_per_second > 0 else 0.0
+
+        def jittered(seconds: float) -> float:
+            if profile.jitter <= 0 or seconds <= 0:
+                return seconds / profile.speed
+            return seconds * rng.uniform(1 - profile.jitter, 1 + profile.jitter) / profile.speed
+
+        return [jittered(ttft)] + [jittered(per_token) for _ in range(count - 1)]
+
+    # ---- Replay ----
+
+    def resolve(self, endpoint: str, body: Dict[str, Any]) -> tuple:
+        key = request_key(endpoint, body)
+        entry = self.cassette.lookup(key)
+        if entry is not None:
+            self.stats.hits += 1
+            return key, entry
+        self.stats.misses += 1
+        if self.on_miss == "any":
+            entry = self.cassette.any_for(endpoint, body.get("model"), key)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"No recording for this {endpoint} request")
+        return key, entry
+
+    async def replay_chunks(self, endpoint: str, model: str, key: str, entry: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        # Sleep against an absolute schedule so many short delays do not drift
+        started = time.monotonic()
+        due = started
+        for chunk, delay in zip(entry["chunks"], self.delays(key, entry)):
+            due += delay
+            wait = due - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield _chunk(endpoint, model, chunk)
+        yield _final(endpoint, model, entry, "", int((time.monotonic() - started) * 1e9))
+
+    async def replay(self, endpoint: str, body: Dict[str, Any]):
+        key, entry = self.resolve(endpoint, body)
+        model = body.get("model") or entry["model"]
+        if body.get("stream", True):
+            chunks = self.replay_chunks(endpoint, model, key, entry)
+            return StreamingResponse(self._ndjson(chunks), media_type="application/x-ndjson")
+
+        self._enter()
+        try:
+            started = time.monotonic()
+            await asyncio.sleep(sum(self.delays(key, entry)))
+            elapsed_ns = int((time.monotonic() - started) * 1e9)
+            return JSONResponse(_final(endpoint, model, entry, "".join(entry["chunks"]), elapsed_ns))
+        finally:
+            self._exit()
+
+    async def _ndjson(self, chunks: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+        self._enter()
+        try:
+            async for chunk in chunks:
+                yield json.dumps(chunk, ensure_ascii=False) + "\n"
+        finally:
+            self._exit()
+
+    def _enter(self) -> None:
+        self.stats.in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+
+    def _exit(self) -> None:
+        self.stats.in_flight -= 1
+
+    # ---- Record ----
+
+    async def record(self, endpoint: str, body: Dict[str, Any]):
+        """Forward to the real Ollama (always streaming, to capture timing) and store the exchange."""
+        key = request_key(endpoint, body)
+        started = time.monotonic()
+        chunks: List[str] = []
+        final: Dict[str, Any] = {}
+        ttft_ms: Optional[float] = None
+        async with self.upstream.stream("POST", f"/api/{endpoint}", json={**body, "stream": True}) as response:
+            if response.status_code != 200:
+                detail = (await response.aread()).decode("utf-8", "replace")
+                raise HTTPException(status_code=response.status_code, detail=detail)
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("done"):
+                    final = data
+                    break
+                text = data["message"]["content"] if endpoint == "chat" else data.get("response", "")
+                if ttft_ms is None:
+                    ttft_ms = (time.monotonic() - started) * 1000
+                chunks.append(text)
+
+        entry = {
+            "key": key,
+            "endpoint": endpoint,
+            "model": body.get("model"),
+            "request": {k: body.get(k) for k in ("prompt", "messages", "system", "format") if body.get(k) is not None},
+            "chunks": chunks or [""],
+            "timing": {"ttft_ms": round(ttft_ms or 0.0, 2), "total_ms": round((time.monotonic() - started) * 1000, 2)},
+            "prompt_eval_count": final.get("prompt_eval_count", 0),
+            "eval_count": final.get("eval_count", len(chunks)),
+            "recorded_at": _now(),
+        }
+        self.cassette.add(entry)
+        self.stats.recorded += 1
+
+        # The caller already waited for the real model; relay without extra latency
+        model = body.get("model")
+        elapsed_ns = int(entry["timing"]["total_ms"] * 1e6)
+        if body.get("stream", True):
+            async def relay():
+                for text in entry["chunks"]:
+                    yield json.dumps(_chunk(endpoint, model, text), ensure_ascii=False) + "\n"
+                yield json.dumps(_final(endpoint, model, entry, "", elapsed_ns), ensure_ascii=False) + "\n"
+            return StreamingResponse(relay(), media_type="application/x-ndjson")
+        return JSONResponse(_final(endpoint, model, entry, "".join(entry["chunks"]), elapsed_ns))
+
+    # ---- HTTP ----
+
+    def app(self) -> FastAPI:
+        app = FastAPI(title="Ollama stand-in")
+
+        @app.get("/")
+        async def root():
+            return "Ollama is running"
+
+        @app.get("/api/version")
+        async def version():
+            return {"version": "0.0.0-standin"}
+
+        @app.get("/api/tags")
+        async def tags():
+            return {"models": [
+                {"name": model, "model": model, "modified_at": _now(), "size": 0, "digest": "", "details": {}}
+                for model in self.cassette.models()
+            ]}
+
+        @app.get("/_standin/stats")
+        async def stats():
+            return {
+                "mode": "record" if self.recording else "replay",
+                "profile": asdict(self.profile),
+                "recordings": len(self.cassette.entries),
+                **self.stats.to_dict(),
+            }
+
+        async def handle(endpoint: str, request: Request):
+            body = await request.json()
+            self.stats.requests += 1
+            if self.recording:
+                return await self.record(endpoint, body)
+            return await self.replay(endpoint, body)
+
+        @app.post("/api/generate")
+        async def generate(request: Request):
+            return await handle("generate", request)
+
+        @app.post("/api/chat")
+        async def chat(request: Request):
+            return await handle("chat", request)
+
+        return app
@@ -1,5 +1,7 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import engine, Base
@@ -31,9 +33,33 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  Warning: Database connection failed: {e}. Running in simulation mode.")
 
+    # Partitions must exist before buffered attempts start landing
+    from app.services.partition_service import partition_manager
+    await partition_manager.start()
+
+    from app.services.ingestion_service import attempt_buffer
+    await attempt_buffer.start()
+
+    from app.services.job_service import job_service
+    await job_service.start()
+
+    from app.services.knowledge_profile_service import knowledge_profile_store
+    await knowledge_profile_store.start()
+
+    from app.services.analysis_cache_service import analysis_cache
+    await analysis_cache.start()
+
     yield
 
     # Shutdown
+    await analysis_cache.stop()
+    await job_service.stop()
+    from app.services.diagnosis_executor import diagnosis_executor
+    diagnosis_executor.shutdown()
+    await knowledge_profile_store.stop()
+    print(f"🧺 Flushing {attempt_buffer.pending} buffered attempts...")
+    await attempt_buffer.stop()
+    await partition_manager.stop()
     print("🛑 Shutting down database connection...")
     await engine.dispose()
 
@@ -86,3 +112,31 @@ async def health_check():
         "database": "connected",
         "ollama": "connected" if ollama_status else "disconnected"
     }
+
+@app.get("/health/llm")
+async def llm_gateway_stats():
+    """LLM gateway queue depth, active slots, waits and timeouts per model"""
+    from app.core.llm_gateway import llm_gateway
+
+    return llm_gateway.stats()
+
+@app.get("/health/llm/calls")
+async def llm_recent_calls(
+    template: Optional[str] = None,
+    model: Optional[str] = None,
+    kind: Optional[str] = None,
+    outcome: Optional[str] = None,
+    since_seconds: Optional[float] = Query(default=None, gt=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """Most recent LLM calls, parse failures, fallbacks and cache hits (newest first)"""
+    from app.core.llm_metrics import llm_metrics
+
+    return llm_metrics.recent(template, model, kind, outcome, since_seconds, limit)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """LLM call metrics in Prometheus text format"""
+    from app.core.llm_metrics import llm_metrics
+
+    return PlainTextResponse(llm_metrics.prometheus(), media_type="text/plain; version=0.0.4")
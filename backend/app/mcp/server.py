@@ -1,4 +1,5 @@
 from mathesis_core.mcp.server import BaseMCPServer
+from app.core.llm_metrics import llm_template
 from app.services.ollama_service import ollama_service
 from app.services.tagging_service import tagging_service
 from app.services.crawler_service import crawler_service
@@ -11,13 +12,24 @@ class Node2MCPServer(BaseMCPServer):
     def __init__(self):
         super().__init__(name="node2-q-dna", version="1.0.0")
 
+    @llm_template("mcp_analyze_problem")
     async def analyze_problem(self, problem_text: str):
         """Analyze a math problem and provide a detailed breakdown."""
         logger.info(f"MCP tool 'analyze_problem' called for: {problem_text[:50]}...")
-        prompt = f"Analyze this math problem and explain the solution steps: {problem_text}"
-        result = await ollama_service.generate_text(prompt)
+        result = await ollama_service.generate_text(self._analysis_prompt(problem_text))
         return {"analysis": result}
 
+    @llm_template("mcp_analyze_problem")
+    async def analyze_problem_stream(self, problem_text: str):
+        """Streaming variant of analyze_problem: yields the analysis text as it is generated."""
+        logger.info(f"MCP tool 'analyze_problem' (stream) called for: {problem_text[:50]}...")
+        async for token in ollama_service.stream_text(self._analysis_prompt(problem_text)):
+            yield token
+
+    @staticmethod
+    def _analysis_prompt(problem_text: str) -> str:
+        return f"Analyze this math problem and explain the solution steps: {problem_text}"
+
     async def get_tag_recommendations(self, content: str):
         """Get recommended educational tags for piece of content."""
         logger.info(f"MCP tool 'get_tag_recommendations' called")
@@ -0,0 +1,23 @@
+from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class AnalysisCacheEntry(Base):
+    """
+    Persistent tier of the LLM analysis cache.
+    cache_key is sha256(namespace, normalized text, model, prompt version), so an
+    unchanged question analysed with the same model and prompt maps to one row.
+    """
+    __tablename__ = "llm_analysis_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    namespace: Mapped[str] = mapped_column(String(50), nullable=False)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    prompt_version: Mapped[str] = mapped_column(String(50), nullable=False)
+    result: Mapped[dict] = mapped_column(JSONB, nullable=False)
+
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    expires_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
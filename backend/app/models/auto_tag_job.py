@@ -0,0 +1,40 @@
+from typing import Optional
+from sqlalchemy import String, Integer, Boolean, Text, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+from app.core.database import Base
+
+
+class AutoTagJob(Base):
+    """
+    Batch auto-tagging job over the question bank.
+    last_question_id is the keyset checkpoint: it is advanced in the same
+    transaction that writes a page of question_tags, so a resumed job never
+    re-tags or skips a question.
+    """
+    __tablename__ = "auto_tag_jobs"
+
+    job_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    status: Mapped[str] = mapped_column(String(20), default="queued", nullable=False)  # queued, running, completed, cancelled, failed
+
+    # Filters
+    question_status: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    curriculum_path: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    retag: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    # Checkpoint and progress
+    last_question_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+    total: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    processed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    tagged: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    tag_links: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,48 @@
+from typing import Any, Dict, Optional
+from sqlalchemy import String, Integer, Text, DateTime, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.sql import func
+import uuid
+from app.core.database import Base
+
+
+class BackgroundJob(Base):
+    """
+    Durable queue entry for long-running work (twin/diagram generation,
+    worksheet and report PDFs, exam crawling).
+    Workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED and hold a lease
+    (lease_expires_at) while running; a row whose lease ran out is claimed
+    again, so jobs survive worker crashes and restarts.
+    """
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        # NULL keys never conflict, so jobs without a key are always new
+        UniqueConstraint("kind", "idempotency_key", name="uq_background_jobs_kind_idempotency_key"),
+        Index("ix_background_jobs_claim", "status", "run_after"),
+    )
+
+    job_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSONB, default=dict, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="queued", nullable=False)  # queued, running, succeeded, failed
+
+    # Retries
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3, nullable=False)
+    run_after: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Lease held by the worker running the job
+    locked_by: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    lease_expires_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    result: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    # Latest job_service.report_progress() of the running handler
+    progress: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    started_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
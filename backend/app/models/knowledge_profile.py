@@ -0,0 +1,38 @@
+from typing import Optional
+from sqlalchemy import String, Integer, Float, Text, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class StudentKnowledgeProfile(Base):
+    """
+    Attempt totals of a student's diagnosis knowledge profile (Personal
+    Knowledge Graph). student_id is the external id used by /diagnosis.
+    Counters are only ever incremented (write-behind deltas), so concurrent
+    workers can upsert the same row without losing updates.
+    """
+    __tablename__ = "student_knowledge_profiles"
+
+    student_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    total_attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total_correct: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class StudentConceptKnowledge(Base):
+    """
+    One knowledge-graph edge student -> concept, accumulated from diagnosis
+    kg_operations. mastery = mastery_sum / evidence_count; relation, strength
+    and evidence are those of the most recent operation (last_seen_at).
+    """
+    __tablename__ = "student_concept_knowledge"
+
+    student_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    concept: Mapped[str] = mapped_column(String(200), primary_key=True)
+    relation: Mapped[str] = mapped_column(String(50), nullable=False)  # mastered, struggles_with, ...
+    strength: Mapped[float] = mapped_column(Float, nullable=False)
+    evidence_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    mastery_sum: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    last_evidence: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    last_seen_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
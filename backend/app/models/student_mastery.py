@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Integer, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
@@ -31,6 +31,7 @@ class StudentMastery(Base):
     updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     __table_args__ = (
-        # Ensure one record per user-skill pair
+        # Ensure one record per user-skill pair (target of the bulk upsert in bkt_service)
+        UniqueConstraint("user_id", "skill_id", name="uq_student_mastery_user_skill"),
         {"schema": None},
     )
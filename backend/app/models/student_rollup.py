@@ -0,0 +1,27 @@
+from typing import Optional
+from sqlalchemy import Integer, Float, BigInteger, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+from app.core.database import Base
+
+
+class StudentNodeRollup(Base):
+    """
+    Running per-student, per-curriculum-node totals of attempt_logs.
+    Maintained incrementally by rollup_service as attempts land, so reports and
+    the knowledge map read O(nodes) rows instead of aggregating O(attempts).
+    """
+    __tablename__ = "student_node_rollups"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    node_id: Mapped[int] = mapped_column(ForeignKey("curriculum_nodes.node_id", ondelete="CASCADE"), primary_key=True)
+
+    attempt_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    correct_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    score_sum: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    time_sum_ms: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+    last_attempt_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -16,3 +16,20 @@ class BulkSubmitResponse(BaseModel):
     success_count: int
     failed_count: int
     failed_items: List[Dict[str, Any]]
+
+class BulkChunkResult(BaseModel):
+    chunk_index: int
+    row_start: int  # 1-based, inclusive
+    row_end: int
+    status: str  # committed, failed
+    success_count: int
+    failed_count: int
+    failed_items: List[Dict[str, Any]] = []
+    failed_items_truncated: bool = False
+    error: Optional[str] = None
+
+class BulkImportResponse(BaseModel):
+    total_rows: int
+    success_count: int
+    failed_count: int
+    chunks: List[BulkChunkResult]
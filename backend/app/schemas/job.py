@@ -0,0 +1,46 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+class JobCreate(BaseModel):
+    kind: str = Field(..., description="twin, bulk_twin, auto_tag, diagram, error_worksheet, student_report, cohort_report or exam_crawl")
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    # The Idempotency-Key header takes precedence
+    idempotency_key: Optional[str] = Field(None, max_length=200)
+
+# Payloads, one per job kind
+
+class TwinJobPayload(BaseModel):
+    question_id: UUID
+
+class DiagramJobPayload(BaseModel):
+    description: str = Field(..., min_length=1)
+
+class ErrorWorksheetJobPayload(BaseModel):
+    question_id: UUID
+    error_types: Optional[List[str]] = None
+
+class StudentReportJobPayload(BaseModel):
+    student_id: UUID
+
+class AutoTagJobPayload(BaseModel):
+    # auto_tag_jobs row holding the filters and checkpoint
+    job_id: UUID
+
+class BulkTwinJobPayload(BaseModel):
+    # ltree path of the curriculum subtree, e.g. "Math.Algebra"
+    curriculum_path: str = Field(..., min_length=1)
+    count_per_question: int = Field(3, ge=1, le=10)
+    # Only source questions in this status; omit for any (generated twins are never sources)
+    status: Optional[str] = None
+    max_questions: int = Field(200, ge=1, le=5000)
+
+class CohortReportJobPayload(BaseModel):
+    # Resolved at submission, so a retry reports on the same period
+    since: datetime
+    student_ids: Optional[List[UUID]] = None
+
+class ExamCrawlJobPayload(BaseModel):
+    source_id: str
+    year: str = "2025"
@@ -47,6 +47,15 @@ class QuestionUpdate(QuestionBase):
     answer_key: Optional[Dict[str, Any]] = None
     version: Optional[int] = None
 
+# Filters for a batch auto-tagging job
+class AutoTagJobRequest(BaseModel):
+    # Only questions in this status (e.g. "draft"); omit for any status
+    status: Optional[str] = None
+    # Only questions mapped into this curriculum subtree (ltree path, e.g. "Math.Algebra")
+    curriculum_path: Optional[str] = None
+    # Re-tag questions that already have tags instead of skipping them
+    retag: bool = False
+
 # Properties shared by models stored in DB
 class QuestionInDBBase(QuestionBase):
     question_id: UUID
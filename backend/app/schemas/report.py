@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from uuid import UUID
+
+class CohortReportRequest(BaseModel):
+    # Omit to report on every student with attempts in the period
+    student_ids: Optional[List[UUID]] = None
+    # Period start; defaults to REPORT_PERIOD_DAYS ago
+    since: Optional[datetime] = None
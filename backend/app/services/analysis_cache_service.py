@@ -0,0 +1,229 @@
+"""
+Content-addressed LLM analysis cache for Node 2 (Q-DNA).
+
+DNA analysis of a question is a pure function of its text, the model and
+the prompt (other namespaces, such as worksheet solutions, pass their own
+key text), so results are stored under
+
+    sha256(namespace | normalized text | model | prompt version)
+
+in two tiers: an in-process LRU (app.core.cache) and the llm_analysis_cache
+table, shared by every worker process and surviving restarts. Re-tagging an
+unchanged question is answered from one of the tiers and never reaches
+Ollama, and concurrent misses for the same key share one lookup and one
+analysis (single-flight). Changing the text, OLLAMA_MODEL or
+ANALYSIS_PROMPT_VERSION changes the key. The persistent tier is best-effort: if Postgres is unavailable the
+cache degrades to memory-only instead of failing the analysis. Reads skip
+expired rows; a background task deletes them every
+ANALYSIS_CACHE_PURGE_INTERVAL_HOURS so the table does not grow without bound.
+"""
+import asyncio
+import copy
+import hashlib
+import logging
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.llm_metrics import llm_metrics
+from app.core.single_flight import SingleFlight
+from app.models.analysis_cache import AnalysisCacheEntry
+
+logger = logging.getLogger(__name__)
+
+DNA_NAMESPACE = "dna"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC + collapsed whitespace; case is kept because it is meaningful in math."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+def analysis_key(text: str, model: str, prompt_version: str, namespace: str = DNA_NAMESPACE) -> str:
+    payload = "\x1f".join((namespace, normalize_text(text), model, prompt_version))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+
+    def __init__(
+        self,
+        max_entries: int = settings.ANALYSIS_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = settings.ANALYSIS_CACHE_TTL_SECONDS,
+        prompt_version: str = settings.ANALYSIS_PROMPT_VERSION,
+        persistent: bool = settings.ANALYSIS_CACHE_PERSISTENT,
+        purge_interval_hours: float = settings.ANALYSIS_CACHE_PURGE_INTERVAL_HOURS,
+    ):
+        self.memory: LRUCache[Dict[str, Any]] = LRUCache(max_entries, ttl_seconds)
+        self.purge_interval_hours = purge_interval_hours
+        self._task: Optional[asyncio.Task] = None
+        self.ttl_seconds = ttl_seconds
+        self.prompt_version = prompt_version
+        self.persistent = persistent
+        self.flight = SingleFlight()
+        self.db_hits = 0
+        self.db_misses = 0
+        self.db_errors = 0
+        self.computed = 0
+
+    def key(self, text: str, model: str, namespace: str = DNA_NAMESPACE) -> str:
+        return analysis_key(text, model, self.prompt_version, namespace)
+
+    async def get_or_compute(
+        self,
+        text: str,
+        model: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        namespace: str = DNA_NAMESPACE,
+    ) -> Dict[str, Any]:
+        """
+        Cached result for (text, model), calling compute() only on a miss in both tiers.
+        Exceptions from compute() propagate and nothing is stored.
+        Callers get their own copy and may mutate it.
+        """
+        key = self.key(text, model, namespace)
+
+        result = self.memory.get(key)
+        if result is None:
+            result = await self.flight.do(key, lambda: self._load_or_compute(key, namespace, model, compute))
+        else:
+            llm_metrics.event("cache_hit", model=model, detail="memory")
+        return copy.deepcopy(result)
+
+    async def get(self, text: str, model: str, namespace: str = DNA_NAMESPACE) -> Optional[Dict[str, Any]]:
+        """Cached result from either tier without computing it; None on a miss."""
+        key = self.key(text, model, namespace)
+        result = self.memory.get(key)
+        if result is not None:
+            llm_metrics.event("cache_hit", model=model, detail="memory")
+        elif self.persistent:
+            result = await self._load(key)
+            if result is not None:
+                llm_metrics.event("cache_hit", model=model, detail="db")
+                self.memory.set(key, result)
+        return copy.deepcopy(result)
+
+    async def put(self, text: str, model: str, result: Dict[str, Any], namespace: str = DNA_NAMESPACE) -> None:
+        """Store a result computed outside get_or_compute (e.g. assembled from a stream)."""
+        key = self.key(text, model, namespace)
+        result = copy.deepcopy(result)
+        self.memory.set(key, result)
+        if self.persistent:
+            await self._store(key, namespace, model, result)
+
+    async def _load_or_compute(
+        self, key: str, namespace: str, model: str, compute: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        if self.persistent:
+            result = await self._load(key)
+            if result is not None:
+                llm_metrics.event("cache_hit", model=model, detail="db")
+                self.memory.set(key, result)
+                return result
+
+        result = await compute()
+        self.computed += 1
+        self.memory.set(key, result)
+        if self.persistent:
+            await self._store(key, namespace, model, result)
+        return result
+
+    async def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with SessionLocal() as db:
+                result = await db.execute(
+                    select(AnalysisCacheEntry.result).where(
+                        AnalysisCacheEntry.cache_key == key,
+                        AnalysisCacheEntry.expires_at > func.now(),
+                    )
+                )
+                row = result.scalar_one_or_none()
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"Analysis cache read failed, continuing without persistent tier: {e}")
+            return None
+        if row is None:
+            self.db_misses += 1
+        else:
+            self.db_hits += 1
+        return row
+
+    async def _store(self, key: str, namespace: str, model: str, result: Dict[str, Any]) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds or 365 * 86400)
+        stmt = pg_insert(AnalysisCacheEntry).values(
+            cache_key=key, namespace=namespace, model=model,
+            prompt_version=self.prompt_version, result=result, expires_at=expires_at,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalysisCacheEntry.cache_key],
+            set_={"result": stmt.excluded.result, "expires_at": stmt.excluded.expires_at, "created_at": func.now()},
+        )
+        try:
+            async with SessionLocal() as db:
+                await db.execute(stmt)
+                await db.commit()
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"Analysis cache write failed: {e}")
+
+    async def purge_expired(self) -> int:
+        async with SessionLocal() as db:
+            result = await db.execute(delete(AnalysisCacheEntry).where(AnalysisCacheEntry.expires_at <= func.now()))
+            await db.commit()
+        return result.rowcount or 0
+
+    async def start(self) -> None:
+        """Purge expired rows periodically in the background (persistent tier only)."""
+        if self.persistent and self.purge_interval_hours > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="analysis-cache-purge")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                purged = await self.purge_expired()
+                if purged:
+                    logger.info(f"Analysis cache: purged {purged} expired rows")
+            except Exception as e:
+                logger.error(f"Analysis cache purge failed: {e}")
+            await asyncio.sleep(self.purge_interval_hours * 3600)
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats
+        hits = memory.hits + self.db_hits
+        lookups = hits + self.computed
+        return {
+            "prompt_version": self.prompt_version,
+            "memory": {**memory.to_dict(), "size": len(self.memory), "max_entries": self.memory.maxsize},
+            "persistent": {
+                "enabled": self.persistent,
+                "hits": self.db_hits,
+                "misses": self.db_misses,
+                "errors": self.db_errors,
+            },
+            "hits": hits,
+            "misses": self.computed,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "single_flight": self.flight.stats(),
+        }
+
+
+analysis_cache = AnalysisCache()
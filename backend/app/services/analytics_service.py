@@ -1,120 +1,123 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
 from app.models.attempt import AttemptLog
-from app.models.question import Question, QuestionCurriculum
 from app.models.curriculum import CurriculumNode
+from app.models.question import QuestionCurriculum
+from app.models.student_rollup import StudentNodeRollup
+from app.core.config import settings
 import uuid
 from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+
+def build_report_payload(since: datetime, total_count: int, correct_count: int, total_time_ms: int,
+                         performances: Sequence[Tuple[str, Optional[float], int]]) -> Dict[str, Any]:
+    """
+    Turn period totals and per-node averages into the weekly report context.
+    Shared by the single-student report and the cohort batch job.
+    """
+    accuracy = round((correct_count / total_count * 100) if total_count > 0 else 0, 1)
+    study_time_min = total_time_ms // 60000
+    study_time_str = f"{study_time_min // 60}시간 {study_time_min % 60}분"
+
+    # performances is list of (name, avg_score, attempt_count), best first
+    # avg_score 100 based (from bulk import)
+    
+    strengths = []
+    weaknesses = []
+    
+    for p in performances:
+        name, score, count = p
+        # Logic: Strength > 80%, Weakness < 60%
+        if not score: score = 0
+        
+        if score >= 80:
+            strengths.append(f"{name} ({int(score)}%)")
+        elif score < 60:
+            weaknesses.append({
+                "concept": name,
+                "accuracy": int(score),
+                "root_cause": "기초 개념 부족" # Dummy logic for MVP
+            })
+    
+    # Fallback if no data
+    if not strengths and total_count > 0:
+        strengths = ["데이터 부족"]
+    if not weaknesses and total_count > 0:
+        pass # No weaknesses is good
+
+    return {
+        "period": f"{since.strftime('%Y-%m-%d')} ~ {datetime.now().strftime('%Y-%m-%d')}",
+        "study_time": study_time_str,
+        "problem_count": total_count,
+        "accuracy": accuracy,
+        "strengths": strengths[:3], # Top 3
+        "weaknesses": weaknesses[:3], # Top 3
+        "predicted_score": f"{min(100, int(accuracy) + 5)} ~ {min(100, int(accuracy) + 10)}", # Dummy AI prediction
+        "target_score": 90
+    }
+
 
 class AnalyticsService:
-    async def get_student_report_data(self, db: AsyncSession, student_id: uuid.UUID):
-        # 1. Basic Stats (Total Attempts, Correct Count, Study Time)
+    async def get_student_report_data(self, db: AsyncSession, student_id: uuid.UUID, since: Optional[datetime] = None):
+        # Every attempt_logs query is bounded on attempted_at (the partition key)
+        # so Postgres only scans the partitions covering the report period.
+        since = since or datetime.now().astimezone() - timedelta(days=settings.REPORT_PERIOD_DAYS)
+        in_period = AttemptLog.attempted_at >= since
+
+        # 1. Basic Stats (Total Attempts, Correct Count, Study Time) in one pass
         # Note: Time taken is in ms.
         stats_query = select(
             func.count(AttemptLog.log_id).label("total"),
-            func.sum(func.cast(AttemptLog.is_correct,  # Cast boolean to integer/numeric if needed depending on DB, but func.count/case is better
-                               kind=None) # Simplified: just count correct
-            ).label("correct_count"),
-             func.sum(AttemptLog.time_taken_ms).label("total_time_ms")
-        ).where(AttemptLog.user_id == student_id)
-        
-        # Correct count proper way
-        correct_query = select(func.count(AttemptLog.log_id)).where(
-            AttemptLog.user_id == student_id,
-            AttemptLog.is_correct == True
-        )
-        
-        total_res = await db.execute(select(func.count(AttemptLog.log_id)).where(AttemptLog.user_id == student_id))
-        total_count = total_res.scalar() or 0
-        
-        correct_res = await db.execute(correct_query)
-        correct_count = correct_res.scalar() or 0
-        
-        time_res = await db.execute(select(func.sum(AttemptLog.time_taken_ms)).where(AttemptLog.user_id == student_id))
-        total_time_ms = time_res.scalar() or 0
-        
-        accuracy = round((correct_count / total_count * 100) if total_count > 0 else 0, 1)
-        study_time_min = total_time_ms // 60000
-        study_time_str = f"{study_time_min // 60}시간 {study_time_min % 60}분"
+            func.count(AttemptLog.log_id).filter(AttemptLog.is_correct == True).label("correct_count"),
+            func.coalesce(func.sum(AttemptLog.time_taken_ms), 0).label("total_time_ms")
+        ).where(AttemptLog.user_id == student_id, in_period)
 
+        stats = (await db.execute(stats_query)).one()
+        total_count = stats.total or 0
+        correct_count = stats.correct_count or 0
+        total_time_ms = stats.total_time_ms or 0
+        
         # 2. Weaknesses & Strengths by Curriculum Node
-        # Join Attempt -> Question -> QuestionCurriculum -> CurriculumNode
-        # Group by Node Name, calculate Avg Score
+        # Same period as the totals above, so read from attempt_logs: the
+        # student_node_rollups are all-time and only back the knowledge map
         
         performance_query = select(
             CurriculumNode.name,
             func.avg(AttemptLog.score).label("avg_score"),
             func.count(AttemptLog.log_id).label("attempt_count")
         ).select_from(AttemptLog)\
-        .join(Question, AttemptLog.question_id == Question.question_id)\
-        .join(QuestionCurriculum, Question.question_id == QuestionCurriculum.question_id)\
+        .join(QuestionCurriculum, AttemptLog.question_id == QuestionCurriculum.question_id)\
         .join(CurriculumNode, QuestionCurriculum.node_id == CurriculumNode.node_id)\
-        .where(AttemptLog.user_id == student_id)\
+        .where(AttemptLog.user_id == student_id, in_period)\
         .group_by(CurriculumNode.name)\
         .order_by(desc("avg_score"))
         
         perf_res = await db.execute(performance_query)
         performances = perf_res.fetchall()
-        
-        # performances is list of (name, avg_score, attempt_count)
-        # avg_score 100 based (from bulk import)
-        
-        strengths = []
-        weaknesses = []
-        
-        for p in performances:
-            name, score, count = p
-            # Logic: Strength > 80%, Weakness < 60%
-            if not score: score = 0
-            
-            if score >= 80:
-                strengths.append(f"{name} ({int(score)}%)")
-            elif score < 60:
-                weaknesses.append({
-                    "concept": name,
-                    "accuracy": int(score),
-                    "root_cause": "기초 개념 부족" # Dummy logic for MVP
-                })
-        
-        # Fallback if no data
-        if not strengths and total_count > 0:
-            strengths = ["데이터 부족"]
-        if not weaknesses and total_count > 0:
-            pass # No weaknesses is good
-
-        return {
-            "period": f"{(datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')} ~ {datetime.now().strftime('%Y-%m-%d')}",
-            "study_time": study_time_str,
-            "problem_count": total_count,
-            "accuracy": accuracy,
-            "strengths": strengths[:3], # Top 3
-            "weaknesses": weaknesses[:3], # Top 3
-            "predicted_score": f"{min(100, int(accuracy) + 5)} ~ {min(100, int(accuracy) + 10)}", # Dummy AI prediction
-            "target_score": 90
-        }
+
+        return build_report_payload(since, total_count, correct_count, total_time_ms, performances)
 
     async def get_knowledge_map(self, db: AsyncSession, student_id: uuid.UUID):
-        # 1. Get all nodes
-        nodes_res = await db.execute(select(CurriculumNode))
-        nodes = nodes_res.scalars().all()
+        from app.services.curriculum_index import curriculum_index
+
+        # 1. Get all nodes (shared in-memory curriculum index)
+        index = await curriculum_index.get(db)
         
-        # 2. Get scores for all nodes
+        # 2. Get all-time scores for all nodes from the rollups (O(nodes), not O(attempts))
         scores_query = select(
-            QuestionCurriculum.node_id,
-            func.avg(AttemptLog.score).label("avg_score")
-        ).select_from(AttemptLog)\
-        .join(Question, AttemptLog.question_id == Question.question_id)\
-        .join(QuestionCurriculum, Question.question_id == QuestionCurriculum.question_id)\
-        .where(AttemptLog.user_id == student_id)\
-        .group_by(QuestionCurriculum.node_id)
+            StudentNodeRollup.node_id,
+            (StudentNodeRollup.score_sum / func.nullif(StudentNodeRollup.attempt_count, 0)).label("avg_score")
+        ).where(StudentNodeRollup.user_id == student_id)
         
         scores_res = await db.execute(scores_query)
         scores_map = {row.node_id: row.avg_score for row in scores_res.fetchall()}
         
         # 3. Build Tree
-        # Helper to find children
-        def build_node(current_node):
-            children = [n for n in nodes if n.path.startswith(current_node.path + ".") and n.path.count(".") == current_node.path.count(".") + 1]
+        # Children come from the index, so the whole map is O(nodes)
+        def build_node(pos):
+            current_node = index.nodes[pos]
+            children = index.children[pos]
             
             node_data = {
                 "name": current_node.name,
@@ -142,8 +145,8 @@ class AnalyticsService:
             return node_data
 
         # Find root (Math)
-        root = next((n for n in nodes if n.path == "Math"), None)
-        if not root:
+        root = index.position_by_path.get("Math")
+        if root is None:
              # Fallback if seed didn't work or named differently
              return {"name": "No Data", "children": []}
              
@@ -153,13 +156,20 @@ class AnalyticsService:
     async def get_user_mastery_map(self, db: AsyncSession, user_id: uuid.UUID):
         return await self.get_knowledge_map(db, user_id)
 
-    # Stub for BKT (Bayesian Knowledge Tracing)
+    # BKT (Bayesian Knowledge Tracing) - single-event entry point into bkt_service
     async def update_bkt(self, db: AsyncSession, user_id: uuid.UUID, skill_id: str, is_correct: bool):
-        # Simplified: just return 0.5 for now, real implementation would track per-user-skill mastery
-        return 0.8 if is_correct else 0.4
+        from app.services.bkt_service import bkt_service, MasteryEvent
+
+        updated = await bkt_service.update_batch(db, [
+            MasteryEvent(user_id=user_id, skill_id=skill_id, is_correct=is_correct, attempted_at=datetime.now().astimezone())
+        ])
+        return updated[(user_id, skill_id)]
+
+    # Recommendation - max-information items from the in-memory item index
+    async def recommend_next_questions(self, db: AsyncSession, user_id: uuid.UUID, count: int = 5,
+                                       node_id: Optional[int] = None, tag: Optional[str] = None):
+        from app.services.recommender_service import recommender_service
 
-    # Stub for Recommendation
-    async def recommend_next_questions(self, db: AsyncSession, user_id: uuid.UUID):
-        return []
+        return await recommender_service.recommend(db, user_id, count=count, node_id=node_id, tag=tag)
 
 analytics_service = AnalyticsService()
@@ -0,0 +1,352 @@
+"""
+Symbolic answer check for Node 2 (Q-DNA).
+
+Most diagnosis requests for a correct answer still cost a full LLM
+generation just to be told "정답입니다". Before diagnosing, the student's
+answer is compared with correct_answer deterministically:
+
+1. both are normalized (NFKC, LaTeX and unicode operators, "x =" / "답:"
+   prefixes, thousands separators, whitespace) and compared as text;
+2. plain numbers, fractions and percentages are compared with a relative
+   and absolute tolerance;
+3. otherwise both are parsed with sympy and the difference is expanded and
+   simplified; equivalence is proven when it reduces to 0, so
+   (x+1)^2 and x^2+2x+1 match.
+
+Comma separated answers ("x = 1, 2") match when every part matches a part
+of the other answer, in any order; "1,234" is one number but "1, 234" two.
+When the question asks for a form (인수분해/전개/간단히, factor/expand/
+simplify), an equivalent expression is not yet an answer, so only exact and
+numeric matches count there. Only a proof of equivalence skips the
+LLM: anything the check cannot parse, does not finish within
+ANSWER_CHECK_TIMEOUT_SECONDS, or finds different goes to the normal
+diagnosis, which also explains wrong answers.
+
+Input reaching parse_expr (which evaluates Python) is restricted to numbers,
+operators, single-letter variables and a whitelist of function names. It is
+first parsed unevaluated, and power towers (9^9^9) or powers whose total
+exponent exceeds _MAX_EXPONENT are rejected: an exact big-integer power holds
+the GIL, so the timeout could not interrupt it and the whole worker would
+stall.
+"""
+import asyncio
+import logging
+import math
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+from fractions import Fraction
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (pattern, replacement) applied in order to the NFKC-normalized answer
+_REWRITES = [
+    (re.compile(r"\$|\\[()\[\]]|\\left|\\right|\\!|\\,|\\;"), ""),
+    (re.compile(r"\\(?:cdot|times)|[×·∙⋅]"), "*"),
+    (re.compile(r"\\div|÷"), "/"),
+    (re.compile(r"[−–—]"), "-"),
+    (re.compile(r"\\pi|π"), "pi"),
+    (re.compile(r"\\sqrt|√"), "sqrt"),
+    (re.compile(r"\\(sin|cos|tan|log|ln|exp)"), r"\1"),
+    (re.compile(r"\s+"), ""),
+]
+_FRAC = re.compile(r"\\[dt]?frac\{([^{}]*)\}\{([^{}]*)\}")
+_SQRT_BARE = re.compile(r"sqrt(\d+(?:\.\d+)?|[a-zA-Z])")
+_THOUSANDS = re.compile(r"(?<![\d.])(\d{1,3}(?:,\d{3})+)(?![\d.])")
+_ANSWER_PREFIX = re.compile(r"^(?:정답|답|answer|ans)\s*[:：]?\s*", re.IGNORECASE)
+_ANSWER_SUFFIX = re.compile(r"(?:입니다|이다|임)?\.?$")
+_VARIABLE_PREFIX = re.compile(r"^([a-zA-Z])=(?!=)")
+_NUMBER = re.compile(r"^([-+]?(?:\d+(?:\.\d*)?|\.\d+))(?:/([-+]?(?:\d+(?:\.\d*)?|\.\d+)))?(%?)$")
+_NAMES = re.compile(r"[A-Za-z_]+")
+_SAFE_CHARS = re.compile(r"^[0-9A-Za-z+\-*/^().]+$")
+_BARE_DOT = re.compile(r"\.(?!\d)")  # dots only as decimal points, never attribute access
+_FUNCTIONS = {"sqrt", "sin", "cos", "tan", "log", "ln", "exp", "pi", "abs"}
+_MAX_EXPONENT = 1000  # largest power, multiplied through nested powers, the CAS may evaluate exactly
+# Questions graded on the form of the answer, not only its value
+_FORM_QUESTION = re.compile(r"인수분해|전개|간단히|factori[sz]|\bfactor|expand|simplif", re.IGNORECASE)
+
+
+def asks_for_form(question_content: Optional[str]) -> bool:
+    return bool(question_content and _FORM_QUESTION.search(question_content))
+
+
+def normalize_answer(text: Optional[str]) -> str:
+    """Canonical text form of an answer; equal forms are equal answers."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text)).strip()
+    text = _ANSWER_PREFIX.sub("", text)
+    # Before whitespace is removed: "1,234" is a number, "1, 234" two answers
+    text = _THOUSANDS.sub(lambda m: m.group(1).replace(",", ""), text)
+    for pattern, replacement in _REWRITES:
+        text = pattern.sub(replacement, text)
+    while True:
+        rewritten = _FRAC.sub(r"((\1)/(\2))", text)
+        if rewritten == text:
+            break
+        text = rewritten
+    text = text.replace("{", "(").replace("}", ")")
+    text = _SQRT_BARE.sub(r"sqrt(\1)", text)
+    return _ANSWER_SUFFIX.sub("", text)
+
+
+def _strip_variable(a: str, b: str) -> tuple:
+    """x=3 vs 3, or x=3 vs x=3: compare the right-hand sides."""
+    match_a, match_b = _VARIABLE_PREFIX.match(a), _VARIABLE_PREFIX.match(b)
+    if match_a and match_b and match_a.group(1) != match_b.group(1):
+        return a, b
+    if match_a:
+        a = a[match_a.end():]
+    if match_b:
+        b = b[match_b.end():]
+    return a, b
+
+
+def parse_number(text: str) -> Optional[float]:
+    """3, -0.5, 3/4, 25% -> float; None for anything else."""
+    match = _NUMBER.match(text)
+    if not match:
+        return None
+    try:
+        value = Fraction(match.group(1))
+        if match.group(2):
+            value /= Fraction(match.group(2))
+    except (ValueError, ZeroDivisionError):
+        return None
+    if match.group(3):
+        value /= 100
+    return float(value)
+
+
+def _split_parts(text: str) -> Tuple[List[str], bool]:
+    """Comma separated parts, and whether their order matters (coordinates, intervals)."""
+    ordered = text[:1] in "([" and text[-1:] in ")]" and "," in text
+    if ordered:
+        text = text[1:-1]
+    return [part for part in text.split(",") if part], ordered
+
+
+@dataclass
+class AnswerCheck:
+    equivalent: bool
+    method: Optional[str] = None  # "exact" | "numeric" | "symbolic" when equivalent
+    student: str = ""
+    correct: str = ""
+    reason: Optional[str] = None  # why the check was inconclusive
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"equivalent": self.equivalent, "method": self.method,
+                "student": self.student, "correct": self.correct, "reason": self.reason}
+
+
+class AnswerChecker:
+
+    def __init__(
+        self,
+        enabled: bool = settings.ANSWER_CHECK_ENABLED,
+        timeout: float = settings.ANSWER_CHECK_TIMEOUT_SECONDS,
+        max_length: int = settings.ANSWER_CHECK_MAX_LENGTH,
+        rel_tolerance: float = settings.ANSWER_CHECK_REL_TOLERANCE,
+        abs_tolerance: float = settings.ANSWER_CHECK_ABS_TOLERANCE,
+    ):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.max_length = max_length
+        self.rel_tolerance = rel_tolerance
+        self.abs_tolerance = abs_tolerance
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "exact": 0, "numeric": 0, "symbolic": 0,
+                      "not_proven": 0, "skipped": 0, "timeouts": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    async def check(
+        self, student_answer: Optional[str], correct_answer: Optional[str], question_content: Optional[str] = None
+    ) -> AnswerCheck:
+        """
+        Try to prove student_answer equivalent to correct_answer. For questions
+        that ask for a form, only exact and numeric matches are accepted.
+        """
+        student, correct = normalize_answer(student_answer), normalize_answer(correct_answer)
+        if not self.enabled or not student or not correct:
+            self._count("skipped")
+            return AnswerCheck(False, student=student, correct=correct, reason="disabled or missing answer")
+        if len(student) > self.max_length or len(correct) > self.max_length:
+            self._count("skipped")
+            return AnswerCheck(False, student=student, correct=correct, reason="answer too long")
+
+        self._count("checked")
+        method = self._compare_text(student, correct)
+        if method is None and asks_for_form(question_content):
+            self._count("not_proven")
+            return AnswerCheck(False, student=student, correct=correct, reason="question asks for a form")
+        if method is None:
+            try:
+                method = await asyncio.wait_for(
+                    asyncio.to_thread(self.compare, student, correct), self.timeout or None
+                )
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                return AnswerCheck(False, student=student, correct=correct, reason="timeout")
+        if method is None:
+            self._count("not_proven")
+            return AnswerCheck(False, student=student, correct=correct, reason="not proven")
+        self._count(method)
+        return AnswerCheck(True, method, student, correct)
+
+    def _compare_text(self, student: str, correct: str) -> Optional[str]:
+        """Cheap checks that do not need the CAS."""
+        student, correct = _strip_variable(student, correct)
+        if student == correct:
+            return "exact"
+        a, b = parse_number(student), parse_number(correct)
+        if a is not None and b is not None and self._close(a, b):
+            return "numeric"
+        return None
+
+    def _close(self, a: float, b: float) -> bool:
+        return math.isclose(a, b, rel_tol=self.rel_tolerance, abs_tol=self.abs_tolerance)
+
+    def compare(self, student: str, correct: str) -> Optional[str]:
+        """Method that proves the normalized answers equivalent, or None."""
+        (student_parts, ordered), (correct_parts, correct_ordered) = _split_parts(student), _split_parts(correct)
+        if len(student_parts) != len(correct_parts) or ordered != correct_ordered:
+            return None
+        if len(student_parts) == 1:
+            return self._compare_one(student, correct)
+
+        methods = []
+        if ordered:
+            if student[0] + student[-1] != correct[0] + correct[-1]:
+                return None  # (1, 2) is not [1, 2)
+            methods = [self._compare_one(a, b) for a, b in zip(student_parts, correct_parts)]
+            if not all(methods):
+                return None
+        else:
+            unmatched = list(correct_parts)
+            for part in student_parts:
+                for other in unmatched:
+                    method = self._compare_one(part, other)
+                    if method:
+                        methods.append(method)
+                        unmatched.remove(other)
+                        break
+                else:
+                    return None
+        return "symbolic" if "symbolic" in methods else "numeric" if "numeric" in methods else "exact"
+
+    def _compare_one(self, student: str, correct: str) -> Optional[str]:
+        method = self._compare_text(student, correct)
+        if method:
+            return method
+        student, correct = _strip_variable(student, correct)
+        a, b = _parse_expression(student), _parse_expression(correct)
+        if a is None or b is None:
+            return None
+        try:
+            import sympy
+
+            difference = a - b
+            if difference == 0 or sympy.expand(difference) == 0 or sympy.simplify(difference) == 0:
+                return "symbolic"
+            if not difference.free_symbols:
+                value = complex(sympy.N(difference))
+                if abs(value) <= self.abs_tolerance + self.rel_tolerance * abs(complex(sympy.N(b))):
+                    return "numeric"
+        except Exception as e:
+            logger.debug(f"Symbolic comparison failed: {e}")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        proven = stats["exact"] + stats["numeric"] + stats["symbolic"]
+        return {"enabled": self.enabled, **stats,
+                "proven": proven,
+                "hit_rate": round(proven / stats["checked"], 4) if stats["checked"] else 0.0}
+
+
+def _parse_expression(text: str) -> Optional[Any]:
+    """sympy expression for a whitelisted answer, None if it cannot be parsed safely."""
+    if not _SAFE_CHARS.match(text) or _BARE_DOT.search(text):
+        return None
+    for name in _NAMES.findall(text):
+        if len(name) > 1 and name not in _FUNCTIONS:
+            return None
+    try:
+        import sympy
+        from sympy.parsing.sympy_parser import (
+            convert_xor,
+            implicit_multiplication_application,
+            parse_expr,
+            standard_transformations,
+        )
+    except ImportError:
+        logger.warning("sympy is not installed; symbolic answer check disabled")
+        return None
+    local_dict = {"ln": sympy.log, "abs": sympy.Abs, "e": sympy.E}
+    transformations = standard_transformations + (implicit_multiplication_application, convert_xor)
+    try:
+        if not _bounded_powers(parse_expr(text, local_dict=local_dict, transformations=transformations,
+                                          evaluate=False)):
+            return None
+        expression = parse_expr(text, local_dict=local_dict, transformations=transformations)
+    except Exception:
+        return None
+    return expression if isinstance(expression, sympy.Expr) else None
+
+
+def _bounded_powers(expression: Any, scale: int = 1) -> bool:
+    """False for an unevaluated expression with a power tower or a power too large to evaluate."""
+    import sympy
+
+    if isinstance(expression, sympy.Pow):
+        base, exponent = expression.args
+        if any(isinstance(node, sympy.Pow) and node.exp != -1 for node in sympy.preorder_traversal(exponent)):
+            return False
+        exponent = exponent.doit()  # only sums, products and reciprocals left
+        if exponent.is_Rational:
+            scale *= abs(exponent.p)
+            if scale > _MAX_EXPONENT or exponent.q > _MAX_EXPONENT:
+                return False
+        return _bounded_powers(base, scale)
+    return all(_bounded_powers(arg, scale) for arg in expression.args)
+
+
+def correct_diagnosis(
+    student_id: str,
+    question_id: Optional[str],
+    check: AnswerCheck,
+) -> Dict[str, Any]:
+    """
+    DiagnosisResponse fields for an answer proven correct without the LLM.
+    Without the LLM the concepts are unknown, so no kg_operations are emitted;
+    the attempt still counts as correct in the knowledge profile.
+    """
+    return {
+        "student_id": student_id,
+        "question_id": question_id,
+        "is_correct": True,
+        "error_type": None,
+        "reasoning_trace": (
+            f"학생 답안 '{check.student}'이(가) 정답 '{check.correct}'과(와) "
+            f"동치임이 확인되었습니다 ({check.method} 비교)."
+        ),
+        "error_location": None,
+        "feedback": "정답입니다! 잘 풀었어요.",
+        "recommendation": "다음 단계의 문제에 도전해 보세요.",
+        "concepts_involved": [],
+        "kg_operations": [],
+        "confidence": 1.0,
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+answer_checker = AnswerChecker()
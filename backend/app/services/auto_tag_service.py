@@ -0,0 +1,352 @@
+"""
+Batch auto-tagging of the question bank for Node 2 (Q-DNA).
+
+Questions created by seed scripts or bulk import never pass through
+QuestionService.create_question_with_ai, so they have no tags. A job walks
+the matching questions in question_id order (keyset pages, no OFFSET),
+analyzes each page with bounded parallelism at BACKGROUND LLM priority and
+writes the page in one transaction:
+
+- missing tags are created in bulk, question_tags are upserted with
+  ON CONFLICT, draft questions move to review_pending;
+- the job row's checkpoint (last_question_id) and counters are advanced in
+  the same transaction, so a resumed job continues exactly after the last
+  written page.
+
+Jobs run as the "auto_tag" kind of the durable background job queue
+(job_service): the queue's lease and retries take a job whose worker died
+or failed transiently and run it again, and run() continues from the
+checkpoint. The auto_tag_jobs row keeps the filters, progress and outcome.
+
+Cancellation is a flag on the job row, checked between pages, so it works
+from any worker process. Questions whose analysis failed are counted and
+left untagged; a later job picks them up again. Tags are cleaned before
+they reach the database: a type outside the tags CHECK constraint becomes
+"custom" and a tag without a name is dropped, so one odd LLM answer cannot
+abort a page (and, on resume, the same page again).
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, exists, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.llm_gateway import Priority, llm_request
+from app.models.auto_tag_job import AutoTagJob
+from app.models.curriculum import CurriculumNode
+from app.models.question import Question, QuestionCurriculum, QuestionTag
+from app.models.tag import Tag
+
+logger = logging.getLogger(__name__)
+
+TAG_NAME_MAX = 100
+TAG_TYPE_MAX = 50
+# tags.check_tag_type
+TAG_TYPES = frozenset({"concept", "cognitive_level", "source", "skill", "custom"})
+FALLBACK_TAG_TYPE = "custom"
+
+# (question_id, tags or None, error or None)
+PageResult = Tuple[uuid.UUID, Optional[List[Dict[str, Any]]], Optional[str]]
+
+
+def job_to_dict(job: AutoTagJob) -> Dict[str, Any]:
+    return {
+        "job_id": str(job.job_id),
+        "status": job.status,
+        "filters": {
+            "status": job.question_status,
+            "curriculum_path": job.curriculum_path,
+            "retag": job.retag,
+        },
+        "total": job.total,
+        "processed": job.processed,
+        "tagged": job.tagged,
+        "failed": job.failed,
+        "tag_links": job.tag_links,
+        "progress": round(min(job.processed / job.total, 1.0), 4) if job.total else (1.0 if job.status == "completed" else 0.0),
+        "last_question_id": str(job.last_question_id) if job.last_question_id else None,
+        "cancel_requested": job.cancel_requested,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def link_rows(
+    tagged: Iterable[Tuple[uuid.UUID, List[Dict[str, Any]]]], tag_ids: Dict[Tuple[str, str], int]
+) -> List[Dict[str, Any]]:
+    """question_tags rows, one per (question, tag) with the highest confidence."""
+    best: Dict[Tuple[uuid.UUID, int], float] = {}
+    for question_id, tags in tagged:
+        for tag in tags:
+            tag_id = tag_ids[tag_key(tag)]
+            confidence = float(tag["confidence"])
+            if confidence > best.get((question_id, tag_id), -1.0):
+                best[(question_id, tag_id)] = confidence
+    return [
+        {"question_id": question_id, "tag_id": tag_id, "confidence": confidence, "auto_tagged": True}
+        for (question_id, tag_id), confidence in best.items()
+    ]
+
+
+def tag_key(tag: Dict[str, Any]) -> Tuple[str, str]:
+    return str(tag["tag"]).strip()[:TAG_NAME_MAX], str(tag["type"]).strip()[:TAG_TYPE_MAX]
+
+
+def clean_tags(tags: Iterable[Any]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Tags the tags table accepts: named, with an allowed type (others become
+    FALLBACK_TAG_TYPE) and a confidence in [0, 1]. Returns (tags, number of
+    tags whose type was replaced or that were dropped).
+    """
+    cleaned: List[Dict[str, Any]] = []
+    fixed = 0
+    for tag in tags:
+        if not isinstance(tag, dict) or not str(tag.get("tag") or "").strip():
+            fixed += 1
+            continue
+        tag_type = str(tag.get("type") or "").strip().lower()
+        if tag_type not in TAG_TYPES:
+            tag_type = FALLBACK_TAG_TYPE
+            fixed += 1
+        try:
+            confidence = min(max(float(tag.get("confidence", 0.0)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        cleaned.append({**tag, "type": tag_type, "confidence": confidence})
+    return cleaned, fixed
+
+
+class AutoTagService:
+
+    def __init__(
+        self,
+        page_size: int = settings.AUTO_TAG_PAGE_SIZE,
+        concurrency: int = settings.AUTO_TAG_CONCURRENCY,
+        tagger: Any = None,
+    ):
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self._tagger = tagger
+
+    @property
+    def tagger(self) -> Any:
+        if self._tagger is None:
+            from app.services.tagging_service import tagging_service
+            self._tagger = tagging_service
+        return self._tagger
+
+    def matching(self, stmt, job: AutoTagJob):
+        """Apply the job's filters to a statement over questions."""
+        if job.question_status:
+            stmt = stmt.where(Question.status == job.question_status)
+        if job.curriculum_path:
+            stmt = stmt.where(exists(
+                select(QuestionCurriculum.question_id)
+                .join(CurriculumNode, CurriculumNode.node_id == QuestionCurriculum.node_id)
+                .where(
+                    QuestionCurriculum.question_id == Question.question_id,
+                    CurriculumNode.path.op("<@")(func.text2ltree(job.curriculum_path)),
+                )
+            ))
+        if not job.retag:
+            stmt = stmt.where(~exists(select(QuestionTag.question_id).where(QuestionTag.question_id == Question.question_id)))
+        return stmt
+
+    def page_query(self, job: AutoTagJob, after: Optional[uuid.UUID]):
+        stmt = self.matching(select(Question.question_id, Question.content_stem), job)
+        if after is not None:
+            stmt = stmt.where(Question.question_id > after)
+        return stmt.order_by(Question.question_id).limit(self.page_size)
+
+    async def create_job(
+        self, db: AsyncSession, status: Optional[str] = None, curriculum_path: Optional[str] = None, retag: bool = False
+    ) -> AutoTagJob:
+        job = AutoTagJob(
+            job_id=uuid.uuid4(), status="queued",
+            question_status=status, curriculum_path=curriculum_path, retag=retag,
+            total=0, processed=0, tagged=0, failed=0, tag_links=0, cancel_requested=False,
+        )
+        job.total = (await db.execute(self.matching(select(func.count(Question.question_id)), job))).scalar_one()
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+    async def start_job(self, db: AsyncSession, job_id: uuid.UUID) -> None:
+        """Queue a run of the job on the background job queue."""
+        from app.services.job_service import job_service
+
+        await job_service.enqueue(db, "auto_tag", {"job_id": str(job_id)})
+
+    async def is_queued(self, db: AsyncSession, job_id: uuid.UUID) -> bool:
+        from app.models.background_job import BackgroundJob
+
+        return (await db.execute(select(exists().where(
+            BackgroundJob.kind == "auto_tag",
+            BackgroundJob.status.in_(("queued", "running")),
+            BackgroundJob.payload["job_id"].astext == str(job_id),
+        )))).scalar_one()
+
+    async def get_job(self, db: AsyncSession, job_id: uuid.UUID) -> Optional[AutoTagJob]:
+        return await db.get(AutoTagJob, job_id, populate_existing=True)
+
+    async def cancel_job(self, db: AsyncSession, job_id: uuid.UUID) -> Optional[AutoTagJob]:
+        job = await self.get_job(db, job_id)
+        if job is None:
+            return None
+        if job.status in ("queued", "running"):
+            job.cancel_requested = True
+            await db.commit()
+        return job
+
+    async def resume_job(self, db: AsyncSession, job_id: uuid.UUID) -> Optional[AutoTagJob]:
+        """
+        Restart a failed or cancelled job from its checkpoint. A job with a
+        queued or running queue entry is left alone: the queue reclaims it
+        from a worker that died once the lease expires.
+        """
+        job = await self.get_job(db, job_id)
+        if job is None or job.status == "completed" or await self.is_queued(db, job_id):
+            return job
+        job.status, job.cancel_requested, job.error, job.finished_at = "queued", False, None, None
+        await db.commit()
+        await self.start_job(db, job_id)
+        return await self.get_job(db, job_id)
+
+    async def analyze_page(self, page: Sequence[Tuple[uuid.UUID, str]]) -> List[PageResult]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def analyze(question_id: uuid.UUID, content: str) -> PageResult:
+            async with semaphore:
+                try:
+                    return question_id, await self.tagger.extract_tags(content), None
+                except Exception as e:
+                    return question_id, None, str(e)[:200]
+
+        # Batch work must never delay interactive requests at the LLM gateway
+        with llm_request(Priority.BACKGROUND):
+            return await asyncio.gather(*(analyze(qid, content) for qid, content in page))
+
+    async def resolve_tags(self, db: AsyncSession, keys: Set[Tuple[str, str]], known: Dict[Tuple[str, str], int]) -> None:
+        """Fill known with tag_ids for keys, creating missing tags in one INSERT."""
+        wanted = [key for key in keys if key not in known]
+        if not wanted:
+            return
+        result = await db.execute(
+            select(Tag.name, Tag.tag_type, Tag.tag_id)
+            .where(tuple_(Tag.name, Tag.tag_type).in_(wanted))
+            .order_by(Tag.tag_id)
+        )
+        for name, tag_type, tag_id in result.all():
+            known.setdefault((name, tag_type), tag_id)
+        missing = [key for key in wanted if key not in known]
+        if missing:
+            result = await db.execute(
+                pg_insert(Tag)
+                .values([{"name": name, "tag_type": tag_type, "tag_metadata": {}} for name, tag_type in missing])
+                .returning(Tag.name, Tag.tag_type, Tag.tag_id)
+            )
+            for name, tag_type, tag_id in result.all():
+                known[(name, tag_type)] = tag_id
+
+    async def write_page(
+        self, db: AsyncSession, job: AutoTagJob, page: Sequence[Tuple[uuid.UUID, str]],
+        results: List[PageResult], known_tags: Dict[Tuple[str, str], int],
+    ) -> List[uuid.UUID]:
+        """Tags, status and checkpoint for one page in a single transaction; returns the tagged ids."""
+        succeeded = []
+        for question_id, tags, error in results:
+            if error is not None:
+                continue
+            tags, fixed = clean_tags(tags or ())
+            if fixed:
+                logger.warning(f"Auto-tag job {job.job_id}: {fixed} invalid tag(s) for question {question_id} "
+                               f"mapped to '{FALLBACK_TAG_TYPE}' or dropped")
+            succeeded.append((question_id, [t for t in tags if all(tag_key(t))]))
+        tagged_ids = [question_id for question_id, tags in succeeded if tags]
+
+        await self.resolve_tags(db, {tag_key(t) for _, tags in succeeded for t in tags}, known_tags)
+        rows = link_rows(succeeded, known_tags)
+        if job.retag and tagged_ids:
+            # Re-tagging replaces earlier auto tags; manual tags stay
+            await db.execute(delete(QuestionTag).where(
+                QuestionTag.question_id.in_(tagged_ids), QuestionTag.auto_tagged == True
+            ))
+        if rows:
+            stmt = pg_insert(QuestionTag).values(rows)
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=[QuestionTag.question_id, QuestionTag.tag_id],
+                set_={"confidence": stmt.excluded.confidence, "auto_tagged": True},
+            ))
+        if tagged_ids:
+            await db.execute(
+                update(Question)
+                .where(Question.question_id.in_(tagged_ids), Question.status == "draft")
+                .values(status="review_pending")
+            )
+        await db.execute(
+            update(AutoTagJob)
+            .where(AutoTagJob.job_id == job.job_id)
+            .values(
+                last_question_id=page[-1][0],
+                processed=AutoTagJob.processed + len(page),
+                tagged=AutoTagJob.tagged + len(tagged_ids),
+                failed=AutoTagJob.failed + (len(results) - len(succeeded)),
+                tag_links=AutoTagJob.tag_links + len(rows),
+            )
+        )
+        await db.commit()
+        return tagged_ids
+
+    async def finish(self, db: AsyncSession, job_id: uuid.UUID, status: str, error: Optional[str] = None) -> None:
+        await db.execute(
+            update(AutoTagJob)
+            .where(AutoTagJob.job_id == job_id)
+            .values(status=status, error=error, finished_at=func.now())
+        )
+        await db.commit()
+
+    async def run(self, job_id: uuid.UUID) -> None:
+        """
+        Tag pages from the checkpoint until done or cancelled. A failure is
+        recorded on the job row and re-raised so the queue can retry the run.
+        """
+        from app.services.recommender_service import recommender_service
+
+        async with SessionLocal() as db:
+            job = await self.get_job(db, job_id)
+            if job is None or job.status in ("completed", "cancelled"):
+                return
+            await db.execute(
+                update(AutoTagJob).where(AutoTagJob.job_id == job_id).values(status="running", error=None)
+            )
+            await db.commit()
+            known_tags: Dict[Tuple[str, str], int] = {}
+            try:
+                while True:
+                    job = await self.get_job(db, job_id)  # fresh checkpoint and cancel flag
+                    if job.cancel_requested:
+                        await self.finish(db, job_id, "cancelled")
+                        break
+                    page = (await db.execute(self.page_query(job, job.last_question_id))).all()
+                    if not page:
+                        await self.finish(db, job_id, "completed")
+                        break
+                    results = await self.analyze_page(page)
+                    tagged_ids = await self.write_page(db, job, page, results, known_tags)
+                    await recommender_service.refresh_questions(db, tagged_ids)
+            except Exception as e:
+                logger.exception(f"Auto-tag job {job_id} failed")
+                await db.rollback()
+                await self.finish(db, job_id, "failed", str(e)[:1000])
+                raise
+        logger.info(f"Auto-tag job {job_id} finished")
+
+
+auto_tag_service = AutoTagService()
@@ -0,0 +1,288 @@
+"""
+BKT (Bayesian Knowledge Tracing) engine for Node 2 (Q-DNA).
+
+Mastery updates are applied in bulk: events are grouped per (user, skill) pair,
+missing pairs are inserted with default state and every pair is locked, the
+posterior is advanced with NumPy over all pairs at once, and the results are
+written back with INSERT ... ON CONFLICT, chunked to the bind-parameter limit.
+Locking rows that already exist means two batches updating a new pair at the
+same time are applied one after the other instead of overwriting each other.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import uuid
+import logging
+
+import numpy as np
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.question import QuestionTag
+from app.models.student_mastery import StudentMastery
+from app.models.tag import Tag
+
+logger = logging.getLogger(__name__)
+
+# Defaults mirror the StudentMastery column defaults
+DEFAULT_P_MASTERY = 0.1
+DEFAULT_P_TRANSIT = 0.1
+DEFAULT_P_SLIP = 0.1
+DEFAULT_P_GUESS = 0.2
+
+UNKNOWN_SKILL = "General.Unknown"
+SKILL_TAG_TYPES = ("concept", "skill")  # tag types allowed by the tags CHECK constraint
+
+# asyncpg caps bind parameters at 32767 per statement; 9 columns per row
+UPSERT_CHUNK_ROWS = 2000
+
+PairKey = Tuple[uuid.UUID, str]
+
+
+@dataclass
+class MasteryEvent:
+    """A single graded answer, already resolved to a skill."""
+    user_id: uuid.UUID
+    skill_id: str
+    is_correct: bool
+    attempted_at: Optional[datetime] = None
+
+
+def bkt_step(
+    p_mastery: np.ndarray,
+    is_correct: np.ndarray,
+    p_transit: np.ndarray,
+    p_slip: np.ndarray,
+    p_guess: np.ndarray,
+) -> np.ndarray:
+    """
+    One BKT update for every pair at once.
+
+    Computes P(L | observation) with Bayes' rule, then applies the learning
+    transition P(L') = P(L|obs) + (1 - P(L|obs)) * P(T).
+    """
+    correct_num = p_mastery * (1.0 - p_slip)
+    correct_den = correct_num + (1.0 - p_mastery) * p_guess
+    wrong_num = p_mastery * p_slip
+    wrong_den = wrong_num + (1.0 - p_mastery) * (1.0 - p_guess)
+
+    posterior = np.where(
+        is_correct,
+        correct_num / np.maximum(correct_den, 1e-12),
+        wrong_num / np.maximum(wrong_den, 1e-12),
+    )
+    return posterior + (1.0 - posterior) * p_transit
+
+
+def run_sequences(
+    p_mastery: np.ndarray,
+    outcomes: np.ndarray,
+    mask: np.ndarray,
+    p_transit: np.ndarray,
+    p_slip: np.ndarray,
+    p_guess: np.ndarray,
+) -> np.ndarray:
+    """
+    Advance many per-pair answer sequences.
+
+    Args:
+        p_mastery: (n_pairs,) prior mastery per pair
+        outcomes: (n_pairs, max_len) correctness, left-aligned per pair
+        mask: (n_pairs, max_len) True where outcomes holds a real answer
+        p_transit, p_slip, p_guess: (n_pairs,) per-pair parameters
+
+    Returns:
+        (n_pairs,) posterior mastery after each pair's full sequence
+    """
+    current = p_mastery.astype(np.float64, copy=True)
+    # Loop over sequence position only; every step is vectorized across pairs
+    for col in range(outcomes.shape[1]):
+        active = mask[:, col]
+        if not active.any():
+            break
+        updated = bkt_step(current, outcomes[:, col], p_transit, p_slip, p_guess)
+        current = np.where(active, updated, current)
+    return current
+
+
+def pack_sequences(sequences: Sequence[Sequence[bool]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Left-align ragged per-pair answer lists into (outcomes, mask) matrices."""
+    lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+    max_len = int(lengths.max()) if len(sequences) else 0
+    mask = np.arange(max_len)[None, :] < lengths[:, None]
+    outcomes = np.zeros((len(sequences), max_len), dtype=bool)
+    if max_len:
+        outcomes[mask] = np.fromiter(
+            (bool(v) for s in sequences for v in s), dtype=bool, count=int(lengths.sum())
+        )
+    return outcomes, mask
+
+
+class BKTService:
+    """
+    Vectorized, persistent BKT engine backed by the student_mastery table.
+    """
+
+    async def resolve_skills(
+        self, db: AsyncSession, question_ids: Iterable[uuid.UUID]
+    ) -> Dict[uuid.UUID, str]:
+        """
+        Map questions to their skill tag with one set-based query.
+        Questions without a concept/subject tag fall back to UNKNOWN_SKILL.
+        """
+        ids = {qid for qid in question_ids if qid is not None}
+        if not ids:
+            return {}
+
+        stmt = (
+            select(QuestionTag.question_id, Tag.name)
+            .join(Tag, Tag.tag_id == QuestionTag.tag_id)
+            .where(QuestionTag.question_id.in_(ids), Tag.tag_type.in_(SKILL_TAG_TYPES))
+            .order_by(QuestionTag.question_id, QuestionTag.confidence.desc(), Tag.tag_id)
+        )
+        result = await db.execute(stmt)
+
+        skills: Dict[uuid.UUID, str] = {}
+        for question_id, name in result.all():
+            skills.setdefault(question_id, name)  # highest-confidence tag wins
+        return {qid: skills.get(qid, UNKNOWN_SKILL) for qid in ids}
+
+    async def record_attempts(
+        self,
+        db: AsyncSession,
+        attempts: Sequence[Tuple[uuid.UUID, uuid.UUID, bool, Optional[datetime]]],
+    ) -> Dict[PairKey, float]:
+        """
+        Resolve (user_id, question_id, is_correct, attempted_at) tuples to skills
+        and apply them as one BKT batch.
+        """
+        skills = await self.resolve_skills(db, (a[1] for a in attempts))
+        events = [
+            MasteryEvent(
+                user_id=user_id,
+                skill_id=skills.get(question_id, UNKNOWN_SKILL),
+                is_correct=is_correct,
+                attempted_at=attempted_at,
+            )
+            for user_id, question_id, is_correct, attempted_at in attempts
+        ]
+        return await self.update_batch(db, events)
+
+    async def update_batch(
+        self, db: AsyncSession, events: Sequence[MasteryEvent]
+    ) -> Dict[PairKey, float]:
+        """
+        Apply a batch of events and persist the new mastery state.
+
+        Returns:
+            {(user_id, skill_id): new p_mastery}
+        """
+        if not events:
+            return {}
+
+        # 1. Group answers per pair, in chronological order
+        ordered = sorted(
+            enumerate(events),
+            key=lambda ie: (
+                ie[1].attempted_at is None,
+                ie[1].attempted_at.timestamp() if ie[1].attempted_at else 0.0,
+                ie[0],
+            ),
+        )
+        grouped: Dict[PairKey, List[MasteryEvent]] = {}
+        for _, event in ordered:
+            grouped.setdefault((event.user_id, event.skill_id), []).append(event)
+        # Sorted keys give a stable lock order across concurrent batches
+        keys = sorted(grouped, key=lambda k: (str(k[0]), k[1]))
+
+        # 2. Lock (creating where missing) and load the current state of every pair
+        existing = await self.lock_rows(db, keys)
+
+        def param(key: PairKey, name: str, default: float) -> float:
+            row = existing.get(key)
+            value = getattr(row, name, None) if row is not None else None
+            return default if value is None else value
+
+        p_mastery = np.array([param(k, "p_mastery", DEFAULT_P_MASTERY) for k in keys])
+        p_transit = np.array([param(k, "p_transit", DEFAULT_P_TRANSIT) for k in keys])
+        p_slip = np.array([param(k, "p_slip", DEFAULT_P_SLIP) for k in keys])
+        p_guess = np.array([param(k, "p_guess", DEFAULT_P_GUESS) for k in keys])
+
+        # 3. Vectorized update over all pairs
+        outcomes, mask = pack_sequences([[e.is_correct for e in grouped[k]] for k in keys])
+        new_mastery = run_sequences(p_mastery, outcomes, mask, p_transit, p_slip, p_guess)
+
+        # 4. Bulk upsert
+        rows = []
+        for i, key in enumerate(keys):
+            pair_events = grouped[key]
+            timestamps = [e.attempted_at for e in pair_events if e.attempted_at is not None]
+            rows.append({
+                "user_id": key[0],
+                "skill_id": key[1],
+                "p_mastery": float(new_mastery[i]),
+                "p_transit": float(p_transit[i]),
+                "p_slip": float(p_slip[i]),
+                "p_guess": float(p_guess[i]),
+                "attempts_count": int(param(key, "attempts_count", 0)) + len(pair_events),
+                "correct_count": int(param(key, "correct_count", 0)) + sum(e.is_correct for e in pair_events),
+                "last_attempt_at": max(timestamps) if timestamps else datetime.now().astimezone(),
+            })
+
+        await self.upsert_rows(db, rows)
+        await db.commit()
+
+        return {key: float(new_mastery[i]) for i, key in enumerate(keys)}
+
+    async def lock_rows(self, db: AsyncSession, keys: List[PairKey]) -> Dict[PairKey, StudentMastery]:
+        """
+        INSERT ... ON CONFLICT DO NOTHING for missing pairs, then SELECT ... FOR
+        UPDATE, both chunked like the upsert and in the callers' key order.
+        """
+        existing: Dict[PairKey, StudentMastery] = {}
+        for start in range(0, len(keys), UPSERT_CHUNK_ROWS):
+            chunk = keys[start:start + UPSERT_CHUNK_ROWS]
+            await db.execute(
+                pg_insert(StudentMastery)
+                .values([
+                    {
+                        "user_id": user_id, "skill_id": skill_id,
+                        "p_mastery": DEFAULT_P_MASTERY, "p_transit": DEFAULT_P_TRANSIT,
+                        "p_slip": DEFAULT_P_SLIP, "p_guess": DEFAULT_P_GUESS,
+                        "attempts_count": 0, "correct_count": 0,
+                    }
+                    for user_id, skill_id in chunk
+                ])
+                .on_conflict_do_nothing(constraint="uq_student_mastery_user_skill")
+            )
+            result = await db.execute(
+                select(StudentMastery)
+                .where(tuple_(StudentMastery.user_id, StudentMastery.skill_id).in_(chunk))
+                .with_for_update()
+            )
+            existing.update({(row.user_id, row.skill_id): row for row in result.scalars().all()})
+        return existing
+
+    async def upsert_rows(self, db: AsyncSession, rows: List[Dict]) -> None:
+        """INSERT ... ON CONFLICT (user_id, skill_id) DO UPDATE, chunked to the bind limit."""
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            chunk = rows[start:start + UPSERT_CHUNK_ROWS]
+            stmt = pg_insert(StudentMastery).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_student_mastery_user_skill",
+                set_={
+                    "p_mastery": stmt.excluded.p_mastery,
+                    "p_transit": stmt.excluded.p_transit,
+                    "p_slip": stmt.excluded.p_slip,
+                    "p_guess": stmt.excluded.p_guess,
+                    "attempts_count": stmt.excluded.attempts_count,
+                    "correct_count": stmt.excluded.correct_count,
+                    "last_attempt_at": stmt.excluded.last_attempt_at,
+                    "updated_at": func.now(),
+                },
+            )
+            await db.execute(stmt)
+
+
+bkt_service = BKTService()
@@ -0,0 +1,249 @@
+"""
+Bulk attempt import for Node 2 (Q-DNA).
+
+Rows arrive as a stream (NDJSON or CSV), are validated per row, checked against
+`questions` with one set-based query per chunk, and written to attempt_logs with
+asyncpg COPY. Each chunk is its own transaction, together with its rollup
+update, so one bad row or one failed chunk never rolls back the rest of the
+upload.
+"""
+import csv
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.question import Question
+from app.schemas.bulk import BulkAttemptItem, BulkChunkResult, BulkImportResponse
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT_COPY_COLUMNS = [
+    "user_id", "question_id", "response_data", "is_correct",
+    "score", "time_taken_ms", "attempted_at",
+]
+MAX_FAILED_ITEMS_PER_CHUNK = 100
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+
+# (row number, parsed item or None, parse error or None)
+ParsedRow = Tuple[int, Optional[BulkAttemptItem], Optional[str]]
+
+
+class UnsupportedBulkFormat(Exception):
+    pass
+
+
+class InvalidBulkBody(Exception):
+    """The body cannot be read at all (e.g. an undecodable CSV header)."""
+
+
+async def iter_lines(byte_stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split an async byte stream into raw lines without buffering the whole body."""
+    pending = b""
+    async for chunk in byte_stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+def _parse_item(data: Dict[str, Any]) -> BulkAttemptItem:
+    if not isinstance(data, dict):
+        raise ValueError("Each row must be a JSON object")
+    # CSV cells are strings; empty cells mean "not provided"
+    cleaned = {k.strip(): (v if v != "" else None) for k, v in data.items() if k}
+    return BulkAttemptItem.model_validate(cleaned)
+
+
+async def parse_rows(byte_stream: AsyncIterator[bytes], content_type: str) -> AsyncIterator[ParsedRow]:
+    """Yield rows from an NDJSON or CSV (with header) body."""
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        is_csv = False
+    elif media_type in CSV_TYPES:
+        is_csv = True
+    else:
+        raise UnsupportedBulkFormat(f"Unsupported content type '{media_type}'. Use NDJSON or CSV.")
+
+    header: Optional[List[str]] = None
+    row_no = 0
+    async for raw in iter_lines(byte_stream):
+        if not raw.strip():
+            continue
+        if is_csv and header is None:
+            try:
+                header = next(csv.reader([raw.decode("utf-8-sig")]))
+            except UnicodeDecodeError:
+                raise InvalidBulkBody("CSV header is not valid UTF-8")
+            continue
+
+        row_no += 1
+        try:
+            # Decoded per row: one undecodable line is a rejected row, not a failed upload
+            line = raw.decode("utf-8")
+            if is_csv:
+                data = dict(zip(header, next(csv.reader([line]))))
+            else:
+                data = json.loads(line)
+            yield row_no, _parse_item(data), None
+        except (ValueError, ValidationError) as e:
+            yield row_no, None, str(e).splitlines()[0]
+
+
+class BulkImportService:
+    """COPY-based, chunked importer for attempt_logs."""
+
+    def __init__(self, chunk_rows: int = settings.BULK_IMPORT_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+
+    async def import_stream(
+        self, db: AsyncSession, byte_stream: AsyncIterator[bytes], content_type: str
+    ) -> BulkImportResponse:
+        return await self.import_rows(db, parse_rows(byte_stream, content_type))
+
+    async def import_items(self, db: AsyncSession, items: Iterable[BulkAttemptItem]) -> BulkImportResponse:
+        async def rows():
+            for i, item in enumerate(items, start=1):
+                yield i, item, None
+        return await self.import_rows(db, rows())
+
+    async def import_rows(self, db: AsyncSession, rows: AsyncIterator[ParsedRow]) -> BulkImportResponse:
+        chunks: List[BulkChunkResult] = []
+        buffer: List[ParsedRow] = []
+        async for row in rows:
+            buffer.append(row)
+            if len(buffer) >= self.chunk_rows:
+                chunks.append(await self.import_chunk(db, len(chunks), buffer))
+                buffer = []
+        if buffer:
+            chunks.append(await self.import_chunk(db, len(chunks), buffer))
+
+        return BulkImportResponse(
+            total_rows=sum(c.row_end - c.row_start + 1 for c in chunks),
+            success_count=sum(c.success_count for c in chunks),
+            failed_count=sum(c.failed_count for c in chunks),
+            chunks=chunks,
+        )
+
+    async def import_chunk(self, db: AsyncSession, chunk_index: int, rows: List[ParsedRow]) -> BulkChunkResult:
+        failed: List[Dict[str, Any]] = []
+        valid: List[Tuple[int, BulkAttemptItem]] = []
+        for row_no, item, error in rows:
+            if item is None:
+                failed.append({"row": row_no, "error": error})
+            else:
+                valid.append((row_no, item))
+
+        # 1. Set-based question validation (one query per chunk)
+        known = set()
+        if valid:
+            ids = {item.question_id for _, item in valid}
+            result = await db.execute(select(Question.question_id).where(Question.question_id.in_(ids)))
+            known = set(result.scalars().all())
+
+        records = []
+        accepted: List[BulkAttemptItem] = []
+        now = datetime.now().astimezone()
+        for row_no, item in valid:
+            if item.question_id not in known:
+                failed.append({
+                    "row": row_no,
+                    "student_id": str(item.student_id),
+                    "question_id": str(item.question_id),
+                    "error": "Unknown question_id",
+                })
+                continue
+            # score is strictly 100.0 (correct) or 0.0 (incorrect) for MVP generic logic
+            records.append((
+                item.student_id,
+                item.question_id,
+                json.dumps({"notes": item.notes} if item.notes else {}),
+                item.is_correct,
+                100.0 if item.is_correct else 0.0,
+                item.time_taken_seconds * 1000 if item.time_taken_seconds else None,
+                now,
+            ))
+            accepted.append(item)
+
+        chunk = BulkChunkResult(
+            chunk_index=chunk_index,
+            row_start=rows[0][0],
+            row_end=rows[-1][0],
+            status="committed",
+            success_count=0,
+            failed_count=0,
+        )
+
+        # 2. COPY valid rows and update their rollups, one transaction per chunk
+        if records:
+            try:
+                await self.copy_attempts(db, records)
+                await self.apply_rollups(db, accepted, now)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Bulk import chunk {chunk_index} failed: {e}")
+                chunk.status = "failed"
+                chunk.error = str(e)
+                failed.extend({
+                    "student_id": str(item.student_id),
+                    "question_id": str(item.question_id),
+                    "error": "Chunk commit failed",
+                } for item in accepted)
+                accepted = []
+        else:
+            await db.rollback()
+
+        # 3. Mastery for the committed rows
+        if accepted:
+            await self.after_commit(db, accepted, now)
+
+        chunk.success_count = len(accepted)
+        chunk.failed_count = len(failed)
+        chunk.failed_items = failed[:MAX_FAILED_ITEMS_PER_CHUNK]
+        chunk.failed_items_truncated = len(failed) > MAX_FAILED_ITEMS_PER_CHUNK
+        return chunk
+
+    async def copy_attempts(self, db: AsyncSession, records: List[tuple]) -> None:
+        """COPY rows into attempt_logs through the session's asyncpg connection."""
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "attempt_logs", records=records, columns=ATTEMPT_COPY_COLUMNS
+        )
+
+    async def apply_rollups(self, db: AsyncSession, items: List[BulkAttemptItem], attempted_at: datetime) -> None:
+        """Rollup upsert for the chunk, in the COPY's transaction (not committed here)."""
+        from app.services.rollup_service import rollup_service, RollupAttempt
+
+        await rollup_service.apply_attempts(db, [
+            RollupAttempt(
+                i.student_id, i.question_id, i.is_correct, 100.0 if i.is_correct else 0.0,
+                i.time_taken_seconds * 1000 if i.time_taken_seconds else None, attempted_at
+            )
+            for i in items
+        ])
+
+    async def after_commit(self, db: AsyncSession, items: List[BulkAttemptItem], attempted_at: datetime) -> None:
+        """BKT update for committed rows; mastery can be backfilled from attempt_logs if it fails."""
+        from app.services.bkt_service import bkt_service
+
+        try:
+            await bkt_service.record_attempts(
+                db, [(i.student_id, i.question_id, i.is_correct, attempted_at) for i in items]
+            )
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"BKT update failed for bulk import chunk: {e}")
+
+
+bulk_import_service = BulkImportService()
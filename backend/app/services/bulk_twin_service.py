@@ -0,0 +1,219 @@
+"""
+Bulk twin-question generation for Node 2 (Q-DNA).
+
+Generates K twins for every question in a curriculum subtree (a "bulk_twin"
+background job, POST /questions/bulk-twins):
+
+1. the source questions are selected with one ltree query; generated twins
+   are never used as sources;
+2. a MinHash index (near_duplicate_index) is built over the content_stem of
+   the whole bank, streamed in batches;
+3. sources are worked through in chunks of SOURCE_CHUNK: K variants per
+   source are generated with bounded parallelism, with no database
+   connection held meanwhile;
+4. variants are checked against the index in completion order, so a twin
+   that nearly repeats an existing question or an already accepted twin is
+   dropped before it is stored (accepted twins are indexed at once);
+5. each chunk's accepted twins, with the source's curriculum links, are
+   inserted with multi-row INSERTs and committed before the next chunk.
+
+Twins record their source in content_metadata.original_question_id, so a
+retried job skips the sources that already have twins and only redoes the
+chunk that was interrupted.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.curriculum import CurriculumNode
+from app.models.question import Question, QuestionCurriculum
+from app.services.near_duplicate_index import MinHashIndex
+
+logger = logging.getLogger(__name__)
+
+INSERT_CHUNK = 500
+INDEX_BATCH = 2000
+SOURCE_CHUNK = 50  # sources generated and committed together; bounds the work lost to a restart
+
+
+class BulkTwinService:
+
+    def __init__(
+        self,
+        concurrency: int = settings.BULK_TWIN_CONCURRENCY,
+        threshold: float = settings.TWIN_DUPLICATE_THRESHOLD,
+        generator: Any = None,
+    ):
+        self.concurrency = concurrency
+        self.threshold = threshold
+        self._generator = generator
+
+    @property
+    def generator(self) -> Any:
+        if self._generator is None:
+            from app.services.math_advanced_service import math_advanced_service
+            self._generator = math_advanced_service
+        return self._generator
+
+    def source_query(self, curriculum_path: str, status: Optional[str], limit: int):
+        stmt = select(Question)
+        if status:
+            stmt = stmt.where(Question.status == status)
+        return (
+            stmt.where(
+                Question.status != "generated",
+                exists(
+                    select(QuestionCurriculum.question_id)
+                    .join(CurriculumNode, CurriculumNode.node_id == QuestionCurriculum.node_id)
+                    .where(
+                        QuestionCurriculum.question_id == Question.question_id,
+                        CurriculumNode.path.op("<@")(func.text2ltree(curriculum_path)),
+                    )
+                ),
+            )
+            .order_by(Question.question_id)
+            .limit(limit)
+        )
+
+    async def sources_with_twins(self, db: AsyncSession, source_ids: Sequence[uuid.UUID]) -> set:
+        """Sources that already have generated twins, e.g. from an interrupted attempt of this job."""
+        original_id = Question.content_metadata["original_question_id"].astext
+        done = set()
+        for start in range(0, len(source_ids), INDEX_BATCH):
+            result = await db.execute(
+                select(original_id).distinct().where(
+                    Question.status == "generated",
+                    original_id.in_([str(sid) for sid in source_ids[start:start + INDEX_BATCH]]),
+                )
+            )
+            done.update(uuid.UUID(value) for value in result.scalars().all())
+        return done
+
+    async def build_index(self, db: AsyncSession) -> MinHashIndex:
+        index = MinHashIndex(threshold=self.threshold)
+        result = await db.stream(
+            select(Question.question_id, Question.content_stem).execution_options(yield_per=INDEX_BATCH)
+        )
+        async for partition in result.partitions():
+            for question_id, content_stem in partition:
+                if content_stem:
+                    index.add(question_id, content_stem)
+        return index
+
+    async def generate(self, sources: Sequence[Any], count: int) -> List[tuple]:
+        """(source, QuestionCreate or None, error or None) per variant, in completion order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(source, variant: int):
+            async with semaphore:
+                try:
+                    return source, await self.generator.generate_twin_variant(source, variant, count), None
+                except Exception as e:
+                    return source, None, str(e)[:200]
+
+        tasks = [one(source, variant) for source in sources for variant in range(1, count + 1)]
+        return [await done for done in asyncio.as_completed(tasks)]
+
+    def select_unique(self, index: MinHashIndex, generated: List[tuple]) -> Dict[str, Any]:
+        accepted, duplicates, failed = [], [], 0
+        for source, twin, error in generated:
+            if twin is None:
+                failed += 1
+                continue
+            twin_id = uuid.uuid4()
+            duplicate = index.add_unless_duplicate(twin_id, twin.content_stem)
+            if duplicate is None:
+                accepted.append((twin_id, source, twin))
+            else:
+                duplicates.append({
+                    "source_id": str(source.question_id),
+                    "duplicate_of": str(duplicate[0]),
+                    "similarity": round(duplicate[1], 3),
+                })
+        return {"accepted": accepted, "duplicates": duplicates, "failed": failed}
+
+    async def insert_twins(self, db: AsyncSession, accepted: List[tuple], created_by: Dict[uuid.UUID, Any]) -> None:
+        rows = [
+            {
+                "question_id": twin_id,
+                "question_type": twin.question_type,
+                "content_stem": twin.content_stem,
+                "content_metadata": twin.content_metadata.model_dump(),
+                "answer_key": twin.answer_key,
+                "difficulty_index": twin.difficulty_index,
+                "version": 1,
+                "status": "generated",
+                "created_by": created_by.get(source.question_id),
+            }
+            for twin_id, source, twin in accepted
+        ]
+        source_ids = {source.question_id for _, source, _ in accepted}
+        links = (await db.execute(
+            select(QuestionCurriculum.question_id, QuestionCurriculum.node_id, QuestionCurriculum.relevance_score)
+            .where(QuestionCurriculum.question_id.in_(source_ids))
+        )).all() if source_ids else []
+        nodes_by_source: Dict[uuid.UUID, List[tuple]] = {}
+        for question_id, node_id, relevance in links:
+            nodes_by_source.setdefault(question_id, []).append((node_id, relevance))
+        link_rows = [
+            {"question_id": twin_id, "node_id": node_id, "relevance_score": relevance}
+            for twin_id, source, _ in accepted
+            for node_id, relevance in nodes_by_source.get(source.question_id, ())
+        ]
+
+        for start in range(0, len(rows), INSERT_CHUNK):
+            await db.execute(pg_insert(Question).values(rows[start:start + INSERT_CHUNK]))
+        for start in range(0, len(link_rows), INSERT_CHUNK):
+            await db.execute(
+                pg_insert(QuestionCurriculum).values(link_rows[start:start + INSERT_CHUNK]).on_conflict_do_nothing()
+            )
+        await db.commit()
+
+    async def run(self, curriculum_path: str, count_per_question: int, status: Optional[str] = None,
+                  max_questions: int = 200) -> Dict[str, Any]:
+        from app.schemas.question import Question as QuestionSchema
+        from app.services.recommender_service import recommender_service
+
+        summary = {"sources": 0, "skipped": 0, "indexed_questions": 0, "generated": 0, "accepted": 0,
+                   "duplicates": [], "failed": 0, "question_ids": []}
+        async with SessionLocal() as db:
+            originals = (await db.execute(self.source_query(curriculum_path, status, max_questions))).scalars().all()
+            if not originals:
+                return summary
+            done = await self.sources_with_twins(db, [q.question_id for q in originals])
+            created_by = {q.question_id: q.created_by for q in originals}
+            sources = [QuestionSchema.model_validate(q) for q in originals if q.question_id not in done]
+            # Twins from an earlier attempt are in the bank, so they are indexed too
+            index = await self.build_index(db)
+            summary.update(sources=len(originals), skipped=len(done), indexed_questions=len(index))
+
+        for start in range(0, len(sources), SOURCE_CHUNK):
+            generated = await self.generate(sources[start:start + SOURCE_CHUNK], count_per_question)
+            selection = self.select_unique(index, generated)
+            accepted = selection["accepted"]
+            if accepted:
+                async with SessionLocal() as db:
+                    await self.insert_twins(db, accepted, created_by)
+                    await recommender_service.refresh_questions(db, [twin_id for twin_id, _, _ in accepted])
+            summary["generated"] += len(generated) - selection["failed"]
+            summary["accepted"] += len(accepted)
+            summary["duplicates"].extend(selection["duplicates"])
+            summary["failed"] += selection["failed"]
+            summary["question_ids"].extend(str(twin_id) for twin_id, _, _ in accepted)
+
+        logger.info(
+            f"Bulk twins for {curriculum_path}: {summary['accepted']} accepted, "
+            f"{len(summary['duplicates'])} near-duplicates, {summary['failed']} failed, "
+            f"{summary['skipped']} sources skipped (already twinned)"
+        )
+        return summary
+
+
+bulk_twin_service = BulkTwinService()
@@ -0,0 +1,283 @@
+"""
+Cohort weekly report batch for Node 2 (Q-DNA).
+
+Report data for a whole cohort is computed with a couple of set-based
+GROUP BY queries over the report period of attempt_logs (totals and
+per-node averages, chunked by student), the PDFs are rendered across a process pool, and each
+file is stored under the SHA-256 of its rendered HTML.
+
+Batches run as the "cohort_report" kind of the durable background job queue
+(job_service), so they survive restarts and any API worker can answer a
+poll. Progress and the per-stage time split are kept on a CohortReportJob
+while the batch runs and published to the queue row (at most every
+PROGRESS_INTERVAL_SECONDS); its final state is the job result.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.attempt import AttemptLog
+from app.models.curriculum import CurriculumNode
+from app.models.question import QuestionCurriculum
+from app.services.analytics_service import build_report_payload
+
+logger = logging.getLogger(__name__)
+
+# Keeps IN (...) lists well under the asyncpg bind-parameter limit
+STUDENT_QUERY_CHUNK = 5000
+MAX_JOB_ERRORS = 100
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+PeriodTotals = Tuple[int, int, int]  # (total, correct, time_ms)
+
+
+def chunked(items: Sequence, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def default_since() -> datetime:
+    return datetime.now().astimezone() - timedelta(days=settings.REPORT_PERIOD_DAYS)
+
+
+def batch_id(since: datetime, student_ids: Optional[List[uuid.UUID]]) -> str:
+    """Stable name of a batch (its manifest), so a retried job overwrites the same manifest."""
+    key = since.isoformat() + "|" + ("*" if student_ids is None else ",".join(sorted(map(str, student_ids))))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def student_display_name(student_id: uuid.UUID) -> str:
+    # Same placeholder as POST /reports/generate until a users table exists
+    return "Student " + str(student_id)[:8]
+
+
+@dataclass
+class CohortReportJob:
+    job_id: str
+    since: datetime
+    student_ids: Optional[List[uuid.UUID]] = None
+    status: str = "queued"  # queued, running, completed, failed
+    total: int = 0
+    rendered: int = 0
+    reused: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    # Wall-clock time per stage, plus render/write time summed over workers
+    stage_ms: Dict[str, float] = field(default_factory=lambda: {"query": 0.0, "build": 0.0, "render": 0.0})
+    worker_ms: Dict[str, float] = field(default_factory=lambda: {"render": 0.0, "write": 0.0})
+    manifest_path: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now().astimezone())
+    finished_at: Optional[datetime] = None
+
+    @property
+    def done(self) -> int:
+        return self.rendered + self.reused + self.failed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "since": self.since.isoformat(),
+            "total": self.total,
+            "done": self.done,
+            "rendered": self.rendered,
+            "reused": self.reused,
+            "failed": self.failed,
+            "progress": round(self.done / self.total, 4) if self.total else (1.0 if self.status == "completed" else 0.0),
+            "stage_ms": self.stage_ms,
+            "worker_ms": self.worker_ms,
+            "manifest_path": self.manifest_path,
+            "errors": self.errors,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class CohortReportService:
+
+    def __init__(
+        self,
+        output_dir: str = settings.REPORT_OUTPUT_DIR,
+        workers: int = settings.REPORT_RENDER_WORKERS,
+        template_dir: str = "app/templates",
+    ):
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.template_dir = template_dir
+
+    def new_job(
+        self, student_ids: Optional[List[uuid.UUID]] = None, since: Optional[datetime] = None
+    ) -> CohortReportJob:
+        since = since or default_since()
+        return CohortReportJob(job_id=batch_id(since, student_ids), since=since, student_ids=student_ids)
+
+    async def period_totals(
+        self, db: AsyncSession, since: datetime, student_ids: Optional[List[uuid.UUID]] = None
+    ) -> Dict[uuid.UUID, PeriodTotals]:
+        """Per-student attempt totals for the period: one GROUP BY per chunk of students."""
+        base = select(
+            AttemptLog.user_id,
+            func.count(AttemptLog.log_id),
+            func.count(AttemptLog.log_id).filter(AttemptLog.is_correct == True),
+            func.coalesce(func.sum(AttemptLog.time_taken_ms), 0),
+        ).where(AttemptLog.attempted_at >= since).group_by(AttemptLog.user_id)
+
+        statements = [base] if student_ids is None else [
+            base.where(AttemptLog.user_id.in_(chunk)) for chunk in chunked(student_ids, STUDENT_QUERY_CHUNK)
+        ]
+        totals: Dict[uuid.UUID, PeriodTotals] = {}
+        for stmt in statements:
+            result = await db.execute(stmt)
+            for user_id, total, correct, time_ms in result.all():
+                totals[user_id] = (total or 0, correct or 0, int(time_ms or 0))
+        return totals
+
+    async def node_performances(
+        self, db: AsyncSession, since: datetime, student_ids: List[uuid.UUID]
+    ) -> Dict[uuid.UUID, List[Tuple[str, Optional[float], int]]]:
+        """
+        Per-student, per-node-name averages for the period, best first. Read
+        from attempt_logs (bounded on the partition key) rather than the
+        all-time rollups, so they describe the same period as the totals.
+        """
+        performances: Dict[uuid.UUID, List[Tuple[str, Optional[float], int]]] = {}
+        for chunk in chunked(student_ids, STUDENT_QUERY_CHUNK):
+            result = await db.execute(
+                select(
+                    AttemptLog.user_id,
+                    CurriculumNode.name,
+                    func.avg(AttemptLog.score),
+                    func.count(AttemptLog.log_id),
+                )
+                .join(QuestionCurriculum, AttemptLog.question_id == QuestionCurriculum.question_id)
+                .join(CurriculumNode, QuestionCurriculum.node_id == CurriculumNode.node_id)
+                .where(AttemptLog.user_id.in_(chunk), AttemptLog.attempted_at >= since)
+                .group_by(AttemptLog.user_id, CurriculumNode.name)
+            )
+            for user_id, name, avg_score, count in result.all():
+                performances.setdefault(user_id, []).append((name, avg_score, count))
+        for rows in performances.values():
+            rows.sort(key=lambda r: r[1] if r[1] is not None else -1.0, reverse=True)
+        return performances
+
+    async def collect_report_data(
+        self, db: AsyncSession, since: datetime, student_ids: Optional[List[uuid.UUID]] = None
+    ) -> Tuple[Dict[uuid.UUID, PeriodTotals], Dict[uuid.UUID, List[Tuple[str, Optional[float], int]]]]:
+        totals = await self.period_totals(db, since, student_ids)
+        # Without an explicit cohort, the cohort is everyone active in the period
+        cohort = list(student_ids) if student_ids is not None else sorted(totals, key=str)
+        performances = await self.node_performances(db, since, cohort) if cohort else {}
+        return {sid: totals.get(sid, (0, 0, 0)) for sid in cohort}, performances
+
+    async def run(self, job: CohortReportJob, progress: Optional[ProgressCallback] = None) -> None:
+        """Run the batch; a failure is recorded on the job and re-raised so the queue can retry."""
+        job.status = "running"
+        last_report = 0.0
+
+        async def report(force: bool = False) -> None:
+            nonlocal last_report
+            if progress is not None and (force or time.monotonic() - last_report >= PROGRESS_INTERVAL_SECONDS):
+                last_report = time.monotonic()
+                await progress(job.to_dict())
+
+        try:
+            started = time.perf_counter()
+            async with SessionLocal() as db:
+                totals, performances = await self.collect_report_data(db, job.since, job.student_ids)
+            job.stage_ms["query"] = round((time.perf_counter() - started) * 1000, 2)
+
+            started = time.perf_counter()
+            payloads = {
+                sid: build_report_payload(job.since, total, correct, time_ms, performances.get(sid, []))
+                for sid, (total, correct, time_ms) in totals.items()
+            }
+            job.total = len(payloads)
+            job.stage_ms["build"] = round((time.perf_counter() - started) * 1000, 2)
+            await report(force=True)
+
+            started = time.perf_counter()
+            manifest = await self.render_all(job, payloads, report)
+            job.stage_ms["render"] = round((time.perf_counter() - started) * 1000, 2)
+
+            job.manifest_path = self.write_manifest(job, manifest)
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Cohort report job {job.job_id} failed: {e}")
+            job.status = "failed"
+            job.errors.append({"error": str(e)})
+            raise
+        finally:
+            job.finished_at = datetime.now().astimezone()
+            logger.info(f"Cohort report job {job.job_id}: {job.status} stage_ms={job.stage_ms}")
+
+    async def render_all(
+        self, job: CohortReportJob, payloads: Dict[uuid.UUID, Dict[str, Any]],
+        report: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Render every payload in the process pool; progress is updated as results arrive."""
+        from app.services.report_service import render_report_to_store
+
+        manifest: Dict[str, Dict[str, Any]] = {}
+        if not payloads:
+            return manifest
+
+        loop = asyncio.get_running_loop()
+        # spawn: never fork a process that owns an event loop and DB connections
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(payloads)), mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            async def render_one(sid: uuid.UUID, data: Dict[str, Any]):
+                try:
+                    return sid, await loop.run_in_executor(
+                        pool, render_report_to_store, self.template_dir, self.output_dir,
+                        str(sid), student_display_name(sid), data,
+                    ), None
+                except Exception as e:
+                    return sid, None, str(e)
+
+            for next_done in asyncio.as_completed([render_one(sid, data) for sid, data in payloads.items()]):
+                sid, result, error = await next_done
+                if error is not None:
+                    job.failed += 1
+                    if len(job.errors) < MAX_JOB_ERRORS:
+                        job.errors.append({"student_id": str(sid), "error": error})
+                    continue
+                if result["cached"]:
+                    job.reused += 1
+                else:
+                    job.rendered += 1
+                job.worker_ms["render"] += result["render_ms"]
+                job.worker_ms["write"] += result["write_ms"]
+                manifest[result["student_id"]] = {"sha256": result["sha256"], "path": result["path"]}
+                if report is not None:
+                    await report()
+
+        job.worker_ms = {k: round(v, 2) for k, v in job.worker_ms.items()}
+        return manifest
+
+    def write_manifest(self, job: CohortReportJob, manifest: Dict[str, Dict[str, Any]]) -> str:
+        """student_id -> report address for this run, next to the store."""
+        path = os.path.join(self.output_dir, "manifests", f"{job.job_id}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"job_id": job.job_id, "since": job.since.isoformat(), "reports": manifest}, f)
+        return path
+
+
+cohort_report_service = CohortReportService()
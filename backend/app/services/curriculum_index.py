@@ -0,0 +1,171 @@
+"""
+In-memory curriculum tree index for Node 2 (Q-DNA).
+
+curriculum_nodes is small, read on almost every analytics request and
+written rarely, so the whole tree is loaded once per process and kept as
+flat arrays in preorder: path/node_id lookups, parent and children lists,
+depth, and the [start, end) preorder range of every subtree. Curriculum
+writes call invalidate(); the next reader rebuilds.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.curriculum import CurriculumNode
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexedNode:
+    node_id: int
+    name: str
+    path: str
+    standard_code: Optional[str] = None
+    description: Optional[str] = None
+
+
+class CurriculumIndex:
+    """
+    Immutable snapshot of the curriculum tree.
+
+    A node whose parent path is missing is treated as a root, matching the
+    previous behaviour of GET /curriculum/tree.
+    """
+
+    def __init__(self, nodes: Iterable[IndexedNode]):
+        by_path = {node.path: node for node in nodes}
+        children_of: Dict[Optional[str], List[str]] = {}
+        for path in sorted(by_path):
+            parent = path.rsplit(".", 1)[0] if "." in path else None
+            if parent not in by_path:
+                parent = None
+            children_of.setdefault(parent, []).append(path)
+
+        # Iterative DFS so deep trees cannot hit the recursion limit
+        self.nodes: List[IndexedNode] = []
+        self.parent: List[int] = []
+        self.depth: List[int] = []
+        self.subtree_end: List[int] = []
+        self.children: List[List[int]] = []
+        self.roots: List[int] = []
+
+        stack = [(path, -1) for path in reversed(children_of.get(None, []))]
+        open_ranges: List[int] = []  # preorder positions whose subtree is still being emitted
+        while stack:
+            path, parent_pos = stack.pop()
+            # Close every open subtree that this node is not part of
+            while open_ranges and open_ranges[-1] != parent_pos:
+                self.subtree_end[open_ranges.pop()] = len(self.nodes)
+
+            pos = len(self.nodes)
+            self.nodes.append(by_path[path])
+            self.parent.append(parent_pos)
+            self.depth.append(0 if parent_pos < 0 else self.depth[parent_pos] + 1)
+            self.subtree_end.append(pos + 1)
+            self.children.append([])
+            if parent_pos < 0:
+                self.roots.append(pos)
+            else:
+                self.children[parent_pos].append(pos)
+            open_ranges.append(pos)
+            stack.extend((child, pos) for child in reversed(children_of.get(path, [])))
+        while open_ranges:
+            self.subtree_end[open_ranges.pop()] = len(self.nodes)
+
+        self.position_by_path: Dict[str, int] = {n.path: i for i, n in enumerate(self.nodes)}
+        self.position_by_id: Dict[int, int] = {n.node_id: i for i, n in enumerate(self.nodes)}
+        self._tree: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get(self, path: str) -> Optional[IndexedNode]:
+        pos = self.position_by_path.get(path)
+        return self.nodes[pos] if pos is not None else None
+
+    def get_by_id(self, node_id: int) -> Optional[IndexedNode]:
+        pos = self.position_by_id.get(node_id)
+        return self.nodes[pos] if pos is not None else None
+
+    def children_of(self, path: str) -> List[IndexedNode]:
+        pos = self.position_by_path.get(path)
+        return [self.nodes[c] for c in self.children[pos]] if pos is not None else []
+
+    def subtree(self, path: str) -> List[IndexedNode]:
+        """The node and all its descendants, in preorder."""
+        pos = self.position_by_path.get(path)
+        return self.nodes[pos:self.subtree_end[pos]] if pos is not None else []
+
+    def is_ancestor(self, ancestor_path: str, path: str) -> bool:
+        a = self.position_by_path.get(ancestor_path)
+        p = self.position_by_path.get(path)
+        return a is not None and p is not None and a <= p < self.subtree_end[a]
+
+    def as_tree(self) -> List[Dict[str, Any]]:
+        """Nested {node_id, name, path, description, children} dicts; built once per snapshot."""
+        if self._tree is None:
+            rendered = [
+                {"node_id": n.node_id, "name": n.name, "path": n.path, "description": n.description, "children": []}
+                for n in self.nodes
+            ]
+            for pos, parent_pos in enumerate(self.parent):
+                if parent_pos >= 0:
+                    rendered[parent_pos]["children"].append(rendered[pos])
+            self._tree = [rendered[r] for r in self.roots]
+        return self._tree
+
+
+class CurriculumIndexCache:
+    """
+    Process-wide holder of the current CurriculumIndex.
+
+    Writes in this process call invalidate(). ttl_seconds bounds staleness
+    for writes made by other worker processes (0 disables expiry).
+    """
+
+    def __init__(self, ttl_seconds: float = settings.CURRICULUM_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._index: Optional[CurriculumIndex] = None
+        self._built_at = 0.0
+        self._version = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _fresh(self) -> bool:
+        if self._index is None:
+            return False
+        return not self.ttl_seconds or time.monotonic() - self._built_at < self.ttl_seconds
+
+    async def get(self, db: AsyncSession) -> CurriculumIndex:
+        if self._fresh():
+            return self._index
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another request may have rebuilt it while we waited
+            if self._fresh():
+                return self._index
+            version = self._version
+            result = await db.execute(select(
+                CurriculumNode.node_id, CurriculumNode.name, CurriculumNode.path,
+                CurriculumNode.standard_code, CurriculumNode.description,
+            ))
+            index = CurriculumIndex(IndexedNode(*row) for row in result.all())
+            # Drop the snapshot if a write invalidated it while we were loading
+            if version == self._version:
+                self._index, self._built_at = index, time.monotonic()
+            logger.info(f"Curriculum index built: {len(index)} nodes")
+            return index
+
+    def invalidate(self) -> None:
+        self._version += 1
+        self._index = None
+
+
+curriculum_index = CurriculumIndexCache()
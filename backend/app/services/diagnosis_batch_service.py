@@ -0,0 +1,228 @@
+"""
+Batch cognitive diagnosis for Node 2 (Q-DNA).
+
+/diagnosis/analyze/batch used to hand the whole homework set to
+diagnose_batch(), which diagnosed one attempt after another. Each attempt
+is now diagnosed on its own through the diagnosis executor, at most
+DIAGNOSIS_BATCH_CONCURRENCY at a time, so wall time approaches the slowest
+attempt (times the number of rounds) instead of the sum of all of them.
+
+Results are yielded in completion order as events:
+
+    {"type": "result", "index": i, "result": {...DiagnosisResponse},
+     "pattern_analysis": {...}}   pattern over the results received so far
+    {"type": "error", "index": i, "detail": "..."}
+    {"type": "summary", "pattern_analysis": {...}, "overall_diagnosis": "...",
+     "completed": n, "failed": m, "elapsed_ms": t}
+
+BatchPatternAnalysis is updated per result, so the pattern never needs the
+whole set. Each diagnosis is also recorded in the knowledge profile store.
+Attempts whose answer is proven equivalent to correct_answer are diagnosed
+by the answer checker and never take an executor slot; the others go
+through the misconception cache, so a batch repeating one wrong answer to
+one question diagnoses it once.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List
+
+from app.core.config import settings
+from app.core.llm_metrics import llm_template
+from app.services.diagnosis_executor import diagnosis_executor
+
+logger = logging.getLogger(__name__)
+
+
+def diagnosis_result_dict(result: Any) -> Dict[str, Any]:
+    """mathesis_core DiagnosisResult -> DiagnosisResponse fields."""
+    if isinstance(result, dict):
+        return result
+    return {
+        "student_id": result.student_id,
+        "question_id": result.question_id,
+        "is_correct": result.is_correct,
+        "error_type": result.error_type.value if result.error_type else None,
+        "reasoning_trace": result.reasoning_trace,
+        "error_location": result.error_location,
+        "feedback": result.feedback,
+        "recommendation": result.recommendation,
+        "concepts_involved": list(result.concepts_involved),
+        "kg_operations": [
+            {
+                "operation": op.operation,
+                "relation": getattr(op.relation, "value", op.relation),
+                "concept": op.concept,
+                "strength": op.strength,
+                "evidence": op.evidence,
+            }
+            for op in result.kg_operations
+        ],
+        "confidence": result.confidence,
+        "timestamp": result.timestamp.isoformat(),
+    }
+
+
+class BatchPatternAnalysis:
+    """
+    Running error pattern of one batch. A concept's mastery is the mean
+    strength of its kg_operations, or the share of correct attempts that
+    involved it when the diagnoses carry no operations for it.
+    """
+
+    def __init__(self, weak_threshold: float = settings.PROFILE_WEAK_THRESHOLD,
+                 strong_threshold: float = settings.PROFILE_STRONG_THRESHOLD):
+        self.weak_threshold = weak_threshold
+        self.strong_threshold = strong_threshold
+        self.analyzed = 0
+        self.correct = 0
+        self.error_types: Counter = Counter()
+        self._concepts: Dict[str, Dict[str, float]] = {}
+
+    def _concept(self, concept: str) -> Dict[str, float]:
+        stats = self._concepts.get(concept)
+        if stats is None:
+            stats = self._concepts[concept] = {"attempts": 0, "wrong": 0, "strength_sum": 0.0, "operations": 0}
+        return stats
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self.analyzed += 1
+        self.correct += bool(result.get("is_correct"))
+        if result.get("error_type"):
+            self.error_types[result["error_type"]] += 1
+        for concept in set(result.get("concepts_involved") or ()):
+            stats = self._concept(concept)
+            stats["attempts"] += 1
+            stats["wrong"] += not result.get("is_correct")
+        for op in result.get("kg_operations") or ():
+            stats = self._concept(op["concept"])
+            stats["strength_sum"] += float(op.get("strength") or 0.0)
+            stats["operations"] += 1
+
+    @staticmethod
+    def _mastery(stats: Dict[str, float]) -> float:
+        if stats["operations"]:
+            return stats["strength_sum"] / stats["operations"]
+        return 1.0 - stats["wrong"] / stats["attempts"] if stats["attempts"] else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        concepts = {
+            concept: {"attempts": int(stats["attempts"]), "wrong": int(stats["wrong"]),
+                      "mastery": round(self._mastery(stats), 4)}
+            for concept, stats in self._concepts.items()
+        }
+        by_mastery = sorted(concepts, key=lambda c: (concepts[c]["mastery"], c))
+        return {
+            "analyzed": self.analyzed,
+            "correct": self.correct,
+            "accuracy": round(self.correct / self.analyzed, 4) if self.analyzed else 0.0,
+            "error_types": dict(self.error_types.most_common()),
+            "weak_concepts": [c for c in by_mastery if concepts[c]["mastery"] < self.weak_threshold],
+            "strong_concepts": [c for c in reversed(by_mastery) if concepts[c]["mastery"] >= self.strong_threshold],
+            "concepts": concepts,
+        }
+
+    def overall_diagnosis(self) -> str:
+        if not self.analyzed:
+            return "진단된 문제가 없습니다."
+        snapshot = self.snapshot()
+        summary = f"{self.analyzed}문제 중 {self.correct}문제 정답 (정답률 {snapshot['accuracy']:.0%})."
+        if snapshot["error_types"]:
+            error_type, count = next(iter(snapshot["error_types"].items()))
+            summary += f" 가장 많은 오류 유형: {error_type} ({count}회)."
+        if snapshot["weak_concepts"]:
+            summary += f" 보완이 필요한 개념: {', '.join(snapshot['weak_concepts'][:5])}."
+        return summary
+
+
+class DiagnosisBatchService:
+
+    def __init__(self, concurrency: int = settings.DIAGNOSIS_BATCH_CONCURRENCY,
+                 timeout: float = settings.DIAGNOSIS_BATCH_TIMEOUT_SECONDS):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+
+    async def run(self, service: Any, student_id: str, attempts: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield result/error events as attempts finish, then one summary event.
+        Closing the generator (client disconnect) cancels the attempts still running.
+        """
+        from app.services.answer_check_service import answer_checker, correct_diagnosis
+        from app.services.knowledge_profile_service import knowledge_profile_store
+        from app.services.misconception_cache_service import diagnosis_model, misconception_cache
+
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pattern = BatchPatternAnalysis()
+
+        async def diagnose(index: int, attempt: Dict[str, Any]):
+            if not attempt.get("question") or attempt.get("student_answer") is None:
+                return index, None, "attempt needs question and student_answer"
+            check = await answer_checker.check(attempt["student_answer"], attempt.get("correct_answer"),
+                                               attempt["question"])
+            if check.equivalent:
+                return index, correct_diagnosis(student_id, attempt.get("question_id"), check), None
+            async def compute():
+                async with semaphore:
+                    result = await diagnosis_executor.run(
+                        service.diagnose,
+                        student_id=student_id,
+                        question_content=attempt["question"],
+                        student_answer=attempt["student_answer"],
+                        correct_answer=attempt.get("correct_answer"),
+                        question_id=attempt.get("question_id"),
+                    )
+                return diagnosis_result_dict(result)
+
+            try:
+                with llm_template("diagnosis_batch"):
+                    result = await misconception_cache.diagnose(
+                        compute,
+                        student_id=student_id,
+                        question_content=attempt["question"],
+                        student_answer=attempt["student_answer"],
+                        correct_answer=attempt.get("correct_answer"),
+                        question_id=attempt.get("question_id"),
+                        model=diagnosis_model(service),
+                    )
+                return index, result, None
+            except Exception as e:
+                logger.warning(f"Batch diagnosis of attempt {index} failed: {e}")
+                return index, None, str(e)[:200] or type(e).__name__
+
+        tasks = [asyncio.create_task(diagnose(i, attempt)) for i, attempt in enumerate(attempts)]
+        pending = set(range(len(tasks)))
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=self.timeout or None):
+                try:
+                    index, result, error = await next_done
+                except asyncio.TimeoutError:
+                    break
+                pending.discard(index)
+                if result is None:
+                    failed += 1
+                    yield {"type": "error", "index": index, "detail": error}
+                    continue
+                pattern.add(result)
+                await knowledge_profile_store.record(student_id, result["is_correct"], result["kg_operations"])
+                yield {"type": "result", "index": index, "result": result, "pattern_analysis": pattern.snapshot()}
+            for index in sorted(pending):
+                failed += 1
+                yield {"type": "error", "index": index, "detail": f"batch did not finish within {self.timeout:.0f}s"}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield {
+            "type": "summary",
+            "pattern_analysis": pattern.snapshot(),
+            "overall_diagnosis": pattern.overall_diagnosis(),
+            "completed": pattern.analyzed,
+            "failed": failed,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 2),
+        }
+
+
+diagnosis_batch_service = DiagnosisBatchService()
@@ -0,0 +1,142 @@
+"""
+Off-loop execution of cognitive diagnosis for Node 2 (Q-DNA).
+
+mathesis_core's CognitiveDiagnosisService is synchronous: diagnose(),
+diagnose_batch() and evaluate_with_rubric() block on LLM calls for seconds.
+Called from an async handler they would freeze the event loop for every
+other request, so they run here instead:
+
+- in a dedicated thread pool of DIAGNOSIS_WORKERS threads, so diagnosis
+  cannot take the default executor used by asyncio.to_thread elsewhere;
+- at most DIAGNOSIS_MAX_PENDING calls are accepted (running or queued);
+  more raise DiagnosisOverloaded instead of growing an unbounded queue;
+- each call has a timeout. On timeout or when the caller is cancelled
+  (client disconnect), a call that has not started is dropped, and a
+  running one gets its LLM cancellation flag set: its next gateway call
+  raises LLMCancelled, so an abandoned batch stops after the current
+  generation. The same timeout is the LLM deadline inside the thread.
+
+Context variables (LLM template label, priority) are copied into the thread.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.llm_gateway import llm_request
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DiagnosisOverloaded(Exception):
+    """Too many diagnoses running or queued."""
+
+
+class DiagnosisTimeout(TimeoutError):
+    pass
+
+
+class DiagnosisExecutor:
+
+    def __init__(
+        self,
+        workers: int = settings.DIAGNOSIS_WORKERS,
+        max_pending: int = settings.DIAGNOSIS_MAX_PENDING,
+        timeout: float = settings.DIAGNOSIS_TIMEOUT_SECONDS,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.timeout = timeout
+        self._pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    @property
+    def pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="diagnosis")
+            return self._pool
+
+    async def run(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        """
+        fn(*args, **kwargs) in the diagnosis pool.
+
+        Raises:
+            DiagnosisOverloaded: If DIAGNOSIS_MAX_PENDING calls are already pending
+            DiagnosisTimeout: If the call did not finish within the timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise DiagnosisOverloaded(f"{self.pending} diagnoses already pending")
+            self.pending += 1
+
+        cancel = threading.Event()
+        context = contextvars.copy_context()
+
+        def call() -> T:
+            with llm_request(timeout=timeout or None, cancel=cancel):
+                return fn(*args, **kwargs)
+
+        # pending counts until the thread is done, not until the caller gives up
+        future = self.pool.submit(context.run, call)
+        future.add_done_callback(self._done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or None)
+        except asyncio.TimeoutError:
+            cancel.set()
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise DiagnosisTimeout(f"Diagnosis did not finish within {timeout:.0f}s")
+        except asyncio.CancelledError:
+            cancel.set()
+            future.cancel()
+            with self._lock:
+                self.cancelled += 1
+            raise
+
+    def _done(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        """Drop queued diagnoses and stop accepting work; running threads finish on their own."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+diagnosis_executor = DiagnosisExecutor()
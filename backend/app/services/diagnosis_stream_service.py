@@ -0,0 +1,153 @@
+"""
+Streaming cognitive diagnosis for Node 2 (Q-DNA).
+
+mathesis_core's CognitiveDiagnosisService.diagnose() is a blocking call that
+returns only when the whole analysis is done. For POST /diagnosis/analyze/stream
+the same analysis is requested directly from Ollama in JSON mode and streamed
+through the LLM gateway: tokens are forwarded as they arrive, each top-level
+field (is_correct, error_type, feedback, ...) as soon as it is complete, and the
+final object is normalized into the DiagnosisResponse shape.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.llm_metrics import llm_metrics, llm_template
+from app.core.streaming import PartialJSONScanner
+
+logger = logging.getLogger(__name__)
+
+# Field order matters: the verdict and feedback stream first, the long trace last
+DIAGNOSIS_STREAM_PROMPT = """당신은 수학 교육 전문가입니다. 학생의 답안을 분석하여 오개념을 진단하세요.
+
+[문제]
+{question}
+
+[학생 답안]
+{student_answer}
+
+[정답]
+{correct_answer}
+
+다음 필드를 이 순서대로 가진 JSON 객체 하나로만 답하세요:
+{{"is_correct": true/false,
+  "error_type": null 또는 오류 유형 (예: "knowledge_gap", "misconception", "calculation_error", "careless_mistake"),
+  "error_location": null 또는 오류가 발생한 풀이 위치,
+  "feedback": "학생에게 줄 피드백",
+  "recommendation": "학습 권장 사항",
+  "concepts_involved": ["관련 개념", ...],
+  "kg_operations": [{{"operation": "update", "relation": "mastered" 또는 "struggles_with", "concept": "개념", "strength": 0.0~1.0, "evidence": "근거"}}],
+  "confidence": 0.0~1.0,
+  "reasoning_trace": "단계별 분석 과정"}}"""
+
+
+def _clamp(value: Any, default: float) -> float:
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def diagnosis_from_json(
+    data: Dict[str, Any],
+    student_id: str,
+    question_id: Optional[str] = None,
+    correct_answer: Optional[str] = None,
+    student_answer: str = "",
+) -> Dict[str, Any]:
+    """Normalize model output into the DiagnosisResponse fields; missing fields get safe defaults."""
+    is_correct = data.get("is_correct")
+    if not isinstance(is_correct, bool):
+        # Fall back to the same comparison the mock service uses
+        is_correct = bool(correct_answer) and (
+            student_answer.replace(" ", "").lower() == correct_answer.replace(" ", "").lower()
+        )
+    operations: List[Dict[str, Any]] = []
+    for op in data.get("kg_operations") or []:
+        if not isinstance(op, dict) or not op.get("concept"):
+            continue
+        operations.append({
+            "operation": str(op.get("operation") or "update"),
+            "relation": str(op.get("relation") or ("mastered" if is_correct else "struggles_with")),
+            "concept": str(op["concept"]),
+            "strength": _clamp(op.get("strength"), 0.5),
+            "evidence": op.get("evidence"),
+        })
+    concepts = data.get("concepts_involved") or []
+    return {
+        "student_id": student_id,
+        "question_id": question_id,
+        "is_correct": is_correct,
+        "error_type": None if is_correct else (data.get("error_type") or None),
+        "reasoning_trace": _text(data.get("reasoning_trace")),
+        "error_location": None if is_correct else (data.get("error_location") or None),
+        "feedback": _text(data.get("feedback")),
+        "recommendation": _text(data.get("recommendation")),
+        "concepts_involved": [str(c) for c in concepts] if isinstance(concepts, list) else [str(concepts)],
+        "kg_operations": operations,
+        "confidence": _clamp(data.get("confidence"), 0.5),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+@llm_template("diagnosis_stream")
+async def stream_diagnosis(
+    student_id: str,
+    question_content: str,
+    student_answer: str,
+    correct_answer: Optional[str] = None,
+    question_id: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Yields ("token", str), ("field", {"name", "value"}) while generating and
+    finally ("result", dict) in the DiagnosisResponse shape. An answer proven
+    equivalent to correct_answer, or one already diagnosed for this question
+    (misconception cache), yields only the result, without generating.
+
+    Raises:
+        ValueError: If the output is not a complete JSON object (nothing is cached)
+    """
+    from app.services.answer_check_service import answer_checker, correct_diagnosis
+    from app.services.misconception_cache_service import DIAGNOSIS_STREAM_NAMESPACE, misconception_cache
+    from app.services.ollama_service import ollama_service
+
+    check = await answer_checker.check(student_answer, correct_answer, question_content)
+    if check.equivalent:
+        yield "result", correct_diagnosis(student_id, question_id, check)
+        return
+    key = dict(question_content=question_content, student_answer=student_answer, correct_answer=correct_answer,
+               model=settings.OLLAMA_MODEL, namespace=DIAGNOSIS_STREAM_NAMESPACE)
+    cached = await misconception_cache.get(student_id=student_id, question_id=question_id, **key)
+    if cached is not None:
+        yield "result", cached
+        return
+
+    prompt = DIAGNOSIS_STREAM_PROMPT.format(
+        question=question_content,
+        student_answer=student_answer,
+        correct_answer=correct_answer or "(제공되지 않음)",
+    )
+    scanner = PartialJSONScanner()
+    async for token in ollama_service.stream_text(prompt, model=settings.OLLAMA_MODEL, format="json"):
+        yield "token", token
+        for name, value in scanner.feed(token):
+            yield "field", {"name": name, "value": value}
+
+    # Only a closed object is a diagnosis: fields completed before a cut-off
+    # (num_predict reached mid-object) would be filled with defaults and cached
+    try:
+        data = scanner.document()
+    except ValueError as e:
+        llm_metrics.event("json_parse_failure", model=settings.OLLAMA_MODEL, detail=str(e))
+        raise ValueError(f"Diagnosis output is not a complete JSON object: {e}")
+    result = diagnosis_from_json(data, student_id, question_id, correct_answer, student_answer)
+    await misconception_cache.put(result, **key)
+    yield "result", result
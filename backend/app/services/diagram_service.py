@@ -5,6 +5,8 @@ import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 from app.core.config import settings
+from app.core.llm_gateway import pooled_client
+from app.core.llm_metrics import llm_template
 from ollama import AsyncClient
 
 # Use non-interactive backend to prevent GUI errors
@@ -15,7 +17,7 @@ STATIC_DIR = os.path.join(os.getcwd(), "backend", "static", "diagrams")
 
 class DiagramService:
     def __init__(self):
-        self.client = AsyncClient(host=settings.OLLAMA_BASE_URL)
+        self.client = pooled_client(AsyncClient(host=settings.OLLAMA_BASE_URL), MODEL)
         if not os.path.exists(STATIC_DIR):
             os.makedirs(STATIC_DIR)
 
@@ -38,6 +40,7 @@ class DiagramService:
         else:
             raise Exception("Failed to generate diagram image")
 
+    @llm_template("diagram_code")
     async def _get_python_code(self, description: str) -> str:
         prompt = f"""
         You are an expert Math Diagram Generator using Python Matplotlib.
@@ -2,18 +2,24 @@
 Error Solution Service for Node 2 (Q-DNA).
 Refactored to use mathesis_core.generation.ProblemGenerator.
 """
-from typing import List, Optional
+import asyncio
+import uuid
+from typing import Dict, List, Optional
 from fastapi import HTTPException
 from mathesis_core.generation import ProblemGenerator
-from mathesis_core.llm.clients import create_ollama_client
 from mathesis_core.exceptions import GenerationError
 from app.schemas.error_solution import ErrorType
 from app.constants.error_types import ERROR_TYPE_DATABASE
 from app.core.config import settings
+from app.core.llm_gateway import shared_ollama_client
+from app.core.llm_metrics import llm_template
+from app.services.analysis_cache_service import analysis_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_ERROR_TYPES = [ErrorType.CONCEPT_MISAPPLICATION, ErrorType.ARITHMETIC_ERROR]
+
 
 class ErrorSolutionService:
     """
@@ -28,14 +34,12 @@ class ErrorSolutionService:
     def __init__(self):
         """Initialize ErrorSolutionService with mathesis_core components."""
         # Create LLM client using mathesis_core
-        self.client = create_ollama_client(
-            base_url=settings.OLLAMA_URL,
-            model=settings.OLLAMA_MODEL
-        )
+        self.client = shared_ollama_client(settings.OLLAMA_URL, settings.OLLAMA_MODEL)
 
         # Use ProblemGenerator from mathesis_core
         self.generator = ProblemGenerator(self.client)
 
+    @llm_template("erroneous_solution")
     async def generate_erroneous_solution(
         self,
         question_content: str,
@@ -65,7 +69,7 @@ class ErrorSolutionService:
         """
         if not error_types:
             # Default error types if none provided
-            error_types = [ErrorType.CONCEPT_MISAPPLICATION, ErrorType.ARITHMETIC_ERROR]
+            error_types = DEFAULT_ERROR_TYPES
 
         # Convert ErrorType enums to string values for mathesis_core
         error_type_strings = [et.value for et in error_types]
@@ -96,6 +100,7 @@ class ErrorSolutionService:
             logger.error(f"Unexpected error in error solution generation: {e}")
             raise HTTPException(status_code=500, detail=f"Generation Failed: {str(e)}")
 
+    @llm_template("correct_solution")
     async def generate_correct_solution(
         self,
         question_content: str,
@@ -134,6 +139,52 @@ class ErrorSolutionService:
             logger.error(f"Unexpected error in correct solution generation: {e}")
             raise HTTPException(status_code=500, detail=f"Generation Failed: {str(e)}")
 
+    async def generate_worksheet_solutions(
+        self,
+        question_id: uuid.UUID,
+        version: int,
+        question_content: str,
+        correct_answer: str,
+        error_types: Optional[List[ErrorType]] = None
+    ) -> Dict[str, dict]:
+        """
+        Erroneous and correct solutions for an error worksheet.
+
+        The two generations are independent and run concurrently. Results are
+        cached (memory + llm_analysis_cache) per question_id and version, the
+        erroneous one also per sorted error types, so regenerating a worksheet
+        for an unchanged question does not reach the LLM. The version changes
+        whenever the question row is updated.
+
+        Returns:
+            {"erroneous_solution": dict, "correct_solution": dict}
+        """
+        error_key = sorted({et.value for et in (error_types or DEFAULT_ERROR_TYPES)})
+        base_key = f"{question_id}|v{version}"
+
+        erroneous, correct = await asyncio.gather(
+            analysis_cache.get_or_compute(
+                f"{base_key}|{','.join(error_key)}",
+                settings.OLLAMA_MODEL,
+                lambda: self.generate_erroneous_solution(
+                    question_content=question_content,
+                    correct_answer=correct_answer,
+                    error_types=[ErrorType(value) for value in error_key]
+                ),
+                namespace="erroneous_solution",
+            ),
+            analysis_cache.get_or_compute(
+                base_key,
+                settings.OLLAMA_MODEL,
+                lambda: self.generate_correct_solution(
+                    question_content=question_content,
+                    correct_answer=correct_answer
+                ),
+                namespace="correct_solution",
+            ),
+        )
+        return {"erroneous_solution": erroneous, "correct_solution": correct}
+
 
 # Singleton instance for backward compatibility
 error_solution_service = ErrorSolutionService()
@@ -0,0 +1,273 @@
+"""
+Attempt ingestion buffer for Node 2 (Q-DNA).
+
+POST /analytics/attempt acknowledges as soon as the attempt is queued here.
+A background flusher drains the queue in micro-batches (by size or by time),
+writes them to attempt_logs with one multi-row INSERT and feeds the same batch
+to the score rollups and the BKT engine.
+
+A batch that still fails after retries because of its rows (an unknown
+question_id, no partition for attempted_at) is split in halves until the
+offending rows are isolated, so every other attempt in it is still written.
+Rows that cannot be written, or whole batches when the database itself is
+unavailable, go to a JSON-lines dead-letter file instead of being lost.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.attempt import AttemptLog
+
+logger = logging.getLogger(__name__)
+
+FLUSH_RETRIES = 3
+FLUSH_RETRY_BASE_DELAY = 0.1
+
+# Queued by stop(); everything ahead of it is flushed before the flusher exits
+_STOP = object()
+
+# Errors caused by the rows themselves: splitting the batch isolates them
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+class IngestionBufferFull(Exception):
+    """Raised when the buffer stays full for longer than the enqueue timeout."""
+
+
+@dataclass
+class PendingAttempt:
+    user_id: uuid.UUID
+    question_id: uuid.UUID
+    response_data: Dict[str, Any]
+    is_correct: bool
+    score: float
+    time_taken_ms: Optional[int]
+    # Stamped at enqueue time so buffering does not shift attempted_at
+    attempted_at: datetime = field(default_factory=lambda: datetime.now().astimezone())
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "question_id": self.question_id,
+            "response_data": self.response_data,
+            "is_correct": self.is_correct,
+            "score": self.score,
+            "time_taken_ms": self.time_taken_ms,
+            "attempted_at": self.attempted_at,
+        }
+
+
+class AttemptIngestionBuffer:
+    """
+    Bounded in-process write-behind buffer.
+
+    - Memory is bounded by max_pending; producers wait up to enqueue_timeout
+      for space and then get IngestionBufferFull (backpressure).
+    - A batch is flushed when batch_size items are pending or flush_interval
+      has elapsed since the first item of the batch arrived.
+    - stop() drains everything still queued before returning.
+    - Rows that cannot be written are appended to dead_letter_path.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = settings.ATTEMPT_BUFFER_MAX_PENDING,
+        batch_size: int = settings.ATTEMPT_FLUSH_BATCH_SIZE,
+        flush_interval_ms: int = settings.ATTEMPT_FLUSH_INTERVAL_MS,
+        enqueue_timeout_ms: int = settings.ATTEMPT_ENQUEUE_TIMEOUT_MS,
+        dead_letter_path: str = settings.ATTEMPT_DEAD_LETTER_PATH,
+    ):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.dead_letter_path = dead_letter_path
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.stats = {
+            "enqueued": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "dead_lettered": 0,
+            "rejected": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        # Queue is created here so it binds to the running event loop
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="attempt-ingestion-flusher")
+
+    async def stop(self) -> None:
+        """Stop accepting work and flush everything still buffered."""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, attempt: PendingAttempt) -> None:
+        if not self.running:
+            await self.start()
+        if self._stopping:
+            raise IngestionBufferFull("Ingestion buffer is shutting down")
+        try:
+            await asyncio.wait_for(self._queue.put(attempt), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise IngestionBufferFull(f"Ingestion buffer full ({self.max_pending} pending)")
+        self.stats["enqueued"] += 1
+
+    async def _run(self) -> None:
+        done = False
+        while not done:
+            batch, done = await self._collect_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _collect_batch(self):
+        """
+        Wait for the first item, then keep taking until size or time limit.
+        Returns (batch, stop_seen).
+        """
+        batch: List[PendingAttempt] = []
+        item = await self._queue.get()
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                # Drain whatever is already queued without yielding
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _flush(self, batch: List[PendingAttempt]) -> None:
+        started = time.perf_counter()
+        for attempt_no in range(1, FLUSH_RETRIES + 1):
+            try:
+                await self.write_batch(batch)
+                written = len(batch)
+                break
+            except Exception as e:
+                logger.error(f"Attempt flush failed ({attempt_no}/{FLUSH_RETRIES}, {len(batch)} rows): {e}")
+                if attempt_no == FLUSH_RETRIES:
+                    if isinstance(e, ROW_ERRORS) and len(batch) > 1:
+                        written = await self._split(batch)
+                    else:
+                        await self._dead_letter(batch, e)
+                        written = 0
+                    break
+                await asyncio.sleep(FLUSH_RETRY_BASE_DELAY * 2 ** attempt_no)
+        if not written:
+            return
+
+        self.stats["flushed"] += written
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = written
+        self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    async def _split(self, batch: List[PendingAttempt]) -> int:
+        """Write the halves of a batch rejected for its rows; dead-letter single bad rows. Returns rows written."""
+        middle = len(batch) // 2
+        written = 0
+        for half in (batch[:middle], batch[middle:]):
+            try:
+                await self.write_batch(half)
+                written += len(half)
+            except ROW_ERRORS as e:
+                if len(half) == 1:
+                    await self._dead_letter(half, e)
+                else:
+                    written += await self._split(half)
+            except Exception as e:
+                await self._dead_letter(half, e)
+        return written
+
+    async def _dead_letter(self, batch: List[PendingAttempt], error: Exception) -> None:
+        self.stats["dropped"] += len(batch)
+        reason = f"{type(error).__name__}: {str(error)[:500]}"
+        lines = "".join(
+            json.dumps({**a.to_row(), "error": reason}, default=str, ensure_ascii=False) + "\n" for a in batch
+        )
+
+        def append() -> None:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+        try:
+            await asyncio.to_thread(append)
+            self.stats["dead_lettered"] += len(batch)
+            logger.error(f"{len(batch)} attempts written to dead-letter file {self.dead_letter_path}: {reason}")
+        except OSError as e:
+            logger.error(f"Dead-letter write failed, {len(batch)} attempts lost: {e}")
+
+    async def write_batch(self, batch: List[PendingAttempt]) -> None:
+        """
+        One multi-row INSERT for the logs and one rollup batch in the same
+        transaction, then one BKT batch for the same attempts.
+        """
+        from app.services.bkt_service import bkt_service
+        from app.services.rollup_service import rollup_service, RollupAttempt
+
+        async with SessionLocal() as db:
+            await db.execute(insert(AttemptLog), [a.to_row() for a in batch])
+            await rollup_service.apply_attempts(db, [
+                RollupAttempt(a.user_id, a.question_id, a.is_correct, a.score, a.time_taken_ms, a.attempted_at)
+                for a in batch
+            ])
+            await db.commit()
+
+            # Logs are durable past this point; mastery can be rebuilt from
+            # them (scripts/backfill_mastery.py) if the update fails.
+            try:
+                await bkt_service.record_attempts(
+                    db, [(a.user_id, a.question_id, a.is_correct, a.attempted_at) for a in batch]
+                )
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"BKT update failed for ingestion batch: {e}")
+
+
+attempt_buffer = AttemptIngestionBuffer()
@@ -0,0 +1,196 @@
+"""
+Background job kinds for Node 2 (Q-DNA).
+
+Each kind pairs a payload schema (validated when the job is submitted) with
+an async handler that receives the stored payload and returns the JSON
+result. Handlers that produce a file write it to the content-addressed
+report store and return {"file": {"path", "media_type", "filename"}}; the
+result endpoint serves that file.
+
+Handlers raise PermanentJobError for failures a retry cannot fix (unknown
+question, bad input); anything else is retried with backoff.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.schemas.job import (
+    AutoTagJobPayload,
+    BulkTwinJobPayload,
+    CohortReportJobPayload,
+    DiagramJobPayload,
+    ErrorWorksheetJobPayload,
+    ExamCrawlJobPayload,
+    StudentReportJobPayload,
+    TwinJobPayload,
+)
+
+JOB_FILE_DIR = os.path.join(settings.REPORT_OUTPUT_DIR, "jobs")
+
+
+class PermanentJobError(Exception):
+    """Job failure that retrying cannot fix."""
+
+
+@dataclass(frozen=True)
+class JobKind:
+    payload_model: Type[BaseModel]
+    handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    max_attempts: Optional[int] = None  # None = JOB_MAX_ATTEMPTS
+
+
+def store_file(content: bytes, media_type: str, filename: str) -> Dict[str, Any]:
+    """Write a job output into the content-addressed store; returns the result's file entry."""
+    from app.services.report_service import report_store_path, write_atomic
+
+    digest = hashlib.sha256(content).hexdigest()
+    path = report_store_path(JOB_FILE_DIR, digest)
+    if not os.path.exists(path):
+        write_atomic(path, content)
+    return {"path": path, "sha256": digest, "bytes": len(content), "media_type": media_type, "filename": filename}
+
+
+async def _load_question(db, question_id: uuid.UUID):
+    from app.models.question import Question as QuestionModel
+
+    question = await db.get(QuestionModel, question_id)
+    if question is None:
+        raise PermanentJobError(f"Question {question_id} not found")
+    return question
+
+
+async def run_twin(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.schemas.question import Question
+    from app.services.math_advanced_service import math_advanced_service
+    from app.services.question_service import question_service
+
+    params = TwinJobPayload(**payload)
+    async with SessionLocal() as db:
+        original = await _load_question(db, params.question_id)
+        twin_in = await math_advanced_service.generate_twin_question(Question.model_validate(original))
+        twin = await question_service.save_twin(db, original, twin_in)
+        return {"question": Question.model_validate(twin).model_dump(mode="json")}
+
+
+async def run_bulk_twin(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.services.bulk_twin_service import bulk_twin_service
+
+    params = BulkTwinJobPayload(**payload)
+    return await bulk_twin_service.run(
+        params.curriculum_path, params.count_per_question, status=params.status, max_questions=params.max_questions
+    )
+
+
+async def run_auto_tag(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.services.auto_tag_service import auto_tag_service, job_to_dict
+
+    params = AutoTagJobPayload(**payload)
+    await auto_tag_service.run(params.job_id)
+    async with SessionLocal() as db:
+        job = await auto_tag_service.get_job(db, params.job_id)
+        if job is None:
+            raise PermanentJobError(f"Auto-tag job {params.job_id} not found")
+        return job_to_dict(job)
+
+
+async def run_diagram(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.services.diagram_service import diagram_service
+
+    params = DiagramJobPayload(**payload)
+    return {"image_url": await diagram_service.generate_diagram(params.description)}
+
+
+async def run_error_worksheet(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.schemas.error_solution import ErrorType
+    from app.services.error_solution_service import error_solution_service
+    from app.services.report_service import report_service
+
+    params = ErrorWorksheetJobPayload(**payload)
+    try:
+        error_types = [ErrorType(et) for et in params.error_types] if params.error_types else None
+    except ValueError as e:
+        raise PermanentJobError(str(e))
+
+    async with SessionLocal() as db:
+        question = await _load_question(db, params.question_id)
+    correct_answer = question.answer_key.get("answer", "") if question.answer_key else ""
+    solutions = await error_solution_service.generate_worksheet_solutions(
+        question_id=question.question_id,
+        version=question.version,
+        question_content=question.content_stem,
+        correct_answer=correct_answer,
+        error_types=error_types,
+    )
+    pdf_bytes = await report_service.error_worksheet_pdf({
+        "question_content": question.content_stem,
+        "erroneous_steps": solutions["erroneous_solution"]["steps"],
+        "correct_steps": solutions["correct_solution"]["steps"],
+        "wrong_answer": solutions["erroneous_solution"].get("final_wrong_answer", ""),
+        "correct_answer": correct_answer,
+    })
+    return {
+        "file": await asyncio.to_thread(
+            store_file, pdf_bytes, "application/pdf", f"error_worksheet_{params.question_id}.pdf"
+        ),
+        **solutions,
+    }
+
+
+async def run_student_report(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.services.analytics_service import analytics_service
+    from app.services.report_service import report_service
+
+    params = StudentReportJobPayload(**payload)
+    async with SessionLocal() as db:
+        report_data = await analytics_service.get_student_report_data(db, params.student_id)
+    student_name = "Student " + str(params.student_id)[:8]
+    pdf_bytes = await asyncio.to_thread(report_service.generate_report, student_name, report_data)
+    return {
+        "file": await asyncio.to_thread(
+            store_file, pdf_bytes, "application/pdf", f"report_{params.student_id}.pdf"
+        )
+    }
+
+
+async def run_cohort_report(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.services.cohort_report_service import cohort_report_service
+    from app.services.job_service import job_service
+
+    params = CohortReportJobPayload(**payload)
+    job = cohort_report_service.new_job(student_ids=params.student_ids, since=params.since)
+    await cohort_report_service.run(job, progress=job_service.report_progress)
+    return job.to_dict()
+
+
+async def run_exam_crawl(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from app.services.crawler_service import crawler_service
+
+    params = ExamCrawlJobPayload(**payload)
+    known = {source["id"] for source in crawler_service.list_available_sources()}
+    if params.source_id not in known:
+        raise PermanentJobError(f"Unknown exam source: {params.source_id}")
+    files = await asyncio.to_thread(crawler_service.download_exam, params.source_id, params.year)
+    return {"source_id": params.source_id, "year": params.year, "files": files}
+
+
+JOB_KINDS: Dict[str, JobKind] = {
+    "twin": JobKind(TwinJobPayload, run_twin),
+    # Twins are committed per chunk of sources and a retry skips twinned sources
+    "bulk_twin": JobKind(BulkTwinJobPayload, run_bulk_twin),
+    # Resumes from the auto_tag_jobs checkpoint, so a retry only redoes the page in progress
+    "auto_tag": JobKind(AutoTagJobPayload, run_auto_tag),
+    "diagram": JobKind(DiagramJobPayload, run_diagram),
+    "error_worksheet": JobKind(ErrorWorksheetJobPayload, run_error_worksheet),
+    "student_report": JobKind(StudentReportJobPayload, run_student_report),
+    # Rendered reports are content-addressed, so a retry reuses every file already written
+    "cohort_report": JobKind(CohortReportJobPayload, run_cohort_report),
+    # Downloads are idempotent but slow; a couple of retries is enough
+    "exam_crawl": JobKind(ExamCrawlJobPayload, run_exam_crawl, max_attempts=2),
+}
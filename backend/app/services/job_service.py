@@ -0,0 +1,280 @@
+"""
+Durable background jobs for Node 2 (Q-DNA), backed by Postgres alone.
+
+POST /jobs stores a background_jobs row and returns 202; a pool of workers
+(in the API process, or scripts/run_job_worker.py) runs it:
+
+- claiming is one UPDATE over a SELECT ... FOR UPDATE SKIP LOCKED, so any
+  number of workers in any number of processes share the table without a
+  broker and never run the same job twice at once;
+- the claim takes a lease that a heartbeat extends while the handler runs.
+  A worker that dies stops renewing it and the job is claimed again once
+  the lease expires;
+- failures are retried with exponential backoff and jitter (run_after)
+  until max_attempts, except PermanentJobError, which fails at once;
+- (kind, idempotency_key) is unique, so a retried submission returns the
+  existing job instead of running the work again;
+- a handler may publish progress with report_progress(); it is stored on
+  the row, so any worker process can answer a poll.
+
+Handlers run at BACKGROUND LLM priority with no deadline: the caller is
+polling, and interactive requests keep their reserved gateway slots.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.llm_gateway import Priority, llm_request
+from app.models.background_job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# (job_id, worker_id) of the job whose handler runs in this context
+_current_job: ContextVar[Optional[Tuple[uuid.UUID, str]]] = ContextVar("current_job", default=None)
+
+
+def retry_delay(attempt: int, base: float, cap: float, rand=random.random) -> float:
+    """Seconds before retry number `attempt` (1-based): capped exponential with 50-100% jitter."""
+    return min(cap, base * 2 ** (attempt - 1)) * (0.5 + rand() / 2)
+
+
+def job_to_dict(job: BackgroundJob) -> Dict[str, Any]:
+    return {
+        "job_id": str(job.job_id),
+        "kind": job.kind,
+        "status": job.status,
+        "idempotency_key": job.idempotency_key,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "error": job.error,
+        "has_result": job.result is not None,
+        "progress": job.progress,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobService:
+
+    def __init__(
+        self,
+        workers: int = settings.JOB_WORKERS,
+        poll_interval: float = settings.JOB_POLL_INTERVAL_SECONDS,
+        lease_seconds: float = settings.JOB_LEASE_SECONDS,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        retry_base: float = settings.JOB_RETRY_BASE_SECONDS,
+        retry_max: float = settings.JOB_RETRY_MAX_SECONDS,
+        kinds: Optional[Dict[str, Any]] = None,
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._kinds = kinds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    @property
+    def kinds(self) -> Dict[str, Any]:
+        if self._kinds is None:
+            from app.services.job_handlers import JOB_KINDS
+            self._kinds = JOB_KINDS
+        return self._kinds
+
+    def _lease(self):
+        return func.now() + func.make_interval(0, 0, 0, 0, 0, 0, self.lease_seconds)
+
+    # ---- Submission and polling ----
+
+    async def enqueue(
+        self, db: AsyncSession, kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None
+    ) -> Tuple[BackgroundJob, bool]:
+        """Store a job; returns (job, created). An existing job with the same key is returned as is."""
+        kind_spec = self.kinds[kind]
+        stmt = pg_insert(BackgroundJob).values(
+            job_id=uuid.uuid4(), kind=kind, idempotency_key=idempotency_key, payload=payload,
+            status="queued", attempts=0, max_attempts=kind_spec.max_attempts or self.max_attempts,
+        )
+        if idempotency_key is not None:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[BackgroundJob.kind, BackgroundJob.idempotency_key])
+        job_id = (await db.execute(stmt.returning(BackgroundJob.job_id))).scalar_one_or_none()
+        await db.commit()
+        if job_id is None:
+            existing = (await db.execute(select(BackgroundJob).where(
+                BackgroundJob.kind == kind, BackgroundJob.idempotency_key == idempotency_key
+            ))).scalar_one()
+            return existing, False
+        self._wakeup.set()
+        return await self.get_job(db, job_id), True
+
+    async def get_job(self, db: AsyncSession, job_id: uuid.UUID) -> Optional[BackgroundJob]:
+        return await db.get(BackgroundJob, job_id, populate_existing=True)
+
+    # ---- Worker side ----
+
+    def claim_statement(self, worker_id: str):
+        """Atomically take the next runnable job: due and queued, or running with an expired lease."""
+        candidate = (
+            select(BackgroundJob.job_id)
+            .where(or_(
+                and_(BackgroundJob.status == "queued", BackgroundJob.run_after <= func.now()),
+                and_(BackgroundJob.status == "running", BackgroundJob.lease_expires_at < func.now()),
+            ))
+            .order_by(BackgroundJob.run_after)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        return (
+            update(BackgroundJob)
+            .where(BackgroundJob.job_id == candidate)
+            .values(
+                status="running", attempts=BackgroundJob.attempts + 1, locked_by=worker_id,
+                lease_expires_at=self._lease(), started_at=func.now(),
+            )
+            .returning(BackgroundJob)
+        )
+
+    async def claim(self, worker_id: str) -> Optional[BackgroundJob]:
+        async with SessionLocal() as db:
+            job = (await db.execute(self.claim_statement(worker_id))).scalar_one_or_none()
+            await db.commit()
+            return job
+
+    async def _finish(self, job: BackgroundJob, worker_id: str, **values) -> None:
+        # Guarded by locked_by: a worker whose lease was taken over must not overwrite the new run
+        async with SessionLocal() as db:
+            await db.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.job_id == job.job_id, BackgroundJob.locked_by == worker_id)
+                .values(locked_by=None, lease_expires_at=None, **values)
+            )
+            await db.commit()
+
+    async def report_progress(self, progress: Dict[str, Any]) -> None:
+        """Store progress for the job running in this context; a no-op outside a handler."""
+        running = _current_job.get()
+        if running is None:
+            return
+        job_id, worker_id = running
+        try:
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(BackgroundJob)
+                    .where(BackgroundJob.job_id == job_id, BackgroundJob.locked_by == worker_id)
+                    .values(progress=progress)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Progress update for job {job_id} failed: {e}")
+
+    async def _heartbeat(self, job: BackgroundJob, worker_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with SessionLocal() as db:
+                    await db.execute(
+                        update(BackgroundJob)
+                        .where(BackgroundJob.job_id == job.job_id, BackgroundJob.locked_by == worker_id)
+                        .values(lease_expires_at=self._lease())
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Lease renewal for job {job.job_id} failed: {e}")
+
+    async def execute(self, job: BackgroundJob, worker_id: str) -> None:
+        from app.services.job_handlers import PermanentJobError
+
+        kind = self.kinds.get(job.kind)
+        if kind is None:
+            await self._finish(job, worker_id, status="failed", error=f"Unknown job kind: {job.kind}", finished_at=func.now())
+            return
+        if job.attempts > job.max_attempts:
+            # Reclaimed after its last attempt's worker died
+            await self._finish(job, worker_id, status="failed", error=job.error or "Lease expired", finished_at=func.now())
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker_id))
+        running = _current_job.set((job.job_id, worker_id))
+        try:
+            with llm_request(Priority.BACKGROUND):
+                result = await kind.handler(dict(job.payload))
+        except asyncio.CancelledError:
+            # Shutdown: hand the job back without spending an attempt
+            await asyncio.shield(self._finish(
+                job, worker_id, status="queued", attempts=BackgroundJob.attempts - 1, run_after=func.now()
+            ))
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:1000]
+            if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+                logger.error(f"Job {job.job_id} ({job.kind}) failed: {error}")
+                await self._finish(job, worker_id, status="failed", error=error, finished_at=func.now())
+            else:
+                delay = retry_delay(job.attempts, self.retry_base, self.retry_max)
+                logger.warning(f"Job {job.job_id} ({job.kind}) attempt {job.attempts} failed, retry in {delay:.1f}s: {error}")
+                await self._finish(
+                    job, worker_id, status="queued", error=error,
+                    run_after=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, delay),
+                )
+            return
+        finally:
+            _current_job.reset(running)
+            heartbeat.cancel()
+        await self._finish(job, worker_id, status="succeeded", result=result, error=None, finished_at=func.now())
+
+    async def _worker(self, n: int) -> None:
+        worker_id = f"{self.worker_id}:{n}"
+        while True:
+            try:
+                job = await self.claim(worker_id)
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            try:
+                await self.execute(job, worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Lost the database mid-job; the lease expiry hands it to another worker
+                logger.exception(f"Job {job.job_id} could not be recorded")
+
+    async def start(self, workers: Optional[int] = None) -> None:
+        count = self.workers if workers is None else workers
+        if self._tasks or count <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n), name=f"job-worker-{n}") for n in range(count)]
+        logger.info(f"Started {count} job workers ({self.worker_id})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_service = JobService()
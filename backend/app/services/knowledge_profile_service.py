@@ -0,0 +1,520 @@
+"""
+Student knowledge profile store for Node 2 (Q-DNA).
+
+Backs /diagnosis/profile and /diagnosis/weak-concepts. Profiles live in
+Postgres (student_knowledge_profiles, student_concept_knowledge), fronted
+by a per-process LRU:
+
+- a diagnosis turns into a ProfileDelta (one more attempt, plus its
+  kg_operations). The delta is applied to the cached profile at once, so
+  the worker reads its own writes, and it is queued for write-behind;
+- queued deltas are merged per student and flushed every
+  PROFILE_FLUSH_INTERVAL_MS, or earlier once PROFILE_FLUSH_BATCH_SIZE
+  students are pending. A flush is a few multi-row upserts whose ON CONFLICT
+  clauses add counters and keep the newest relation, so deltas from several
+  workers commute and nothing is rewritten wholesale;
+- a cache miss loads one student (two indexed queries) and replays any delta
+  not yet committed. Cached entries expire after PROFILE_CACHE_TTL_SECONDS,
+  which bounds how long another worker's updates stay invisible.
+
+Memory is bounded by PROFILE_CACHE_MAX_ENTRIES profiles plus the pending
+deltas, however many students exist. A flush rejected for its rows
+(IntegrityError/DataError), or failing PROFILE_FLUSH_MAX_FAILURES times in
+a row, is split in halves until the offending students are isolated; their
+deltas go to PROFILE_DEAD_LETTER_PATH so one bad row cannot stall every
+other student's writes. Other failures (database down) keep the deltas
+for the next flush.
+
+A kg_operation's strength is read as the mastery it evidences (the mock
+service reports 0.8 for "mastered" and 0.4 for "struggles_with"); a
+concept's mastery is the mean over its operations. "remove"/"delete"
+operations drop the concept.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import case, delete, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.knowledge_profile import StudentConceptKnowledge, StudentKnowledgeProfile
+
+logger = logging.getLogger(__name__)
+
+UPSERT_CHUNK = 1000
+# Column sizes of the knowledge profile tables
+STUDENT_ID_MAX = 100
+CONCEPT_MAX = 200
+RELATION_MAX = 50
+# Errors caused by the rows themselves: splitting the batch isolates them
+ROW_ERRORS = (IntegrityError, DataError)
+MASTERED = "mastered"
+REMOVE_OPERATIONS = frozenset({"remove", "delete"})
+
+
+def _value(op: Any, name: str) -> Any:
+    value = op.get(name) if isinstance(op, dict) else getattr(op, name, None)
+    return getattr(value, "value", value)  # RelationType and friends are enums
+
+
+@dataclass
+class ConceptState:
+    relation: str
+    strength: float
+    last_seen_at: datetime
+    evidence_count: int = 0
+    mastery_sum: float = 0.0
+    last_evidence: Optional[str] = None
+
+    @property
+    def mastery(self) -> float:
+        return self.mastery_sum / self.evidence_count if self.evidence_count else 0.0
+
+    def merge(self, other: "ConceptState") -> None:
+        """Add other's evidence; relation, strength and evidence follow the newer of the two."""
+        self.evidence_count += other.evidence_count
+        self.mastery_sum += other.mastery_sum
+        if other.last_seen_at >= self.last_seen_at:
+            self.relation = other.relation
+            self.strength = other.strength
+            self.last_seen_at = other.last_seen_at
+            if other.last_evidence is not None:
+                self.last_evidence = other.last_evidence
+
+    def copy(self) -> "ConceptState":
+        return ConceptState(self.relation, self.strength, self.last_seen_at, self.evidence_count,
+                            self.mastery_sum, self.last_evidence)
+
+
+@dataclass
+class ProfileDelta:
+    """Changes to one profile; `removed` concepts are dropped before `concepts` are merged."""
+    attempts: int = 0
+    correct: int = 0
+    concepts: Dict[str, ConceptState] = field(default_factory=dict)
+    removed: Set[str] = field(default_factory=set)
+
+    def merge(self, newer: "ProfileDelta") -> None:
+        self.attempts += newer.attempts
+        self.correct += newer.correct
+        for concept in newer.removed:
+            self.concepts.pop(concept, None)
+        self.removed |= newer.removed
+        for concept, state in newer.concepts.items():
+            current = self.concepts.get(concept)
+            if current is None:
+                self.concepts[concept] = state.copy()
+            else:
+                current.merge(state)
+
+
+def diagnosis_delta(is_correct: bool, kg_operations: Iterable[Any], at: Optional[datetime] = None) -> ProfileDelta:
+    """Delta for one diagnosis; operations may be dicts or mathesis_core KnowledgeGraphOperation objects."""
+    at = at or datetime.now(timezone.utc)
+    delta = ProfileDelta(attempts=1, correct=int(bool(is_correct)))
+    for op in kg_operations or ():
+        concept = _value(op, "concept")
+        if not concept:
+            continue
+        concept = str(concept)[:CONCEPT_MAX]
+        if str(_value(op, "operation") or "update").lower() in REMOVE_OPERATIONS:
+            delta.merge(ProfileDelta(removed={concept}))
+            continue
+        relation = str(_value(op, "relation") or (MASTERED if is_correct else "struggles_with")).lower()[:RELATION_MAX]
+        try:
+            strength = min(max(float(_value(op, "strength")), 0.0), 1.0)
+        except (TypeError, ValueError):
+            strength = 0.5
+        evidence = _value(op, "evidence")
+        delta.merge(ProfileDelta(concepts={concept: ConceptState(
+            relation=relation,
+            strength=strength,
+            last_seen_at=at,
+            evidence_count=1,
+            mastery_sum=strength,
+            last_evidence=None if evidence is None else str(evidence),
+        )}))
+    return delta
+
+
+@dataclass
+class KnowledgeProfile:
+    student_id: str
+    total_attempts: int = 0
+    total_correct: int = 0
+    concepts: Dict[str, ConceptState] = field(default_factory=dict)
+
+    def apply(self, delta: ProfileDelta) -> None:
+        self.total_attempts += delta.attempts
+        self.total_correct += delta.correct
+        for concept in delta.removed:
+            self.concepts.pop(concept, None)
+        for concept, state in delta.concepts.items():
+            current = self.concepts.get(concept)
+            if current is None:
+                self.concepts[concept] = state.copy()
+            else:
+                current.merge(state)
+
+    @property
+    def overall_accuracy(self) -> float:
+        return round(self.total_correct / self.total_attempts, 4) if self.total_attempts else 0.0
+
+    def weak(self, threshold: float = settings.PROFILE_WEAK_THRESHOLD) -> List[str]:
+        """Concepts with mastery below threshold, weakest first."""
+        weak = [(state.mastery, concept) for concept, state in self.concepts.items() if state.mastery < threshold]
+        return [concept for _, concept in sorted(weak)]
+
+    @property
+    def weak_concepts(self) -> List[str]:
+        return self.weak()
+
+    @property
+    def strong_concepts(self) -> List[str]:
+        strong = [(-state.mastery, concept) for concept, state in self.concepts.items()
+                  if state.mastery >= settings.PROFILE_STRONG_THRESHOLD]
+        return [concept for _, concept in sorted(strong)]
+
+    @property
+    def misconception_concepts(self) -> List[str]:
+        return sorted(concept for concept, state in self.concepts.items() if "misconception" in state.relation)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "student_id": self.student_id,
+            "total_attempts": self.total_attempts,
+            "total_correct": self.total_correct,
+            "concepts": {
+                concept: {
+                    "relation": state.relation,
+                    "strength": state.strength,
+                    "mastery": round(state.mastery, 4),
+                    "evidence_count": state.evidence_count,
+                    "last_evidence": state.last_evidence,
+                    "last_seen_at": state.last_seen_at.isoformat(),
+                }
+                for concept, state in self.concepts.items()
+            },
+        }
+
+    def to_graph_data(self) -> Dict[str, Any]:
+        """Student-centred graph: one node per concept, one edge per relation."""
+        return {
+            "nodes": [{"id": self.student_id, "type": "student"}] + [
+                {"id": concept, "type": "concept", "mastery": round(state.mastery, 4)}
+                for concept, state in self.concepts.items()
+            ],
+            "edges": [
+                {"source": self.student_id, "target": concept, "relation": state.relation, "weight": state.strength}
+                for concept, state in self.concepts.items()
+            ],
+        }
+
+
+class KnowledgeProfileStore:
+
+    def __init__(
+        self,
+        max_entries: int = settings.PROFILE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = settings.PROFILE_CACHE_TTL_SECONDS,
+        flush_interval_ms: int = settings.PROFILE_FLUSH_INTERVAL_MS,
+        batch_size: int = settings.PROFILE_FLUSH_BATCH_SIZE,
+        max_failures: int = settings.PROFILE_FLUSH_MAX_FAILURES,
+        dead_letter_path: str = settings.PROFILE_DEAD_LETTER_PATH,
+    ):
+        self.cache: LRUCache[KnowledgeProfile] = LRUCache(max_entries, ttl_seconds)
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_failures = max(1, max_failures)
+        self.dead_letter_path = dead_letter_path
+        self._failures = 0  # consecutive failed flushes
+        self._pending: Dict[str, ProfileDelta] = {}
+        self._flushing: Dict[str, ProfileDelta] = {}
+        # Bumped whenever a flush commits; a load that straddles a commit is redone
+        self._generation = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {"recorded": 0, "flushed_students": 0, "flushes": 0, "flush_failures": 0,
+                      "dead_lettered_students": 0, "loads": 0, "last_flush_ms": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._flushing)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="knowledge-profile-flusher")
+
+    async def stop(self) -> None:
+        """Stop the flusher after writing every pending delta."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def get(self, student_id: str) -> KnowledgeProfile:
+        profile = self.cache.get(student_id)
+        if profile is not None:
+            return profile
+        while True:
+            generation = self._generation
+            profile = await self._load(student_id)
+            if generation == self._generation:
+                break
+        # Deltas not yet committed: the one being flushed, then the newer pending one
+        for deltas in (self._flushing, self._pending):
+            delta = deltas.get(student_id)
+            if delta is not None:
+                profile.apply(delta)
+        self.cache.set(student_id, profile)
+        return profile
+
+    async def record(self, student_id: str, is_correct: bool, kg_operations: Iterable[Any],
+                     at: Optional[datetime] = None) -> None:
+        """
+        Apply one diagnosis to the cached profile (if any) and queue it for the database.
+
+        Raises:
+            ValueError: If student_id is longer than the student_id column
+        """
+        if len(student_id) > STUDENT_ID_MAX:
+            raise ValueError(f"student_id longer than {STUDENT_ID_MAX} characters")
+        if not self.running:
+            await self.start()
+        delta = diagnosis_delta(is_correct, kg_operations, at)
+        profile = self.cache.get(student_id)
+        if profile is not None:
+            profile.apply(delta)
+        pending = self._pending.get(student_id)
+        if pending is None:
+            self._pending[student_id] = delta
+        else:
+            pending.merge(delta)
+        self.stats["recorded"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+        await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write pending deltas and return the number of students written. Deltas
+        that could not be written are put back and retried on the next flush,
+        except those of students isolated as bad rows, which are dead-lettered.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            started = time.perf_counter()
+            written_before = self.stats["flushed_students"]
+            try:
+                await self.write_batch(self._flushing)
+                self._committed(self._flushing)
+            except Exception as e:
+                logger.error(f"Knowledge profile flush failed ({len(self._flushing)} students): {e}")
+                self.stats["flush_failures"] += 1
+                self._failures += 1
+                if isinstance(e, ROW_ERRORS) or self._failures >= self.max_failures:
+                    await self._isolate(dict(self._flushing), e)
+            flushed = self.stats["flushed_students"] - written_before
+            if self._flushing:
+                self._requeue()
+                return flushed
+            self._failures = 0
+            self.stats["flushes"] += 1
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return flushed
+
+    def _committed(self, batch: Dict[str, ProfileDelta]) -> None:
+        students = list(batch)
+        for student_id in students:
+            self._flushing.pop(student_id, None)
+        self._generation += 1
+        self.stats["flushed_students"] += len(students)
+
+    def _requeue(self) -> None:
+        """Put the deltas still in _flushing back in front of the newer pending ones."""
+        for student_id, newer in self._pending.items():
+            older = self._flushing.get(student_id)
+            if older is None:
+                self._flushing[student_id] = newer
+            else:
+                older.merge(newer)
+        self._pending, self._flushing = self._flushing, {}
+
+    async def _isolate(self, batch: Dict[str, ProfileDelta], error: Exception) -> None:
+        """
+        Write the halves of a failed batch, splitting further while the
+        failure is caused by rows. Students still failing alone with a row
+        error are dead-lettered; the rest stays in _flushing for a retry.
+        """
+        if len(batch) == 1:
+            if isinstance(error, ROW_ERRORS):
+                await self._dead_letter(batch, error)
+            return
+        items = list(batch.items())
+        middle = len(items) // 2
+        for half in (dict(items[:middle]), dict(items[middle:])):
+            try:
+                await self.write_batch(half)
+            except ROW_ERRORS as e:
+                await self._isolate(half, e)
+            except Exception:
+                continue
+            else:
+                self._committed(half)
+
+    async def _dead_letter(self, batch: Dict[str, ProfileDelta], error: Exception) -> None:
+        for student_id in batch:
+            self._flushing.pop(student_id, None)
+        reason = f"{type(error).__name__}: {str(error)[:500]}"
+        lines = "".join(
+            json.dumps({"student_id": student_id, "delta": asdict(delta), "error": reason},
+                       default=str, ensure_ascii=False) + "\n"
+            for student_id, delta in batch.items()
+        )
+
+        def append() -> None:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+        self.stats["dead_lettered_students"] += len(batch)
+        try:
+            await asyncio.to_thread(append)
+            logger.error(f"Knowledge profile deltas of {list(batch)} dead-lettered to {self.dead_letter_path}: {reason}")
+        except OSError as e:
+            logger.error(f"Dead-letter write failed, deltas of {list(batch)} lost: {e}")
+
+    async def write_batch(self, batch: Dict[str, ProfileDelta]) -> None:
+        """Additive upserts for totals and concepts, in one transaction."""
+        profile_rows = [
+            {"student_id": student_id, "total_attempts": delta.attempts, "total_correct": delta.correct}
+            for student_id, delta in batch.items()
+        ]
+        removed = [(student_id, concept) for student_id, delta in batch.items() for concept in delta.removed]
+        concept_rows = [
+            {
+                "student_id": student_id,
+                "concept": concept,
+                "relation": state.relation,
+                "strength": state.strength,
+                "evidence_count": state.evidence_count,
+                "mastery_sum": state.mastery_sum,
+                "last_evidence": state.last_evidence,
+                "last_seen_at": state.last_seen_at,
+            }
+            for student_id, delta in batch.items()
+            for concept, state in delta.concepts.items()
+        ]
+
+        async with SessionLocal() as db:
+            for start in range(0, len(profile_rows), UPSERT_CHUNK):
+                await db.execute(profiles_upsert(profile_rows[start:start + UPSERT_CHUNK]))
+            for start in range(0, len(removed), UPSERT_CHUNK):
+                await db.execute(
+                    delete(StudentConceptKnowledge).where(
+                        tuple_(StudentConceptKnowledge.student_id, StudentConceptKnowledge.concept)
+                        .in_(removed[start:start + UPSERT_CHUNK])
+                    )
+                )
+            for start in range(0, len(concept_rows), UPSERT_CHUNK):
+                await db.execute(concepts_upsert(concept_rows[start:start + UPSERT_CHUNK]))
+            await db.commit()
+
+    async def _load(self, student_id: str) -> KnowledgeProfile:
+        self.stats["loads"] += 1
+        async with SessionLocal() as db:
+            totals = (await db.execute(
+                select(StudentKnowledgeProfile.total_attempts, StudentKnowledgeProfile.total_correct)
+                .where(StudentKnowledgeProfile.student_id == student_id)
+            )).one_or_none()
+            rows = (await db.execute(
+                select(StudentConceptKnowledge).where(StudentConceptKnowledge.student_id == student_id)
+            )).scalars().all()
+        profile = KnowledgeProfile(student_id)
+        if totals is not None:
+            profile.total_attempts, profile.total_correct = totals
+        for row in rows:
+            profile.concepts[row.concept] = ConceptState(
+                relation=row.relation,
+                strength=row.strength,
+                last_seen_at=row.last_seen_at,
+                evidence_count=row.evidence_count,
+                mastery_sum=row.mastery_sum,
+                last_evidence=row.last_evidence,
+            )
+        return profile
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending_students": self.pending, "cached_profiles": len(self.cache),
+                "cache": self.cache.stats.to_dict()}
+
+
+def profiles_upsert(rows: List[Dict[str, Any]]):
+    stmt = pg_insert(StudentKnowledgeProfile).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[StudentKnowledgeProfile.student_id],
+        set_={
+            "total_attempts": StudentKnowledgeProfile.total_attempts + stmt.excluded.total_attempts,
+            "total_correct": StudentKnowledgeProfile.total_correct + stmt.excluded.total_correct,
+            "updated_at": func.now(),
+        },
+    )
+
+
+def concepts_upsert(rows: List[Dict[str, Any]]):
+    stmt = pg_insert(StudentConceptKnowledge).values(rows)
+    table = StudentConceptKnowledge
+    newer = stmt.excluded.last_seen_at >= table.last_seen_at
+    return stmt.on_conflict_do_update(
+        index_elements=[table.student_id, table.concept],
+        set_={
+            "evidence_count": table.evidence_count + stmt.excluded.evidence_count,
+            "mastery_sum": table.mastery_sum + stmt.excluded.mastery_sum,
+            "relation": _newest(newer, stmt.excluded.relation, table.relation),
+            "strength": _newest(newer, stmt.excluded.strength, table.strength),
+            "last_evidence": _newest(newer, func.coalesce(stmt.excluded.last_evidence, table.last_evidence),
+                                     table.last_evidence),
+            "last_seen_at": func.greatest(table.last_seen_at, stmt.excluded.last_seen_at),
+        },
+    )
+
+
+def _newest(newer, incoming, current):
+    return case((newer, incoming), else_=current)
+
+
+knowledge_profile_store = KnowledgeProfileStore()
@@ -0,0 +1,275 @@
+"""
+Streaming BKT/mastery backfill for Node 2 (Q-DNA).
+
+Recomputes student_mastery from the full attempt_logs history:
+
+- attempts are read in (user_id, attempted_at) order through a server-side
+  cursor, so memory holds one shard of users at a time;
+- complete users are grouped into shards and replayed in a process pool
+  with the vectorized BKT kernels from bkt_service;
+- each shard is bulk-upserted and committed in stream order, after which a
+  checkpoint (last user_id done) is written, so an interrupted run resumes
+  where it stopped.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import SessionLocal
+from app.models.question import QuestionTag
+from app.models.student_mastery import StudentMastery
+from app.models.tag import Tag
+from app.services.bkt_service import (
+    DEFAULT_P_GUESS,
+    DEFAULT_P_MASTERY,
+    DEFAULT_P_SLIP,
+    DEFAULT_P_TRANSIT,
+    SKILL_TAG_TYPES,
+    UNKNOWN_SKILL,
+    bkt_service,
+    pack_sequences,
+    run_sequences,
+)
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_ROWS = 20_000
+SHARD_ATTEMPTS = 50_000
+
+# (user_id, [(skill_id, is_correct, attempted_at), ...])
+UserHistory = Tuple[uuid.UUID, List[Tuple[str, bool, Optional[datetime]]]]
+
+
+@dataclass
+class BKTParams:
+    p_mastery: float = DEFAULT_P_MASTERY
+    p_transit: float = DEFAULT_P_TRANSIT
+    p_slip: float = DEFAULT_P_SLIP
+    p_guess: float = DEFAULT_P_GUESS
+
+
+@dataclass
+class BackfillProgress:
+    users: int = 0
+    attempts: int = 0
+    pairs: int = 0
+    shards: int = 0
+    last_user_id: Optional[str] = None
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def attempts_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.attempts / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "users": self.users,
+            "attempts": self.attempts,
+            "pairs": self.pairs,
+            "shards": self.shards,
+            "last_user_id": self.last_user_id,
+            "elapsed_s": round(time.monotonic() - self.started_at, 2),
+            "attempts_per_second": round(self.attempts_per_second, 1),
+        }
+
+
+def replay_shard(
+    sequences: List[List[bool]], params: Tuple[float, float, float, float]
+) -> List[float]:
+    """
+    Process-pool worker: final mastery for every (user, skill) sequence,
+    starting from the prior in params (p_mastery, p_transit, p_slip, p_guess).
+    """
+    if not sequences:
+        return []
+    p_mastery, p_transit, p_slip, p_guess = params
+    n = len(sequences)
+    outcomes, mask = pack_sequences(sequences)
+    final = run_sequences(
+        np.full(n, p_mastery), outcomes, mask, np.full(n, p_transit), np.full(n, p_slip), np.full(n, p_guess)
+    )
+    return final.tolist()
+
+
+def split_pairs(histories: List[UserHistory]) -> Tuple[List[Tuple[uuid.UUID, str]], List[List[bool]], List[Dict[str, Any]]]:
+    """Per-(user, skill) outcome sequences plus the counters that go into the upsert rows."""
+    keys: List[Tuple[uuid.UUID, str]] = []
+    sequences: List[List[bool]] = []
+    stats: List[Dict[str, Any]] = []
+    for user_id, attempts in histories:
+        per_skill: Dict[str, int] = {}
+        for skill_id, is_correct, attempted_at in attempts:
+            pos = per_skill.get(skill_id)
+            if pos is None:
+                pos = per_skill[skill_id] = len(keys)
+                keys.append((user_id, skill_id))
+                sequences.append([])
+                stats.append({"correct_count": 0, "last_attempt_at": None})
+            sequences[pos].append(is_correct)
+            stats[pos]["correct_count"] += int(is_correct)
+            if attempted_at is not None:
+                stats[pos]["last_attempt_at"] = attempted_at  # attempts arrive in time order
+    return keys, sequences, stats
+
+
+class MasteryBackfillService:
+
+    def __init__(self, workers: int = 0, shard_attempts: int = SHARD_ATTEMPTS):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_attempts = shard_attempts
+
+    async def load_skill_map(self, db: AsyncSession) -> Dict[uuid.UUID, str]:
+        """question_id -> skill, same rule as bkt_service.resolve_skills (highest confidence wins)."""
+        result = await db.execute(
+            select(QuestionTag.question_id, Tag.name)
+            .join(Tag, Tag.tag_id == QuestionTag.tag_id)
+            .where(Tag.tag_type.in_(SKILL_TAG_TYPES))
+            .order_by(QuestionTag.question_id, QuestionTag.confidence.desc(), Tag.tag_id)
+        )
+        skills: Dict[uuid.UUID, str] = {}
+        for question_id, name in result.all():
+            skills.setdefault(question_id, name)
+        return skills
+
+    async def stream_histories(self, db: AsyncSession, skills: Dict[uuid.UUID, str], after_user_id: Optional[str] = None):
+        """Yield complete per-user histories from a server-side cursor, in user_id order."""
+        where = "WHERE user_id > CAST(:after AS uuid)" if after_user_id else ""
+        result = await db.stream(text(f"""
+            SELECT user_id, question_id, is_correct, attempted_at
+            FROM attempt_logs
+            {where}
+            ORDER BY user_id, attempted_at, log_id
+        """), {"after": after_user_id} if after_user_id else {})
+
+        current: Optional[uuid.UUID] = None
+        attempts: List[Tuple[str, bool, Optional[datetime]]] = []
+        async for partition in result.partitions(STREAM_BATCH_ROWS):
+            for user_id, question_id, is_correct, attempted_at in partition:
+                if user_id != current:
+                    if current is not None:
+                        yield current, attempts
+                    current, attempts = user_id, []
+                attempts.append((skills.get(question_id, UNKNOWN_SKILL), bool(is_correct), attempted_at))
+        if current is not None:
+            yield current, attempts
+
+    async def shards(self, histories) -> Any:
+        """Group user histories into shards of roughly shard_attempts attempts (users are never split)."""
+        shard: List[UserHistory] = []
+        size = 0
+        async for history in histories:
+            shard.append(history)
+            size += len(history[1])
+            if size >= self.shard_attempts:
+                yield shard
+                shard, size = [], 0
+        if shard:
+            yield shard
+
+    async def write_shard(
+        self, keys: List[Tuple[uuid.UUID, str]], final: List[float], stats: List[Dict[str, Any]],
+        sequences: List[List[bool]], params: BKTParams,
+    ) -> None:
+        rows = [
+            {
+                "user_id": user_id,
+                "skill_id": skill_id,
+                "p_mastery": final[i],
+                "p_transit": params.p_transit,
+                "p_slip": params.p_slip,
+                "p_guess": params.p_guess,
+                "attempts_count": len(sequences[i]),
+                "correct_count": stats[i]["correct_count"],
+                "last_attempt_at": stats[i]["last_attempt_at"] or datetime.now().astimezone(),
+            }
+            for i, (user_id, skill_id) in enumerate(keys)
+        ]
+        async with SessionLocal() as db:
+            await bkt_service.upsert_rows(db, rows)
+            await db.commit()
+
+    async def run(
+        self,
+        params: Optional[BKTParams] = None,
+        checkpoint_path: Optional[str] = None,
+        resume: bool = True,
+        truncate: bool = False,
+        on_progress: Optional[Callable[[BackfillProgress], None]] = None,
+    ) -> BackfillProgress:
+        params = params or BKTParams()
+        checkpoint = read_checkpoint(checkpoint_path) if (checkpoint_path and resume) else None
+        after = checkpoint.get("last_user_id") if checkpoint else None
+        progress = BackfillProgress(last_user_id=after)
+
+        async with SessionLocal() as db:
+            if truncate and after is None:
+                await db.execute(delete(StudentMastery))
+                await db.commit()
+            skills = await self.load_skill_map(db)
+
+        loop = asyncio.get_running_loop()
+        worker_params = (params.p_mastery, params.p_transit, params.p_slip, params.p_guess)
+        in_flight: Deque[Tuple[asyncio.Future, List[UserHistory], tuple]] = deque()
+
+        async def complete_oldest() -> None:
+            # Shards are committed in stream order so the checkpoint is always a safe resume point
+            future, shard, (keys, sequences, stats) = in_flight.popleft()
+            final = await future
+            await self.write_shard(keys, final, stats, sequences, params)
+            progress.users += len(shard)
+            progress.attempts += sum(len(h[1]) for h in shard)
+            progress.pairs += len(keys)
+            progress.shards += 1
+            progress.last_user_id = str(shard[-1][0])
+            if checkpoint_path:
+                write_checkpoint(checkpoint_path, progress)
+            if on_progress:
+                on_progress(progress)
+
+        async with SessionLocal() as stream_db:
+            with ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                async for shard in self.shards(self.stream_histories(stream_db, skills, after)):
+                    keys, sequences, stats = split_pairs(shard)
+                    future = loop.run_in_executor(pool, replay_shard, sequences, worker_params)
+                    in_flight.append((future, shard, (keys, sequences, stats)))
+                    # Bounded read-ahead: at most two shards per worker in flight
+                    if len(in_flight) >= self.workers * 2:
+                        await complete_oldest()
+                while in_flight:
+                    await complete_oldest()
+
+        logger.info(f"Mastery backfill finished: {progress.to_dict()}")
+        return progress
+
+
+def read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_checkpoint(path: str, progress: BackfillProgress) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(progress.to_dict(), f)
+    os.replace(tmp_path, path)
+
+
+mastery_backfill_service = MasteryBackfillService()
@@ -2,18 +2,33 @@
 Math Advanced Service for Node 2 (Q-DNA).
 Refactored to use mathesis_core.generation.ProblemGenerator.
 """
-from typing import Dict, Any
+import json
+from typing import Dict, Any, AsyncIterator, Tuple
 from mathesis_core.generation import ProblemGenerator
 from mathesis_core.analysis import DNAAnalyzer
-from mathesis_core.llm.clients import create_ollama_client
 from mathesis_core.llm.parsers import LLMJSONParser
 from mathesis_core.exceptions import GenerationError, AnalysisError
 from app.core.config import settings
+from app.core.llm_gateway import shared_ollama_client
+from app.core.llm_metrics import llm_metrics, llm_template
+from app.services.analysis_cache_service import analysis_cache
 from app.schemas.question import QuestionMetadata, ExamSourceInfo, MathDomainInfo, DifficultyMetrics, QuestionCreate, Question
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Same output fields ProblemGenerator.generate_twin returns
+TWIN_PROMPT = """You are a math teacher writing a "twin" problem: same concept, skill and
+difficulty as the original, but with different numbers or context.{variation}
+
+Original question (JSON):
+{question}
+
+Respond with a single JSON object, fields in this order:
+{{"question_stem": "new question text, math in LaTeX",
+  "answer": "final answer",
+  "solution_steps": "step-by-step solution"}}"""
+
 
 class MathAdvancedService:
     """
@@ -28,15 +43,13 @@ class MathAdvancedService:
     def __init__(self):
         """Initialize MathAdvancedService with mathesis_core components."""
         # Create LLM client using mathesis_core
-        self.client = create_ollama_client(
-            base_url=settings.OLLAMA_URL,
-            model=settings.OLLAMA_MODEL
-        )
+        self.client = shared_ollama_client(settings.OLLAMA_URL, settings.OLLAMA_MODEL)
 
         # Use ProblemGenerator and DNAAnalyzer from mathesis_core
         self.generator = ProblemGenerator(self.client)
         self.dna_analyzer = DNAAnalyzer(self.client)
 
+    @llm_template("dna_analysis")
     async def analyze_question_metadata(self, content_stem: str) -> QuestionMetadata:
         """
         Analyze question text and extract metadata using DNAAnalyzer.
@@ -51,8 +64,12 @@ class MathAdvancedService:
             QuestionMetadata (Pydantic model)
         """
         try:
-            # Use DNAAnalyzer to get metadata
-            dna = await self.dna_analyzer.analyze(content_stem)
+            # Use DNAAnalyzer to get metadata (shares cached results with TaggingService)
+            dna = await analysis_cache.get_or_compute(
+                content_stem,
+                settings.OLLAMA_MODEL,
+                lambda: self.dna_analyzer.analyze(content_stem),
+            )
             metadata_dict = dna.get("metadata", {})
 
             # Convert to Pydantic schema expected by Node 2 API
@@ -76,12 +93,14 @@ class MathAdvancedService:
         except AnalysisError as e:
             logger.error(f"Metadata analysis error: {e}")
             # Fallback to default if AI fails
+            llm_metrics.event("fallback", model=settings.OLLAMA_MODEL, detail="default QuestionMetadata")
             return QuestionMetadata(
                 source=ExamSourceInfo(name="Unknown", grade=5),
                 domain=MathDomainInfo(major_domain="Number"),
                 difficulty=DifficultyMetrics()
             )
 
+    @llm_template("twin")
     async def generate_twin_question(self, original_question: Question) -> QuestionCreate:
         """
         Generate a twin question based on the original question logic.
@@ -99,52 +118,12 @@ class MathAdvancedService:
             GenerationError: If generation fails
         """
         try:
-            meta = original_question.content_metadata
-            original_text = original_question.content_stem
-
-            # Prepare question dict for ProblemGenerator
-            question_dict = {
-                "content_stem": original_text,
-                "answer_key": original_question.answer_key or {"answer": ""},
-                "question_type": original_question.question_type,
-                "content_metadata": {
-                    "source": {
-                        "name": meta.source.name if meta and meta.source else "Unknown",
-                        "grade": meta.source.grade if meta and meta.source else 5
-                    },
-                    "domain": {
-                        "major_domain": meta.domain.major_domain if meta and meta.domain else "Number"
-                    },
-                    "difficulty": {
-                        "estimated_level": meta.difficulty.estimated_level if meta and meta.difficulty else 3
-                    }
-                } if meta else None
-            }
+            question_dict = self._twin_source(original_question)
 
             # Delegate to ProblemGenerator from mathesis_core
             result = await self.generator.generate_twin(question_dict, preserve_metadata=True)
 
-            # Extract generated content
-            new_stem = result.get("question_stem", "")
-            new_answer_key = {
-                "answer": result.get("answer", "See solution"),
-                "explanation": result.get("solution_steps", "")
-            }
-
-            # Create QuestionCreate schema with preserved metadata
-            return QuestionCreate(
-                question_type=original_question.question_type,
-                content_stem=new_stem,
-                answer_key=new_answer_key,
-                create_by=original_question.created_by,
-                content_metadata=QuestionMetadata(
-                    source=meta.source if meta else ExamSourceInfo(name="Generated", grade=5),
-                    domain=meta.domain if meta else MathDomainInfo(major_domain="Number"),
-                    difficulty=meta.difficulty if meta else DifficultyMetrics(),
-                    is_twin_generated=True,
-                    original_question_id=str(original_question.question_id)
-                )
-            )
+            return self._twin_from_result(original_question, result)
 
         except GenerationError as e:
             logger.error(f"Twin question generation error: {e}")
@@ -153,6 +132,119 @@ class MathAdvancedService:
             logger.error(f"Unexpected error in twin generation: {e}")
             raise GenerationError(f"Failed to generate twin question: {str(e)}")
 
+    @llm_template("twin_stream")
+    async def stream_twin_question(self, original_question: Question) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of generate_twin_question.
+
+        Yields ("token", str) as the model generates, ("field", {"name", "value"})
+        whenever a top-level JSON field of the answer is complete, and finally
+        ("twin", QuestionCreate) built exactly like generate_twin_question.
+
+        Raises:
+            GenerationError: If the completed output cannot be parsed
+        """
+        from app.core.streaming import PartialJSONScanner
+        from app.services.ollama_service import ollama_service
+
+        question_dict = self._twin_source(original_question)
+        prompt = TWIN_PROMPT.format(
+            variation="", question=json.dumps(question_dict, ensure_ascii=False, default=str)
+        )
+        scanner = PartialJSONScanner()
+        async for token in ollama_service.stream_text(prompt, model=settings.OLLAMA_MODEL, format="json"):
+            yield "token", token
+            for name, value in scanner.feed(token):
+                yield "field", {"name": name, "value": value}
+
+        try:
+            result = LLMJSONParser.parse(scanner.text)
+        except Exception as e:
+            llm_metrics.event("json_parse_failure", model=settings.OLLAMA_MODEL, detail=str(e))
+            logger.error(f"Twin stream parse error: {e}")
+            raise GenerationError(f"Failed to parse twin question: {str(e)}")
+        yield "twin", self._twin_from_result(original_question, result)
+
+    @llm_template("twin_variant")
+    async def generate_twin_variant(self, original_question: Question, variant: int, total: int) -> QuestionCreate:
+        """
+        Generate twin number `variant` (1-based) of `total` for one original.
+
+        The variant number is part of the prompt, so the calls differ (and are
+        not coalesced by the LLM single-flight) and the model is steered away
+        from repeating the same numbers.
+
+        Raises:
+            GenerationError: If generation or parsing fails
+        """
+        question_dict = self._twin_source(original_question)
+        prompt = TWIN_PROMPT.format(
+            variation=(
+                f"\nThis is variant {variant} of {total}: use numbers and a context that the"
+                " other variants are unlikely to pick."
+            ),
+            question=json.dumps(question_dict, ensure_ascii=False, default=str),
+        )
+        try:
+            raw = await self.client.generate(prompt=prompt, format="json", temperature=0.9)
+        except Exception as e:
+            logger.error(f"Twin variant generation error: {e}")
+            raise GenerationError(f"Failed to generate twin variant: {str(e)}")
+        try:
+            result = LLMJSONParser.parse(raw)
+        except Exception as e:
+            llm_metrics.event("json_parse_failure", model=settings.OLLAMA_MODEL, detail=str(e))
+            logger.error(f"Twin variant parse error: {e}")
+            raise GenerationError(f"Failed to parse twin variant: {str(e)}")
+        return self._twin_from_result(original_question, result)
+
+    def _twin_source(self, original_question: Question) -> Dict[str, Any]:
+        """Question dict in the shape ProblemGenerator expects."""
+        meta = original_question.content_metadata
+        return {
+            "content_stem": original_question.content_stem,
+            "answer_key": original_question.answer_key or {"answer": ""},
+            "question_type": original_question.question_type,
+            "content_metadata": {
+                "source": {
+                    "name": meta.source.name if meta and meta.source else "Unknown",
+                    "grade": meta.source.grade if meta and meta.source else 5
+                },
+                "domain": {
+                    "major_domain": meta.domain.major_domain if meta and meta.domain else "Number"
+                },
+                "difficulty": {
+                    "estimated_level": meta.difficulty.estimated_level if meta and meta.difficulty else 3
+                }
+            } if meta else None
+        }
+
+    def _twin_from_result(self, original_question: Question, result: Dict[str, Any]) -> QuestionCreate:
+        """QuestionCreate for a generated twin, preserving the original metadata."""
+        meta = original_question.content_metadata
+
+        # Extract generated content
+        new_stem = result.get("question_stem", "")
+        new_answer_key = {
+            "answer": result.get("answer", "See solution"),
+            "explanation": result.get("solution_steps", "")
+        }
+
+        # Create QuestionCreate schema with preserved metadata
+        return QuestionCreate(
+            question_type=original_question.question_type,
+            content_stem=new_stem,
+            answer_key=new_answer_key,
+            create_by=original_question.created_by,
+            content_metadata=QuestionMetadata(
+                source=meta.source if meta else ExamSourceInfo(name="Generated", grade=5),
+                domain=meta.domain if meta else MathDomainInfo(major_domain="Number"),
+                difficulty=meta.difficulty if meta else DifficultyMetrics(),
+                is_twin_generated=True,
+                original_question_id=str(original_question.question_id)
+            )
+        )
+
 
 # Singleton instance for backward compatibility
 math_advanced_service = MathAdvancedService()
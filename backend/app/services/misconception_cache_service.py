@@ -0,0 +1,163 @@
+"""
+Misconception cache for Node 2 (Q-DNA).
+
+On an exam day dozens of students submit the same wrong answer to the same
+question, and each of them used to pay for a full LLM diagnosis. A
+diagnosis depends on the question, the answer and the model, not on the
+student, so results are shared under
+
+    (sha256 of the normalized question, normalized student answer,
+     normalized correct answer, DIAGNOSIS_PROMPT_VERSION, model)
+
+through the analysis cache (memory LRU + llm_analysis_cache table, namespace
+"diagnosis" / "diagnosis_stream"). Answers are normalized like the symbolic
+answer check, so "x = -1" and "x=−1" share an entry. Concurrent misses for
+the same key run one diagnosis.
+
+Stored results have the student-specific fields (student_id, question_id,
+timestamp) cleared; a hit is replayed with the requesting student's values.
+Hits and misses are counted per namespace for get_stats(); the analysis
+cache also reports them as llm cache_hit events.
+"""
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.analysis_cache_service import AnalysisCache, analysis_cache, normalize_text
+from app.services.answer_check_service import normalize_answer
+
+logger = logging.getLogger(__name__)
+
+DIAGNOSIS_NAMESPACE = "diagnosis"
+DIAGNOSIS_STREAM_NAMESPACE = "diagnosis_stream"
+
+_STUDENT_FIELDS = ("student_id", "question_id", "timestamp")
+
+
+def diagnosis_model(service: Any) -> str:
+    """Model version of a diagnosis service, part of the cache key."""
+    return getattr(service, "model_version", None) or settings.DIAGNOSIS_MODEL
+
+
+class MisconceptionCache:
+
+    def __init__(
+        self,
+        cache: AnalysisCache = analysis_cache,
+        enabled: bool = settings.MISCONCEPTION_CACHE_ENABLED,
+        prompt_version: str = settings.DIAGNOSIS_PROMPT_VERSION,
+    ):
+        self.cache = cache
+        self.enabled = enabled
+        self.prompt_version = prompt_version
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def key_text(self, question_content: str, student_answer: Optional[str], correct_answer: Optional[str]) -> str:
+        question_hash = hashlib.sha256(normalize_text(question_content).encode("utf-8")).hexdigest()
+        return "\x1f".join((
+            self.prompt_version, question_hash, normalize_answer(student_answer), normalize_answer(correct_answer),
+        ))
+
+    def _count(self, namespace: str, outcome: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            stats[outcome] += 1
+
+    @staticmethod
+    def shared(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Result without the student-specific fields, as stored."""
+        return {**result, **{field: None for field in _STUDENT_FIELDS}}
+
+    @staticmethod
+    def replay(result: Dict[str, Any], student_id: str, question_id: Optional[str]) -> Dict[str, Any]:
+        return {**result, "student_id": student_id, "question_id": question_id,
+                "timestamp": datetime.now().isoformat()}
+
+    async def diagnose(
+        self,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        *,
+        student_id: str,
+        question_content: str,
+        student_answer: Optional[str],
+        correct_answer: Optional[str] = None,
+        question_id: Optional[str] = None,
+        model: str = settings.DIAGNOSIS_MODEL,
+        namespace: str = DIAGNOSIS_NAMESPACE,
+    ) -> Dict[str, Any]:
+        """
+        Diagnosis for this student: a cached one for the same question and
+        answer, or compute() (a DiagnosisResponse-shaped dict) on a miss.
+        Exceptions from compute() propagate and nothing is cached.
+        """
+        if not self.enabled:
+            return await compute()
+
+        computed = False
+
+        async def run() -> Dict[str, Any]:
+            nonlocal computed
+            computed = True
+            return self.shared(await compute())
+
+        result = await self.cache.get_or_compute(
+            self.key_text(question_content, student_answer, correct_answer), model, run, namespace=namespace
+        )
+        self._count(namespace, "misses" if computed else "hits")
+        return self.replay(result, student_id, question_id)
+
+    async def get(
+        self,
+        *,
+        student_id: str,
+        question_content: str,
+        student_answer: Optional[str],
+        correct_answer: Optional[str] = None,
+        question_id: Optional[str] = None,
+        model: str = settings.DIAGNOSIS_MODEL,
+        namespace: str = DIAGNOSIS_NAMESPACE,
+    ) -> Optional[Dict[str, Any]]:
+        """Cached diagnosis replayed for this student, or None (counted as a miss)."""
+        if not self.enabled:
+            return None
+        result = await self.cache.get(self.key_text(question_content, student_answer, correct_answer), model, namespace)
+        self._count(namespace, "misses" if result is None else "hits")
+        return None if result is None else self.replay(result, student_id, question_id)
+
+    async def put(
+        self,
+        result: Dict[str, Any],
+        *,
+        question_content: str,
+        student_answer: Optional[str],
+        correct_answer: Optional[str] = None,
+        model: str = settings.DIAGNOSIS_MODEL,
+        namespace: str = DIAGNOSIS_NAMESPACE,
+    ) -> None:
+        if self.enabled:
+            await self.cache.put(self.key_text(question_content, student_answer, correct_answer), model,
+                                 self.shared(result), namespace)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = {name: dict(stats) for name, stats in self._stats.items()}
+        hits = sum(stats["hits"] for stats in namespaces.values())
+        lookups = hits + sum(stats["misses"] for stats in namespaces.values())
+        for stats in namespaces.values():
+            total = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+        return {
+            "enabled": self.enabled,
+            "prompt_version": self.prompt_version,
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "namespaces": namespaces,
+        }
+
+
+misconception_cache = MisconceptionCache()
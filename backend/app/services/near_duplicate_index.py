@@ -0,0 +1,96 @@
+"""
+MinHash near-duplicate index over question text for Node 2 (Q-DNA).
+
+Each text is reduced to character shingles of its normalized form
+(analysis_cache_service.normalize_text, lowercased, whitespace removed so
+"x + 1" and "x+1" agree), and to a MinHash signature of num_perm 32-bit
+hash minima. The estimated Jaccard similarity of two texts is the fraction
+of equal signature positions.
+
+Lookups use LSH banding: the signature is cut into `bands` bands of
+num_perm / bands rows, and only texts sharing at least one whole band are
+compared. With the defaults (64 permutations, 16 bands of 4) a pair at
+Jaccard 0.8 becomes a candidate with probability ~1.0 and a pair at 0.3
+with ~0.12, so queries stay far below a full scan of the bank.
+"""
+import hashlib
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.analysis_cache_service import normalize_text
+
+_PRIME = np.uint64((1 << 61) - 1)
+
+
+def shingles(text: str, size: int = 4) -> List[str]:
+    compact = "".join(normalize_text(text).lower().split())
+    if len(compact) <= size:
+        return [compact]
+    return sorted({compact[i:i + size] for i in range(len(compact) - size + 1)})
+
+
+class MinHashIndex:
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 4,
+                 threshold: float = 0.8, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        # a < 2^31 and hashes < 2^32 keep a * h + b below 2^64
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+             for s in shingles(text, self.shingle_size)),
+            dtype=np.uint64,
+        )
+        # (num_perm, n_shingles) -> min per permutation
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _bands(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key: Hashable, text: str, signature: Optional[np.ndarray] = None) -> None:
+        if key in self._signatures:
+            return
+        signature = self.signature(text) if signature is None else signature
+        self._signatures[key] = signature
+        for bucket in self._bands(signature):
+            self._buckets.setdefault(bucket, []).append(key)
+
+    def similar(self, text: str, signature: Optional[np.ndarray] = None) -> List[Tuple[Hashable, float]]:
+        """Indexed texts with estimated Jaccard >= threshold, most similar first."""
+        signature = self.signature(text) if signature is None else signature
+        candidates = set()
+        for bucket in self._bands(signature):
+            candidates.update(self._buckets.get(bucket, ()))
+        matches = []
+        for key in candidates:
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= self.threshold:
+                matches.append((key, similarity))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add_unless_duplicate(self, key: Hashable, text: str) -> Optional[Tuple[Hashable, float]]:
+        """Index text unless a near-duplicate is already indexed; returns that duplicate, or None."""
+        signature = self.signature(text)
+        matches = self.similar(text, signature)
+        if matches:
+            return matches[0]
+        self.add(key, text, signature)
+        return None
@@ -4,10 +4,11 @@ Refactored to use mathesis_core.vision.OCREngine.
 """
 from typing import Dict, Any
 from mathesis_core.vision import OCREngine
-from mathesis_core.llm.clients import create_ollama_client
 from mathesis_core.llm.parsers import LLMJSONParser
 from mathesis_core.exceptions import OCRError
 from app.core.config import settings
+from app.core.llm_gateway import shared_ollama_client
+from app.core.llm_metrics import llm_metrics, llm_template
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,14 +27,12 @@ class OCRService:
     def __init__(self):
         """Initialize OCR Service with mathesis_core components."""
         # Create LLM client using mathesis_core
-        self.llm_client = create_ollama_client(
-            base_url=settings.OLLAMA_URL,
-            model=settings.OLLAMA_MODEL
-        )
+        self.llm_client = shared_ollama_client(settings.OLLAMA_URL, settings.OLLAMA_MODEL)
 
         # Use OCREngine from mathesis_core
         self.ocr_engine = OCREngine(self.llm_client)
 
+    @llm_template("ocr_extract")
     async def extract_from_image_bytes(self, image_content: bytes) -> Dict[str, Any]:
         """
         Extract text and math from image bytes.
@@ -65,6 +64,7 @@ class OCRService:
         except OCRError as e:
             logger.error(f"OCR Error: {e}")
             # Emergency fallback for backward compatibility
+            llm_metrics.event("fallback", model=settings.OLLAMA_MODEL, detail=str(e))
             return {
                 "text": "OCR processing failed. Please try again.",
                 "latex": [],
@@ -126,20 +126,25 @@ Extract and structure this as an educational question in JSON format:
 }}"""
 
         try:
-            structured = await self.llm_client.generate(
-                prompt=structure_prompt,
-                format="json",
-                temperature=0.3
-            )
-
-            question_data = LLMJSONParser.safe_parse(structured, default={
-                "question_stem": ocr_result["combined"],
-                "question_type": "short_answer",
-                "choices": None,
-                "subject_area": "Unknown",
-                "estimated_difficulty": 0.5,
-                "keywords": []
-            })
+            with llm_template("ocr_structure"):
+                structured = await self.llm_client.generate(
+                    prompt=structure_prompt,
+                    format="json",
+                    temperature=0.3
+                )
+
+                try:
+                    question_data = LLMJSONParser.parse(structured)
+                except Exception as e:
+                    llm_metrics.event("json_parse_failure", model=settings.OLLAMA_MODEL, detail=str(e))
+                    question_data = {
+                        "question_stem": ocr_result["combined"],
+                        "question_type": "short_answer",
+                        "choices": None,
+                        "subject_area": "Unknown",
+                        "estimated_difficulty": 0.5,
+                        "keywords": []
+                    }
 
             # Include raw OCR result
             question_data["ocr_raw"] = ocr_result
@@ -148,6 +153,7 @@ Extract and structure this as an educational question in JSON format:
         except Exception as e:
             logger.warning(f"Question structuring failed: {e}, using fallback")
             # Fallback
+            llm_metrics.event("fallback", model=settings.OLLAMA_MODEL, detail=str(e), template="ocr_structure")
             return {
                 "question_stem": ocr_result["combined"],
                 "question_type": "short_answer",
@@ -1,6 +1,9 @@
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, AsyncIterator
+from ollama import AsyncClient
 from app.core.config import settings
-from mathesis_core.llm.clients import create_ollama_client
+from app.core.llm_gateway import LLMDeadlineExceeded, llm_gateway, shared_ollama_client
+from app.core.llm_metrics import llm_metrics
 from mathesis_core.llm.parsers import LLMJSONParser
 
 class OllamaService:
@@ -10,13 +13,15 @@ class OllamaService:
     """
 
     def __init__(self):
-        self.client = create_ollama_client(
-            base_url=settings.OLLAMA_BASE_URL,
-            model=settings.OLLAMA_TEXT_MODEL,
+        self.client = shared_ollama_client(
+            settings.OLLAMA_BASE_URL,
+            settings.OLLAMA_TEXT_MODEL,
             async_mode=True
         )
         self.vision_model = settings.OLLAMA_VISION_MODEL
         self.text_model = settings.OLLAMA_TEXT_MODEL
+        # Raw ollama client for token streaming (the mathesis_core client returns whole completions)
+        self.stream_client = AsyncClient(host=settings.OLLAMA_BASE_URL)
 
     async def generate_text(self, prompt: str, **kwargs) -> str:
         return await self.client.async_chat(
@@ -24,6 +29,37 @@ class OllamaService:
             **kwargs
         )
 
+    async def stream_text(
+        self, prompt: str, model: Optional[str] = None, format: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield response tokens as Ollama generates them. The stream holds one
+        LLM gateway slot until it is exhausted or closed.
+        """
+        model = model or self.text_model
+        with llm_metrics.call(model, "stream", (prompt,), bind=False) as call:
+            parts: List[str] = []
+            try:
+                async with llm_gateway.slot(model, call=call) as deadline:
+                    stream = await self.stream_client.generate(
+                        model=model, prompt=prompt, format=format, options=options, stream=True
+                    )
+                    async for chunk in stream:
+                        if deadline is not None and time.monotonic() > deadline:
+                            llm_gateway.limiter(model).record_timeout()
+                            raise LLMDeadlineExceeded(f"{model}: deadline passed during generation")
+                        if chunk.get("done"):
+                            call.finish(chunk)  # the final chunk carries Ollama's token counts
+                        token = chunk["response"]
+                        if token:
+                            call.first_token()
+                            parts.append(token)
+                            yield token
+            finally:
+                if call.completion_tokens is None:
+                    call.finish("".join(parts))
+
     async def chat(self, messages: List[Dict], **kwargs) -> str:
         return await self.client.async_chat(messages, **kwargs)
 
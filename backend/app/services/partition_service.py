@@ -0,0 +1,179 @@
+"""
+Partition manager for attempt_logs (Node 2 - Q-DNA).
+
+attempt_logs is range-partitioned by month on attempted_at
+(attempt_logs_yyyy_mm). This service keeps future partitions created ahead of
+time, detaches partitions past the retention window into the `archive` schema,
+and reports partition sizes.
+"""
+import asyncio
+import logging
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "attempt_logs"
+ARCHIVE_SCHEMA = "archive"
+PARTITION_NAME_RE = re.compile(rf"^{PARENT_TABLE}_(\d{{4}})_(\d{{2}})$")
+
+
+def add_months(month_start: date, months: int) -> date:
+    index = month_start.year * 12 + (month_start.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_start: date) -> str:
+    return f"{PARENT_TABLE}_{month_start.year:04d}_{month_start.month:02d}"
+
+
+def parse_partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+class PartitionManager:
+    """
+    Startup + periodic maintenance of attempt_logs partitions.
+
+    Indexes defined on the partitioned parent (idx_logs_user_question,
+    idx_logs_attempted_at) are created on each new partition automatically by
+    PostgreSQL when it is attached, so pre-creating a partition also
+    pre-creates its indexes.
+    """
+
+    def __init__(
+        self,
+        months_ahead: int = settings.ATTEMPT_PARTITION_MONTHS_AHEAD,
+        retention_months: int = settings.ATTEMPT_RETENTION_MONTHS,
+        interval_hours: float = settings.PARTITION_MAINTENANCE_INTERVAL_HOURS,
+    ):
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.interval_hours = interval_hours
+        self._task: Optional[asyncio.Task] = None
+
+    async def is_partitioned(self, db: AsyncSession) -> bool:
+        # Dev databases created with Base.metadata.create_all have a plain table
+        result = await db.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :parent AND c.relnamespace = 'public'::regnamespace"
+        ), {"parent": PARENT_TABLE})
+        return result.first() is not None
+
+    async def list_partitions(self, db: AsyncSession) -> List[str]:
+        result = await db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent ORDER BY c.relname"
+        ), {"parent": PARENT_TABLE})
+        return [row[0] for row in result.all()]
+
+    async def ensure_partitions(self, db: AsyncSession, today: Optional[date] = None) -> List[str]:
+        """Create monthly partitions from the current month through months_ahead."""
+        current = (today or date.today()).replace(day=1)
+        existing = set(await self.list_partitions(db))
+
+        created = []
+        for offset in range(self.months_ahead + 1):
+            start = add_months(current, offset)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            # Names and bounds are derived from dates only, never from user input
+            await db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+            ))
+            created.append(name)
+        return created
+
+    async def detach_expired(self, db: AsyncSession, today: Optional[date] = None) -> List[str]:
+        """Detach partitions older than the retention window and move them to the archive schema."""
+        if self.retention_months <= 0:
+            return []
+        cutoff = add_months((today or date.today()).replace(day=1), -self.retention_months)
+
+        archived = []
+        for name in await self.list_partitions(db):
+            month = parse_partition_month(name)
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+            await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+            await db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            await db.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            archived.append(name)
+        return archived
+
+    async def partition_sizes(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        result = await db.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bounds, "
+            "pg_total_relation_size(c.oid) AS total_bytes, c.reltuples::bigint AS row_estimate "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent ORDER BY c.relname"
+        ), {"parent": PARENT_TABLE})
+        return [
+            {
+                "name": row.relname,
+                "bounds": row.bounds,
+                "total_bytes": row.total_bytes,
+                "row_estimate": max(row.row_estimate, 0),
+            }
+            for row in result.all()
+        ]
+
+    async def run_maintenance(self) -> Dict[str, List[str]]:
+        async with SessionLocal() as db:
+            if not await self.is_partitioned(db):
+                logger.warning(f"{PARENT_TABLE} is not partitioned; skipping partition maintenance")
+                return {"created": [], "archived": []}
+            created = await self.ensure_partitions(db)
+            archived = await self.detach_expired(db)
+            await db.commit()
+
+        if created or archived:
+            logger.info(f"Partition maintenance: created={created} archived={archived}")
+        return {"created": created, "archived": archived}
+
+    async def start(self) -> None:
+        """Run maintenance once now, then periodically in the background."""
+        try:
+            await self.run_maintenance()
+        except Exception as e:
+            logger.error(f"Startup partition maintenance failed: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="attempt-partition-maintenance")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_hours * 3600)
+            try:
+                await self.run_maintenance()
+            except Exception as e:
+                logger.error(f"Periodic partition maintenance failed: {e}")
+
+
+partition_manager = PartitionManager()
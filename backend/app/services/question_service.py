@@ -66,6 +66,9 @@ class QuestionService:
 
         await db.commit()
         await db.refresh(db_question)
+
+        from app.services.recommender_service import recommender_service
+        await recommender_service.refresh_questions(db, [db_question.question_id])
         return db_question
 
     async def get_questions_by_curriculum(
@@ -106,6 +109,32 @@ class QuestionService:
         db.add(q)
         await db.commit()
         await db.refresh(q)
+
+        from app.services.recommender_service import recommender_service
+        await recommender_service.refresh_questions(db, [q.question_id])
         return q
 
+    async def save_twin(
+        self, db: AsyncSession, original: Question, twin_in: QuestionCreate
+    ) -> Question:
+        """
+        Saves a generated twin question (status 'generated') under the original's owner.
+        """
+        db_question = Question(
+            question_type=twin_in.question_type,
+            content_stem=twin_in.content_stem,
+            content_metadata=twin_in.content_metadata.model_dump(), # JSONB serialization
+            answer_key=twin_in.answer_key,
+            difficulty_index=twin_in.difficulty_index,
+            created_by=original.created_by, # Inherit owner for now
+            status="generated"
+        )
+        db.add(db_question)
+        await db.commit()
+        await db.refresh(db_question)
+
+        from app.services.recommender_service import recommender_service
+        await recommender_service.refresh_questions(db, [db_question.question_id])
+        return db_question
+
 question_service = QuestionService()
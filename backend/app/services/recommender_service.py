@@ -0,0 +1,361 @@
+"""
+Real-time question recommender for Node 2 (Q-DNA).
+
+The item bank is held in memory, bucketed by curriculum node, by skill tag
+and as one global bucket. Each bucket keeps its items sorted by IRT
+difficulty b, so a request bisects to the student's ability, scans outward
+over a bounded window, and ranks the candidates by 2PL Fisher information
+a^2 * P * (1 - P). Items the student already attempted are skipped.
+
+Ability per skill comes from BKT mastery: theta = logit(p_mastery).
+Item parameters come from the IRT calibration (discrimination = a,
+difficulty_index = sigmoid(b)); uncalibrated items use a = 1.
+"""
+import asyncio
+import logging
+import math
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.attempt import AttemptLog
+from app.models.question import Question, QuestionCurriculum, QuestionTag
+from app.models.student_mastery import StudentMastery
+from app.models.tag import Tag
+from app.services.bkt_service import SKILL_TAG_TYPES
+
+logger = logging.getLogger(__name__)
+
+NOT_RECOMMENDABLE_STATUSES = ("archived",)
+MASTERED_P = 0.95
+THETA_BOUNDS = (-4.0, 4.0)
+
+# Candidates gathered per requested item before ranking by information,
+# and a hard cap on items inspected per bucket (students with huge histories)
+CANDIDATE_FACTOR = 4
+MAX_SCAN_PER_BUCKET = 5000
+LOAD_CHUNK_ROWS = 5000
+
+ALL_ITEMS = ("all", None)
+
+BucketKey = Tuple[str, Hashable]
+
+
+@dataclass(frozen=True)
+class IndexedItem:
+    question_id: uuid.UUID
+    a: float
+    b: float
+    node_ids: Tuple[int, ...] = ()
+    tags: Tuple[str, ...] = ()
+
+    def bucket_keys(self) -> List[BucketKey]:
+        return [ALL_ITEMS] + [("node", n) for n in self.node_ids] + [("tag", t) for t in self.tags]
+
+
+def logit(p: float) -> float:
+    p = min(max(p, 1e-4), 1 - 1e-4)
+    return math.log(p / (1.0 - p))
+
+
+def information(a: float, b: float, theta: float) -> float:
+    """2PL Fisher information of an item at ability theta."""
+    p = 1.0 / (1.0 + math.exp(-a * (theta - b)))
+    return a * a * p * (1.0 - p)
+
+
+class ItemBucket:
+    """Items of one bucket as parallel lists sorted by difficulty."""
+    __slots__ = ("difficulties", "question_ids")
+
+    def __init__(self):
+        self.difficulties: List[float] = []
+        self.question_ids: List[uuid.UUID] = []
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def add(self, b: float, question_id: uuid.UUID) -> None:
+        i = bisect_right(self.difficulties, b)
+        self.difficulties.insert(i, b)
+        self.question_ids.insert(i, question_id)
+
+    def remove(self, b: float, question_id: uuid.UUID) -> None:
+        i = bisect_left(self.difficulties, b)
+        while i < len(self.question_ids) and self.question_ids[i] != question_id:
+            i += 1
+        if i < len(self.question_ids):
+            del self.difficulties[i]
+            del self.question_ids[i]
+
+    def nearest(self, theta: float, exclude: Set[uuid.UUID], limit: int) -> List[uuid.UUID]:
+        """Up to `limit` non-excluded items, closest in difficulty to theta first."""
+        n = len(self.question_ids)
+        hi = bisect_left(self.difficulties, theta)
+        lo = hi - 1
+        picked: List[uuid.UUID] = []
+        scanned = 0
+        while len(picked) < limit and (lo >= 0 or hi < n) and scanned < MAX_SCAN_PER_BUCKET:
+            if hi < n and (lo < 0 or self.difficulties[hi] - theta <= theta - self.difficulties[lo]):
+                question_id = self.question_ids[hi]
+                hi += 1
+            else:
+                question_id = self.question_ids[lo]
+                lo -= 1
+            scanned += 1
+            if question_id not in exclude:
+                picked.append(question_id)
+        return picked
+
+
+class ItemIndex:
+
+    def __init__(self):
+        self.items: Dict[uuid.UUID, IndexedItem] = {}
+        self.buckets: Dict[BucketKey, ItemBucket] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @classmethod
+    def build(cls, items: Iterable[IndexedItem]) -> "ItemIndex":
+        """Bulk build: group per bucket and sort once instead of inserting one by one."""
+        index = cls()
+        grouped: Dict[BucketKey, List[Tuple[float, uuid.UUID]]] = {}
+        for item in items:
+            index.items[item.question_id] = item
+            for key in item.bucket_keys():
+                grouped.setdefault(key, []).append((item.b, item.question_id))
+        for key, entries in grouped.items():
+            entries.sort(key=lambda e: e[0])
+            bucket = index.buckets[key] = ItemBucket()
+            bucket.difficulties = [b for b, _ in entries]
+            bucket.question_ids = [qid for _, qid in entries]
+        return index
+
+    def upsert(self, item: IndexedItem) -> None:
+        self.remove(item.question_id)
+        self.items[item.question_id] = item
+        for key in item.bucket_keys():
+            self.buckets.setdefault(key, ItemBucket()).add(item.b, item.question_id)
+
+    def remove(self, question_id: uuid.UUID) -> None:
+        old = self.items.pop(question_id, None)
+        if old is None:
+            return
+        for key in old.bucket_keys():
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.remove(old.b, question_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def best(self, key: BucketKey, theta: float, exclude: Set[uuid.UUID], count: int) -> List[Tuple[uuid.UUID, float]]:
+        """The `count` most informative items at theta in one bucket, as (question_id, information)."""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return []
+        candidates = bucket.nearest(theta, exclude, count * CANDIDATE_FACTOR)
+        scored = [(qid, information(self.items[qid].a, self.items[qid].b, theta)) for qid in candidates]
+        scored.sort(key=lambda s: s[1], reverse=True)
+        return scored[:count]
+
+
+class RecommenderService:
+    """
+    Owns the process-wide ItemIndex.
+
+    The index is built on first use. Question writes in this process call
+    refresh_questions(); in addition, questions whose updated_at moved past
+    the last poll are picked up in the background every
+    RECOMMENDER_REFRESH_SECONDS, which also covers other worker processes.
+    """
+
+    def __init__(self, refresh_seconds: float = settings.RECOMMENDER_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.index: Optional[ItemIndex] = None
+        self._watermark: Optional[datetime] = None
+        self._polled_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def load_items(self, db: AsyncSession, question_ids: Optional[List[uuid.UUID]] = None) -> List[IndexedItem]:
+        """Questions plus their node and skill-tag links: three set-based queries per chunk."""
+        def scoped(stmt, column):
+            return stmt if question_ids is None else stmt.where(column.in_(chunk))
+
+        chunks = [None] if question_ids is None else [
+            question_ids[i:i + LOAD_CHUNK_ROWS] for i in range(0, len(question_ids), LOAD_CHUNK_ROWS)
+        ]
+        items: List[IndexedItem] = []
+        for chunk in chunks:
+            questions = (await db.execute(scoped(
+                select(Question.question_id, Question.difficulty_index, Question.discrimination)
+                .where(Question.status.notin_(NOT_RECOMMENDABLE_STATUSES)),
+                Question.question_id,
+            ))).all()
+            nodes: Dict[uuid.UUID, List[int]] = {}
+            for question_id, node_id in (await db.execute(scoped(
+                select(QuestionCurriculum.question_id, QuestionCurriculum.node_id), QuestionCurriculum.question_id
+            ))).all():
+                nodes.setdefault(question_id, []).append(node_id)
+            tags: Dict[uuid.UUID, List[str]] = {}
+            for question_id, name in (await db.execute(scoped(
+                select(QuestionTag.question_id, Tag.name)
+                .join(Tag, Tag.tag_id == QuestionTag.tag_id)
+                .where(Tag.tag_type.in_(SKILL_TAG_TYPES)),
+                QuestionTag.question_id,
+            ))).all():
+                tags.setdefault(question_id, []).append(name)
+
+            items.extend(
+                IndexedItem(
+                    question_id=question_id,
+                    a=discrimination if discrimination else 1.0,
+                    b=logit(0.5 if difficulty_index is None else difficulty_index),
+                    node_ids=tuple(nodes.get(question_id, ())),
+                    tags=tuple(tags.get(question_id, ())),
+                )
+                for question_id, difficulty_index, discrimination in questions
+            )
+        return items
+
+    async def get_index(self, db: AsyncSession) -> ItemIndex:
+        if self.index is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self.index is None:
+                    started = time.perf_counter()
+                    watermark = await self._max_updated_at(db)
+                    index = ItemIndex.build(await self.load_items(db))
+                    self.index, self._watermark, self._polled_at = index, watermark, time.monotonic()
+                    logger.info(
+                        f"Recommender index built: {len(index)} items, {len(index.buckets)} buckets "
+                        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+                    )
+        elif self._stale() and (self._refresh_task is None or self._refresh_task.done()):
+            self._polled_at = time.monotonic()
+            self._refresh_task = asyncio.create_task(self._poll_updates(), name="recommender-index-refresh")
+        return self.index
+
+    def _stale(self) -> bool:
+        return bool(self.refresh_seconds) and time.monotonic() - self._polled_at >= self.refresh_seconds
+
+    async def _max_updated_at(self, db: AsyncSession) -> Optional[datetime]:
+        return (await db.execute(select(func.max(Question.updated_at)))).scalar()
+
+    async def _poll_updates(self) -> None:
+        try:
+            async with SessionLocal() as db:
+                stmt = select(Question.question_id, Question.updated_at)
+                if self._watermark is not None:
+                    stmt = stmt.where(Question.updated_at > self._watermark)
+                changed = (await db.execute(stmt)).all()
+                if changed:
+                    await self.refresh_questions(db, [qid for qid, _ in changed])
+                    self._watermark = max(updated_at for _, updated_at in changed)
+        except Exception as e:
+            logger.error(f"Recommender index refresh failed: {e}")
+
+    async def refresh_questions(self, db: AsyncSession, question_ids: Iterable[uuid.UUID]) -> None:
+        """Re-read the given questions and update (or drop) their index entries."""
+        if self.index is None:
+            return
+        ids = list(dict.fromkeys(question_ids))
+        if not ids:
+            return
+        loaded = {item.question_id: item for item in await self.load_items(db, ids)}
+        for question_id in ids:
+            if question_id in loaded:
+                self.index.upsert(loaded[question_id])
+            else:
+                self.index.remove(question_id)
+
+    def invalidate(self) -> None:
+        self.index = None
+
+    async def student_state(self, db: AsyncSession, user_id: uuid.UUID) -> Tuple[Dict[str, float], Set[uuid.UUID]]:
+        """({skill: p_mastery}, attempted question ids) with two indexed lookups."""
+        mastery = dict((await db.execute(
+            select(StudentMastery.skill_id, StudentMastery.p_mastery).where(StudentMastery.user_id == user_id)
+        )).all())
+        attempted = set((await db.execute(
+            select(AttemptLog.question_id).where(AttemptLog.user_id == user_id).distinct()
+        )).scalars().all())
+        return mastery, attempted
+
+    async def recommend(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        count: int = 5,
+        node_id: Optional[int] = None,
+        tag: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        index = await self.get_index(db)
+        mastery, attempted = await self.student_state(db, user_id)
+        return self.choose(index, mastery, attempted, count, node_id=node_id, tag=tag)
+
+    def choose(
+        self,
+        index: ItemIndex,
+        mastery: Dict[str, float],
+        attempted: Set[uuid.UUID],
+        count: int,
+        node_id: Optional[int] = None,
+        tag: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Pure selection step: max-information items per target, weakest target first."""
+        thetas = {skill: min(max(logit(p), THETA_BOUNDS[0]), THETA_BOUNDS[1]) for skill, p in mastery.items() if p is not None}
+        overall = sum(thetas.values()) / len(thetas) if thetas else 0.0
+
+        if node_id is not None:
+            targets = [(("node", node_id), overall)]
+        elif tag is not None:
+            targets = [(("tag", tag), thetas.get(tag, overall))]
+        else:
+            weak = sorted((p, skill) for skill, p in mastery.items() if p is not None and p < MASTERED_P)
+            targets = [(("tag", skill), thetas[skill]) for _, skill in weak if ("tag", skill) in index.buckets]
+            if not targets:
+                targets = [(ALL_ITEMS, overall)]
+
+        # Round-robin takes at most one item per target per round, so only the
+        # first `count` targets matter and each needs only its share (+ slack
+        # for items shared between targets)
+        targets = targets[:count]
+        per_target = min(count, -(-count // len(targets)) + 2)
+        ranked = [(key, theta, index.best(key, theta, attempted, per_target)) for key, theta in targets]
+
+        # Round-robin over targets so the weakest skills are all represented
+        picked: List[Dict[str, Any]] = []
+        seen: Set[uuid.UUID] = set()
+        for position in range(count):
+            for (kind, value), theta, items in ranked:
+                if len(picked) >= count:
+                    return picked
+                if position >= len(items) or items[position][0] in seen:
+                    continue
+                question_id, info = items[position]
+                seen.add(question_id)
+                item = index.items[question_id]
+                picked.append({
+                    "question_id": question_id,
+                    "target": {"type": kind, "value": value},
+                    "theta": round(theta, 3),
+                    "information": round(info, 4),
+                    "discrimination": round(item.a, 4),
+                    "difficulty": round(item.b, 4),
+                })
+        return picked
+
+
+recommender_service = RecommenderService()
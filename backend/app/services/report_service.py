@@ -1,11 +1,79 @@
 from jinja2 import Environment, FileSystemLoader
 from weasyprint import HTML
+import asyncio
+import hashlib
 import os
+import time
 from typing import Dict, Any
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.single_flight import SingleFlight
+
+WEEKLY_REPORT_TEMPLATE = "weekly_report.html"
+ERROR_WORKSHEET_TEMPLATE = "error_worksheet.html"
+
+# Per-process template environments for the cohort render pool
+_worker_envs: Dict[str, Environment] = {}
+
+
+def report_store_path(output_dir: str, digest: str) -> str:
+    """Content-addressed location of a rendered report: <dir>/<ab>/<abcdef...>.pdf"""
+    return os.path.join(output_dir, digest[:2], f"{digest}.pdf")
+
+
+def write_atomic(path: str, content: bytes) -> None:
+    """Write-then-rename so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def render_report_to_store(template_dir: str, output_dir: str, student_id: str,
+                           student_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process-pool worker: render one weekly report into the content-addressed store.
+
+    The address is the SHA-256 of the rendered HTML, so a report whose inputs
+    have not changed is found on disk and is not rendered again.
+    """
+    env = _worker_envs.get(template_dir)
+    if env is None:
+        env = _worker_envs[template_dir] = Environment(loader=FileSystemLoader(template_dir))
+
+    started = time.perf_counter()
+    html_content = env.get_template(WEEKLY_REPORT_TEMPLATE).render({"student_name": student_name, **data})
+    digest = hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+    path = report_store_path(output_dir, digest)
+    result = {"student_id": student_id, "sha256": digest, "path": path, "cached": True,
+              "render_ms": 0.0, "write_ms": 0.0}
+    if os.path.exists(path):
+        return result
+
+    pdf_bytes = HTML(string=html_content).write_pdf()
+    rendered = time.perf_counter()
+
+    write_atomic(path, pdf_bytes)
+
+    result.update(
+        cached=False,
+        bytes=len(pdf_bytes),
+        render_ms=round((rendered - started) * 1000, 2),
+        write_ms=round((time.perf_counter() - rendered) * 1000, 2),
+    )
+    return result
+
 
 class ReportService:
-    def __init__(self, template_dir: str = "app/templates"):
+    def __init__(self, template_dir: str = "app/templates",
+                 worksheet_dir: str = os.path.join(settings.REPORT_OUTPUT_DIR, "worksheets")):
+        self.template_dir = template_dir
         self.env = Environment(loader=FileSystemLoader(template_dir))
+        # Error worksheets: memory tier over a content-addressed PDF store on disk
+        self.worksheet_dir = worksheet_dir
+        self.worksheet_pdfs: LRUCache[bytes] = LRUCache(settings.WORKSHEET_PDF_CACHE_ENTRIES)
+        self._render_flight = SingleFlight()
 
     def generate_report(self, student_name: str, data: Dict[str, Any], output_path: str = None) -> bytes:
         """
@@ -15,7 +83,7 @@ class ReportService:
         :param output_path: If provided, save PDF to this path.
         :return: PDF bytes
         """
-        template = self.env.get_template("weekly_report.html")
+        template = self.env.get_template(WEEKLY_REPORT_TEMPLATE)
         
         # Merge context
         context = {
@@ -36,9 +104,34 @@ class ReportService:
         """
         오류 찾기 워크시트 PDF 생성
         """
-        template = self.env.get_template("error_worksheet.html")
+        template = self.env.get_template(ERROR_WORKSHEET_TEMPLATE)
         html_content = template.render(data)
         pdf_bytes = HTML(string=html_content).write_pdf()
         return pdf_bytes
 
+    async def error_worksheet_pdf(self, data: Dict[str, Any]) -> bytes:
+        """
+        Cached error worksheet PDF, addressed by the SHA-256 of its rendered HTML.
+        Lookup order: memory, disk store, render; rendering runs in a thread so
+        the event loop keeps serving, and identical concurrent renders share one.
+        """
+        html_content = self.env.get_template(ERROR_WORKSHEET_TEMPLATE).render(data)
+        digest = hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+        pdf_bytes = self.worksheet_pdfs.get(digest)
+        if pdf_bytes is None:
+            pdf_bytes = await self._render_flight.do(
+                digest, lambda: asyncio.to_thread(self._load_or_render_pdf, html_content, digest)
+            )
+            self.worksheet_pdfs.set(digest, pdf_bytes)
+        return pdf_bytes
+
+    def _load_or_render_pdf(self, html_content: str, digest: str) -> bytes:
+        path = report_store_path(self.worksheet_dir, digest)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        pdf_bytes = HTML(string=html_content).write_pdf()
+        write_atomic(path, pdf_bytes)
+        return pdf_bytes
+
 report_service = ReportService()
@@ -0,0 +1,132 @@
+"""
+Per-student / per-curriculum-node score rollups for Node 2 (Q-DNA).
+
+Each batch of new attempts is mapped to curriculum nodes with one query,
+aggregated in memory, and added to student_node_rollups with a single
+INSERT ... ON CONFLICT DO UPDATE SET col = col + EXCLUDED.col. Writers apply
+it in the transaction that inserts the attempt_logs rows, so the rollups
+commit (or roll back) together with the logs they count.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import uuid
+import logging
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.question import QuestionCurriculum
+from app.models.student_rollup import StudentNodeRollup
+
+logger = logging.getLogger(__name__)
+
+# asyncpg bind limit (32767) / 7 columns per row
+UPSERT_CHUNK_ROWS = 4000
+
+
+@dataclass
+class RollupAttempt:
+    user_id: uuid.UUID
+    question_id: uuid.UUID
+    is_correct: bool
+    score: float
+    time_taken_ms: Optional[int]
+    attempted_at: Optional[datetime]
+
+
+def aggregate_deltas(
+    attempts: Iterable[RollupAttempt],
+    question_nodes: Dict[uuid.UUID, List[int]],
+) -> Dict[Tuple[uuid.UUID, int], Dict]:
+    """Fold attempts into one delta row per (user_id, node_id)."""
+    deltas: Dict[Tuple[uuid.UUID, int], Dict] = defaultdict(lambda: {
+        "attempt_count": 0, "correct_count": 0, "score_sum": 0.0, "time_sum_ms": 0, "last_attempt_at": None,
+    })
+    for a in attempts:
+        for node_id in question_nodes.get(a.question_id, ()):
+            d = deltas[(a.user_id, node_id)]
+            d["attempt_count"] += 1
+            d["correct_count"] += int(a.is_correct)
+            d["score_sum"] += a.score
+            d["time_sum_ms"] += a.time_taken_ms or 0
+            if a.attempted_at and (d["last_attempt_at"] is None or a.attempted_at > d["last_attempt_at"]):
+                d["last_attempt_at"] = a.attempted_at
+    return dict(deltas)
+
+
+class RollupService:
+
+    async def question_nodes(self, db: AsyncSession, question_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, List[int]]:
+        ids = {qid for qid in question_ids if qid is not None}
+        if not ids:
+            return {}
+        result = await db.execute(
+            select(QuestionCurriculum.question_id, QuestionCurriculum.node_id)
+            .where(QuestionCurriculum.question_id.in_(ids))
+        )
+        nodes: Dict[uuid.UUID, List[int]] = defaultdict(list)
+        for question_id, node_id in result.all():
+            nodes[question_id].append(node_id)
+        return nodes
+
+    async def apply_attempts(self, db: AsyncSession, attempts: Sequence[RollupAttempt]) -> int:
+        """
+        Add a batch of attempts to the rollups. Returns the number of rows
+        touched. Does not commit: the caller commits with the attempt rows.
+        """
+        if not attempts:
+            return 0
+        deltas = aggregate_deltas(attempts, await self.question_nodes(db, (a.question_id for a in attempts)))
+        if not deltas:
+            return 0
+
+        # Sorted keys give a stable lock order across concurrent batches
+        rows = [
+            {"user_id": user_id, "node_id": node_id, **delta}
+            for (user_id, node_id), delta in sorted(deltas.items(), key=lambda kv: (str(kv[0][0]), kv[0][1]))
+        ]
+        table = StudentNodeRollup.__table__
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            stmt = pg_insert(StudentNodeRollup).values(rows[start:start + UPSERT_CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.node_id],
+                set_={
+                    "attempt_count": table.c.attempt_count + stmt.excluded.attempt_count,
+                    "correct_count": table.c.correct_count + stmt.excluded.correct_count,
+                    "score_sum": table.c.score_sum + stmt.excluded.score_sum,
+                    "time_sum_ms": table.c.time_sum_ms + stmt.excluded.time_sum_ms,
+                    "last_attempt_at": func.greatest(table.c.last_attempt_at, stmt.excluded.last_attempt_at),
+                    "updated_at": func.now(),
+                },
+            )
+            await db.execute(stmt)
+        return len(rows)
+
+    async def get_user_rollups(self, db: AsyncSession, user_id: uuid.UUID) -> List[StudentNodeRollup]:
+        result = await db.execute(select(StudentNodeRollup).where(StudentNodeRollup.user_id == user_id))
+        return list(result.scalars().all())
+
+    async def rebuild(self, db: AsyncSession, user_id: Optional[uuid.UUID] = None) -> None:
+        """Recompute rollups from attempt_logs (all users, or one user)."""
+        user_filter = "WHERE a.user_id = :user_id" if user_id else ""
+        stmt = delete(StudentNodeRollup)
+        if user_id:
+            stmt = stmt.where(StudentNodeRollup.user_id == user_id)
+        await db.execute(stmt)
+        await db.execute(text(f"""
+            INSERT INTO student_node_rollups
+                (user_id, node_id, attempt_count, correct_count, score_sum, time_sum_ms, last_attempt_at)
+            SELECT a.user_id, qc.node_id, COUNT(*), COUNT(*) FILTER (WHERE a.is_correct),
+                   SUM(a.score), COALESCE(SUM(a.time_taken_ms), 0), MAX(a.attempted_at)
+            FROM attempt_logs a
+            JOIN question_curriculum qc ON qc.question_id = a.question_id
+            {user_filter}
+            GROUP BY a.user_id, qc.node_id
+        """), {"user_id": user_id} if user_id else {})
+        await db.commit()
+
+
+rollup_service = RollupService()
@@ -4,9 +4,11 @@ Refactored to use mathesis_core.analysis.DNAAnalyzer.
 """
 from typing import List, Dict
 from mathesis_core.analysis import DNAAnalyzer
-from mathesis_core.llm.clients import create_ollama_client
 from mathesis_core.exceptions import AnalysisError
 from app.core.config import settings
+from app.core.llm_gateway import shared_ollama_client
+from app.core.llm_metrics import llm_metrics, llm_template
+from app.services.analysis_cache_service import analysis_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,14 +27,23 @@ class TaggingService:
     def __init__(self):
         """Initialize Tagging Service with mathesis_core components."""
         # Create LLM client using mathesis_core
-        self.llm_client = create_ollama_client(
-            base_url=settings.OLLAMA_URL,
-            model=settings.OLLAMA_MODEL
-        )
+        self.llm_client = shared_ollama_client(settings.OLLAMA_URL, settings.OLLAMA_MODEL)
 
         # Use DNAAnalyzer from mathesis_core
         self.dna_analyzer = DNAAnalyzer(self.llm_client)
 
+    @llm_template("dna_analysis")
+    async def _analyze(self, question_text: str) -> Dict:
+        """
+        DNA analysis through the content-addressed analysis cache.
+        All three public methods share one cached result per question text.
+        """
+        return await analysis_cache.get_or_compute(
+            question_text,
+            settings.OLLAMA_MODEL,
+            lambda: self.dna_analyzer.analyze(question_text),
+        )
+
     async def get_tag_recommendations(self, question_text: str) -> List[Dict]:
         """
         AI Auto-Tagging logic using DNAAnalyzer.
@@ -48,21 +59,7 @@ class TaggingService:
             List of {"tag": str, "confidence": float, "type": str}
         """
         try:
-            # Delegate to DNAAnalyzer from mathesis_core
-            dna = await self.dna_analyzer.analyze(question_text)
-
-            # Extract tags from DNA result
-            tags = dna.get("tags", [])
-
-            # Validate and filter (same as before)
-            valid_tags = []
-            for tag_obj in tags:
-                if all(k in tag_obj for k in ["tag", "type", "confidence"]):
-                    # Ensure confidence is float
-                    tag_obj["confidence"] = float(tag_obj["confidence"])
-                    valid_tags.append(tag_obj)
-
-            return valid_tags
+            return await self.extract_tags(question_text)
 
         except AnalysisError as e:
             logger.error(f"Tagging error: {e}")
@@ -73,6 +70,28 @@ class TaggingService:
             logger.error(f"Unexpected tagging error: {e}")
             return self._fallback_tagging(question_text)
 
+    async def extract_tags(self, question_text: str) -> List[Dict]:
+        """
+        Validated tags from DNA analysis, without the keyword fallback.
+        Raises on analysis failure so batch jobs can leave the question untagged
+        and retry it later instead of storing fallback tags.
+        """
+        # Delegate to DNAAnalyzer from mathesis_core (through the shared analysis cache)
+        dna = await self._analyze(question_text)
+
+        # Extract tags from DNA result
+        tags = dna.get("tags", [])
+
+        # Validate and filter (same as before)
+        valid_tags = []
+        for tag_obj in tags:
+            if all(k in tag_obj for k in ["tag", "type", "confidence"]):
+                # Ensure confidence is float
+                tag_obj["confidence"] = float(tag_obj["confidence"])
+                valid_tags.append(tag_obj)
+
+        return valid_tags
+
     async def generate_metadata(self, question_text: str) -> Dict:
         """
         Generate comprehensive metadata using DNAAnalyzer.
@@ -95,8 +114,8 @@ class TaggingService:
             }
         """
         try:
-            # Delegate to DNAAnalyzer from mathesis_core
-            dna = await self.dna_analyzer.analyze(question_text)
+            # Delegate to DNAAnalyzer from mathesis_core (through the shared analysis cache)
+            dna = await self._analyze(question_text)
 
             # Extract metadata from DNA result
             metadata = dna.get("metadata", {})
@@ -134,8 +153,8 @@ class TaggingService:
             String like "Math.Algebra.Quadratics.Factoring"
         """
         try:
-            # Delegate to DNAAnalyzer from mathesis_core
-            dna = await self.dna_analyzer.analyze(question_text)
+            # Delegate to DNAAnalyzer from mathesis_core (through the shared analysis cache)
+            dna = await self._analyze(question_text)
 
             # Extract curriculum path from DNA result
             path = dna.get("curriculum_path", "General.Unknown")
@@ -146,6 +165,7 @@ class TaggingService:
 
         except Exception as e:
             logger.error(f"Curriculum path suggestion error: {e}")
+            llm_metrics.event("fallback", model=settings.OLLAMA_MODEL, detail="General.Unknown", template="dna_analysis")
             return "General.Unknown"
 
     def _fallback_tagging(self, question_text: str) -> List[Dict]:
@@ -153,6 +173,7 @@ class TaggingService:
         Simple keyword-based fallback when AI fails.
         This is service-specific logic (not in mathesis_core).
         """
+        llm_metrics.event("fallback", model=settings.OLLAMA_MODEL, detail="_fallback_tagging", template="dna_analysis")
         tags = []
         text_lower = question_text.lower()
 
@@ -178,6 +199,7 @@ class TaggingService:
 
     def _default_metadata(self) -> Dict:
         """Return default metadata when analysis fails."""
+        llm_metrics.event("fallback", model=settings.OLLAMA_MODEL, detail="_default_metadata", template="dna_analysis")
         return {
             "cognitive_level": "Apply",
             "difficulty_estimation": 0.5,
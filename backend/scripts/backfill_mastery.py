@@ -0,0 +1,52 @@
+"""
+Recompute student_mastery (BKT) from the full attempt_logs history.
+Run with: python -m scripts.backfill_mastery [--workers 4] [--checkpoint data/mastery_backfill.json]
+Re-running with the same checkpoint resumes after the last completed user.
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.mastery_backfill_service import BKTParams, MasteryBackfillService, SHARD_ATTEMPTS
+
+
+def print_progress(progress):
+    p = progress.to_dict()
+    print(f"  users={p['users']} attempts={p['attempts']} pairs={p['pairs']} "
+          f"({p['attempts_per_second']:.0f} attempts/s) last_user={p['last_user_id']}")
+
+
+async def main(args):
+    params = BKTParams(
+        p_mastery=args.p_mastery, p_transit=args.p_transit, p_slip=args.p_slip, p_guess=args.p_guess
+    )
+    service = MasteryBackfillService(workers=args.workers, shard_attempts=args.shard_attempts)
+    print("🧠 Backfilling student_mastery from attempt_logs...")
+    progress = await service.run(
+        params=params,
+        checkpoint_path=args.checkpoint,
+        resume=not args.restart,
+        truncate=args.truncate,
+        on_progress=print_progress,
+    )
+    print(f"\n✅ Done: {progress.to_dict()}")
+
+
+if __name__ == "__main__":
+    defaults = BKTParams()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=0, help="Process pool size (0 = one per CPU)")
+    parser.add_argument("--shard-attempts", type=int, default=SHARD_ATTEMPTS)
+    parser.add_argument("--checkpoint", default="data/mastery_backfill.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--truncate", action="store_true", help="Clear student_mastery first (fresh runs only)")
+    parser.add_argument("--p-mastery", type=float, default=defaults.p_mastery)
+    parser.add_argument("--p-transit", type=float, default=defaults.p_transit)
+    parser.add_argument("--p-slip", type=float, default=defaults.p_slip)
+    parser.add_argument("--p-guess", type=float, default=defaults.p_guess)
+    asyncio.run(main(parser.parse_args()))
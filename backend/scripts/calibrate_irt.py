@@ -0,0 +1,37 @@
+"""
+Calibrate 2PL IRT parameters for every question from attempt_logs.
+Writes questions.discrimination and questions.difficulty_index.
+Run with: python -m scripts.calibrate_irt [--since 2025-01-01] [--min-responses 30] [--cold]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.irt_service import irt_calibration_service
+
+
+async def main(args):
+    since = datetime.fromisoformat(args.since).astimezone() if args.since else None
+    print("📐 Calibrating item parameters (2PL, EM/MML)...")
+    async with SessionLocal() as db:
+        summary = await irt_calibration_service.calibrate(
+            db, since=since, min_responses=args.min_responses, warm_start=not args.cold
+        )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--since", help="Only use attempts on or after this ISO date")
+    parser.add_argument("--min-responses", type=int, default=settings.IRT_MIN_RESPONSES)
+    parser.add_argument("--cold", action="store_true", help="Ignore the previous calibration")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,34 @@
+"""
+Run background job workers outside the API process.
+Run with: python -m scripts.run_job_worker [--workers 4]
+Set JOB_WORKERS=0 for the API processes when jobs run here instead.
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.job_service import job_service
+
+
+async def main(args):
+    print(f"🛠️  Starting {args.workers} job workers ({job_service.worker_id})...")
+    await job_service.start(workers=args.workers)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=max(settings.JOB_WORKERS, 1))
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("\n🛑 Job workers stopped")
@@ -0,0 +1,55 @@
+"""
+Serve the record/replay Ollama stand-in (app/devtools/ollama_standin.py).
+Run with:
+    python -m scripts.run_ollama_standin --upstream http://localhost:11434   # record
+    python -m scripts.run_ollama_standin --profile gpu --seed 7              # replay
+then start the backend with OLLAMA_BASE_URL=http://localhost:11435.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import uvicorn
+
+from app.devtools.ollama_standin import PROFILES, Cassette, LatencyProfile, OllamaStandin
+
+
+def build_profile(args) -> LatencyProfile:
+    base = PROFILES[args.profile]
+    return LatencyProfile(
+        name=base.name,
+        ttft_ms=base.ttft_ms if args.ttft_ms is None else args.ttft_ms,
+        tokens_per_second=base.tokens_per_second if args.tokens_per_second is None else args.tokens_per_second,
+        jitter=base.jitter if args.jitter is None else args.jitter,
+        use_recorded=base.use_recorded,
+        speed=args.speed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", default="data/llm_cassette.jsonl")
+    parser.add_argument("--upstream", help="Real Ollama URL; enables record mode")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="gpu")
+    parser.add_argument("--ttft-ms", type=float, help="Override the profile's time to first token")
+    parser.add_argument("--tokens-per-second", type=float, help="Override the profile's token rate (0 = no delay)")
+    parser.add_argument("--jitter", type=float, help="Override the profile's jitter (0.1 = +/-10%%)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Divide every delay by this factor")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--on-miss", choices=["any", "error"], default="any",
+                        help="Unrecorded requests: replay a recording for the same model, or 404")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    args = parser.parse_args()
+
+    standin = OllamaStandin(
+        Cassette(args.cassette), profile=build_profile(args), seed=args.seed,
+        on_miss=args.on_miss, upstream=args.upstream,
+    )
+    mode = f"recording from {args.upstream}" if args.upstream else f"replaying with profile '{args.profile}'"
+    print(f"🦙 Ollama stand-in on http://{args.host}:{args.port} ({mode}, {len(standin.cassette.entries)} recordings)")
+    uvicorn.run(standin.app(), host=args.host, port=args.port, log_level="warning")
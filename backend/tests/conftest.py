@@ -0,0 +1,27 @@
+"""
+Shared test setup.
+
+tests/test_models.py replaces sqlalchemy in sys.modules with Mocks when it is
+imported, so every test file collected after it (and every service those
+files import first) would get Mocks too. The real modules are put back
+before each other test file is collected, so SQL assertions do not depend
+on file order.
+"""
+import sys
+
+import pytest
+import sqlalchemy  # noqa: F401
+import sqlalchemy.dialects.postgresql  # noqa: F401
+import sqlalchemy.ext.asyncio  # noqa: F401
+import sqlalchemy.orm  # noqa: F401
+import sqlalchemy.sql  # noqa: F401
+
+_REAL_SQLALCHEMY = {
+    name: module for name, module in sys.modules.items()
+    if name == "sqlalchemy" or name.startswith("sqlalchemy.")
+}
+
+
+def pytest_collectstart(collector):
+    if isinstance(collector, pytest.Module) and collector.path.name != "test_models.py":
+        sys.modules.update(_REAL_SQLALCHEMY)
@@ -0,0 +1,108 @@
+"""Tests for app/services/analysis_cache_service.py"""
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, Mock
+
+from app.core.cache import LRUCache
+from app.services import analysis_cache_service
+from app.services.analysis_cache_service import AnalysisCache, analysis_key
+
+
+def test_key_ignores_whitespace_but_not_model_or_prompt_version():
+    base = analysis_key("x^2 + 1 = 0 을 푸시오", "qwen2.5", "v1")
+
+    assert analysis_key("  x^2 +  1 = 0\n을 푸시오 ", "qwen2.5", "v1") == base
+    assert analysis_key("X^2 + 1 = 0 을 푸시오", "qwen2.5", "v1") != base
+    assert analysis_key("x^2 + 1 = 0 을 푸시오", "llama3", "v1") != base
+    assert analysis_key("x^2 + 1 = 0 을 푸시오", "qwen2.5", "v2") != base
+
+
+def test_lru_evicts_least_recently_used_and_expires():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "b" not in cache and cache.get("a") == 1
+    assert cache.stats.evictions == 1
+
+    expiring = LRUCache(maxsize=2, ttl_seconds=1e-9)
+    expiring.set("a", 1)
+    assert expiring.get("a") is None
+    assert expiring.stats.expirations == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_calls_analyzer_once_and_returns_copies():
+    cache = AnalysisCache(max_entries=16, ttl_seconds=0, prompt_version="v1", persistent=False)
+    analyze = AsyncMock(return_value={"metadata": {}, "tags": []})
+
+    first = await cache.get_or_compute("2x = 4", "m", analyze)
+    first["metadata"]["cognitive_level"] = "Mutated"
+    second = await cache.get_or_compute(" 2x  = 4 ", "m", analyze)
+
+    assert analyze.await_count == 1
+    assert second == {"metadata": {}, "tags": []}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_analysis_is_not_cached():
+    cache = AnalysisCache(max_entries=16, ttl_seconds=0, prompt_version="v1", persistent=False)
+    analyze = AsyncMock(side_effect=[RuntimeError("ollama down"), {"tags": []}])
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("2x = 4", "m", analyze)
+    assert await cache.get_or_compute("2x = 4", "m", analyze) == {"tags": []}
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier_hit_skips_analyzer(monkeypatch):
+    db = AsyncMock()
+    result = Mock()
+    result.scalar_one_or_none.return_value = {"tags": [{"tag": "Algebra"}]}
+    db.execute.return_value = result
+
+    @asynccontextmanager
+    async def session():
+        yield db
+
+    monkeypatch.setattr(analysis_cache_service, "SessionLocal", session)
+    cache = AnalysisCache(max_entries=16, ttl_seconds=60, prompt_version="v1", persistent=True)
+    analyze = AsyncMock()
+
+    assert await cache.get_or_compute("2x = 4", "m", analyze) == {"tags": [{"tag": "Algebra"}]}
+    assert await cache.get_or_compute("2x = 4", "m", analyze) == {"tags": [{"tag": "Algebra"}]}
+    analyze.assert_not_awaited()
+    assert db.execute.await_count == 1  # second lookup answered from memory
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier_failure_degrades_to_analyzer(monkeypatch):
+    @asynccontextmanager
+    async def broken_session():
+        raise ConnectionError("db unavailable")
+        yield
+
+    monkeypatch.setattr(analysis_cache_service, "SessionLocal", broken_session)
+    cache = AnalysisCache(max_entries=16, ttl_seconds=60, prompt_version="v1", persistent=True)
+    analyze = AsyncMock(return_value={"tags": []})
+
+    assert await cache.get_or_compute("2x = 4", "m", analyze) == {"tags": []}
+    assert cache.stats()["persistent"]["errors"] == 2  # read and write both failed
+
+
+@pytest.mark.asyncio
+async def test_background_task_purges_expired_rows():
+    cache = AnalysisCache(max_entries=16, ttl_seconds=60, prompt_version="v1", persistent=True,
+                          purge_interval_hours=1.0)
+    cache.purge_expired = AsyncMock(return_value=3)
+
+    await cache.start()
+    await asyncio.sleep(0)
+    await cache.stop()
+
+    cache.purge_expired.assert_awaited_once()
+    assert cache._task is None
@@ -0,0 +1,68 @@
+"""Tests for app/services/answer_check_service.py"""
+import pytest
+
+from app.services.answer_check_service import AnswerChecker, correct_diagnosis, normalize_answer
+
+
+def test_normalize_answer_strips_notation():
+    assert normalize_answer(" 답: $x = \\frac{1}{2}$ ") == "x=((1)/(2))"
+    assert normalize_answer("2√2 × 3") == "2sqrt(2)*3"
+    assert normalize_answer("1,000입니다.") == "1000"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("student, correct, method", [
+    ("x = 3", "3", "exact"),
+    ("50%", "1/2", "numeric"),
+    ("3.0000000001", "3", "numeric"),
+    ("(x+1)^2", "x^2+2x+1", "symbolic"),
+    ("\\sqrt{2}/2", "1/√2", "symbolic"),
+    ("x = 2, -1", "x=-1, 2", "exact"),
+])
+async def test_equivalent_answers_are_proven(student, correct, method):
+    check = await AnswerChecker().check(student, correct)
+    assert (check.equivalent, check.method) == (True, method)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("student, correct", [
+    ("(x+1)(x-1)", "(x+1)^2"),
+    ("(1, 2)", "(2, 1)"),
+    ("3.01", "3"),
+    ("__import__('os')", "0"),
+    ("x.n", "x"),
+    ("모르겠어요", "3"),
+    ("3", None),
+    ("1, 234", "1234"),
+    ("9^9^9", "1"),
+    ("((2^64)^64)^64", "2"),
+    ("9^(99999*99999)", "1"),
+])
+async def test_other_answers_are_left_to_the_llm(student, correct):
+    checker = AnswerChecker()
+    assert not (await checker.check(student, correct)).equivalent
+    assert checker.get_stats()["proven"] == 0
+
+
+@pytest.mark.asyncio
+async def test_form_questions_need_the_requested_form():
+    checker = AnswerChecker()
+    question = "x^2 + 2x + 1을 인수분해하시오."
+
+    check = await checker.check("x^2+2x+1", "(x+1)^2", question)
+    assert (check.equivalent, check.reason) == (False, "question asks for a form")
+    assert (await checker.check("(x + 1)^2", "(x+1)^2", question)).method == "exact"
+    assert (await checker.check("0.5", "1/2", "Simplify 2/4")).method == "numeric"
+
+
+@pytest.mark.asyncio
+async def test_correct_diagnosis_and_stats():
+    checker = AnswerChecker()
+    check = await checker.check("2x+2x", "4x")
+    await checker.check("1", "2")
+
+    result = correct_diagnosis("s1", "q1", check)
+    assert (result["is_correct"], result["error_type"], result["confidence"]) == (True, None, 1.0)
+    assert result["kg_operations"] == [] and "4x" in result["reasoning_trace"]
+    stats = checker.get_stats()
+    assert (stats["checked"], stats["symbolic"], stats["not_proven"], stats["hit_rate"]) == (2, 1, 1, 0.5)
@@ -0,0 +1,163 @@
+"""Tests for app/services/auto_tag_service.py"""
+import asyncio
+import uuid
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from app.core.llm_gateway import Priority, current_priority
+from app.models.auto_tag_job import AutoTagJob
+from app.services.auto_tag_service import AutoTagService, clean_tags, link_rows, tag_key
+
+
+class FakeTagger:
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.active = 0
+        self.max_active = 0
+        self.priorities = set()
+
+    async def extract_tags(self, text):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.priorities.add(current_priority())
+        await asyncio.sleep(0)
+        self.active -= 1
+        if text in self.fail_on:
+            raise RuntimeError("ollama unavailable")
+        return [{"tag": "Algebra", "type": "concept", "confidence": 0.9}]
+
+
+def _job(**kwargs):
+    fields = dict(job_id=uuid.uuid4(), status="running", retag=False, processed=0, total=0)
+    fields.update(kwargs)
+    return AutoTagJob(**fields)
+
+
+def test_link_rows_keep_highest_confidence_per_question_tag():
+    qid = uuid.uuid4()
+    tags = [
+        {"tag": "Algebra ", "type": "concept", "confidence": 0.4},
+        {"tag": "Algebra", "type": "concept", "confidence": 0.8},
+    ]
+    rows = link_rows([(qid, tags)], {("Algebra", "concept"): 7})
+
+    assert rows == [{"question_id": qid, "tag_id": 7, "confidence": 0.8, "auto_tagged": True}]
+    assert len(tag_key({"tag": "x" * 300, "type": "concept"})[0]) == 100
+
+
+def test_clean_tags_maps_unknown_types_to_custom():
+    tags, fixed = clean_tags([
+        {"tag": "Algebra", "type": "Concept", "confidence": 0.9},
+        {"tag": "Vieta", "type": "theorem", "confidence": "high"},
+        {"tag": " ", "type": "skill", "confidence": 0.5},
+        "Quadratics",
+    ])
+
+    assert [(t["tag"], t["type"], t["confidence"]) for t in tags] == [("Algebra", "concept", 0.9), ("Vieta", "custom", 0.0)]
+    assert fixed == 3
+
+
+@pytest.mark.asyncio
+async def test_analyze_page_is_bounded_background_and_keeps_failures():
+    tagger = FakeTagger(fail_on={"q3"})
+    service = AutoTagService(page_size=10, concurrency=2, tagger=tagger)
+    page = [(uuid.uuid4(), f"q{i}") for i in range(6)]
+
+    results = await service.analyze_page(page)
+
+    assert [r[0] for r in results] == [qid for qid, _ in page]
+    assert results[3][1] is None and "ollama" in results[3][2]
+    assert tagger.max_active == 2
+    assert tagger.priorities == {Priority.BACKGROUND}
+
+
+@pytest.mark.asyncio
+async def test_write_page_upserts_tags_and_checkpoint_in_one_transaction():
+    service = AutoTagService(tagger=FakeTagger())
+    db = AsyncMock()
+    existing, inserted, plain = Mock(), Mock(), Mock()
+    existing.all.return_value = [("Algebra", "concept", 1)]
+    inserted.all.return_value = [("Quadratics", "skill", 2)]
+    db.execute.side_effect = [existing, inserted, plain, plain, plain]
+
+    q1, q2, q3 = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    page = [(q1, "a"), (q2, "b"), (q3, "c")]
+    results = [
+        (q1, [{"tag": "Algebra", "type": "concept", "confidence": 0.9}], None),
+        (q2, [{"tag": "Quadratics", "type": "skill", "confidence": 0.7}], None),
+        (q3, None, "timeout"),
+    ]
+    known = {}
+
+    tagged = await service.write_page(db, _job(), page, results, known)
+
+    assert tagged == [q1, q2]
+    assert known == {("Algebra", "concept"): 1, ("Quadratics", "skill"): 2}
+    # tags select, tags insert, question_tags upsert, status update, checkpoint update
+    assert db.execute.await_count == 5
+    checkpoint = db.execute.await_args_list[-1].args[0].compile().params
+    assert checkpoint["last_question_id"] == q3
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_run_stops_on_cancel_flag(monkeypatch):
+    from contextlib import asynccontextmanager
+    from app.services import auto_tag_service as module
+
+    db = AsyncMock()
+    job = _job(cancel_requested=True)
+    db.get.return_value = job
+
+    @asynccontextmanager
+    async def session():
+        yield db
+
+    monkeypatch.setattr(module, "SessionLocal", session)
+    service = AutoTagService(tagger=FakeTagger())
+    service.analyze_page = AsyncMock()
+
+    await service.run(job.job_id)
+
+    service.analyze_page.assert_not_awaited()
+    final = db.execute.await_args_list[-1].args[0].compile().params
+    assert final["status"] == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_resume_requeues_only_jobs_without_a_queue_entry():
+    service = AutoTagService(tagger=FakeTagger())
+    service.start_job = AsyncMock()
+    db = AsyncMock()
+
+    stuck = _job(status="running")
+    db.get.return_value = stuck
+    service.is_queued = AsyncMock(return_value=True)
+    await service.resume_job(db, stuck.job_id)
+    service.start_job.assert_not_awaited()
+
+    service.is_queued = AsyncMock(return_value=False)  # e.g. its process died before the queue existed
+    await service.resume_job(db, stuck.job_id)
+    service.start_job.assert_awaited_once_with(db, stuck.job_id)
+    assert stuck.status == "queued"
+
+
+@pytest.mark.asyncio
+async def test_run_failure_is_recorded_and_raised_for_retry(monkeypatch):
+    from contextlib import asynccontextmanager
+    from app.services import auto_tag_service as module
+
+    db = AsyncMock()
+    db.get.return_value = _job()
+    db.execute.side_effect = [Mock(), RuntimeError("connection reset"), Mock()]
+
+    @asynccontextmanager
+    async def session():
+        yield db
+
+    monkeypatch.setattr(module, "SessionLocal", session)
+
+    with pytest.raises(RuntimeError):
+        await AutoTagService(tagger=FakeTagger()).run(db.get.return_value.job_id)
+    final = db.execute.await_args_list[-1].args[0].compile().params
+    assert final["status"] == "failed"
@@ -0,0 +1,127 @@
+"""Tests for app/services/bkt_service.py"""
+import pytest
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, AsyncMock
+import numpy as np
+
+from app.services.bkt_service import (
+    BKTService,
+    MasteryEvent,
+    bkt_step,
+    pack_sequences,
+    run_sequences,
+)
+
+
+def _scalar_step(p, correct, t=0.1, s=0.1, g=0.2):
+    if correct:
+        post = p * (1 - s) / (p * (1 - s) + (1 - p) * g)
+    else:
+        post = p * s / (p * s + (1 - p) * (1 - g))
+    return post + (1 - post) * t
+
+
+def test_bkt_step_matches_scalar_formula():
+    """Vectorized step equals the textbook BKT update"""
+    p = np.array([0.1, 0.5, 0.9, 0.5])
+    correct = np.array([True, True, False, False])
+    params = np.full(4, 0.1), np.full(4, 0.1), np.full(4, 0.2)
+
+    result = bkt_step(p, correct, *params)
+
+    expected = [_scalar_step(pi, ci) for pi, ci in zip(p, correct)]
+    assert np.allclose(result, expected)
+
+
+def test_correct_answer_raises_mastery():
+    """Correct answers raise mastery, wrong answers lower it"""
+    p = np.array([0.5, 0.5])
+    params = np.full(2, 0.1), np.full(2, 0.1), np.full(2, 0.2)
+
+    up, down = bkt_step(p, np.array([True, False]), *params)
+
+    assert up > 0.5
+    assert down < 0.5
+
+
+def test_run_sequences_handles_ragged_pairs():
+    """Pairs with different sequence lengths match a per-pair scalar loop"""
+    sequences = [[True, True, True], [False], [True, False, True, True, False]]
+    outcomes, mask = pack_sequences(sequences)
+    n = len(sequences)
+
+    result = run_sequences(
+        np.full(n, 0.1), outcomes, mask, np.full(n, 0.1), np.full(n, 0.1), np.full(n, 0.2)
+    )
+
+    for i, seq in enumerate(sequences):
+        p = 0.1
+        for c in seq:
+            p = _scalar_step(p, c)
+        assert result[i] == pytest.approx(p)
+
+
+def test_pack_sequences_shape():
+    """Ragged lists are left-aligned with a validity mask"""
+    outcomes, mask = pack_sequences([[True], [False, True]])
+
+    assert outcomes.shape == (2, 2)
+    assert mask.tolist() == [[True, False], [True, True]]
+    assert outcomes.tolist() == [[True, False], [False, True]]
+
+
+@pytest.mark.asyncio
+async def test_update_batch_single_upsert_per_batch():
+    """Many events for many pairs are written with one upsert and one commit"""
+    service = BKTService()
+    user_a, user_b = uuid.uuid4(), uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    events = [
+        MasteryEvent(user_a, "Algebra", True, now),
+        MasteryEvent(user_a, "Algebra", True, now + timedelta(seconds=1)),
+        MasteryEvent(user_b, "Geometry", False, now),
+    ]
+
+    select_result = Mock()
+    select_result.scalars = Mock(return_value=Mock(all=Mock(return_value=[])))
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=select_result)
+
+    updated = await service.update_batch(db, events)
+
+    # insert-if-missing + SELECT ... FOR UPDATE + one INSERT ... ON CONFLICT
+    assert db.execute.await_count == 3
+    db.commit.assert_awaited_once()
+    assert updated[(user_a, "Algebra")] > updated[(user_b, "Geometry")]
+
+
+@pytest.mark.asyncio
+async def test_update_batch_locks_pairs_in_chunks(monkeypatch):
+    """Missing pairs are created before the lock, and both statements are chunked"""
+    from sqlalchemy.dialects import postgresql
+    import app.models.curriculum  # noqa: F401  (mappers must be complete to compile ORM selects)
+    from app.services import bkt_service
+
+    monkeypatch.setattr(bkt_service, "UPSERT_CHUNK_ROWS", 2)
+    select_result = Mock()
+    select_result.scalars = Mock(return_value=Mock(all=Mock(return_value=[])))
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=select_result)
+    events = [MasteryEvent(uuid.uuid4(), "Algebra", True) for _ in range(3)]
+
+    await BKTService().update_batch(db, events)
+
+    sql = [str(c.args[0].compile(dialect=postgresql.dialect())) for c in db.execute.await_args_list]
+    assert ["ON CONFLICT" in s and "DO NOTHING" in s for s in sql[:4]] == [True, False, True, False]
+    assert all("FOR UPDATE" in s for s in sql[1:4:2])
+    assert len(sql) == 6  # two lock chunks, two upsert chunks
+
+
+@pytest.mark.asyncio
+async def test_update_batch_empty():
+    """Empty batches do not touch the database"""
+    db = AsyncMock()
+
+    assert await BKTService().update_batch(db, []) == {}
+    db.execute.assert_not_awaited()
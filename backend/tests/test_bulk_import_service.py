@@ -0,0 +1,123 @@
+"""Tests for app/services/bulk_import_service.py"""
+import json
+import pytest
+import uuid
+from unittest.mock import Mock, AsyncMock
+
+from app.services.bulk_import_service import (
+    BulkImportService,
+    UnsupportedBulkFormat,
+    parse_rows,
+)
+
+
+async def _stream(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def _collect(agen):
+    return [row async for row in agen]
+
+
+@pytest.mark.asyncio
+async def test_parse_ndjson_across_chunk_boundaries():
+    """Lines split across network chunks are reassembled"""
+    sid, qid = uuid.uuid4(), uuid.uuid4()
+    line = json.dumps({"student_id": str(sid), "question_id": str(qid), "is_correct": True}).encode()
+    body = line + b"\n" + b"{not json}\n" + line
+
+    rows = await _collect(parse_rows(_stream(body[:10], body[10:50], body[50:]), "application/x-ndjson"))
+
+    assert [r[0] for r in rows] == [1, 2, 3]
+    assert rows[0][1].question_id == qid
+    assert rows[1][1] is None and rows[1][2]
+
+
+@pytest.mark.asyncio
+async def test_parse_csv_with_header():
+    """CSV rows are mapped by header and empty cells become None"""
+    sid, qid = uuid.uuid4(), uuid.uuid4()
+    body = (
+        "student_id,question_id,is_correct,time_taken_seconds,notes\r\n"
+        f"{sid},{qid},true,30,\r\n"
+        f"{sid},{qid},maybe,,\r\n"
+    ).encode()
+
+    rows = await _collect(parse_rows(_stream(body), "text/csv; charset=utf-8"))
+
+    assert rows[0][1].time_taken_seconds == 30
+    assert rows[0][1].notes is None
+    assert rows[1][1] is None
+
+
+@pytest.mark.asyncio
+async def test_invalid_utf8_rejects_the_row_only():
+    sid, qid = uuid.uuid4(), uuid.uuid4()
+    line = json.dumps({"student_id": str(sid), "question_id": str(qid), "is_correct": True}).encode()
+
+    rows = await _collect(parse_rows(_stream(b"\xff\xfe{}\n" + line), "application/x-ndjson"))
+
+    assert rows[0][1] is None and "utf-8" in rows[0][2]
+    assert rows[1][1].question_id == qid
+
+
+@pytest.mark.asyncio
+async def test_unsupported_content_type():
+    with pytest.raises(UnsupportedBulkFormat):
+        await _collect(parse_rows(_stream(b"x"), "application/xml"))
+
+
+def _db_with_known_questions(known):
+    result = Mock()
+    result.scalars = Mock(return_value=Mock(all=Mock(return_value=list(known))))
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_unknown_question_fails_only_that_row():
+    """Set-based validation rejects unknown question IDs without failing the chunk"""
+    good_q, bad_q, sid = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    lines = [
+        json.dumps({"student_id": str(sid), "question_id": str(q), "is_correct": True})
+        for q in (good_q, bad_q, good_q)
+    ]
+    service = BulkImportService(chunk_rows=10)
+    service.copy_attempts = AsyncMock()
+    service.apply_rollups = AsyncMock()
+    service.after_commit = AsyncMock()
+    db = _db_with_known_questions({good_q})
+
+    result = await service.import_stream(db, _stream("\n".join(lines).encode()), "application/x-ndjson")
+
+    assert result.success_count == 2
+    assert result.failed_count == 1
+    assert result.chunks[0].failed_items[0]["row"] == 2
+    copied = service.copy_attempts.await_args.args[1]
+    assert len(copied) == 2
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_does_not_affect_other_chunks():
+    """Each chunk commits independently"""
+    qid, sid = uuid.uuid4(), uuid.uuid4()
+    body = "\n".join(
+        json.dumps({"student_id": str(sid), "question_id": str(qid), "is_correct": False})
+        for _ in range(4)
+    ).encode()
+    service = BulkImportService(chunk_rows=2)
+    service.copy_attempts = AsyncMock(side_effect=[RuntimeError("copy failed"), None])
+    service.apply_rollups = AsyncMock()
+    service.after_commit = AsyncMock()
+    db = _db_with_known_questions({qid})
+
+    result = await service.import_stream(db, _stream(body), "application/x-ndjson")
+
+    assert [c.status for c in result.chunks] == ["failed", "committed"]
+    service.apply_rollups.assert_awaited_once()  # the failed chunk's rollups were never applied
+    assert result.success_count == 2
+    assert result.failed_count == 2
+    assert result.total_rows == 4
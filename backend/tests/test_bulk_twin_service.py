@@ -0,0 +1,146 @@
+"""Tests for app/services/bulk_twin_service.py and app/services/near_duplicate_index.py"""
+import asyncio
+import uuid
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+from sqlalchemy.dialects import postgresql
+
+from app.services import bulk_twin_service
+from app.services.bulk_twin_service import BulkTwinService
+from app.services.near_duplicate_index import MinHashIndex, shingles
+
+
+BANK = {
+    "q1": "이차방정식 x^2 - 5x + 6 = 0 의 두 근의 합을 구하시오.",
+    "q2": "삼각형 ABC에서 AB = 5, BC = 12, 각 B가 직각일 때 AC의 길이를 구하시오.",
+}
+
+
+def test_shingles_ignore_spacing_and_case():
+    assert shingles("X + 1 = 2") == shingles("x+1=2")
+
+
+def test_index_finds_near_duplicates_but_not_related_questions():
+    index = MinHashIndex(threshold=0.8)
+    for key, text in BANK.items():
+        index.add(key, text)
+
+    near = "이차방정식  x^2 - 5x + 6 = 0의 두 근의 합을 구하시오"
+    other = "이차방정식 x^2 + 3x - 10 = 0 의 두 근의 곱을 구하시오."
+
+    assert [key for key, _ in index.similar(near)] == ["q1"]
+    assert index.similar(other) == []
+    assert index.add_unless_duplicate("t1", near)[0] == "q1"
+    assert index.add_unless_duplicate("t2", other) is None
+    assert index.add_unless_duplicate("t3", other + " ")[0] == "t2"  # accepted twins are indexed too
+    assert len(index) == 3
+
+
+class FakeGenerator:
+    def __init__(self, stems, fail=()):
+        self.stems = stems
+        self.fail = set(fail)
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_twin_variant(self, source, variant, total):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0)
+        self.active -= 1
+        if variant in self.fail:
+            raise RuntimeError("invalid JSON")
+        return SimpleNamespace(content_stem=self.stems[variant - 1])
+
+
+@pytest.mark.asyncio
+async def test_generate_is_bounded_and_selection_drops_duplicates():
+    generator = FakeGenerator([
+        "이차방정식 x^2 - 5x + 6 = 0 의 두 근의 합을 구하시오",  # repeats q1
+        "이차방정식 x^2 - 7x + 12 = 0 의 두 근의 곱을 구하시오.",
+        "x",
+    ], fail={3})
+    service = BulkTwinService(concurrency=2, generator=generator)
+    source = SimpleNamespace(question_id=uuid.uuid4())
+    index = MinHashIndex()
+    for key, text in BANK.items():
+        index.add(key, text)
+
+    generated = await service.generate([source, source], 3)
+    selection = service.select_unique(index, generated)
+
+    assert generator.max_active == 2
+    assert selection["failed"] == 2
+    assert [twin.content_stem for _, _, twin in selection["accepted"]] == [generator.stems[1]]
+    # as_completed order is not deterministic
+    assert sorted(d["duplicate_of"] for d in selection["duplicates"]) == sorted(
+        ["q1", "q1", str(selection["accepted"][0][0])]
+    )
+
+
+@pytest.mark.asyncio
+async def test_run_skips_twinned_sources_and_commits_per_chunk(monkeypatch):
+    now = datetime.now()
+    originals = [
+        SimpleNamespace(question_id=uuid.uuid4(), question_type="short_answer", content_stem=f"문제 {i}",
+                        content_metadata={}, answer_key={"answer": str(i)}, difficulty_index=0.5, status="active",
+                        version=1, created_by=None, created_at=now, updated_at=now)
+        for i in range(3)
+    ]
+    db = AsyncMock()
+    result = Mock()
+    result.scalars.return_value.all.return_value = originals
+    db.execute.return_value = result
+
+    @asynccontextmanager
+    async def session():
+        yield db
+
+    monkeypatch.setattr(bulk_twin_service, "SessionLocal", session)
+    monkeypatch.setattr(bulk_twin_service, "SOURCE_CHUNK", 1)
+    from app.services.recommender_service import recommender_service
+    monkeypatch.setattr(recommender_service, "refresh_questions", AsyncMock())
+    stems = iter(["이차방정식 x^2 - 7x + 12 = 0 의 두 근의 곱을 구하시오.",
+                  "삼각형의 넓이가 24이고 밑변이 8일 때 높이를 구하시오."])
+    generator = Mock(generate_twin_variant=AsyncMock(side_effect=lambda *_: SimpleNamespace(content_stem=next(stems))))
+    service = BulkTwinService(generator=generator)
+    service.sources_with_twins = AsyncMock(return_value={originals[0].question_id})  # done by an earlier attempt
+    service.build_index = AsyncMock(return_value=MinHashIndex())
+    service.insert_twins = AsyncMock()
+
+    summary = await service.run("Math.Algebra", 1)
+
+    assert (summary["sources"], summary["skipped"], summary["accepted"]) == (3, 1, 2)
+    # one insert (and commit) per chunk of sources, never for the skipped one
+    inserted = [call.args[1][0][1].question_id for call in service.insert_twins.await_args_list]
+    assert inserted == [originals[1].question_id, originals[2].question_id]
+
+
+@pytest.mark.asyncio
+async def test_insert_twins_copies_curriculum_links_in_bulk():
+    service = BulkTwinService(generator=FakeGenerator([]))
+    source = SimpleNamespace(question_id=uuid.uuid4())
+    twins = [
+        (uuid.uuid4(), source, SimpleNamespace(
+            question_type="short_answer", content_stem=f"stem {i}", answer_key={"answer": str(i)},
+            difficulty_index=0.5, content_metadata=Mock(model_dump=Mock(return_value={"is_twin_generated": True})),
+        ))
+        for i in range(3)
+    ]
+    db = AsyncMock()
+    links = Mock()
+    links.all.return_value = [(source.question_id, 7, 0.9)]
+    db.execute.side_effect = [links, Mock(), Mock()]
+
+    await service.insert_twins(db, twins, {source.question_id: None})
+
+    # link lookup, one multi-row questions INSERT, one question_curriculum INSERT
+    assert db.execute.await_count == 3
+    questions_insert = db.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect())
+    assert questions_insert.params["status_m2"] == "generated"
+    link_sql = str(db.execute.await_args_list[2].args[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT DO NOTHING" in link_sql
+    db.commit.assert_awaited_once()
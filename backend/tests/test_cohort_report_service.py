@@ -0,0 +1,99 @@
+"""Tests for app/services/cohort_report_service.py"""
+import json
+import uuid
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from unittest.mock import Mock, AsyncMock
+
+from app.services import cohort_report_service as module
+from app.services.analytics_service import build_report_payload
+from app.services.cohort_report_service import CohortReportService
+
+
+SINCE = datetime(2026, 10, 10, tzinfo=timezone.utc)
+
+
+def _result(rows):
+    result = Mock()
+    result.all.return_value = rows
+    return result
+
+
+def test_build_report_payload_splits_strengths_and_weaknesses():
+    payload = build_report_payload(
+        SINCE, total_count=10, correct_count=7, total_time_ms=3_900_000,
+        performances=[("분수", 92.0, 4), ("도형", 70.0, 3), ("방정식", 40.0, 3)],
+    )
+
+    assert payload["accuracy"] == 70.0
+    assert payload["study_time"] == "1시간 5분"
+    assert payload["strengths"] == ["분수 (92%)"]
+    assert payload["weaknesses"][0]["concept"] == "방정식"
+    assert payload["period"].startswith("2026-10-10")
+
+
+@pytest.mark.asyncio
+async def test_collect_report_data_uses_grouped_queries_for_explicit_cohort():
+    active, idle = uuid.uuid4(), uuid.uuid4()
+    db = AsyncMock()
+    db.execute.side_effect = [
+        _result([(active, 5, 4, 60000)]),
+        _result([(active, "도형", 50.0, 2), (active, "분수", 95.0, 3)]),
+    ]
+
+    totals, performances = await CohortReportService().collect_report_data(db, SINCE, [active, idle])
+
+    assert db.execute.await_count == 2
+    assert totals == {active: (5, 4, 60000), idle: (0, 0, 0)}
+    # Best node first, as the single-student report orders them
+    assert [name for name, _, _ in performances[active]] == ["분수", "도형"]
+    assert idle not in performances
+
+
+@pytest.mark.asyncio
+async def test_run_records_stage_timings_and_manifest(tmp_path, monkeypatch):
+    student = uuid.uuid4()
+    service = CohortReportService(output_dir=str(tmp_path), workers=1)
+    service.collect_report_data = AsyncMock(return_value=({student: (2, 1, 0)}, {}))
+
+    async def fake_render_all(job, payloads, report=None):
+        job.rendered = len(payloads)
+        return {str(sid): {"sha256": "ab" * 32, "path": "x.pdf"} for sid in payloads}
+    service.render_all = fake_render_all
+
+    @asynccontextmanager
+    async def fake_session():
+        yield AsyncMock()
+    monkeypatch.setattr(module, "SessionLocal", fake_session)
+
+    job = service.new_job(since=SINCE)
+    progress = AsyncMock()
+    await service.run(job, progress=progress)
+
+    state = job.to_dict()
+    assert progress.await_args.args[0]["total"] == 1  # published for pollers on other workers
+    assert state["status"] == "completed"
+    assert state["total"] == 1 and state["progress"] == 1.0
+    assert set(state["stage_ms"]) == {"query", "build", "render"}
+    with open(job.manifest_path, encoding="utf-8") as f:
+        assert str(student) in json.load(f)["reports"]
+
+
+@pytest.mark.asyncio
+async def test_run_reraises_failures_for_the_queue_to_retry():
+    service = CohortReportService()
+    service.collect_report_data = AsyncMock(side_effect=ConnectionError("db down"))
+
+    @asynccontextmanager
+    async def fake_session():
+        yield AsyncMock()
+
+    job = service.new_job(since=SINCE)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(module, "SessionLocal", fake_session)
+        with pytest.raises(ConnectionError):
+            await service.run(job)
+    assert job.status == "failed" and job.finished_at is not None
+    # a retry of the same batch writes the same manifest
+    assert service.new_job(since=SINCE).job_id == job.job_id
@@ -0,0 +1,53 @@
+"""Tests for app/services/curriculum_index.py"""
+import pytest
+from unittest.mock import Mock, AsyncMock
+
+from app.services.curriculum_index import CurriculumIndex, CurriculumIndexCache, IndexedNode
+
+
+PATHS = [
+    "Math.Geometry", "Math", "Math.Algebra.Quadratics", "Math.Algebra",
+    "Math.Algebra.Linear", "Orphan.Child", "Science",
+]
+
+
+def _index():
+    return CurriculumIndex(IndexedNode(i, p.rsplit(".", 1)[-1], p) for i, p in enumerate(PATHS, start=1))
+
+
+def test_preorder_children_depth_and_subtree_ranges():
+    index = _index()
+
+    assert [n.path for n in index.children_of("Math")] == ["Math.Algebra", "Math.Geometry"]
+    assert [n.path for n in index.subtree("Math.Algebra")] == [
+        "Math.Algebra", "Math.Algebra.Linear", "Math.Algebra.Quadratics",
+    ]
+    assert index.depth[index.position_by_path["Math.Algebra.Linear"]] == 2
+    assert index.is_ancestor("Math", "Math.Algebra.Quadratics")
+    assert not index.is_ancestor("Math.Geometry", "Math.Algebra")
+    assert index.get_by_id(3).path == "Math.Algebra.Quadratics"
+
+
+def test_missing_parent_becomes_root_in_tree():
+    tree = _index().as_tree()
+
+    assert [root["path"] for root in tree] == ["Math", "Orphan.Child", "Science"]
+    algebra = tree[0]["children"][0]
+    assert [c["name"] for c in algebra["children"]] == ["Linear", "Quadratics"]
+
+
+@pytest.mark.asyncio
+async def test_cache_builds_once_until_invalidated():
+    cache = CurriculumIndexCache(ttl_seconds=0)
+    db = AsyncMock()
+    result = Mock()
+    result.all.return_value = [(1, "Math", "Math", None, None)]
+    db.execute.return_value = result
+
+    first = await cache.get(db)
+    assert await cache.get(db) is first
+    assert db.execute.await_count == 1
+
+    cache.invalidate()
+    assert await cache.get(db) is not first
+    assert db.execute.await_count == 2
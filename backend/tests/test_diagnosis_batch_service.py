@@ -0,0 +1,69 @@
+"""Tests for app/services/diagnosis_batch_service.py"""
+import time
+from unittest.mock import AsyncMock
+import pytest
+
+import app.services.knowledge_profile_service as knowledge_profile_service
+import app.services.misconception_cache_service as misconception_cache_service
+from app.services.analysis_cache_service import AnalysisCache
+from app.services.diagnosis_batch_service import BatchPatternAnalysis, DiagnosisBatchService
+from app.services.misconception_cache_service import MisconceptionCache
+
+
+class SlowDiagnosisService:
+    """Blocking diagnose() like mathesis_core's; answers "2" are wrong."""
+
+    def diagnose(self, student_id, question_content, student_answer, correct_answer=None, question_id=None):
+        time.sleep(0.1)
+        if student_answer == "boom":
+            raise RuntimeError("LLM returned garbage")
+        wrong = student_answer == "2"
+        return {
+            "student_id": student_id,
+            "question_id": question_id,
+            "is_correct": not wrong,
+            "error_type": "calculation_error" if wrong else None,
+            "concepts_involved": ["덧셈"],
+            "kg_operations": [{"operation": "update", "relation": "struggles_with" if wrong else "mastered",
+                               "concept": "덧셈", "strength": 0.2 if wrong else 0.9}],
+        }
+
+
+def test_pattern_analysis_is_incremental():
+    pattern = BatchPatternAnalysis(weak_threshold=0.5)
+    pattern.add({"is_correct": False, "error_type": "calculation_error", "concepts_involved": ["분수"],
+                 "kg_operations": []})
+    assert pattern.snapshot()["weak_concepts"] == ["분수"]
+
+    pattern.add({"is_correct": True, "concepts_involved": ["분수"], "kg_operations": []})
+    pattern.add({"is_correct": True, "concepts_involved": ["분수"], "kg_operations": []})
+    snapshot = pattern.snapshot()
+    assert (snapshot["analyzed"], snapshot["accuracy"], snapshot["weak_concepts"]) == (3, 0.6667, [])
+    assert snapshot["error_types"] == {"calculation_error": 1}
+    assert "3문제 중 2문제 정답" in pattern.overall_diagnosis()
+
+
+@pytest.mark.asyncio
+async def test_batch_fans_out_and_streams_results_as_they_finish(monkeypatch):
+    record = AsyncMock()
+    monkeypatch.setattr(knowledge_profile_service.knowledge_profile_store, "record", record)
+    monkeypatch.setattr(misconception_cache_service, "misconception_cache",
+                        MisconceptionCache(AnalysisCache(persistent=False)))
+    attempts = [{"question": f"1+{i}=?", "student_answer": "2" if i == 0 else str(i + 1) + "0"} for i in range(5)]
+    attempts += [{"question": "x", "student_answer": "boom"}, {"student_answer": "1"}]
+
+    started = time.monotonic()
+    events = [event async for event in DiagnosisBatchService(concurrency=4).run(SlowDiagnosisService(), "s1", attempts)]
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.45  # 6 diagnoses of 0.1s in two rounds, not 0.6s in sequence
+    results = [e for e in events if e["type"] == "result"]
+    assert sorted(e["index"] for e in results) == [0, 1, 2, 3, 4]
+    assert [e["pattern_analysis"]["analyzed"] for e in results] == [1, 2, 3, 4, 5]
+    assert sorted(e["index"] for e in events if e["type"] == "error") == [5, 6]
+
+    summary = events[-1]
+    assert summary["type"] == "summary"
+    assert (summary["completed"], summary["failed"]) == (5, 2)
+    assert summary["pattern_analysis"]["error_types"] == {"calculation_error": 1}
+    assert record.await_count == 5
@@ -0,0 +1,66 @@
+"""Tests for app/services/diagnosis_executor.py"""
+import asyncio
+import threading
+import time
+import pytest
+
+from app.core.llm_gateway import LLMGateway
+from app.services.diagnosis_executor import DiagnosisExecutor, DiagnosisOverloaded, DiagnosisTimeout
+
+
+@pytest.mark.asyncio
+async def test_blocking_diagnosis_does_not_freeze_the_event_loop():
+    executor = DiagnosisExecutor(workers=2, max_pending=4, timeout=5)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    results = await asyncio.gather(*(executor.run(lambda i=i: time.sleep(0.2) or i) for i in range(2)))
+    task.cancel()
+
+    assert results == [0, 1]
+    assert ticks >= 10
+    assert executor.stats()["completed"] == 2
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pending_limit_rejects_instead_of_queueing():
+    executor = DiagnosisExecutor(workers=1, max_pending=1, timeout=5)
+    release = threading.Event()
+
+    first = asyncio.create_task(executor.run(release.wait))
+    await asyncio.sleep(0)
+    with pytest.raises(DiagnosisOverloaded):
+        await executor.run(lambda: None)
+
+    release.set()
+    assert await first is True
+    assert executor.stats()["rejected"] == 1
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timeout_stops_the_abandoned_call_at_its_next_llm_call():
+    executor = DiagnosisExecutor(workers=1, max_pending=2, timeout=0.1)
+    gateway = LLMGateway(max_concurrency=1, reserved_interactive=0, interactive_timeout=0, background_timeout=0)
+    calls = []
+
+    def batch():
+        for i in range(50):
+            gateway.run_sync("m", lambda: time.sleep(0.03))
+            calls.append(i)
+
+    with pytest.raises(DiagnosisTimeout):
+        await executor.run(batch)
+    await asyncio.sleep(0.1)
+
+    assert len(calls) < 10
+    stats = executor.stats()
+    assert (stats["pending"], stats["timeouts"], stats["failed"]) == (0, 1, 1)
+    executor.shutdown()
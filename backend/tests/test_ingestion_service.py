@@ -0,0 +1,161 @@
+"""Tests for app/services/ingestion_service.py"""
+import asyncio
+import json
+import pytest
+import uuid
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock
+
+from sqlalchemy.exc import IntegrityError
+
+from app.services import ingestion_service
+from app.services.ingestion_service import (
+    AttemptIngestionBuffer,
+    IngestionBufferFull,
+    PendingAttempt,
+)
+
+
+def _attempt():
+    return PendingAttempt(
+        user_id=uuid.uuid4(),
+        question_id=uuid.uuid4(),
+        response_data={},
+        is_correct=True,
+        score=100.0,
+        time_taken_ms=1000,
+    )
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_batch_size():
+    """A full batch is written as one call"""
+    buffer = AttemptIngestionBuffer(max_pending=100, batch_size=5, flush_interval_ms=1000)
+    buffer.write_batch = AsyncMock()
+
+    for _ in range(5):
+        await buffer.submit(_attempt())
+    await buffer.stop()
+
+    buffer.write_batch.assert_awaited_once()
+    assert len(buffer.write_batch.await_args.args[0]) == 5
+    assert buffer.stats["flushed"] == 5
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_interval():
+    """A partial batch is flushed once the interval elapses"""
+    buffer = AttemptIngestionBuffer(max_pending=100, batch_size=500, flush_interval_ms=20)
+    buffer.write_batch = AsyncMock()
+
+    await buffer.submit(_attempt())
+    await asyncio.sleep(0.1)
+
+    buffer.write_batch.assert_awaited_once()
+    await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_pending():
+    """Nothing buffered is lost on shutdown"""
+    buffer = AttemptIngestionBuffer(max_pending=100, batch_size=3, flush_interval_ms=5000)
+    buffer.write_batch = AsyncMock()
+
+    for _ in range(7):
+        await buffer.submit(_attempt())
+    await buffer.stop()
+
+    written = sum(len(c.args[0]) for c in buffer.write_batch.await_args_list)
+    assert written == 7
+    assert buffer.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_backpressure_when_full():
+    """Producers are rejected once the bounded queue stays full"""
+    release = asyncio.Event()
+
+    async def slow_write(batch):
+        await release.wait()
+
+    buffer = AttemptIngestionBuffer(max_pending=2, batch_size=1, flush_interval_ms=10, enqueue_timeout_ms=20)
+    buffer.write_batch = slow_write
+
+    await buffer.submit(_attempt())  # taken by the flusher, blocks in write
+    await asyncio.sleep(0.02)
+    await buffer.submit(_attempt())
+    await buffer.submit(_attempt())
+
+    with pytest.raises(IngestionBufferFull):
+        await buffer.submit(_attempt())
+    assert buffer.stats["rejected"] == 1
+
+    release.set()
+    await buffer.stop()
+    assert buffer.stats["flushed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_counted_as_dropped(tmp_path):
+    """Batches that keep failing are dead-lettered after retries instead of growing memory"""
+    dead_letter = tmp_path / "attempts.jsonl"
+    buffer = AttemptIngestionBuffer(max_pending=10, batch_size=2, flush_interval_ms=10,
+                                    dead_letter_path=str(dead_letter))
+    buffer.write_batch = AsyncMock(side_effect=RuntimeError("db down"))
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.services.ingestion_service.FLUSH_RETRY_BASE_DELAY", 0)
+        await buffer.submit(_attempt())
+        await buffer.submit(_attempt())
+        await buffer.stop()
+
+    assert buffer.stats["dropped"] == 2
+    assert buffer.stats["flushed"] == 0
+    assert len(dead_letter.read_text().splitlines()) == 2
+
+
+@pytest.mark.asyncio
+async def test_row_errors_split_the_batch_and_dead_letter_only_bad_rows(tmp_path):
+    """One unknown question_id does not take the rest of the batch down with it"""
+    dead_letter = tmp_path / "attempts.jsonl"
+    buffer = AttemptIngestionBuffer(max_pending=10, batch_size=5, flush_interval_ms=1000,
+                                    dead_letter_path=str(dead_letter))
+    attempts = [_attempt() for _ in range(5)]
+    bad = attempts[3]
+    written = []
+
+    async def write_batch(batch):
+        if bad in batch:
+            raise IntegrityError("INSERT", {}, Exception("violates foreign key constraint"))
+        written.extend(batch)
+
+    buffer.write_batch = write_batch
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.services.ingestion_service.FLUSH_RETRY_BASE_DELAY", 0)
+        for attempt in attempts:
+            await buffer.submit(attempt)
+        await buffer.stop()
+
+    assert sorted(map(id, written)) == sorted(id(a) for a in attempts if a is not bad)
+    assert (buffer.stats["flushed"], buffer.stats["dropped"], buffer.stats["dead_lettered"]) == (4, 1, 1)
+    row = json.loads(dead_letter.read_text())
+    assert row["question_id"] == str(bad.question_id) and row["error"].startswith("IntegrityError")
+
+
+@pytest.mark.asyncio
+async def test_rollup_failure_rolls_back_the_logs(monkeypatch):
+    """Logs and rollups commit together; a failed rollup fails the batch for retry"""
+    from app.services.rollup_service import rollup_service
+
+    db = AsyncMock()
+
+    @asynccontextmanager
+    async def session():
+        yield db
+
+    monkeypatch.setattr(ingestion_service, "SessionLocal", session)
+    monkeypatch.setattr(rollup_service, "apply_attempts", AsyncMock(side_effect=RuntimeError("deadlock")))
+
+    with pytest.raises(RuntimeError):
+        await AttemptIngestionBuffer().write_batch([_attempt()])
+    db.commit.assert_not_awaited()
@@ -0,0 +1,72 @@
+"""Tests for app/services/irt_service.py"""
+import uuid
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.irt_service import (
+    IRTCalibrationService,
+    ResponseMatrix,
+    fit_2pl,
+    from_difficulty_index,
+    initial_parameters,
+    to_difficulty_index,
+)
+
+
+def _simulate(n_items=40, n_users=3000, per_user=20, seed=0):
+    rng = np.random.default_rng(seed)
+    a = rng.lognormal(0.0, 0.3, n_items)
+    b = rng.normal(0.0, 1.0, n_items)
+    theta = rng.normal(0.0, 1.0, n_users)
+    users = np.repeat(np.arange(n_users, dtype=np.int32), per_user)
+    items = rng.integers(0, n_items, users.size).astype(np.int32)
+    p = 1.0 / (1.0 + np.exp(-a[items] * (theta[users] - b[items])))
+    matrix = ResponseMatrix(
+        user_ids=[uuid.uuid4() for _ in range(n_users)],
+        question_ids=[uuid.uuid4() for _ in range(n_items)],
+        users=users, items=items, correct=rng.random(users.size) < p,
+    )
+    return matrix, a, b
+
+
+def test_fit_recovers_simulated_parameters():
+    matrix, a, b = _simulate()
+    result = fit_2pl(matrix, *initial_parameters(matrix))
+
+    assert result.converged
+    assert np.corrcoef(b, result.b)[0, 1] > 0.97
+    assert np.corrcoef(a, result.a)[0, 1] > 0.8
+
+
+def test_warm_start_converges_faster():
+    matrix, _, _ = _simulate(seed=1)
+    cold = fit_2pl(matrix, *initial_parameters(matrix))
+    warm = fit_2pl(matrix, *initial_parameters(matrix, cold.a, cold.b))
+
+    assert warm.iterations < cold.iterations
+    np.testing.assert_allclose(warm.b, cold.b, atol=0.05)
+
+
+def test_difficulty_index_roundtrip_stays_in_unit_range():
+    b = np.array([-3.0, 0.0, 2.5])
+    idx = to_difficulty_index(b)
+    assert ((idx > 0) & (idx < 1)).all()
+    np.testing.assert_allclose(from_difficulty_index(idx), b, atol=1e-9)
+
+
+@pytest.mark.asyncio
+async def test_calibrate_only_writes_items_with_enough_responses():
+    matrix, _, _ = _simulate(n_items=5, n_users=200, per_user=5)
+    matrix.items[matrix.items == 4] = 3  # item 4 ends up with no responses
+    service = IRTCalibrationService()
+    service.load_responses = AsyncMock(return_value=matrix)
+    service.load_previous = AsyncMock(return_value=(np.full(5, np.nan), np.full(5, np.nan)))
+    service.write_parameters = AsyncMock()
+
+    summary = await service.calibrate(AsyncMock(), min_responses=1)
+
+    rows = service.write_parameters.await_args.args[1]
+    assert summary["updated"] == len(rows) == 4
+    assert {r["question_id"] for r in rows} == set(matrix.question_ids[:4])
+    assert all(0 < r["difficulty_index"] < 1 for r in rows)
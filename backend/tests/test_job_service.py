@@ -0,0 +1,134 @@
+"""Tests for app/services/job_service.py"""
+import uuid
+import pytest
+from unittest.mock import AsyncMock, Mock
+from sqlalchemy.dialects import postgresql
+
+from app.core.llm_gateway import Priority, current_priority
+from app.models.background_job import BackgroundJob
+from app.services.job_handlers import JobKind, PermanentJobError
+from app.schemas.job import DiagramJobPayload
+from app.services.job_service import JobService, retry_delay
+
+
+def _service(handler):
+    return JobService(workers=0, kinds={"diagram": JobKind(DiagramJobPayload, handler)})
+
+
+def _job(**kwargs):
+    fields = dict(job_id=uuid.uuid4(), kind="diagram", payload={"description": "circle"}, attempts=1, max_attempts=3)
+    fields.update(kwargs)
+    return BackgroundJob(**fields)
+
+
+def _finished(service):
+    service._finish = AsyncMock()
+    return service._finish
+
+
+def test_retry_delay_doubles_with_jitter_and_cap():
+    assert retry_delay(1, 5, 600, rand=lambda: 1.0) == 5
+    assert retry_delay(3, 5, 600, rand=lambda: 1.0) == 20
+    assert retry_delay(3, 5, 600, rand=lambda: 0.0) == 10
+    assert retry_delay(20, 5, 600, rand=lambda: 1.0) == 600
+
+
+def test_claim_skips_locked_rows_and_reclaims_expired_leases():
+    sql = str(_service(AsyncMock()).claim_statement("w1").compile(dialect=postgresql.dialect()))
+
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "lease_expires_at <" in sql
+    assert "attempts + " in sql and "RETURNING" in sql
+
+
+@pytest.mark.asyncio
+async def test_execute_stores_result_at_background_priority():
+    seen = []
+
+    async def handler(payload):
+        seen.append((payload, current_priority()))
+        return {"image_url": "/static/diagrams/x.png"}
+
+    service = _service(handler)
+    finish = _finished(service)
+
+    await service.execute(_job(), "w1")
+
+    assert seen == [({"description": "circle"}, Priority.BACKGROUND)]
+    assert finish.await_args.kwargs["status"] == "succeeded"
+    assert finish.await_args.kwargs["result"] == {"image_url": "/static/diagrams/x.png"}
+
+
+@pytest.mark.asyncio
+async def test_execute_requeues_transient_failures_until_the_last_attempt():
+    service = _service(AsyncMock(side_effect=RuntimeError("ollama down")))
+    finish = _finished(service)
+
+    await service.execute(_job(attempts=1), "w1")
+    assert finish.await_args.kwargs["status"] == "queued"
+    assert "ollama down" in finish.await_args.kwargs["error"]
+
+    await service.execute(_job(attempts=3), "w1")
+    assert finish.await_args.kwargs["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_permanent_errors_and_dead_leases_fail_without_retry():
+    handler = AsyncMock(side_effect=PermanentJobError("Question not found"))
+    service = _service(handler)
+    finish = _finished(service)
+
+    await service.execute(_job(attempts=1), "w1")
+    assert finish.await_args.kwargs["status"] == "failed"
+
+    # Reclaimed after the worker running its last attempt died
+    await service.execute(_job(attempts=4), "w1")
+    assert finish.await_args.kwargs["status"] == "failed"
+    assert handler.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_returns_existing_job_for_reused_idempotency_key():
+    service = _service(AsyncMock())
+    existing = _job(idempotency_key="k1")
+    db = AsyncMock()
+    conflict, lookup = Mock(), Mock()
+    conflict.scalar_one_or_none.return_value = None
+    lookup.scalar_one.return_value = existing
+    db.execute.side_effect = [conflict, lookup]
+
+    job, created = await service.enqueue(db, "diagram", {"description": "circle"}, idempotency_key="k1")
+
+    assert job is existing and created is False
+    insert_sql = str(db.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (kind, idempotency_key) DO NOTHING" in insert_sql
+
+
+@pytest.mark.asyncio
+async def test_handlers_publish_progress_on_their_own_row(monkeypatch):
+    from contextlib import asynccontextmanager
+    from app.services import job_service as module
+
+    db = AsyncMock()
+
+    @asynccontextmanager
+    async def session():
+        yield db
+
+    monkeypatch.setattr(module, "SessionLocal", session)
+
+    async def handler(payload):
+        await service.report_progress({"done": 1, "total": 2})
+        return {}
+
+    service = _service(handler)
+    _finished(service)
+    job = _job()
+
+    await service.report_progress({"done": 0})  # outside a handler: nothing to update
+    db.execute.assert_not_awaited()
+    await service.execute(job, "w1")
+
+    params = db.execute.await_args.args[0].compile(dialect=postgresql.dialect()).params
+    assert params["progress"] == {"done": 1, "total": 2}
+    assert params["job_id_1"] == job.job_id and params["locked_by_1"] == "w1"
@@ -0,0 +1,127 @@
+"""Tests for app/services/knowledge_profile_service.py"""
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DataError
+
+import app.services.knowledge_profile_service as knowledge_profile_service
+from app.services.knowledge_profile_service import KnowledgeProfile, KnowledgeProfileStore, diagnosis_delta
+
+T0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def _op(concept, relation, strength, operation="update"):
+    return {"operation": operation, "relation": relation, "concept": concept, "strength": strength}
+
+
+def test_deltas_merge_counts_and_keep_the_newest_relation():
+    profile = KnowledgeProfile("s1")
+    profile.apply(diagnosis_delta(False, [_op("인수분해", "struggles_with", 0.2), _op("일차방정식", "mastered", 0.9)], T0))
+    profile.apply(diagnosis_delta(True, [_op("인수분해", "mastered", 0.8)], T0 + timedelta(minutes=1)))
+    profile.apply(diagnosis_delta(False, [_op("일차방정식", "mastered", 0.9, operation="remove")], T0))
+
+    state = profile.concepts["인수분해"]
+    assert (profile.total_attempts, profile.total_correct, profile.overall_accuracy) == (3, 1, 0.3333)
+    assert (state.relation, state.evidence_count, round(state.mastery, 2)) == ("mastered", 2, 0.5)
+    assert list(profile.concepts) == ["인수분해"]
+    assert profile.weak(0.6) == ["인수분해"] and profile.weak() == []
+
+
+def test_operation_objects_with_enum_relations_are_accepted():
+    op = SimpleNamespace(operation="update", relation=SimpleNamespace(value="misconception"),
+                         concept="분수", strength=0.3, evidence="분모끼리 더함")
+    profile = KnowledgeProfile("s1")
+    profile.apply(diagnosis_delta(False, [op], T0))
+    assert profile.misconception_concepts == ["분수"]
+    assert profile.to_graph_data()["edges"][0]["relation"] == "misconception"
+
+
+def _session(db):
+    @asynccontextmanager
+    async def session():
+        yield db
+    return session
+
+
+@pytest.mark.asyncio
+async def test_miss_loads_from_db_and_replays_unflushed_deltas(monkeypatch):
+    db = AsyncMock()
+    totals, concepts = Mock(), Mock()
+    totals.one_or_none.return_value = (4, 3)
+    concepts.scalars.return_value.all.return_value = [SimpleNamespace(
+        concept="인수분해", relation="mastered", strength=0.9, last_seen_at=T0,
+        evidence_count=4, mastery_sum=3.6, last_evidence=None,
+    )]
+    db.execute.side_effect = [totals, concepts]
+    monkeypatch.setattr(knowledge_profile_service, "SessionLocal", _session(db))
+    store = KnowledgeProfileStore(flush_interval_ms=60_000)
+
+    await store.record("s1", False, [_op("인수분해", "struggles_with", 0.1)])
+    profile = await store.get("s1")
+
+    assert (profile.total_attempts, profile.total_correct) == (5, 3)
+    assert profile.concepts["인수분해"].relation == "struggles_with"
+    assert round(profile.concepts["인수분해"].mastery, 2) == 0.74
+    assert await store.get("s1") is profile  # served from the LRU
+    assert db.execute.await_count == 2
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_additive_upserts_and_keeps_deltas_on_failure(monkeypatch):
+    db = AsyncMock()
+    monkeypatch.setattr(knowledge_profile_service, "SessionLocal", _session(db))
+    store = KnowledgeProfileStore(flush_interval_ms=60_000)
+
+    await store.record("s1", True, [_op("a", "mastered", 0.9), _op("b", "x", 0.5, operation="remove")])
+    await store.record("s1", False, [_op("a", "struggles_with", 0.3)])
+    await store.record("s2", True, [])
+
+    db.commit.side_effect = [RuntimeError("db down"), None]
+    assert await store.flush() == 0
+    assert store.pending == 2
+    assert await store.flush() == 2
+    assert store.pending == 0
+
+    statements = [str(c.args[0].compile(dialect=postgresql.dialect())) for c in db.execute.await_args_list[-3:]]
+    assert "total_attempts = (student_knowledge_profiles.total_attempts + excluded.total_attempts)" in statements[0]
+    assert statements[1].startswith("DELETE FROM student_concept_knowledge")
+    assert "evidence_count = (student_concept_knowledge.evidence_count + excluded.evidence_count)" in statements[2]
+    params = db.execute.await_args_list[-1].args[0].compile(dialect=postgresql.dialect()).params
+    assert (params["evidence_count_m0"], params["relation_m0"]) == (2, "struggles_with")
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_bad_rows_are_isolated_and_dead_lettered(tmp_path):
+    dead_letter = tmp_path / "profiles.jsonl"
+    store = KnowledgeProfileStore(flush_interval_ms=60_000, dead_letter_path=str(dead_letter))
+    written = []
+
+    async def write_batch(batch):
+        if "bad" in batch:
+            raise DataError("INSERT", {}, Exception("value too long for type character varying(50)"))
+        written.extend(batch)
+
+    store.write_batch = write_batch
+    for student_id in ("s1", "s2", "bad", "s3"):
+        await store.record(student_id, True, [_op("a", "mastered", 0.9)])
+
+    assert await store.flush() == 3
+    assert sorted(written) == ["s1", "s2", "s3"]
+    assert store.pending == 0 and store.stats["dead_lettered_students"] == 1
+    assert json.loads(dead_letter.read_text())["student_id"] == "bad"
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_oversized_fields_are_bounded_before_the_database():
+    delta = diagnosis_delta(False, [_op("분수", "x" * 80, 0.3)], T0)
+    assert len(delta.concepts["분수"].relation) == 50
+
+    with pytest.raises(ValueError):
+        await KnowledgeProfileStore(flush_interval_ms=60_000).record("s" * 101, True, [])
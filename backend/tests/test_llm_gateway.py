@@ -0,0 +1,106 @@
+"""Tests for app/core/llm_gateway.py"""
+import asyncio
+import threading
+import pytest
+
+from app.core.llm_gateway import LLMDeadlineExceeded, LLMGateway, Priority, llm_request
+
+
+def _gateway(**kwargs):
+    options = dict(max_concurrency=1, reserved_interactive=0, interactive_timeout=0, background_timeout=0)
+    options.update(kwargs)
+    return LLMGateway(**options)
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_jump_the_background_queue():
+    gateway = _gateway()
+    release = asyncio.Event()
+    order = []
+
+    async def job(name):
+        order.append(name)
+        await release.wait()
+        return name
+
+    first = asyncio.create_task(gateway.run("m", lambda: job("bg-1"), Priority.BACKGROUND))
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.create_task(gateway.run("m", lambda: job("bg-2"), Priority.BACKGROUND)),
+        asyncio.create_task(gateway.run("m", lambda: job("ui-1"), Priority.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0)
+    assert gateway.limiter("m").stats()["queued"] == {"interactive": 1, "background": 1}
+
+    release.set()
+    await asyncio.gather(first, *queued)
+    assert order == ["bg-1", "ui-1", "bg-2"]
+
+
+@pytest.mark.asyncio
+async def test_reserved_slots_are_never_given_to_background_work():
+    gateway = _gateway(max_concurrency=2, reserved_interactive=1)
+    release = asyncio.Event()
+
+    async def job():
+        await release.wait()
+
+    with llm_request(Priority.BACKGROUND):
+        background = [asyncio.create_task(gateway.run("m", job)) for _ in range(2)]
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(gateway.run("m", job))
+    await asyncio.sleep(0)
+
+    stats = gateway.limiter("m").stats()
+    assert stats["active"] == {"interactive": 1, "background": 1}
+    assert stats["queued"]["background"] == 1
+
+    release.set()
+    await asyncio.gather(interactive, *background)
+    assert gateway.limiter("m").stats()["completed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_deadline_covers_queue_wait_and_generation():
+    gateway = _gateway()
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+
+    holder = asyncio.create_task(gateway.run("m", slow))
+    await asyncio.sleep(0)
+    with llm_request(timeout=0.01):
+        with pytest.raises(LLMDeadlineExceeded):
+            await gateway.run("m", slow)  # times out while queued
+    release.set()
+    await holder
+
+    release.clear()
+    with llm_request(timeout=0.01):
+        with pytest.raises(TimeoutError):
+            await gateway.run("m", slow)  # times out while generating
+    stats = gateway.limiter("m").stats()
+    assert stats["timeouts"] == 2 and stats["active"]["interactive"] == 0
+
+
+def test_sync_callers_share_the_same_slots():
+    gateway = _gateway()
+    limiter = gateway.limiter("m")
+    inside, release = threading.Event(), threading.Event()
+
+    def hold():
+        inside.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=lambda: gateway.run_sync("m", hold))
+    worker.start()
+    inside.wait(5)
+    with pytest.raises(LLMDeadlineExceeded):
+        with llm_request(timeout=0.01):
+            gateway.run_sync("m", lambda: None)
+    release.set()
+    worker.join(5)
+
+    assert gateway.run_sync("m", lambda: "ok") == "ok"
+    assert limiter.stats()["queued"] == {"interactive": 0, "background": 0}
@@ -0,0 +1,107 @@
+"""Tests for app/core/llm_metrics.py"""
+import asyncio
+import pytest
+
+import app.core.llm_gateway as llm_gateway_module
+import app.core.single_flight as single_flight_module
+from app.core.llm_gateway import GatewayClient, LLMDeadlineExceeded, LLMGateway
+from app.core.llm_metrics import LLMMetrics, current_template, llm_template
+from app.core.single_flight import SingleFlight, SingleFlightClient
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = LLMMetrics(ring_size=50)
+    monkeypatch.setattr(llm_gateway_module, "llm_metrics", metrics)
+    monkeypatch.setattr(single_flight_module, "llm_metrics", metrics)
+    return metrics
+
+
+def _gateway(**kwargs):
+    options = dict(max_concurrency=1, reserved_interactive=0, interactive_timeout=0, background_timeout=0)
+    options.update(kwargs)
+    return LLMGateway(**options)
+
+
+class FakeClient:
+    def __init__(self, result, delay=0.0):
+        self.result = result
+        self.delay = delay
+
+    async def generate(self, prompt, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_template_labels_nest_and_follow_async_generators():
+    @llm_template("outer")
+    async def outer():
+        with llm_template("inner"):
+            assert current_template() == "inner"
+        return current_template()
+
+    @llm_template("streamed")
+    async def stream():
+        yield current_template()
+        yield current_template()
+
+    assert await outer() == "outer"
+    assert [label async for label in stream()] == ["streamed", "streamed"]
+    assert current_template() == "unlabelled"
+
+
+@pytest.mark.asyncio
+async def test_gateway_calls_record_queue_wait_latency_and_tokens(metrics):
+    gateway = _gateway()
+    slow = GatewayClient(FakeClient({"response": "{}", "prompt_eval_count": 12, "eval_count": 3}, delay=0.05), "m", gateway)
+    plain = GatewayClient(FakeClient("x" * 40), "m", gateway)
+
+    with llm_template("twin"):
+        await asyncio.gather(slow.generate(prompt="p"), plain.generate(prompt="y" * 80))
+
+    first, second = sorted(metrics.recent(kind="call"), key=lambda e: e["queue_wait_ms"])
+    assert first["template"] == "twin" and first["outcome"] == "ok" and first["priority"] == "interactive"
+    assert (first["prompt_tokens"], first["completion_tokens"], first["tokens_estimated"]) == (12, 3, False)
+    assert (second["prompt_tokens"], second["completion_tokens"], second["tokens_estimated"]) == (20, 10, True)
+    assert second["queue_wait_ms"] >= 40  # waited for the single slot
+    assert second["latency_ms"] >= second["queue_wait_ms"]
+
+    summary = metrics.summary()["templates"]["twin"]["m"]
+    assert summary["calls"] == 2 and summary["prompt_tokens"] == 32
+
+
+@pytest.mark.asyncio
+async def test_timeouts_events_and_prometheus_export(metrics):
+    gateway = _gateway(interactive_timeout=0.01)
+    client = GatewayClient(FakeClient("late", delay=0.2), "m", gateway)
+
+    with llm_template("diagnosis"):
+        with pytest.raises(LLMDeadlineExceeded):
+            await client.generate(prompt="p")
+        metrics.event("json_parse_failure", model="m", detail="Expecting value")
+        metrics.event("fallback", model="m")
+
+    assert metrics.recent(outcome="timeout")[0]["template"] == "diagnosis"
+    assert [e["kind"] for e in metrics.recent(template="diagnosis")] == ["fallback", "json_parse_failure", "call"]
+    assert metrics.recent(template="diagnosis", limit=1)[0]["kind"] == "fallback"
+    with pytest.raises(ValueError):
+        metrics.event("call")
+
+    text = metrics.prometheus()
+    assert 'llm_calls_total{template="diagnosis",model="m",outcome="timeout"} 1' in text
+    assert 'llm_latency_seconds_bucket{template="diagnosis",model="m",le="+Inf"} 1' in text
+    assert 'llm_json_parse_failures_total{template="diagnosis",model="m"} 1' in text
+    assert 'llm_fallbacks_total{template="diagnosis",model="m"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_coalesced_calls_are_counted_once_as_calls(metrics):
+    client = SingleFlightClient(GatewayClient(FakeClient("same", delay=0.01), "m", _gateway(max_concurrency=4)),
+                                SingleFlight(), namespace="m")
+
+    with llm_template("dna_analysis"):
+        await asyncio.gather(*(client.generate(prompt="p") for _ in range(3)))
+
+    stats = metrics.summary()["templates"]["dna_analysis"]["m"]
+    assert (stats["calls"], stats["coalesced"]) == (1, 2)
@@ -0,0 +1,63 @@
+"""Tests for app/services/mastery_backfill_service.py"""
+import json
+import uuid
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from app.services.bkt_service import bkt_step, DEFAULT_P_MASTERY, DEFAULT_P_TRANSIT, DEFAULT_P_SLIP, DEFAULT_P_GUESS
+from app.services.mastery_backfill_service import (
+    BackfillProgress,
+    MasteryBackfillService,
+    read_checkpoint,
+    replay_shard,
+    split_pairs,
+    write_checkpoint,
+)
+
+T0 = datetime(2026, 9, 1, tzinfo=timezone.utc)
+PARAMS = (DEFAULT_P_MASTERY, DEFAULT_P_TRANSIT, DEFAULT_P_SLIP, DEFAULT_P_GUESS)
+
+
+def test_split_pairs_groups_per_user_and_skill_in_time_order():
+    u1, u2 = uuid.uuid4(), uuid.uuid4()
+    keys, sequences, stats = split_pairs([
+        (u1, [("A", True, T0), ("B", False, T0 + timedelta(1)), ("A", False, T0 + timedelta(2))]),
+        (u2, [("A", True, T0)]),
+    ])
+
+    assert keys == [(u1, "A"), (u1, "B"), (u2, "A")]
+    assert sequences == [[True, False], [False], [True]]
+    assert stats[0] == {"correct_count": 1, "last_attempt_at": T0 + timedelta(2)}
+
+
+def test_replay_shard_matches_sequential_bkt():
+    final = replay_shard([[True, True, False], [False]], PARAMS)
+
+    expected = DEFAULT_P_MASTERY
+    for outcome in (True, True, False):
+        expected = float(bkt_step(expected, outcome, DEFAULT_P_TRANSIT, DEFAULT_P_SLIP, DEFAULT_P_GUESS))
+    assert final[0] == pytest.approx(expected)
+    assert len(final) == 2
+
+
+@pytest.mark.asyncio
+async def test_shards_never_split_a_user():
+    async def histories():
+        for n in (3, 3, 5, 1):
+            yield uuid.uuid4(), [("A", True, T0)] * n
+
+    service = MasteryBackfillService(workers=1, shard_attempts=5)
+    sizes = [[len(h[1]) for h in shard] async for shard in service.shards(histories())]
+
+    assert sizes == [[3, 3], [5], [1]]
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    path = str(tmp_path / "ckpt.json")
+    progress = BackfillProgress(users=2, attempts=10, last_user_id=str(uuid.uuid4()))
+    write_checkpoint(path, progress)
+
+    assert read_checkpoint(path)["last_user_id"] == progress.last_user_id
+    assert read_checkpoint(str(tmp_path / "missing.json")) is None
+    with open(path, encoding="utf-8") as f:
+        assert "attempts_per_second" in json.load(f)
@@ -139,3 +139,21 @@ async def test_fetch_public_exams_default_year():
         result = await server.fetch_public_exams("KICE")
         
         mock_service.download_exam.assert_called_once_with("KICE", "2025")
+
+
+@pytest.mark.asyncio
+async def test_analyze_problem_stream():
+    """Test analyze_problem_stream forwards generated tokens in order"""
+    server = Node2MCPServer()
+
+    async def tokens(prompt):
+        assert "x^2" in prompt
+        for token in ["This is ", "a quadratic", "..."]:
+            yield token
+
+    with patch('app.mcp.server.ollama_service') as mock_service:
+        mock_service.stream_text = tokens
+
+        chunks = [chunk async for chunk in server.analyze_problem_stream("Solve x^2 + 5x + 6 = 0")]
+
+        assert "".join(chunks) == "This is a quadratic..."
@@ -0,0 +1,66 @@
+"""Tests for app/services/misconception_cache_service.py"""
+import asyncio
+from unittest.mock import AsyncMock
+import pytest
+
+from app.services.analysis_cache_service import AnalysisCache
+from app.services.misconception_cache_service import MisconceptionCache, diagnosis_model
+
+QUESTION = "x^2 - 1 = 0 을 푸시오"
+
+
+def _cache(**kwargs):
+    return MisconceptionCache(AnalysisCache(persistent=False), **kwargs)
+
+
+def _diagnosis(student_id="first", is_correct=False):
+    return {"student_id": student_id, "question_id": "q1", "is_correct": is_correct,
+            "error_type": "calculation_error", "feedback": "부호를 확인하세요.",
+            "kg_operations": [], "timestamp": "2026-03-01T09:00:00"}
+
+
+def test_key_normalizes_answers_but_not_the_question():
+    cache = _cache()
+    base = cache.key_text(QUESTION, "x = -1", "x = 1, -1")
+
+    assert cache.key_text(f"  {QUESTION} ", "x=−1", "x=1,-1") == base
+    assert cache.key_text(QUESTION, "x = 1", "x = 1, -1") != base
+    assert cache.key_text(QUESTION.replace("-", "+"), "x = -1", "x = 1, -1") != base
+    assert _cache(prompt_version="v2").key_text(QUESTION, "x = -1", "x = 1, -1") != base
+    assert diagnosis_model(object()) == "llama3"
+
+
+@pytest.mark.asyncio
+async def test_same_wrong_answer_is_diagnosed_once_and_replayed_per_student():
+    cache = _cache()
+    compute = AsyncMock(side_effect=[_diagnosis(), _diagnosis("other")])
+
+    async def diagnose(student_id, answer, model="llama3"):
+        return await cache.diagnose(compute, student_id=student_id, question_content=QUESTION,
+                                    student_answer=answer, question_id=f"q-{student_id}", model=model)
+
+    first, second, third = await asyncio.gather(diagnose("s1", "x = -1"), diagnose("s2", "x=−1"), diagnose("s3", "x=-1"))
+    assert compute.await_count == 1
+    assert [r["student_id"] for r in (first, second, third)] == ["s1", "s2", "s3"]
+    assert second["question_id"] == "q-s2" and second["timestamp"] != "2026-03-01T09:00:00"
+    assert second["feedback"] == first["feedback"]
+
+    await diagnose("s4", "x = -1", model="qwen2.5")  # another model is another entry
+    assert compute.await_count == 2
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 2, 0.5)
+
+
+@pytest.mark.asyncio
+async def test_stream_entries_are_stored_without_student_fields():
+    cache = _cache()
+    key = dict(question_content=QUESTION, student_answer="3", namespace="diagnosis_stream")
+
+    assert await cache.get(student_id="s1", **key) is None
+    await cache.put(_diagnosis("s1"), **key)
+    replayed = await cache.get(student_id="s2", question_id="q9", **key)
+
+    assert (replayed["student_id"], replayed["question_id"]) == ("s2", "q9")
+    stored = await cache.cache.get(cache.key_text(QUESTION, "3", None), "llama3", "diagnosis_stream")
+    assert (stored["student_id"], stored["timestamp"]) == (None, None)
+    assert cache.get_stats()["namespaces"]["diagnosis_stream"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,88 @@
+"""Tests for app/devtools/ollama_standin.py"""
+import json
+import httpx
+import pytest
+
+from app.devtools.ollama_standin import Cassette, LatencyProfile, OllamaStandin, request_key, split_tokens
+
+
+def _entry(endpoint, body, text, **extra):
+    entry = {
+        "key": request_key(endpoint, body), "endpoint": endpoint, "model": body["model"],
+        "chunks": split_tokens(text), "timing": {"ttft_ms": 200.0, "total_ms": 600.0},
+    }
+    entry.update(extra)
+    return entry
+
+
+def _client(standin):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=standin.app()), base_url="http://standin")
+
+
+GENERATE = {"model": "qwen2.5:latest", "prompt": "Solve x^2 = 4", "format": "json"}
+
+
+@pytest.mark.asyncio
+async def test_replays_generate_as_ollama_ndjson_stream():
+    cassette = Cassette()
+    cassette.add(_entry("generate", GENERATE, '{"answer": "x = 2 or x = -2"}'))
+    standin = OllamaStandin(cassette)
+
+    async with _client(standin) as client:
+        response = await client.post("/api/generate", json={**GENERATE, "options": {"temperature": 0.7}})
+        lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert "".join(line["response"] for line in lines) == '{"answer": "x = 2 or x = -2"}'
+    assert [line["done"] for line in lines][-2:] == [False, True]
+    assert lines[-1]["eval_count"] == len(lines) - 1
+    assert standin.stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_without_stream_and_miss_policies():
+    body = {"model": "llama3", "messages": [{"role": "user", "content": "hi"}]}
+    cassette = Cassette()
+    cassette.add(_entry("chat", body, "Hello there"))
+
+    async with _client(OllamaStandin(cassette)) as client:
+        response = await client.post("/api/chat", json={**body, "stream": False})
+        assert response.json()["message"]["content"] == "Hello there"
+
+        other = {"model": "llama3", "messages": [{"role": "user", "content": "unrecorded"}], "stream": False}
+        assert (await client.post("/api/chat", json=other)).json()["message"]["content"] == "Hello there"
+
+    async with _client(OllamaStandin(cassette, on_miss="error")) as client:
+        assert (await client.post("/api/chat", json=other)).status_code == 404
+
+
+def test_latency_profile_is_repeatable_per_request_occurrence():
+    entry = _entry("generate", GENERATE, "one two three four")
+    profile = LatencyProfile("test", ttft_ms=100.0, tokens_per_second=10.0, jitter=0.5)
+
+    first, second = OllamaStandin(Cassette(), profile, seed=3), OllamaStandin(Cassette(), profile, seed=3)
+    delays = first.delays(entry["key"], entry)
+
+    assert delays == second.delays(entry["key"], entry)
+    assert first.delays(entry["key"], entry) != delays  # next occurrence draws new jitter
+    assert 0.05 <= delays[0] <= 0.15 and all(0.05 <= d <= 0.15 for d in delays[1:])
+
+    recorded = OllamaStandin(Cassette(), LatencyProfile("rec", use_recorded=True, speed=2.0))
+    assert recorded.delays(entry["key"], entry) == [0.1, 0.2 / 3, 0.2 / 3, 0.2 / 3]
+
+
+@pytest.mark.asyncio
+async def test_record_mode_forwards_upstream_and_appends_to_cassette(tmp_path):
+    upstream_cassette = Cassette()
+    upstream_cassette.add(_entry("generate", GENERATE, "x equals two", eval_count=3))
+    upstream = _client(OllamaStandin(upstream_cassette))
+
+    path = tmp_path / "cassette.jsonl"
+    recorder = OllamaStandin(Cassette(str(path)), upstream_client=upstream)
+    async with _client(recorder) as client:
+        response = await client.post("/api/generate", json={**GENERATE, "stream": False})
+    await upstream.aclose()
+
+    assert response.json()["response"] == "x equals two"
+    replayed = Cassette(str(path)).lookup(request_key("generate", GENERATE))
+    assert "".join(replayed["chunks"]) == "x equals two"
+    assert replayed["eval_count"] == 3 and replayed["request"]["format"] == "json"
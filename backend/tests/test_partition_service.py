@@ -0,0 +1,65 @@
+"""Tests for app/services/partition_service.py"""
+import pytest
+from datetime import date
+from unittest.mock import Mock, AsyncMock
+from sqlalchemy.dialects import postgresql
+
+from app.services.partition_service import (
+    PartitionManager,
+    add_months,
+    parse_partition_month,
+    partition_name,
+)
+
+
+def test_add_months_wraps_years():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+
+
+def test_partition_name_roundtrip():
+    name = partition_name(date(2026, 3, 1))
+    assert name == "attempt_logs_2026_03"
+    assert parse_partition_month(name) == date(2026, 3, 1)
+    assert parse_partition_month("attempt_logs_default") is None
+
+
+def _executed_sql(db):
+    return [str(c.args[0].compile(dialect=postgresql.dialect())) for c in db.execute.await_args_list]
+
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_creates_only_missing_months():
+    manager = PartitionManager(months_ahead=2, retention_months=0)
+    manager.list_partitions = AsyncMock(return_value=["attempt_logs_2026_10"])
+    db = AsyncMock()
+
+    created = await manager.ensure_partitions(db, today=date(2026, 10, 17))
+
+    assert created == ["attempt_logs_2026_11", "attempt_logs_2026_12"]
+    sql = _executed_sql(db)
+    assert "FROM ('2026-12-01') TO ('2027-01-01')" in sql[-1]
+
+
+@pytest.mark.asyncio
+async def test_detach_expired_archives_old_partitions():
+    manager = PartitionManager(months_ahead=0, retention_months=12)
+    manager.list_partitions = AsyncMock(return_value=[
+        "attempt_logs_2025_01", "attempt_logs_2025_10", "attempt_logs_2025_11", "attempt_logs_2026_10",
+    ])
+    db = AsyncMock()
+
+    archived = await manager.detach_expired(db, today=date(2026, 10, 17))
+
+    # cutoff is 2025-10-01: only partitions ending on or before it are archived
+    assert archived == ["attempt_logs_2025_01"]
+    assert any("DETACH PARTITION attempt_logs_2025_01" in s for s in _executed_sql(db))
+
+
+@pytest.mark.asyncio
+async def test_retention_disabled():
+    manager = PartitionManager(months_ahead=0, retention_months=0)
+    db = AsyncMock()
+
+    assert await manager.detach_expired(db) == []
+    db.execute.assert_not_awaited()
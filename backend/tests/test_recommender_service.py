@@ -0,0 +1,103 @@
+"""Tests for app/services/recommender_service.py"""
+import time
+import uuid
+import random
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.recommender_service import (
+    ALL_ITEMS,
+    IndexedItem,
+    ItemIndex,
+    RecommenderService,
+    information,
+    logit,
+)
+
+
+def _item(b, a=1.0, nodes=(), tags=()):
+    return IndexedItem(uuid.uuid4(), a, b, tuple(nodes), tuple(tags))
+
+
+def test_information_peaks_at_item_difficulty():
+    assert information(1.5, 0.3, 0.3) > information(1.5, 0.3, 1.3)
+    assert information(2.0, 0.0, 0.0) == pytest.approx(1.0)
+
+
+def test_best_prefers_informative_unattempted_items_near_theta():
+    far, near, attempted, sharp = _item(3.0), _item(0.1), _item(0.0), _item(0.4, a=2.5)
+    index = ItemIndex.build([far, near, attempted, sharp])
+
+    best = index.best(ALL_ITEMS, 0.0, {attempted.question_id}, 2)
+
+    assert [qid for qid, _ in best] == [sharp.question_id, near.question_id]
+
+
+def test_upsert_and_remove_keep_buckets_sorted():
+    items = [_item(b, tags=("Fractions",)) for b in (0.5, -1.0, 2.0)]
+    index = ItemIndex()
+    for item in items:
+        index.upsert(item)
+    index.upsert(IndexedItem(items[0].question_id, 1.0, -2.0, (), ("Fractions",)))
+    index.remove(items[2].question_id)
+
+    bucket = index.buckets[("tag", "Fractions")]
+    assert bucket.difficulties == [-2.0, -1.0]
+    assert bucket.question_ids == [items[0].question_id, items[1].question_id]
+
+
+def test_choose_targets_weakest_skills_round_robin():
+    weak = [_item(b, tags=("Quadratics",)) for b in (-2.0, -1.5, 0.0)]
+    weaker = [_item(b, tags=("Fractions",)) for b in (-3.0, -2.9)]
+    mastered = [_item(2.0, tags=("Counting",))]
+    index = ItemIndex.build(weak + weaker + mastered)
+    mastery = {"Quadratics": 0.12, "Fractions": 0.05, "Counting": 0.99}
+
+    picked = RecommenderService(refresh_seconds=0).choose(index, mastery, set(), 3)
+
+    assert [p["target"]["value"] for p in picked] == ["Fractions", "Quadratics", "Fractions"]
+    assert picked[1]["question_id"] == weak[0].question_id  # closest to logit(0.12)
+    assert all(p["question_id"] != mastered[0].question_id for p in picked)
+
+
+def test_cold_start_uses_whole_bank_and_node_filter():
+    a, b = _item(0.0, nodes=(7,)), _item(0.2)
+    index = ItemIndex.build([a, b])
+    service = RecommenderService(refresh_seconds=0)
+
+    assert {p["question_id"] for p in service.choose(index, {}, set(), 5)} == {a.question_id, b.question_id}
+    assert [p["question_id"] for p in service.choose(index, {}, set(), 5, node_id=7)] == [a.question_id]
+
+
+@pytest.mark.asyncio
+async def test_refresh_questions_drops_items_no_longer_recommendable():
+    kept, archived = _item(0.0), _item(1.0)
+    service = RecommenderService(refresh_seconds=0)
+    service.index = ItemIndex.build([kept, archived])
+    service.load_items = AsyncMock(return_value=[IndexedItem(kept.question_id, 1.2, 0.5)])
+
+    await service.refresh_questions(AsyncMock(), [kept.question_id, archived.question_id])
+
+    assert set(service.index.items) == {kept.question_id}
+    assert service.index.items[kept.question_id].a == 1.2
+
+
+def test_selection_latency_on_large_bank():
+    rng = random.Random(0)
+    skills = [f"skill{i}" for i in range(200)]
+    items = [
+        _item(rng.gauss(0, 1), a=rng.uniform(0.5, 2.0), nodes=(rng.randrange(2000),), tags=(rng.choice(skills),))
+        for _ in range(100_000)
+    ]
+    index = ItemIndex.build(items)
+    service = RecommenderService(refresh_seconds=0)
+    mastery = {s: rng.uniform(0.05, 0.9) for s in rng.sample(skills, 40)}
+    attempted = {item.question_id for item in rng.sample(items, 2000)}
+
+    timings = []
+    for _ in range(200):
+        started = time.perf_counter()
+        service.choose(index, mastery, attempted, 10)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    assert timings[int(len(timings) * 0.99) - 1] < 0.010
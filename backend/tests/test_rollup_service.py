@@ -0,0 +1,67 @@
+"""Tests for app/services/rollup_service.py"""
+import uuid
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+from sqlalchemy.dialects import postgresql
+
+from app.services.rollup_service import RollupAttempt, RollupService, aggregate_deltas
+
+
+T0 = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def test_aggregate_deltas_folds_attempts_per_user_and_node():
+    user = uuid.uuid4()
+    q1, q2 = uuid.uuid4(), uuid.uuid4()
+    attempts = [
+        RollupAttempt(user, q1, True, 100.0, 30000, T0),
+        RollupAttempt(user, q1, False, 0.0, None, T0 + timedelta(minutes=5)),
+        RollupAttempt(user, q2, True, 80.0, 1000, T0 - timedelta(days=1)),
+    ]
+
+    deltas = aggregate_deltas(attempts, {q1: [1, 2], q2: [2]})
+
+    assert deltas[(user, 1)] == {
+        "attempt_count": 2, "correct_count": 1, "score_sum": 100.0,
+        "time_sum_ms": 30000, "last_attempt_at": T0 + timedelta(minutes=5),
+    }
+    assert deltas[(user, 2)]["attempt_count"] == 3
+    assert deltas[(user, 2)]["score_sum"] == 180.0
+    assert deltas[(user, 2)]["last_attempt_at"] == T0 + timedelta(minutes=5)
+
+
+def test_aggregate_deltas_skips_unmapped_questions():
+    attempts = [RollupAttempt(uuid.uuid4(), uuid.uuid4(), True, 100.0, 10, T0)]
+    assert aggregate_deltas(attempts, {}) == {}
+
+
+@pytest.mark.asyncio
+async def test_apply_attempts_issues_one_upsert_in_the_callers_transaction():
+    service = RollupService()
+    user, question = uuid.uuid4(), uuid.uuid4()
+    service.question_nodes = AsyncMock(return_value={question: [7]})
+    db = AsyncMock()
+
+    touched = await service.apply_attempts(db, [
+        RollupAttempt(user, question, True, 100.0, 500, T0),
+        RollupAttempt(user, question, True, 90.0, 500, T0),
+    ])
+
+    assert touched == 1
+    assert db.execute.await_count == 1
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (user_id, node_id) DO UPDATE" in sql
+    assert "student_node_rollups.attempt_count + excluded.attempt_count" in sql
+    db.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_apply_attempts_noop_without_curriculum_links():
+    service = RollupService()
+    service.question_nodes = AsyncMock(return_value={})
+    db = AsyncMock()
+
+    assert await service.apply_attempts(db, [RollupAttempt(uuid.uuid4(), uuid.uuid4(), False, 0.0, None, T0)]) == 0
+    db.execute.assert_not_awaited()
+    db.commit.assert_not_awaited()
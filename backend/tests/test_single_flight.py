@@ -0,0 +1,104 @@
+"""Tests for app/core/single_flight.py"""
+import asyncio
+import threading
+import time
+import pytest
+
+from app.core.single_flight import SingleFlight, SingleFlightClient
+
+
+class FakeClient:
+    model = "qwen"
+
+    def __init__(self):
+        self.generations = 0
+        self.release = asyncio.Event()
+
+    async def generate(self, prompt, **kwargs):
+        self.generations += 1
+        await self.release.wait()
+        return {"prompt": prompt, "n": self.generations}
+
+    def health(self):
+        return "ok"
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_calls_share_one_generation():
+    client = FakeClient()
+    proxy = SingleFlightClient(client, SingleFlight())
+
+    calls = [asyncio.create_task(proxy.generate("2x=4", temperature=0.1)) for _ in range(5)]
+    other = asyncio.create_task(proxy.generate("3x=9", temperature=0.1))
+    await asyncio.sleep(0)
+    client.release.set()
+    results = await asyncio.gather(*calls)
+
+    assert client.generations == 2
+    assert all(r == results[0] for r in results)
+    assert results[0] is not results[1]  # each caller owns its copy
+    assert (await other)["prompt"] == "3x=9"
+    assert proxy.health() == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return 42
+
+    leader = asyncio.create_task(flight.do("k", slow))
+    follower = asyncio.create_task(flight.do("k", slow))
+    await asyncio.sleep(0)
+    leader.cancel()
+    release.set()
+
+    assert await follower == 42
+    assert flight.stats()["coalesced"] == 1 and flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter_and_are_not_remembered():
+    flight = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise ValueError("bad json")
+
+    results = await asyncio.gather(flight.do("k", boom), flight.do("k", boom), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def ok():
+        return "fine"
+
+    assert await flight.do("k", ok) == "fine"
+
+
+def test_sync_calls_coalesce_across_threads():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do_sync("k", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do_sync("k", slow))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while flight.stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert runs == [1] and results == ["done"] * 4
@@ -0,0 +1,94 @@
+"""Tests for app/core/streaming.py and app/services/diagnosis_stream_service.py"""
+import json
+import sys
+from types import SimpleNamespace
+import pytest
+
+from app.core.llm_gateway import LLMGateway
+from app.core.streaming import PartialJSONScanner, sse_event
+from app.services.diagnosis_stream_service import diagnosis_from_json
+
+
+def test_scanner_emits_fields_as_they_complete_across_chunks():
+    scanner = PartialJSONScanner()
+    chunks = ['Sure: {"question_stem": "Solve \\"x', '\\" = 2, y", "ans', 'wer": 4, "steps": [1, {"a": ",}"}]', "}"]
+
+    emitted = [scanner.feed(chunk) for chunk in chunks]
+
+    assert emitted[0] == []
+    assert emitted[1] == [("question_stem", 'Solve "x" = 2, y')]
+    assert emitted[2] == [("answer", 4)]
+    assert emitted[3] == [("steps", [1, {"a": ",}"}])]
+    assert scanner.fields == json.loads(scanner.text[scanner.text.index("{"):])
+    assert scanner.document() == scanner.fields
+
+
+def test_scanner_document_rejects_a_cut_off_object():
+    scanner = PartialJSONScanner()
+    scanner.feed('{"is_correct": false, "error_type": "misconception", "feedback": "부호')
+
+    assert scanner.fields == {"is_correct": False, "error_type": "misconception"}
+    assert not scanner.closed
+    with pytest.raises(ValueError):
+        scanner.document()
+
+
+def test_sse_event_format():
+    assert sse_event("token", {"text": "이차"}) == 'event: token\ndata: {"text": "이차"}\n\n'
+
+
+def test_diagnosis_from_json_fills_defaults_and_clamps():
+    result = diagnosis_from_json(
+        {
+            "is_correct": "no",
+            "error_type": "misconception",
+            "kg_operations": [{"concept": "인수분해", "strength": 3}, {"strength": 0.2}],
+            "confidence": "0.7",
+        },
+        student_id="s1",
+        correct_answer="(x+1)^2",
+        student_answer="(x+1)(x-1)",
+    )
+
+    assert result["is_correct"] is False and result["error_type"] == "misconception"
+    assert result["kg_operations"] == [{
+        "operation": "update", "relation": "struggles_with", "concept": "인수분해", "strength": 1.0, "evidence": None,
+    }]
+    assert result["confidence"] == 0.7 and result["feedback"] == ""
+
+
+@pytest.mark.asyncio
+async def test_gateway_slot_holds_capacity_for_the_whole_stream():
+    gateway = LLMGateway(max_concurrency=1, reserved_interactive=0, interactive_timeout=0, background_timeout=0)
+    limiter = gateway.limiter("m")
+
+    async with gateway.slot("m") as deadline:
+        assert deadline is None
+        assert limiter.stats()["active"]["interactive"] == 1
+    assert limiter.stats()["active"]["interactive"] == 0 and limiter.stats()["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cut_off_diagnosis_stream_raises_and_is_not_cached(monkeypatch):
+    import app.services.misconception_cache_service as misconception_cache_service
+    from app.services.analysis_cache_service import AnalysisCache
+    from app.services.diagnosis_stream_service import stream_diagnosis
+    from app.services.misconception_cache_service import MisconceptionCache
+
+    async def stream_text(prompt, **kwargs):
+        # num_predict reached mid-object
+        for token in ['{"is_correct": false, ', '"feedback": "분모를']:
+            yield token
+
+    cache = MisconceptionCache(AnalysisCache(persistent=False))
+    monkeypatch.setattr(misconception_cache_service, "misconception_cache", cache)
+    monkeypatch.setitem(sys.modules, "app.services.ollama_service",
+                        SimpleNamespace(ollama_service=SimpleNamespace(stream_text=stream_text)))
+
+    events = []
+    with pytest.raises(ValueError, match="not a complete JSON object"):
+        async for kind, payload in stream_diagnosis("s1", "1/2 + 1/3 = ?", "2/5"):
+            events.append(kind)
+
+    assert "result" not in events
+    assert len(cache.cache.memory) == 0